@@ -13,6 +13,8 @@ PROGRESS_DETAILS_KEY = u'details'
 PROGRESS_STATE_KEY = u'state'
 PROGRESS_ERROR_DETAILS_KEY = u'error_details'
 PROGRESS_SUB_STEPS_KEY = u'sub_steps'
+# Only reported by steps that track the number of bytes they copied or wrote
+PROGRESS_NUM_BYTES_KEY = u'num_bytes'
 
 STATE_NOT_STARTED = u'NOT_STARTED'
 STATE_RUNNING = u'IN_PROGRESS'
@@ -36,6 +36,7 @@ ACTION_REFRESH_CONTENT_SOURCE = 'refresh_content_source'
 ACTION_REFRESH_ALL_CONTENT_SOURCES = 'refresh_all_content_sources'
 ACTION_DOWNLOAD_TYPE = 'download'
 ACTION_DEFERRED_DOWNLOADS_TYPE = 'deferred_download'
+ACTION_RECONCILE_ORPHAN_COUNTS = 'reconcile_orphan_counts'
 
 
 def action_tag(action_name):
@@ -262,18 +262,21 @@ class Repository(Entity):
             else:
                 distributor_in.add()
 
-    def run_synchronization(self, progress, cancelled, options):
+    def run_synchronization(self, progress, cancelled, options, bindings=None):
         """
         Run a repo_sync() on this repository.
         :param progress: A progress report.
         :type progress: pulp_node.progress.RepositoryProgress
         :param options: node synchronization options.
         :type options: dict
+        :param bindings: Optional pulp bindings for this node to be (re)used.
+            When not specified, new bindings are created.
+        :type bindings: pulp.bindings.bindings.Bindings
         :return: The task result.
         """
         warnings.warn(TASK_DEPRECATION_WARNING, NodeDeprecationWarning)
 
-        bindings = resources.pulp_bindings()
+        bindings = bindings or resources.pulp_bindings()
         poller = TaskPoller(bindings)
         max_download = options.get(
             constants.MAX_DOWNLOAD_CONCURRENCY_KEYWORD,
@@ -294,16 +297,18 @@ class Repository(Entity):
         task = http.response_body.spawned_tasks[0]
         result = poller.join(task.task_id, progress, cancelled)
         if cancelled():
-            self._cancel_synchronization(task)
+            self._cancel_synchronization(task, bindings)
         return result
 
-    def _cancel_synchronization(self, task):
+    def _cancel_synchronization(self, task, bindings=None):
         """
         Cancel a task associated with a repository synchronization.
         :param task: A running task.
         :type task: pulp.bindings.responses.Task
+        :param bindings: Optional pulp bindings for this node to be (re)used.
+        :type bindings: pulp.bindings.bindings.Bindings
         """
-        bindings = resources.pulp_bindings()
+        bindings = bindings or resources.pulp_bindings()
         http = bindings.tasks.cancel_task(task.task_id)
         if http.response_code == httplib.ACCEPTED:
             log.info('Task [%s] canceled', task.task_id)
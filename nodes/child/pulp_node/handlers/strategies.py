@@ -1,8 +1,11 @@
 from gettext import gettext as _
 from logging import getLogger
 from operator import itemgetter
+from Queue import Queue, Empty
+from threading import Thread
 
 from pulp_node import constants
+from pulp_node import resources
 from pulp_node.error import NodeError, CaughtException
 from pulp_node.handlers import model
 from pulp_node.handlers.validation import Validator
@@ -77,6 +80,126 @@ class Request(object):
         """
         self.progress.finished()
 
+    def concurrency(self):
+        """
+        Get the number of repositories to be synchronized concurrently.
+        :return: The number of concurrent repository synchronizations.
+        :rtype: int
+        """
+        limit = self.options.get(
+            constants.MAX_CONCURRENT_REPOSITORIES_KEYWORD,
+            constants.DEFAULT_CONCURRENT_REPOSITORIES)
+        return max(1, min(int(limit), len(self.bindings)))
+
+
+def shared_options(options, concurrency):
+    """
+    Get the synchronization options to be used for each repository when
+    repositories are synchronized concurrently.  The download concurrency and
+    bandwidth limits apply to the node as a whole so they are divided
+    among the repositories being synchronized at the same time.
+    :param options: The node synchronization options.
+    :type options: dict
+    :param concurrency: The number of concurrent repository synchronizations.
+    :type concurrency: int
+    :return: The options for each repository synchronization.
+    :rtype: dict
+    """
+    if concurrency < 2:
+        return options
+    options = dict(options)
+    max_download = options.get(
+        constants.MAX_DOWNLOAD_CONCURRENCY_KEYWORD,
+        constants.DEFAULT_DOWNLOAD_CONCURRENCY)
+    options[constants.MAX_DOWNLOAD_CONCURRENCY_KEYWORD] = max(1, int(max_download) / concurrency)
+    bandwidth = options.get(constants.MAX_DOWNLOAD_BANDWIDTH_KEYWORD)
+    if bandwidth:
+        options[constants.MAX_DOWNLOAD_BANDWIDTH_KEYWORD] = max(1, int(bandwidth) / concurrency)
+    return options
+
+
+# --- scheduling ------------------------------------------------------------------------
+
+
+class SyncWorker(Thread):
+    """
+    Processes repositories queued by the SyncScheduler.
+    The pulp bindings (connection) to this node are created once
+    and used for every repository processed by the worker.
+    :ivar queue: The queue of items to be processed.
+    :type queue: Queue
+    :ivar fn: The function called for each item as: fn(item, bindings).
+    :type fn: callable
+    """
+
+    def __init__(self, queue, fn):
+        """
+        :param queue: The queue of items to be processed.
+        :type queue: Queue
+        :param fn: The function called for each item as: fn(item, bindings).
+        :type fn: callable
+        """
+        super(SyncWorker, self).__init__(name='node-sync')
+        self.daemon = True
+        self.queue = queue
+        self.fn = fn
+
+    def run(self):
+        """
+        Process queued items until the queue is empty.
+        """
+        bindings = None
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except Empty:
+                break
+            try:
+                if bindings is None:
+                    bindings = resources.pulp_bindings()
+                self.fn(item, bindings)
+            except Exception:
+                log.exception('repository synchronization failed')
+
+
+class SyncScheduler(object):
+    """
+    Processes repositories with bounded concurrency.
+    When the concurrency is 1, items are processed in the calling thread.
+    :ivar concurrency: The maximum number of items processed concurrently.
+    :type concurrency: int
+    """
+
+    def __init__(self, concurrency):
+        """
+        :param concurrency: The maximum number of items processed concurrently.
+        :type concurrency: int
+        """
+        self.concurrency = concurrency
+
+    def run(self, fn, items):
+        """
+        Process the items and wait for all of them to be processed.
+        Items are started in order.
+        :param fn: The function called for each item as: fn(item, bindings).
+            The function is expected to handle (and report) its own errors.
+        :type fn: callable
+        :param items: The items to be processed.
+        :type items: list
+        """
+        if self.concurrency < 2:
+            for item in items:
+                fn(item, None)
+            return
+        queue = Queue()
+        for item in items:
+            queue.put(item)
+        workers = [SyncWorker(queue, fn) for n in range(self.concurrency)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
 
 # --- abstract strategy -----------------------------------------------------------------
 
@@ -128,50 +251,80 @@ class HandlerStrategy(object):
         Add or update repositories based on bindings.
           - Merge repositories found in BOTH parent and child.
           - Add repositories found in the parent but NOT in the child.
+        Up to request.concurrency() repositories are merged and
+        synchronized at the same time.
         :param request: A synchronization request.
         :type request: SyncRequest
         """
-        for bind in request.bindings:
-            try:
-                repo_id = bind['repo_id']
-                details = bind['details']
-                if request.cancelled():
-                    request.summary[repo_id].action = RepositoryReport.CANCELLED
-                    continue
-                parent = model.Repository(repo_id, details)
-                child = model.Repository.fetch(repo_id)
-                progress = request.progress.find_report(repo_id)
-                progress.begin_merging()
-                if child:
-                    request.summary[repo_id].action = RepositoryReport.MERGED
-                    child.merge(parent)
-                else:
-                    child = model.Repository(repo_id, parent.details)
-                    request.summary[repo_id].action = RepositoryReport.ADDED
-                    child.add()
-                self._synchronize_repository(request, repo_id)
-            except NodeError, ne:
-                request.summary.errors.append(ne)
-            except Exception, e:
-                log.exception(repo_id)
-                error = CaughtException(e, repo_id)
-                request.summary.errors.append(error)
+        concurrency = request.concurrency()
+        options = shared_options(request.options, concurrency)
+
+        def merge(bind, bindings):
+            self._merge_repository(request, bind, options, bindings)
+
+        scheduler = SyncScheduler(concurrency)
+        scheduler.run(merge, request.bindings)
 
-    def _synchronize_repository(self, request, repo_id):
+    def _merge_repository(self, request, bind, options=None, bindings=None):
+        """
+        Add or update the repository for a binding and synchronize it.
+        :param request: A synchronization request.
+        :type request: SyncRequest
+        :param bind: A consumer binding payload.
+        :type bind: dict
+        :param options: The synchronization options for the repository.
+            Defaults to the request options.
+        :type options: dict
+        :param bindings: Optional pulp bindings for this node to be (re)used.
+        :type bindings: pulp.bindings.bindings.Bindings
+        """
+        repo_id = bind['repo_id']
+        try:
+            details = bind['details']
+            if request.cancelled():
+                request.summary[repo_id].action = RepositoryReport.CANCELLED
+                return
+            parent = model.Repository(repo_id, details)
+            child = model.Repository.fetch(repo_id)
+            progress = request.progress.find_report(repo_id)
+            progress.begin_merging()
+            if child:
+                request.summary[repo_id].action = RepositoryReport.MERGED
+                child.merge(parent)
+            else:
+                child = model.Repository(repo_id, parent.details)
+                request.summary[repo_id].action = RepositoryReport.ADDED
+                child.add()
+            self._synchronize_repository(request, repo_id, options, bindings)
+        except NodeError, ne:
+            request.summary.errors.append(ne)
+        except Exception, e:
+            log.exception(repo_id)
+            error = CaughtException(e, repo_id)
+            request.summary.errors.append(error)
+
+    def _synchronize_repository(self, request, repo_id, options=None, bindings=None):
         """
         Run synchronization on a repository by ID.
         :param request: A synchronization request.
         :type request: SyncRequest
         :param repo_id: A repository ID.
         :type repo_id: str
+        :param options: The synchronization options for the repository.
+            Defaults to the request options.
+        :type options: dict
+        :param bindings: Optional pulp bindings for this node to be (re)used.
+        :type bindings: pulp.bindings.bindings.Bindings
         """
+        options = options or request.options
         progress = request.progress.find_report(repo_id)
-        skip = request.options.get(constants.SKIP_CONTENT_UPDATE_KEYWORD, False)
+        skip = options.get(constants.SKIP_CONTENT_UPDATE_KEYWORD, False)
         if skip:
             progress.finished()
             return
         repo = model.Repository(repo_id)
-        importer_report = repo.run_synchronization(progress, request.cancelled, request.options)
+        importer_report = repo.run_synchronization(
+            progress, request.cancelled, options, bindings=bindings)
         if request.cancelled():
             request.summary[repo_id].action = RepositoryReport.CANCELLED
             return
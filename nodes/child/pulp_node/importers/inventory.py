@@ -28,42 +28,103 @@ class UniqueKey(object):
         return self.uid != other.uid
 
 
+def sorted_parent_units(units):
+    """
+    Sort a stream of parent units by unique key.
+    The units are sorted in memory, as neither the parent manifest nor the
+    child query is ordered by unit key.  The unit metadata is dropped as it
+    is not needed to compare the inventories and can be fetched again using
+    the unit reference, so only the keys and references are held.
+    :param units: An iterable of: (unit, ref).
+    :type units: iterable
+    :return: A list of: (key, unit, ref) sorted by key.
+    :rtype: list
+    """
+    _units = []
+    for unit, ref in units:
+        unit.pop('metadata', None)
+        _units.append((UniqueKey(unit), unit, ref))
+    _units.sort(key=lambda u: u[0].uid)
+    return _units
+
+
+def sorted_child_units(units):
+    """
+    Sort a stream of child units by unique key.
+    The units are sorted in memory, see sorted_parent_units().
+    The unit metadata is dropped as it is not needed to compare the inventories.
+    :param units: An iterable of units.
+    :type units: iterable
+    :return: A list of: (key, unit) sorted by key.
+    :rtype: list
+    """
+    _units = []
+    for unit in units:
+        unit.pop('metadata', None)
+        _units.append((UniqueKey(unit), unit))
+    _units.sort(key=lambda u: u[0].uid)
+    return _units
+
+
 class UnitInventory(object):
     """
     The unit inventory contains both the parent and child inventory
-    of content units associated with a specific repository.  Each is contained
-    within a dictionary keyed by {UnitKey} to ensure uniqueness.
+    of content units associated with a specific repository.  Both inventories are
+    held in memory without their metadata.  They are sorted by {UniqueKey} and
+    compared in a single merge pass which splits the
+    units into those found only in the parent, those found only in the child and
+    those updated on the parent.  Units with the same key are collapsed.
     """
 
-    @staticmethod
-    def _import_parent_units(units):
-        _units = {}
-        for unit, ref in units:
-            unit.pop('metadata', None)
-            key = UniqueKey(unit)
-            _units[key] = (unit, ref)
-        return _units
-
-    @staticmethod
-    def _import_child_units(units):
-        _units = {}
-        for unit in units:
-            unit.pop('metadata', None)
-            key = UniqueKey(unit)
-            _units[key] = unit
-        return _units
-
-    def __init__(self, base_URL, parent_units, child_units):
+    def __init__(self, base_URL, parent_units, child_units, presorted=False):
         """
         :param base_URL: The base URL for downloading parent units.
         :param parent_units: The content units in the parent node.
         :type parent_units: iterable
         :param child_units: The content units in the child node.
         :type child_units: iterable
+        :param presorted: Indicates the units have already been sorted using
+            sorted_parent_units() and sorted_child_units().
+        :type presorted: bool
         """
         self.base_URL = base_URL
-        self.parent_units = self._import_parent_units(parent_units)
-        self.child_units = self._import_child_units(child_units)
+        if not presorted:
+            parent_units = sorted_parent_units(parent_units)
+            child_units = sorted_child_units(child_units)
+        self._parent_only = []
+        self._child_only = []
+        self._updated = []
+        self._merge(parent_units, child_units)
+
+    def _merge(self, parent_units, child_units):
+        """
+        Walk both sorted inventories in step and classify each unit.
+        :param parent_units: A sorted list of: (key, unit, ref).
+        :type parent_units: list
+        :param child_units: A sorted list of: (key, unit).
+        :type child_units: list
+        """
+        parent = iter(_unique(parent_units))
+        child = iter(_unique(child_units))
+        p = next(parent, None)
+        c = next(child, None)
+        while p is not None or c is not None:
+            if c is None or (p is not None and p[0].uid < c[0].uid):
+                self._parent_only.append(p[1:])
+                p = next(parent, None)
+                continue
+            if p is None or c[0].uid < p[0].uid:
+                self._child_only.append(c[1])
+                c = next(child, None)
+                continue
+            key, unit, ref = p
+            child_unit = c[1]
+            parent_last_updated = unit.get(constants.LAST_UPDATED, 0)
+            child_last_updated = child_unit.get(constants.LAST_UPDATED, 0)
+            if parent_last_updated > child_last_updated:
+                self._updated.append((unit, ref))
+            p = next(parent, None)
+            c = next(child, None)
 
     def units_on_parent_only(self):
         """
@@ -72,7 +133,7 @@ class UnitInventory(object):
         :return: List of (unit, ref).
         :rtype: list
         """
-        return [r for k, r in self.parent_units.items() if k not in self.child_units]
+        return self._parent_only
 
     def units_on_child_only(self):
         """
@@ -81,7 +142,7 @@ class UnitInventory(object):
         :return: List of units that need to be purged.
         :rtype: list
         """
-        return [u for k, u in self.child_units.items() if k not in self.parent_units]
+        return self._child_only
 
     def updated_units(self):
         """
@@ -89,13 +150,22 @@ class UnitInventory(object):
         :return: List of (unit, ref).
         :rtype: list
         """
-        updated = []
-        for key, (unit, ref) in self.parent_units.items():
-            child_unit = self.child_units.get(key)
-            if child_unit is None:
-                continue
-            parent_last_updated = unit.get(constants.LAST_UPDATED, 0)
-            child_last_updated = child_unit.get(constants.LAST_UPDATED, 0)
-            if parent_last_updated > child_last_updated:
-                updated.append((unit, ref))
-        return updated
+        return self._updated
+
+
+def _unique(units):
+    """
+    Collapse adjacent entries with the same key in a sorted inventory.
+    The last entry wins, matching the behavior of building a dictionary.
+    :param units: A sorted list of tuples with the key as the first element.
+    :type units: list
+    :return: A generator of the entries with unique keys.
+    :rtype: generator
+    """
+    last = None
+    for entry in units:
+        if last is not None and last[0].uid != entry[0].uid:
+            yield last
+        last = entry
+    if last is not None:
+        yield last
@@ -5,10 +5,12 @@ the strategies provided here.
 """
 
 import os
+import sys
 import errno
 
 from gettext import gettext as _
 from logging import getLogger
+from threading import Thread
 from urlparse import urlparse, ParseResult
 
 from pulp.plugins.model import Unit, AssociatedUnit
@@ -18,8 +20,8 @@ from pulp.server.content.sources.container import ContentContainer
 from pulp_node import constants
 from pulp_node import pathlib
 from pulp_node.conduit import NodesConduit
-from pulp_node.manifest import Manifest, RemoteManifest
-from pulp_node.importers.inventory import UnitInventory
+from pulp_node.manifest import Manifest, RemoteManifest, UnitRef
+from pulp_node.importers.inventory import UnitInventory, sorted_child_units, sorted_parent_units
 from pulp_node.importers.download import ContentDownloadListener
 from pulp_node.error import (NodeError, GetChildUnitsError, GetParentUnitsError, AddUnitError,
                              DeleteUnitError, InvalidManifestError, CaughtException)
@@ -30,6 +32,9 @@ _log = getLogger(__name__)
 
 STRATEGY_UNSUPPORTED = _('Importer strategy "%(s)s" not supported')
 
+# The number of units without files that are read from the units file and added together.
+ADD_BATCH_SIZE = 1000
+
 
 class Request(object):
     """
@@ -110,6 +115,8 @@ class ImporterStrategy(object):
         :type request: SyncRequest
         """
         request.started()
+        # units are saved in batches, see add_unit()
+        request.conduit.buffer_saves()
 
         try:
             self._synchronize(request)
@@ -131,7 +138,8 @@ class ImporterStrategy(object):
         """
         Add the specified unit to the child inventory using the conduit.
         The conduit will automatically associate the unit to the repository
-        to which it's pre-configured.
+        to which it's pre-configured.  The conduit buffers saved units, so
+        the unit is only written once a batch is full or _flush() is called.
         :param request: A synchronization request.
         :type request: SyncRequest
         :param unit: The unit to be added.
@@ -151,25 +159,57 @@ class ImporterStrategy(object):
 
     # --- protected ---------------------------------------------------------------------
 
+    def _flush(self, request):
+        """
+        Save the units added to the child inventory but still buffered by the conduit.
+        :param request: A synchronization request.
+        :type request: SyncRequest
+        """
+        try:
+            request.conduit.flush()
+        except Exception:
+            _log.exception(request.repo_id)
+            request.summary.errors.append(AddUnitError(request.repo_id))
+
     def _unit_inventory(self, request):
         """
         Build the unit inventory.
+        The child units are fetched from the database in a separate thread
+        while the parent manifest and units are downloaded.
         :param request: A synchronization request.
         :type request: SyncRequest
         :return: The built inventory.
         :rtype: UnitInventory
         """
-        # fetch child units
+        child_inventory = ChildInventory(request.repo_id)
+        child_inventory.start()
         try:
-            conduit = NodesConduit()
-            child_units = conduit.get_units(request.repo_id)
-        except NodeError:
-            raise
+            manifest = self._parent_manifest(request)
+            parent_units = sorted_parent_units(manifest.get_units())
         except Exception:
-            _log.exception(request.repo_id)
-            raise GetChildUnitsError(request.repo_id)
+            info = sys.exc_info()
+            child_inventory.join()
+            # errors fetching the child units take precedence
+            child_inventory.result()
+            raise info[0], info[1], info[2]
+        child_inventory.join()
+        child_units = child_inventory.result()
 
-        # fetch parent units
+        # build the inventory
+        base_URL = manifest.publishing_details[constants.BASE_URL]
+        inventory = UnitInventory(base_URL, parent_units, child_units, presorted=True)
+        return inventory
+
+    def _parent_manifest(self, request):
+        """
+        Fetch the parent manifest and the units file it references.
+        The units file is only downloaded when the manifest has changed
+        or the units file from a previous synchronization is not valid.
+        :param request: A synchronization request.
+        :type request: SyncRequest
+        :return: The parent manifest.
+        :rtype: Manifest
+        """
         try:
             request.progress.begin_manifest_download()
             url = request.config.get(constants.MANIFEST_URL_KEYWORD)
@@ -191,18 +231,13 @@ class ImporterStrategy(object):
                 manifest = fetched_manifest
             if not manifest.is_valid():
                 raise InvalidManifestError()
+            return manifest
         except NodeError:
             raise
         except Exception:
             _log.exception(request.repo_id)
             raise GetParentUnitsError(request.repo_id)
 
-        # build the inventory
-        parent_units = manifest.get_units()
-        base_URL = manifest.publishing_details[constants.BASE_URL]
-        inventory = UnitInventory(base_URL, parent_units, child_units)
-        return inventory
-
     def _reset_storage_path(self, unit):
         """
         Reset the storage_path using the storage_dir defined in
@@ -239,25 +274,61 @@ class ImporterStrategy(object):
         :type unit_inventory: UnitInventory
         """
         download_list = []
+        batch = []
         units = unit_inventory.units_on_parent_only()
         request.progress.begin_adding_units(len(units))
         listener = ContentDownloadListener(self, request)
         for unit, unit_ref in units:
             if request.cancelled():
+                self._flush(request)
                 return
             self._reset_storage_path(unit)
             if not self._needs_download(unit):
                 # unit has no file associated
-                self.add_unit(request, unit_ref.fetch())
+                batch.append(unit_ref)
+                if len(batch) >= ADD_BATCH_SIZE:
+                    self._add_batch(request, batch)
+                    batch = []
                 continue
             unit_url, destination = self._url_and_destination(unit_inventory.base_URL, unit)
             _request = listener.create_request(unit_url, destination, unit, unit_ref)
             download_list.append(_request)
+        self._add_batch(request, batch)
         if request.cancelled():
+            self._flush(request)
             return
         container = ContentContainer()
         request.summary.sources = container.download(request.downloader, download_list, listener)
         request.summary.errors.extend(listener.error_list)
+        self._flush(request)
+
+    def _add_batch(self, request, unit_refs):
+        """
+        Add a batch of units that have no associated file.
+        The referenced units are read from the units file in a single
+        sequential pass and then added to the child inventory.  When the
+        pass fails, the units are read one at a time so an error is
+        reported for each unit that cannot be read and the others are added.
+        :param request: A synchronization request.
+        :type request: SyncRequest
+        :param unit_refs: A list of references to the units to be added.
+        :type unit_refs: list
+        """
+        if not unit_refs:
+            return
+        try:
+            units = UnitRef.fetch_all(unit_refs)
+        except Exception:
+            _log.exception(request.repo_id)
+            units = []
+            for unit_ref in unit_refs:
+                try:
+                    units.append(unit_ref.fetch())
+                except Exception:
+                    _log.exception(request.repo_id)
+                    request.summary.errors.append(AddUnitError(request.repo_id))
+        for unit in units:
+            self.add_unit(request, unit)
 
     def _update_units(self, request, unit_inventory):
         """
@@ -269,6 +340,7 @@ class ImporterStrategy(object):
         :type unit_inventory: UnitInventory
         """
         download_list = []
+        batch = []
         units = unit_inventory.updated_units()
         listener = ContentDownloadListener(self, request)
         for unit, unit_ref in units:
@@ -279,9 +351,13 @@ class ImporterStrategy(object):
                 _request = listener.create_request(unit_url, destination, unit, unit_ref)
                 download_list.append(_request)
             else:
-                unit = unit_ref.fetch()
-                self.add_unit(request, unit)
+                batch.append(unit_ref)
+                if len(batch) >= ADD_BATCH_SIZE:
+                    self._add_batch(request, batch)
+                    batch = []
+        self._add_batch(request, batch)
         if not download_list:
+            self._flush(request)
             return
         container = ContentContainer()
         request.summary.sources = container.download(
@@ -289,6 +365,7 @@ class ImporterStrategy(object):
             download_list,
             listener)
         request.summary.errors.extend(listener.error_list)
+        self._flush(request)
 
     def _url_and_destination(self, base_url, unit):
         """
@@ -363,6 +440,56 @@ class ImporterStrategy(object):
                 request.summary.errors.append(DeleteUnitError(request.repo_id))
 
 
+class ChildInventory(Thread):
+    """
+    Fetches and sorts the content units associated with a repository
+    on the child node in a separate thread so that it can be done while
+    the parent manifest and units are being downloaded.
+    :ivar repo_id: The repository ID.
+    :type repo_id: str
+    :ivar units: The sorted child units.
+    :type units: list
+    :ivar exception: The error raised while fetching units.
+    :type exception: NodeError
+    """
+
+    def __init__(self, repo_id):
+        """
+        :param repo_id: The repository ID.
+        :type repo_id: str
+        """
+        super(ChildInventory, self).__init__(name='child-inventory:%s' % repo_id)
+        self.daemon = True
+        self.repo_id = repo_id
+        self.units = None
+        self.exception = None
+
+    def run(self):
+        """
+        Fetch and sort the child units.
+        """
+        try:
+            conduit = NodesConduit()
+            self.units = sorted_child_units(conduit.get_units(self.repo_id))
+        except NodeError, ne:
+            self.exception = ne
+        except Exception:
+            _log.exception(self.repo_id)
+            self.exception = GetChildUnitsError(self.repo_id)
+
+    def result(self):
+        """
+        Get the sorted child units.
+        Must only be called after the thread has finished.
+        :return: The sorted child units.
+        :rtype: list
+        :raise NodeError: on errors fetching units.
+        """
+        if self.exception is not None:
+            raise self.exception
+        return self.units
+
+
 class Mirror(ImporterStrategy):
     """
     The *mirror* strategy is used to ensure that the content units associated
@@ -41,9 +41,12 @@ PURGE_ORPHANS_KEYWORD = 'purge_orphans'
 
 MAX_DOWNLOAD_BANDWIDTH_KEYWORD = 'max_download_bandwidth'
 MAX_DOWNLOAD_CONCURRENCY_KEYWORD = 'max_download_concurrency'
+MAX_CONCURRENT_REPOSITORIES_KEYWORD = 'max_concurrent_repositories'
 
 SKIP_CONTENT_UPDATE_KEYWORD = 'skip_content_update'
 
+UNITS_PARTS_KEYWORD = 'units_parts'
+
 
 # --- unit/publishing --------------------------------------------------------
 
@@ -70,6 +73,8 @@ STRATEGY_NOTE_KEY = '_node-update-strategy'
 # --- settings ---------------------------------------------------------------
 
 DEFAULT_DOWNLOAD_CONCURRENCY = 20
+DEFAULT_CONCURRENT_REPOSITORIES = 4
+DEFAULT_UNITS_PARTS = 4
 
 
 # --- profiling --------------------------------------------------------------
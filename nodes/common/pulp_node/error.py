@@ -1,4 +1,5 @@
 from gettext import gettext as _
+from threading import RLock
 
 CLI_DEPRECATION_WARNING = \
     _('Warning: this Nodes command is deprecated as the Nodes functionality will be '
@@ -198,6 +199,9 @@ class DeleteUnitError(NodeError):
 
 class ErrorList(list):
 
+    # Errors may be appended by concurrent repository synchronizations.
+    _lock = RLock()
+
     def append(self, error):
         """
         Append the error.
@@ -208,8 +212,9 @@ class ErrorList(list):
         """
         if not isinstance(error, NodeError):
             raise ValueError(error)
-        if error not in self:
-            super(ErrorList, self).append(error)
+        with self._lock:
+            if error not in self:
+                super(ErrorList, self).append(error)
 
     def extend(self, iterable):
         """
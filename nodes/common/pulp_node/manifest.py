@@ -12,15 +12,36 @@
 """
 Provides classes for managing the content unit manifest.
 The manifest is a json encoded file that defines content units
-associated with repository.  The units themselves are stored in a separate
-json encoded file.  For performance reasons, the unit files are compressed.
+associated with repository.  The units themselves are stored in separate
+json encoded files.  For performance reasons, the unit files are compressed.
+
+Since version 3 of the manifest, units are written to one or more parts.  Each
+part is a units file made of independently compressed blocks of json encoded
+units followed by an index of the blocks and of the units within them:
+
+  [block 0] ... [block N] [index] [trailer]
+
+The trailer is a fixed size record containing a magic string along with the
+offset and length of the zlib compressed json index.  This lets a reader
+iterate the units block by block or fetch a single unit by reference or by
+unit key without decompressing the whole file.  Units are distributed across
+the parts round-robin so the parts can be written in parallel and iterating
+them in turn restores the original order.
+
+Version 2 manifests, which reference a single gzip compressed units file with
+one json encoded unit per line, are still supported.
 """
 
 import os
 import gzip
 import errno
+import struct
+import zlib
 
+from hashlib import sha1
 from logging import getLogger
+from Queue import Queue
+from threading import Thread
 
 from nectar.request import DownloadRequest
 from nectar.listener import AggregatingEventListener
@@ -36,9 +57,12 @@ log = getLogger(__name__)
 
 # --- constants -------------------------------------------------------------------------
 
-MANIFEST_VERSION = 2
+MANIFEST_VERSION = 3
+LEGACY_MANIFEST_VERSION = 2
+SUPPORTED_VERSIONS = (LEGACY_MANIFEST_VERSION, MANIFEST_VERSION)
 MANIFEST_FILE_NAME = 'manifest.json'
 UNITS_FILE_NAME = 'units.json.gz'
+UNITS_PART_FILE_NAME = 'units-%d.blk'
 
 ID = 'id'
 VERSION = 'version'
@@ -48,6 +72,17 @@ UNITS = 'units'
 UNITS_PATH = 'path'
 UNITS_TOTAL = 'total'
 UNITS_SIZE = 'size'
+UNITS_PARTS = 'parts'
+
+# The approximate (uncompressed) size of each block in a units file.
+BLOCK_SIZE = 256 * 1024
+
+# The trailer at the end of a units file: magic, index offset, index length.
+BLOCK_MAGIC = 'PNU3'
+TRAILER = struct.Struct('>4sQI')
+
+# The number of units queued for each part writer thread.
+PART_QUEUE_SIZE = 1000
 
 
 # --- utils -----------------------------------------------------------------------------
@@ -76,6 +111,20 @@ def unzip(path, destination, bfrlen=65535):
         fp_in.close()
 
 
+def unit_key_digest(type_id, unit_key):
+    """
+    Get a digest uniquely identifying a unit by type and unit key.
+    :param type_id: The unit type ID.
+    :type type_id: str
+    :param unit_key: The unit key.
+    :type unit_key: dict
+    :return: The hex digest.
+    :rtype: str
+    """
+    key = json.dumps([type_id, sorted(unit_key.items())])
+    return sha1(key).hexdigest()
+
+
 # --- manifest --------------------------------------------------------------------------
 
 
@@ -148,21 +197,65 @@ class Manifest(object):
         :raise ValueError: json decoding errors
         """
         total = self.units[UNITS_TOTAL]
-        if total:
-            path = self.units_path()
-            path = self.unzip_units(path)
-            return UnitIterator(path, total)
-        else:
+        if not total:
             return []
+        if self.partitioned():
+            return PartsIterator(self.units_paths(), total)
+        path = self.units_path()
+        path = self.unzip_units(path)
+        return UnitIterator(path, total)
+
+    def get_unit(self, type_id, unit_key):
+        """
+        Get a content unit referenced in the manifest by unit key.
+        The unit is located using the index in the units files so only the
+        block containing the unit is read and decompressed.
+        :param type_id: The unit type ID.
+        :type type_id: str
+        :param unit_key: The unit key.
+        :type unit_key: dict
+        :return: The unit or None when not found.
+        :rtype: dict
+        :raise IOError: on I/O errors.
+        :raise ValueError: json decoding errors
+        """
+        if not self.partitioned():
+            for unit, ref in self.get_units():
+                if unit['type_id'] == type_id and unit['unit_key'] == unit_key:
+                    return unit
+            return None
+        digest = unit_key_digest(type_id, unit_key)
+        for path in self.units_paths():
+            with BlockUnitReader(path) as reader:
+                ref = reader.find(digest)
+                if ref is not None:
+                    return ref.fetch()
+        return None
 
     def units_published(self, unit_writer):
         """
         Update the manifest publishing information.
+        The manifest version reflects the format of the units file(s).
         :param unit_writer: A writer used to publish the units.
-        :type unit_writer: UnitWriter
+        :type unit_writer: UnitWriter|PartitionedUnitWriter
         """
         self.units[UNITS_TOTAL] = unit_writer.total_units
         self.units[UNITS_SIZE] = unit_writer.bytes_written
+        parts = getattr(unit_writer, 'parts', None)
+        if parts is None:
+            self.units.pop(UNITS_PARTS, None)
+            self.version = LEGACY_MANIFEST_VERSION
+        else:
+            self.units[UNITS_PARTS] = parts
+            self.version = MANIFEST_VERSION
+
+    def partitioned(self):
+        """
+        Get whether the units are stored in indexed parts.
+        :return: True if stored in parts.
+        :rtype: bool
+        """
+        return UNITS_PARTS in self.units
 
     def published(self, details):
         """
@@ -180,21 +273,26 @@ class Manifest(object):
         :rtype: bool
         """
         try:
-            return self.version == MANIFEST_VERSION
+            return self.version in SUPPORTED_VERSIONS
         except AttributeError:
             return False
 
     def has_valid_units(self):
         """
-        Validate the associated units file by comparing the size of the
-        units file to units_size in the manifest.
+        Validate the associated units file(s) by comparing the size of each
+        units file to the size recorded in the manifest.
         :return: True if valid.
         :rtype: bool
         """
+        if self.partitioned():
+            expected = [part[UNITS_SIZE] for part in self.units[UNITS_PARTS]]
+        else:
+            expected = [self.units[UNITS_SIZE]]
         try:
-            path = self.units_path()
-            size = os.path.getsize(path)
-            return size == self.units[UNITS_SIZE]
+            for path, size in zip(self.units_paths(), expected):
+                if os.path.getsize(path) != size:
+                    return False
+            return True
         except OSError, e:
             if e.errno != errno.ENOENT:
                 raise
@@ -229,6 +327,17 @@ class Manifest(object):
         """
         return self.units[UNITS_PATH] or pathlib.join(os.path.dirname(self.path), UNITS_FILE_NAME)
 
+    def units_paths(self):
+        """
+        Get the absolute paths to all of the associated units files.
+        :return: A list of paths.
+        :rtype: list
+        """
+        if not self.partitioned():
+            return [self.units_path()]
+        dir_path = os.path.dirname(self.path)
+        return [pathlib.join(dir_path, part[UNITS_PATH]) for part in self.units[UNITS_PARTS]]
+
     def __eq__(self, other):
         if isinstance(other, Manifest):
             return self.id == other.id
@@ -276,18 +385,20 @@ class RemoteManifest(Manifest):
 
     def fetch_units(self):
         """
-        Fetch the units file referenced in the manifest.
+        Fetch the units file(s) referenced in the manifest.
+        The parts of a partitioned manifest are downloaded concurrently.
         :raise ManifestDownloadError: on downloading errors.
         :raise HTTPError: on URL errors.
         :raise ValueError: on json decoding errors
         """
         base_url = self.url.rsplit('/', 1)[0]
-        url = pathlib.join(base_url, UNITS_FILE_NAME)
-        destination = pathlib.join(os.path.dirname(self.path), UNITS_FILE_NAME)
-        request = DownloadRequest(str(url), destination)
+        request_list = []
+        for destination in self.units_paths():
+            url = pathlib.join(base_url, os.path.basename(destination))
+            request_list.append(DownloadRequest(str(url), destination))
         listener = AggregatingEventListener()
         self.downloader.event_listener = listener
-        self.downloader.download([request])
+        self.downloader.download(request_list)
         if listener.failed_reports:
             report = listener.failed_reports[0]
             raise ManifestDownloadError(self.url, report.error_msg)
@@ -369,6 +480,238 @@ class UnitWriter(object):
         return False
 
 
+class BlockUnitWriter(object):
+    """
+    Writes json encoded content units to an indexed units file made of
+    independently compressed blocks.  See the module documentation for the layout.
+    :ivar path: The absolute path to the file.
+    :type path: str
+    :ivar fp: The file pointer used to write the file.
+    :type fp: A python file object.
+    :ivar total_units: Tracks the total number of units written.
+    :type total_units: int
+    :ivar bytes_written: The total number of bytes written.
+    :type bytes_written: int
+    """
+
+    def __init__(self, path, block_size=BLOCK_SIZE):
+        """
+        :param path: The absolute path to the file.
+        :type path: str
+        :param block_size: The approximate (uncompressed) size of each block.
+        :type block_size: int
+        :raise IOError: on I/O errors
+        """
+        self.path = path
+        self.block_size = block_size
+        self.fp = open(path, 'wb')
+        self.total_units = 0
+        self.bytes_written = 0
+        self._buffer = []
+        self._buffered = 0
+        self._blocks = []
+        self._index = []
+
+    @property
+    def closed(self):
+        """
+        Determines if the file is closed or not.
+        :return: True if the file is closed.
+        :rtype: bool
+        """
+        return self.fp.closed
+
+    def add(self, unit):
+        """
+        Add (write) the specified unit to the file as a json encoded string.
+        :param unit: A content unit.
+        :type unit: dict
+        :raise IOError: on I/O errors.
+        :raise ValueError: json encoding errors
+        """
+        self.total_units += 1
+        json_unit = json.dumps(unit)
+        digest = unit_key_digest(unit['type_id'], unit['unit_key'])
+        self._index.append((len(self._blocks), self._buffered, len(json_unit), digest))
+        self._buffer.append(json_unit)
+        self._buffered += len(json_unit)
+        if self._buffered >= self.block_size:
+            self._write_block()
+
+    def _write_block(self):
+        """
+        Compress and write the buffered units as a block.
+        """
+        if not self._buffer:
+            return
+        block = zlib.compress(''.join(self._buffer))
+        self._blocks.append((self.fp.tell(), len(block)))
+        self.fp.write(block)
+        self._buffer = []
+        self._buffered = 0
+
+    def close(self):
+        """
+        Write the last block, the index and the trailer and close the file.
+        This method is idempotent.
+        :return: The number of units written.
+        :rtype: int
+        """
+        if not self.closed:
+            self._write_block()
+            index = zlib.compress(json.dumps(dict(blocks=self._blocks, units=self._index)))
+            offset = self.fp.tell()
+            self.fp.write(index)
+            self.fp.write(TRAILER.pack(BLOCK_MAGIC, offset, len(index)))
+            self.fp.close()
+            self.bytes_written = os.path.getsize(self.path)
+            self._index = []
+        return self.total_units
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *unused):
+        self.close()
+        return False
+
+
+class PartWriter(Thread):
+    """
+    Writes units queued by the PartitionedUnitWriter to one part.
+    :ivar writer: The writer for the part.
+    :type writer: BlockUnitWriter
+    :ivar queue: The queue of units to be written.  None signals the end.
+    :type queue: Queue
+    :ivar exception: The exception raised while writing.
+    :type exception: Exception
+    """
+
+    def __init__(self, writer):
+        """
+        :param writer: The writer for the part.
+        :type writer: BlockUnitWriter
+        """
+        super(PartWriter, self).__init__(name='part-writer:%s' % writer.path)
+        self.daemon = True
+        self.writer = writer
+        self.queue = Queue(PART_QUEUE_SIZE)
+        self.exception = None
+
+    def run(self):
+        """
+        Write queued units until the end is signaled.
+        Queued units are still drained after a failure so the
+        publisher is never blocked on a full queue.
+        """
+        while True:
+            unit = self.queue.get()
+            if unit is None:
+                break
+            if self.exception is not None:
+                continue
+            try:
+                self.writer.add(unit)
+            except Exception, e:
+                log.exception(self.writer.path)
+                self.exception = e
+
+
+class PartitionedUnitWriter(object):
+    """
+    Writes json encoded content units to one or more indexed parts.
+    Units are distributed across the parts round-robin.  When there is more
+    than one part, each part is written by its own thread.
+    :ivar dir_path: The absolute path to the directory containing the parts.
+    :type dir_path: str
+    :ivar total_units: Tracks the total number of units written.
+    :type total_units: int
+    :ivar bytes_written: The total number of bytes written.
+    :type bytes_written: int
+    :ivar parts: The description of each part written, for the manifest.
+        Populated when the writer is closed.
+    :type parts: list
+    """
+
+    def __init__(self, dir_path, parts=1, block_size=BLOCK_SIZE):
+        """
+        :param dir_path: The absolute path to the directory containing the parts.
+        :type dir_path: str
+        :param parts: The number of parts.
+        :type parts: int
+        :param block_size: The approximate (uncompressed) size of each block.
+        :type block_size: int
+        :raise IOError: on I/O errors
+        """
+        self.dir_path = dir_path
+        self.total_units = 0
+        self.bytes_written = 0
+        self.parts = None
+        self._writers = []
+        for n in range(max(parts, 1)):
+            path = pathlib.join(dir_path, UNITS_PART_FILE_NAME % n)
+            self._writers.append(BlockUnitWriter(path, block_size))
+        self._threads = []
+        if len(self._writers) > 1:
+            for writer in self._writers:
+                thread = PartWriter(writer)
+                thread.start()
+                self._threads.append(thread)
+
+    def add(self, unit):
+        """
+        Add (write) the specified unit to the next part.
+        :param unit: A content unit.
+        :type unit: dict
+        :raise IOError: on I/O errors.
+        :raise ValueError: json encoding errors
+        """
+        n = self.total_units % len(self._writers)
+        self.total_units += 1
+        if not self._threads:
+            self._writers[n].add(unit)
+            return
+        thread = self._threads[n]
+        if thread.exception is not None:
+            raise thread.exception
+        thread.queue.put(unit)
+
+    def close(self):
+        """
+        Wait for the part writers and close each part.  This method is idempotent.
+        :return: The number of units written.
+        :rtype: int
+        """
+        if self.parts is not None:
+            return self.total_units
+        for thread in self._threads:
+            thread.queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        for writer in self._writers:
+            writer.close()
+        for thread in self._threads:
+            if thread.exception is not None:
+                raise thread.exception
+        self.parts = []
+        for writer in self._writers:
+            part = {
+                UNITS_PATH: os.path.basename(writer.path),
+                UNITS_TOTAL: writer.total_units,
+                UNITS_SIZE: writer.bytes_written
+            }
+            self.parts.append(part)
+            self.bytes_written += writer.bytes_written
+        return self.total_units
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *unused):
+        self.close()
+        return False
+
+
 class UnitIterator:
     """
     Used to iterate content units inventory file associated with a manifest.
@@ -411,6 +754,179 @@ class UnitIterator:
         return self.total_units
 
 
+class BlockFile(object):
+    """
+    An open indexed units file.
+    Keeps the most recently read block decompressed so that units
+    stored in the same block are read without decompressing it again.
+    :ivar name: The absolute path to the file.
+    :type name: str
+    :ivar fp: The open file.
+    :type fp: A python file object.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: The absolute path to the file.
+        :type path: str
+        :raise IOError: on I/O errors.
+        """
+        self.name = path
+        self.fp = open(path, 'rb')
+        self._block = (None, None)
+
+    def read_block(self, offset, length):
+        """
+        Read and decompress the block at the specified offset.
+        :param offset: The offset of the block within the file.
+        :type offset: int
+        :param length: The (compressed) length of the block.
+        :type length: int
+        :return: The decompressed block.
+        :rtype: str
+        :raise IOError: on I/O errors.
+        """
+        if self._block[0] != offset:
+            self.fp.seek(offset)
+            self._block = (offset, zlib.decompress(self.fp.read(length)))
+        return self._block[1]
+
+    def read_index(self):
+        """
+        Read the index stored at the end of the file.
+        :return: The index: {blocks: [(offset, length)], units: [(block, start, length, digest)]}
+        :rtype: dict
+        :raise IOError: on I/O errors or when the file is not an indexed units file.
+        """
+        self.fp.seek(-TRAILER.size, os.SEEK_END)
+        magic, offset, length = TRAILER.unpack(self.fp.read(TRAILER.size))
+        if magic != BLOCK_MAGIC:
+            raise IOError(errno.EINVAL, 'not an indexed units file', self.name)
+        self.fp.seek(offset)
+        return json.loads(zlib.decompress(self.fp.read(length)))
+
+    def close(self):
+        self.fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *unused):
+        self.close()
+        return False
+
+
+class BlockUnitReader(object):
+    """
+    Reads content units from an indexed units file.
+    :ivar path: The absolute path to the file.
+    :type path: str
+    """
+
+    def __init__(self, path):
+        """
+        :param path: The absolute path to the file.
+        :type path: str
+        :raise IOError: on I/O errors.
+        """
+        self.path = path
+        self.fp = BlockFile(path)
+        index = self.fp.read_index()
+        self.blocks = index['blocks']
+        self.units = index['units']
+        self._digests = None
+
+    def ref(self, entry):
+        """
+        Get a reference to a unit from its entry in the index.
+        :param entry: An index entry: (block, start, length, digest).
+        :type entry: list
+        :return: The unit reference.
+        :rtype: BlockUnitRef
+        """
+        block, start, length, digest = entry
+        offset, block_length = self.blocks[block]
+        return BlockUnitRef(self.path, offset, block_length, start, length)
+
+    def find(self, digest):
+        """
+        Find a unit by unit key digest.
+        :param digest: A digest created using unit_key_digest().
+        :type digest: str
+        :return: The unit reference or None when not found.
+        :rtype: BlockUnitRef
+        """
+        if self._digests is None:
+            self._digests = dict((entry[3], entry) for entry in self.units)
+        entry = self._digests.get(digest)
+        if entry is None:
+            return None
+        return self.ref(entry)
+
+    def __iter__(self):
+        """
+        Iterate the units in the file in order.
+        Each block is read and decompressed once.
+        :return: A generator of: (unit, ref).
+        :rtype: generator
+        """
+        for entry in self.units:
+            ref = self.ref(entry)
+            yield ref.fetch(self.fp), ref
+
+    def close(self):
+        self.fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *unused):
+        self.close()
+        return False
+
+
+class PartsIterator(object):
+    """
+    Used to iterate the content units in the indexed parts associated with a manifest.
+    The parts are read in turn which restores the order in which the units were written.
+    The total number of units in all parts is reported by __len__().
+    """
+
+    @staticmethod
+    def get_units(paths):
+        readers = [BlockUnitReader(path) for path in paths]
+        try:
+            iterators = [iter(r) for r in readers]
+            while iterators:
+                for it in list(iterators):
+                    try:
+                        yield it.next()
+                    except StopIteration:
+                        iterators.remove(it)
+        finally:
+            for reader in readers:
+                reader.close()
+
+    def __init__(self, paths, total_units):
+        """
+        :param paths: The absolute paths to the parts to be iterated.
+        :type paths: list
+        :param total_units: The number of units contained in the parts.
+        :type total_units: int
+        """
+        self.unit_generator = PartsIterator.get_units(paths)
+        self.total_units = total_units
+
+    def next(self):
+        return self.unit_generator.next()
+
+    def __iter__(self):
+        return self
+
+    def __len__(self):
+        return self.total_units
+
+
 class UnitRef(object):
     """
     Reference to a unit within the downloaded units file.
@@ -435,15 +951,118 @@ class UnitRef(object):
         self.offset = offset
         self.length = length
 
-    def fetch(self):
+    def open(self):
+        """
+        Open the units file for reading referenced units.
+        :return: The open file.
+        :rtype: file
+        :raise IOError: on I/O errors.
+        """
+        return open(self.path)
+
+    def fetch(self, fp=None):
+        """
+        Fetch referenced content unit from the units file.
+        :param fp: An optional units file opened using open() to read from.  When not
+            specified, the units file is opened and closed for this unit.
+        :type fp: file
+        :return: The json decoded unit.
+        :rtype: dict
+        :raise IOError: on I/O errors.
+        :raise ValueError: json decoding errors
+        """
+        if fp is None:
+            with self.open() as fp:
+                return self.fetch(fp)
+        fp.seek(self.offset)
+        json_unit = fp.read(self.length)
+        return json.loads(json_unit)
+
+    @staticmethod
+    def fetch_all(unit_refs):
+        """
+        Fetch a batch of referenced content units.
+        The units are read in the order they appear in the units files using
+        one open file at a time so each file is read sequentially instead of
+        opened and seeked for every unit.
+        :param unit_refs: A list of unit references.
+        :type unit_refs: list
+        :return: The json decoded units in the same order as unit_refs.
+        :rtype: list
+        :raise IOError: on I/O errors.
+        :raise ValueError: json decoding errors
+        """
+        units = [None] * len(unit_refs)
+        ordered = sorted(enumerate(unit_refs), key=lambda r: (r[1].path, r[1].offset))
+        fp = None
+        try:
+            for index, ref in ordered:
+                if fp is None or fp.name != ref.path:
+                    if fp is not None:
+                        fp.close()
+                    fp = ref.open()
+                units[index] = ref.fetch(fp)
+        finally:
+            if fp is not None:
+                fp.close()
+        return units
+
+
+class BlockUnitRef(UnitRef):
+    """
+    Reference to a unit within a downloaded indexed units file.
+    :ivar path: The absolute path to the units file.
+    :type path: str
+    :ivar offset: The offset of the block containing the unit within the file.
+    :type offset: int
+    :ivar block_length: The (compressed) length of the block.
+    :type block_length: int
+    :ivar start: The offset of the unit within the decompressed block.
+    :type start: int
+    :ivar length: The length of the unit within the decompressed block.
+    :type length: int
+    """
+
+    def __init__(self, path, offset, block_length, start, length):
+        """
+        :param path: The absolute path to the units file.
+        :type path: str
+        :param offset: The offset of the block containing the unit within the file.
+        :type offset: int
+        :param block_length: The (compressed) length of the block.
+        :type block_length: int
+        :param start: The offset of the unit within the decompressed block.
+        :type start: int
+        :param length: The length of the unit within the decompressed block.
+        :type length: int
+        """
+        UnitRef.__init__(self, path, offset, length)
+        self.block_length = block_length
+        self.start = start
+
+    def open(self):
+        """
+        Open the units file for reading referenced units.
+        :return: The open file.
+        :rtype: BlockFile
+        :raise IOError: on I/O errors.
+        """
+        return BlockFile(self.path)
+
+    def fetch(self, fp=None):
         """
         Fetch referenced content unit from the units file.
+        :param fp: An optional units file opened using open() to read from.  When not
+            specified, the units file is opened and closed for this unit.
+        :type fp: BlockFile
         :return: The json decoded unit.
         :rtype: dict
         :raise IOError: on I/O errors.
         :raise ValueError: json decoding errors
         """
-        with open(self.path) as fp:
-            fp.seek(self.offset)
-            json_unit = fp.read(self.length)
-            return json.loads(json_unit)
+        if fp is None:
+            with self.open() as fp:
+                return self.fetch(fp)
+        block = fp.read_block(self.offset, self.block_length)
+        json_unit = block[self.start:self.start + self.length]
+        return json.loads(json_unit)
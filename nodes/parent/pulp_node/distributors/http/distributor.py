@@ -63,7 +63,8 @@ class NodesHttpDistributor(Distributor):
                 client_cert : <path>
                 verify : <bool>
               }
-            }
+            },
+            units_parts (optional) : <int>
           }
         """
         key = constants.PROTOCOL_KEYWORD
@@ -81,6 +82,14 @@ class NodesHttpDistributor(Distributor):
             alias = section.get(key[1])
             if not alias:
                 return (False, PROPERTY_MISSING % {'p': '.'.join(key)})
+        key = constants.UNITS_PARTS_KEYWORD
+        parts = config.get(key)
+        if parts is not None:
+            try:
+                if int(parts) < 1:
+                    raise ValueError(parts)
+            except (TypeError, ValueError):
+                return (False, PROPERTY_INVALID % {'p': key, 'v': _('a positive integer')})
         return (True, None)
 
     def publish_repo(self, repo, conduit, config):
@@ -128,7 +137,8 @@ class NodesHttpDistributor(Distributor):
         alias = section.get('alias')
         base_url = '://'.join((protocol, host))
         repo_publish_dir = self._get_publish_dir(repo.id, config)
-        return HttpPublisher(base_url, alias, repo.id, repo_publish_dir)
+        units_parts = int(config.get(constants.UNITS_PARTS_KEYWORD, constants.DEFAULT_UNITS_PARTS))
+        return HttpPublisher(base_url, alias, repo.id, repo_publish_dir, units_parts)
 
     def cancel_publish_repo(self):
         pass
@@ -24,7 +24,8 @@ class HttpPublisher(FilePublisher):
     :type alias: tuple(2)
     """
 
-    def __init__(self, base_url, alias, repo_id, publish_path):
+    def __init__(self, base_url, alias, repo_id, publish_path,
+                 units_parts=constants.DEFAULT_UNITS_PARTS):
         """
         :param base_url: The base URL.
         :type base_url: str
@@ -32,11 +33,13 @@ class HttpPublisher(FilePublisher):
         :type alias: tuple(2)
         :param repo_id: A repository ID.
         :type repo_id: str
+        :param units_parts: The number of indexed parts the units are written to.
+        :type units_parts: int
         """
         self.base_url = base_url
         self.alias = alias
         self.repo_id = repo_id
-        FilePublisher.__init__(self, publish_path)
+        FilePublisher.__init__(self, publish_path, units_parts)
 
     def publish(self, units):
         """
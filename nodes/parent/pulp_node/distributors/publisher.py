@@ -18,7 +18,7 @@ from logging import getLogger
 
 from pulp_node import constants
 from pulp_node import pathlib
-from pulp_node.manifest import Manifest, UnitWriter
+from pulp_node.manifest import Manifest, PartitionedUnitWriter
 
 
 log = getLogger(__name__)
@@ -94,21 +94,26 @@ class FilePublisher(Publisher):
     :type tmp_dir: str
     :ivar staged: A flag indicating that publishing has been staged and needs commit.
     :type staged: bool
+    :ivar units_parts: The number of indexed parts the units are written to.
+    :type units_parts: int
     """
 
-    def __init__(self, publish_dir):
+    def __init__(self, publish_dir, units_parts=constants.DEFAULT_UNITS_PARTS):
         """
         :param publish_dir: The publishing root directory for this repository
         :type publish_dir: str
+        :param units_parts: The number of indexed parts the units are written to.
+        :type units_parts: int
         """
         self.publish_dir = publish_dir
         self.tmp_dir = None
         self.staged = False
+        self.units_parts = units_parts
 
     def publish(self, units):
         """
         Publish the specified units.
-        Writes the units.json file and symlinks each of the files associated
+        Writes the indexed units files and symlinks each of the files associated
         to the unit.storage_path.  Publishing is staged in a temporary directory and
         must use commit() to make the publishing permanent.
         :param units: A list of units to publish.
@@ -121,7 +126,7 @@ class FilePublisher(Publisher):
         pathlib.mkdir(parent_path)
         self.tmp_dir = mkdtemp(dir=parent_path)
 
-        with UnitWriter(self.tmp_dir) as writer:
+        with PartitionedUnitWriter(self.tmp_dir, self.units_parts) as writer:
             for unit in units:
                 self.publish_unit(unit)
                 writer.add(unit)
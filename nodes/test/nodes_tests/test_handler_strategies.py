@@ -57,17 +57,18 @@ PARENT_SETTINGS = {
 
 class TestBase(TestCase):
 
-    def request(self, cancel_on=0):
+    def request(self, cancel_on=0, repo_ids=(REPO_ID,), **options):
         conduit = TestConduit(cancel_on)
         progress = HandlerProgress(conduit)
         summary = SummaryReport()
+        options[constants.PARENT_SETTINGS] = PARENT_SETTINGS
         request = strategies.Request(
             conduit=conduit,
             progress=progress,
             summary=summary,
-            bindings=[dict(repo_id=REPO_ID, details={})],
+            bindings=[dict(repo_id=repo_id, details={}) for repo_id in repo_ids],
             scope=constants.NODE_SCOPE,
-            options={constants.PARENT_SETTINGS: PARENT_SETTINGS}
+            options=options
         )
         return request
 
@@ -210,6 +211,61 @@ class TestBase(TestCase):
         # Verify
         mock_cancel.assert_called_with(TASK_ID)
 
+    def test_shared_options(self):
+        options = {
+            constants.MAX_DOWNLOAD_CONCURRENCY_KEYWORD: 20,
+            constants.MAX_DOWNLOAD_BANDWIDTH_KEYWORD: 1000,
+        }
+        # Test
+        shared = strategies.shared_options(options, 4)
+        # Verify
+        self.assertEqual(shared[constants.MAX_DOWNLOAD_CONCURRENCY_KEYWORD], 5)
+        self.assertEqual(shared[constants.MAX_DOWNLOAD_BANDWIDTH_KEYWORD], 250)
+        self.assertEqual(options[constants.MAX_DOWNLOAD_CONCURRENCY_KEYWORD], 20)
+        self.assertTrue(strategies.shared_options(options, 1) is options)
+
+    @patch('pulp_node.handlers.strategies.resources.pulp_bindings')
+    @patch('pulp_node.handlers.model.Repository.fetch', return_value=None)
+    @patch('pulp_node.handlers.model.Repository.add')
+    @patch('pulp_node.handlers.model.Repository.run_synchronization')
+    def test_merge_repositories_concurrent(self, mock_sync, mock_add, mock_fetch, mock_bindings):
+        repo_ids = ['repo-%d' % n for n in range(5)]
+        mock_sync.return_value = {
+            'added_count': 1,
+            'updated_count': 0,
+            'removed_count': 0,
+            'details': {'errors': [], 'sources': {}}
+        }
+        options = {
+            constants.MAX_CONCURRENT_REPOSITORIES_KEYWORD: 3,
+            constants.MAX_DOWNLOAD_CONCURRENCY_KEYWORD: 9,
+        }
+        request = self.request(repo_ids=repo_ids, **options)
+        request.started()
+        # Test
+        strategy = strategies.HandlerStrategy()
+        strategy._merge_repositories(request)
+        # Verify
+        self.assertEqual(request.concurrency(), 3)
+        self.assertEqual(len(request.summary.errors), 0)
+        self.assertEqual(mock_sync.call_count, len(repo_ids))
+        self.assertTrue(mock_bindings.call_count <= 3)
+        for call in mock_sync.call_args_list:
+            sync_options = call[0][2]
+            self.assertEqual(sync_options[constants.MAX_DOWNLOAD_CONCURRENCY_KEYWORD], 3)
+            self.assertEqual(call[1]['bindings'], mock_bindings.return_value)
+        for repo_id in repo_ids:
+            report = request.summary[repo_id]
+            self.assertEqual(report.action, RepositoryReport.ADDED)
+            self.assertEqual(report.units.added, 1)
+
+    def test_concurrency(self):
+        request = self.request(repo_ids=['a', 'b'])
+        self.assertEqual(request.concurrency(), 2)
+        request = self.request(repo_ids=['a', 'b'], **{
+            constants.MAX_CONCURRENT_REPOSITORIES_KEYWORD: 1})
+        self.assertEqual(request.concurrency(), 1)
+
     def test_strategy_factory(self):
         for name, strategy in strategies.STRATEGIES.items():
             self.assertEqual(strategies.find_strategy(name), strategy)
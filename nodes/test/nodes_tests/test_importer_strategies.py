@@ -26,6 +26,8 @@ class TestConduit:
         ]
 
     save_unit = Mock()
+    buffer_saves = Mock()
+    flush = Mock()
     remove_unit = Mock()
     set_progress = Mock()
 
@@ -257,6 +259,107 @@ class TestBase(TestCase):
         unit = {constants.STORAGE_PATH: path, constants.FILE_SIZE: size + 1}
         self.assertTrue(strategy._needs_download(unit))
 
+    @patch('pulp_node.importers.strategies.UnitRef.fetch_all')
+    @patch('pulp_node.importers.strategies.ImporterStrategy.add_unit')
+    def test_add_units_without_files(self, mock_add_unit, mock_fetch_all):
+        # Setup
+        request = self.request()
+        units = [dict(unit_id=str(i), type_id='T', unit_key={'n': i}, metadata={})
+                 for i in range(3)]
+        manifest = TestManifest(units)
+        inventory = UnitInventory(BASE_URL, manifest.get_units(), [])
+        mock_fetch_all.side_effect = lambda refs: [r.fetch() for r in refs]
+        # Test
+        strategy = strategies.ImporterStrategy()
+        with patch('pulp_node.importers.strategies.ADD_BATCH_SIZE', 2):
+            strategy._add_units(request, inventory)
+        # Verify
+        self.assertEqual(mock_fetch_all.call_count, 2)
+        self.assertEqual(mock_add_unit.call_count, 3)
+        added = sorted(c[0][1]['unit_id'] for c in mock_add_unit.call_args_list)
+        self.assertEqual(added, ['0', '1', '2'])
+
+    @patch('pulp_node.importers.strategies.ContentContainer')
+    @patch('pulp_node.importers.strategies.UnitRef.fetch_all', side_effect=IOError())
+    @patch('pulp_node.importers.strategies.ImporterStrategy.add_unit')
+    def test_add_units_fetch_error(self, mock_add_unit, *unused):
+        # Setup
+        request = self.request()
+        units = [dict(unit_id=str(i), type_id='T', unit_key={'n': i}, metadata={})
+                 for i in range(3)]
+        manifest = TestManifest(units)
+        manifest.units[1][1].fetch = Mock(side_effect=IOError())
+        inventory = UnitInventory(BASE_URL, manifest.get_units(), [])
+        # Test
+        strategy = strategies.ImporterStrategy()
+        strategy._add_units(request, inventory)
+        # Verify
+        added = sorted(c[0][1]['unit_id'] for c in mock_add_unit.call_args_list)
+        self.assertEqual(added, ['0', '2'])
+        self.assertEqual(len(request.summary.errors), 1)
+        self.assertEqual(request.summary.errors[0].error_id, error.AddUnitError.ERROR_ID)
+
+    @patch('pulp_node.importers.strategies.ContentContainer')
+    @patch('pulp_node.importers.strategies.ImporterStrategy._unit_inventory')
+    def test_synchronize_buffers_saves(self, *unused):
+        # Setup
+        request = self.request()
+        request.conduit.buffer_saves = Mock()
+        request.conduit.flush = Mock()
+        # Test
+        strategy = strategies.Additive()
+        strategy.synchronize(request)
+        # Verify
+        request.conduit.buffer_saves.assert_called_once_with()
+        self.assertTrue(request.conduit.flush.called)
+        self.assertEqual(request.summary.errors, [])
+
+    def test_flush_exception(self):
+        # Setup
+        request = self.request()
+        request.conduit.flush = Mock(side_effect=ValueError())
+        # Test
+        strategy = strategies.ImporterStrategy()
+        strategy._flush(request)
+        # Verify
+        self.assertEqual(len(request.summary.errors), 1)
+        self.assertEqual(request.summary.errors[0].error_id, error.AddUnitError.ERROR_ID)
+
+    def test_inventory(self):
+        # Setup
+        parent = [
+            dict(type_id='T', unit_key={'n': 1}, last_updated=1, metadata={}),
+            dict(type_id='T', unit_key={'n': 2}, last_updated=2, metadata={}),
+            dict(type_id='T', unit_key={'n': 3}, last_updated=1, metadata={}),
+        ]
+        child = [
+            dict(unit_id='c2', type_id='T', unit_key={'n': 2}, last_updated=1, metadata={}),
+            dict(unit_id='c3', type_id='T', unit_key={'n': 3}, last_updated=1, metadata={}),
+            dict(unit_id='c4', type_id='T', unit_key={'n': 4}, last_updated=1, metadata={}),
+        ]
+        manifest = TestManifest(parent)
+        # Test
+        inventory = UnitInventory(BASE_URL, manifest.get_units(), child)
+        # Verify
+        parent_only = inventory.units_on_parent_only()
+        self.assertEqual([u['unit_key'] for u, r in parent_only], [{'n': 1}])
+        child_only = inventory.units_on_child_only()
+        self.assertEqual([u['unit_id'] for u in child_only], ['c4'])
+        updated = inventory.updated_units()
+        self.assertEqual([u['unit_key'] for u, r in updated], [{'n': 2}])
+        for unit in parent + child:
+            self.assertFalse('metadata' in unit)
+
+    @patch('pulp_node.importers.strategies.NodesConduit.get_units',
+           side_effect=error.GetChildUnitsError(REPO_ID))
+    @patch('pulp_node.manifest.RemoteManifest.fetch', side_effect=ValueError())
+    def test_child_error_precedence(self, *unused):
+        # Setup
+        request = self.request()
+        # Test
+        strategy = strategies.ImporterStrategy()
+        self.assertRaises(error.GetChildUnitsError, strategy._unit_inventory, request)
+
     def test_strategy_factory(self):
         for name, strategy in strategies.STRATEGIES.items():
             self.assertEqual(strategies.find_strategy(name), strategy)
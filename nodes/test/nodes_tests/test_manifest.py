@@ -120,3 +120,91 @@ class TestManifest(TestCase):
             _unit = ref.fetch()
             self.assertEqual(unit, _unit)
         self.verify(units, units_in)
+
+    def test_fetch_all(self):
+        # Setup
+        units = []
+        manifest_path = os.path.join(self.tmp_dir, manifest.MANIFEST_FILE_NAME)
+        for i in range(0, self.NUM_UNITS):
+            unit = dict(unit_id=i, type_id='T', unit_key={})
+            units.append(unit)
+        units_path = os.path.join(self.tmp_dir, manifest.UNITS_FILE_NAME)
+        writer = manifest.UnitWriter(units_path)
+        for u in units:
+            writer.add(u)
+        writer.close()
+        m = manifest.Manifest(manifest_path, self.MANIFEST_ID)
+        m.units_published(writer)
+        m.write()
+        refs = [r for u, r in m.get_units()]
+        refs.reverse()
+        # Test
+        fetched = manifest.UnitRef.fetch_all(refs)
+        # Verify
+        fetched.reverse()
+        self.verify(units, fetched)
+
+    def test_partitioned_round_trip(self):
+        # Setup
+        units = []
+        manifest_path = os.path.join(self.tmp_dir, manifest.MANIFEST_FILE_NAME)
+        for i in range(0, self.NUM_UNITS):
+            unit = dict(unit_id=i, type_id='T', unit_key={'n': i})
+            units.append(unit)
+        writer = manifest.PartitionedUnitWriter(self.tmp_dir, parts=3, block_size=64)
+        for u in units:
+            writer.add(u)
+        writer.close()
+        m = manifest.Manifest(manifest_path, self.MANIFEST_ID)
+        m.units_published(writer)
+        m.write()
+        # Test
+        cfg = DownloaderConfig()
+        downloader = LocalFileDownloader(cfg)
+        working_dir = os.path.join(self.tmp_dir, 'working_dir')
+        os.makedirs(working_dir)
+        url = 'file://%s' % manifest_path
+        m = manifest.RemoteManifest(url, downloader, working_dir)
+        m.fetch()
+        m.fetch_units()
+        # Verify
+        self.assertEqual(m.version, manifest.MANIFEST_VERSION)
+        self.assertTrue(m.is_valid())
+        self.assertTrue(m.has_valid_units())
+        self.assertEqual(len(m.units_paths()), 3)
+        self.assertEqual(sum(p[manifest.UNITS_TOTAL] for p in m.units[manifest.UNITS_PARTS]),
+                         self.NUM_UNITS)
+        units_in = []
+        refs = []
+        for unit, ref in m.get_units():
+            units_in.append(unit)
+            refs.append(ref)
+            self.assertEqual(unit, ref.fetch())
+        self.verify(units, units_in)
+        refs.reverse()
+        fetched = manifest.UnitRef.fetch_all(refs)
+        fetched.reverse()
+        self.verify(units, fetched)
+
+    def test_get_unit(self):
+        # Setup
+        manifest_path = os.path.join(self.tmp_dir, manifest.MANIFEST_FILE_NAME)
+        writer = manifest.PartitionedUnitWriter(self.tmp_dir, parts=2, block_size=64)
+        for i in range(0, self.NUM_UNITS):
+            writer.add(dict(unit_id=i, type_id='T', unit_key={'n': i}))
+        writer.close()
+        m = manifest.Manifest(manifest_path, self.MANIFEST_ID)
+        m.units_published(writer)
+        m.write()
+        # Test
+        unit = m.get_unit('T', {'n': 7})
+        missing = m.get_unit('T', {'n': self.NUM_UNITS})
+        # Verify
+        self.assertEqual(unit['unit_id'], 7)
+        self.assertTrue(missing is None)
+
+    def test_invalid_block_file(self):
+        path = os.path.join(self.tmp_dir, manifest.UNITS_PART_FILE_NAME % 0)
+        with open(path, 'w+') as fp:
+            fp.write('invalid-units' * 10)
+        self.assertRaises(IOError, manifest.BlockUnitReader, path)
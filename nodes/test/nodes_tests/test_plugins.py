@@ -38,7 +38,7 @@ from pulp.common.config import Config
 from pulp.server.managers import factory as managers
 from pulp.server.content.sources.model import Request as DownloadRequest
 from pulp.agent.lib.conduit import Conduit
-from pulp_node.manifest import Manifest, RemoteManifest, MANIFEST_FILE_NAME, UNITS_FILE_NAME
+from pulp_node.manifest import Manifest, RemoteManifest, MANIFEST_FILE_NAME
 from pulp_node.handlers.strategies import Mirror, Additive
 from pulp_node import error
 from pulp_node import constants
@@ -704,11 +704,11 @@ class ImporterTest(PluginTestBase):
             self.define_plugins()
             publisher = dist.publisher(repo, configuration)
             manifest_path = publisher.manifest_path()
-            units_path = os.path.join(os.path.dirname(manifest_path), UNITS_FILE_NAME)
             manifest = Manifest(manifest_path)
             manifest.read()
             shutil.copy(manifest_path, os.path.join(working_dir, MANIFEST_FILE_NAME))
-            shutil.copy(units_path, os.path.join(working_dir, UNITS_FILE_NAME))
+            for units_path in manifest.units_paths():
+                shutil.copy(units_path, working_dir)
             # Test
             importer = NodesHttpImporter()
             manifest_url = pathlib.url_join(publisher.base_url, manifest_path)
@@ -788,8 +788,9 @@ class ImporterTest(PluginTestBase):
             manifest = Manifest(manifest_path)
             manifest.read()
             shutil.copy(manifest_path, os.path.join(working_dir, MANIFEST_FILE_NAME))
-            with open(os.path.join(working_dir, UNITS_FILE_NAME), 'w+') as fp:
-                fp.write('invalid-units')
+            for units_path in manifest.units_paths():
+                with open(os.path.join(working_dir, os.path.basename(units_path)), 'w+') as fp:
+                    fp.write('invalid-units')
             # Test
             importer = NodesHttpImporter()
             manifest_url = pathlib.url_join(publisher.base_url, manifest_path)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python2
+"""
+Benchmark basic authentication of REST API requests.
+
+Each request is authenticated by AuthenticationManager.check_username_password
+the way the auth_required decorator does it. Users are looked up in memory
+instead of the database so the numbers reflect password hashing. The modes
+are the iterated HMAC used for passwords stored by older releases, PBKDF2
+(hashlib.pbkdf2_hmac), and PBKDF2 with the credential cache enabled.
+"""
+
+import sys
+import time
+from optparse import OptionParser
+
+from pulp.server.config import config
+from pulp.server.db import model
+from pulp.server.managers.auth import authentication
+
+
+class Users(object):
+    """
+    In memory replacement for User.objects supporting objects(login=...).first().
+    """
+
+    def __init__(self, users):
+        self.users = dict((user.login, user) for user in users)
+        self.login = None
+
+    def __call__(self, login):
+        self.login = login
+        return self
+
+    def first(self):
+        return self.users.get(self.login)
+
+
+def legacy_user(login, password):
+    user = model.User(login=login)
+    salt = user._random_bytes(8)
+    hashed = user._pbkdf_sha256(password, salt, model.PASSWORD_ITERATIONS)
+    user.password = salt.encode('base64').strip() + ',' + hashed.encode('base64').strip()
+    return user
+
+
+def pbkdf2_user(login, password):
+    user = model.User(login=login)
+    user.set_password(password)
+    return user
+
+
+def run(label, make_user, count, distinct, ttl):
+    users = [make_user('user%d' % n, 'password%d' % n) for n in xrange(distinct)]
+    for user in users:
+        # keep legacy passwords from being rehashed
+        user.password_needs_rehash = lambda: False
+    model.User.objects = Users(users)
+    config.set('authentication', 'credential_cache_ttl', str(ttl))
+    authentication.credential_cache.clear()
+    manager = authentication.AuthenticationManager()
+    started = time.time()
+    for n in xrange(count):
+        login = manager.check_username_password('user%d' % (n % distinct),
+                                                'password%d' % (n % distinct))
+        assert login is not None
+    elapsed = time.time() - started
+    print '%-22s %8d in %6.2fs %10.0f requests/s' % (label, count, elapsed, count / elapsed)
+
+
+def main():
+    parser = OptionParser(description=__doc__.strip().split('\n')[0])
+    parser.add_option('--count', type='int', default=2000, help='number of requests')
+    parser.add_option('--users', type='int', default=10, help='number of distinct users')
+    options, args = parser.parse_args()
+
+    config.set('ldap', 'enabled', 'false')
+    run('iterated hmac', legacy_user, options.count, options.users, 0)
+    run('pbkdf2', pbkdf2_user, options.count, options.users, 0)
+    run('pbkdf2 cached', pbkdf2_user, options.count, options.users, 60)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+#!/usr/bin/env python2
+"""
+Benchmark writing a large XmlFileContext with a checksum in the file name.
+
+The checksums are calculated while the file is written. The "read back" mode
+writes the file without a checksum and then hashes it by reading the whole
+file into memory, which is what finalize() used to do. Each mode runs in a
+forked process and reports the time taken and the peak RSS of the process.
+No database or configuration is needed.
+"""
+
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from optparse import OptionParser
+
+from pulp.plugins.util.metadata_writer import XmlFileContext
+from pulp.server.util import CHECKSUM_FUNCTIONS, TYPE_SHA1, TYPE_SHA256
+
+
+def write(path, count, **kwargs):
+    """
+    Write count package elements with some text to an XmlFileContext.
+    """
+    with XmlFileContext(path, 'metadata', {'packages': str(count)}, **kwargs) as context:
+        for n in xrange(count):
+            context.xml_generator.startElement('package', {'type': 'rpm'})
+            context.xml_generator.characters('package-%d ' % n + 'description ' * 40)
+            context.xml_generator.endElement('package')
+    return context
+
+
+def read_back(path, count, checksum_type):
+    context = write(path, count)
+    with open(context.metadata_file_path, 'rb') as file_handle:
+        CHECKSUM_FUNCTIONS[checksum_type](file_handle.read()).hexdigest()
+
+
+def while_writing(path, count, checksum_type):
+    write(path, count, checksum_type=checksum_type)
+
+
+def multiple(path, count, checksum_type):
+    write(path, count, checksum_type=checksum_type, checksum_types=[TYPE_SHA1])
+
+
+def run(label, fn, directory, file_name, count, checksum_type):
+    pid = os.fork()
+    if pid == 0:
+        path = os.path.join(tempfile.mkdtemp(dir=directory), file_name)
+        started = time.time()
+        fn(path, count, checksum_type)
+        elapsed = time.time() - started
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+        print '%-28s %7.2fs  peak RSS %7.1f MB' % (label, elapsed, rss)
+        sys.stdout.flush()
+        os._exit(0)
+    os.waitpid(pid, 0)
+
+
+def main():
+    parser = OptionParser(description=__doc__.strip().split('\n')[0])
+    parser.add_option('--packages', type='int', default=500000, help='number of elements')
+    parser.add_option('--dir', help='directory for the files, defaults to a temporary one')
+    options, args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(dir=options.dir)
+    try:
+        for file_name in ('primary.xml', 'primary.xml.gz'):
+            for label, fn in (('read back', read_back),
+                              ('while writing', while_writing),
+                              ('while writing +sha1', multiple)):
+                run('%s %s' % (file_name, label), fn, directory, file_name, options.packages,
+                    TYPE_SHA256)
+    finally:
+        shutil.rmtree(directory)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
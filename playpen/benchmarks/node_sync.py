@@ -0,0 +1,181 @@
+#!/usr/bin/env python2
+"""
+Benchmark a full nodes child repository synchronization against a parent
+fixture served from a local directory.
+
+The fixture is a nodes manifest and units file plus a content file for a
+subset of the units, served over HTTP on the loopback interface the same way
+a parent node publishes them.  The child synchronizes it with the selected
+strategy.  Units are recorded by a conduit that does not write to the database
+so the numbers reflect the nodes importer itself; the child inventory is read
+from the database for a repository that does not exist.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+from BaseHTTPServer import HTTPServer
+from optparse import OptionParser
+from SimpleHTTPServer import SimpleHTTPRequestHandler
+from threading import Event, Thread
+
+from nectar.config import DownloaderConfig
+from nectar.downloaders.threaded import HTTPThreadedDownloader
+
+from pulp.server.config import config as pulp_conf
+from pulp.server.db import connection
+
+from pulp_node import constants
+from pulp_node.manifest import Manifest, UnitWriter, MANIFEST_FILE_NAME
+from pulp_node.importers.reports import SummaryReport, ProgressListener
+from pulp_node.importers.strategies import Request, find_strategy
+from pulp_node.reports import RepositoryProgress
+
+
+REPO_ID = 'node-sync-benchmark'
+
+
+class Repository(object):
+
+    def __init__(self, working_dir):
+        self.id = REPO_ID
+        self.working_dir = working_dir
+
+
+class Conduit(object):
+    """
+    Records the units saved and removed by the strategy.
+    """
+
+    def __init__(self):
+        self.saved = 0
+        self.removed = 0
+
+    def save_unit(self, unit):
+        self.saved += 1
+        return unit
+
+    def remove_unit(self, unit):
+        self.removed += 1
+
+    def set_progress(self, report):
+        pass
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(parent_dir):
+    """
+    Serve the parent fixture on an ephemeral loopback port.
+    :return: The base URL.
+    """
+    os.chdir(parent_dir)
+    server = HTTPServer(('127.0.0.1', 0), QuietHandler)
+    thread = Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return 'http://127.0.0.1:%d/' % server.server_port
+
+
+def publish(parent_dir, base_url, num_units, num_files, file_size):
+    """
+    Write the parent fixture.
+    :return: The URL of the published manifest.
+    """
+    content_dir = os.path.join(parent_dir, constants.CONTENT_PATH)
+    os.makedirs(content_dir)
+    data = os.urandom(file_size)
+    with UnitWriter(parent_dir) as writer:
+        for n in xrange(num_units):
+            unit = {
+                'unit_id': str(n),
+                'type_id': 'benchmark',
+                'unit_key': {'name': 'unit-%d' % n, 'version': '1.0'},
+                'metadata': {'description': 'benchmark unit %d' % n, 'n': n},
+                constants.LAST_UPDATED: 1.0,
+                constants.STORAGE_PATH: None,
+                constants.RELATIVE_PATH: None,
+            }
+            if n < num_files:
+                relative_path = 'content/unit-%d' % n
+                path = os.path.join(content_dir, relative_path)
+                if not os.path.isdir(os.path.dirname(path)):
+                    os.makedirs(os.path.dirname(path))
+                with open(path, 'w') as fp:
+                    fp.write(data)
+                unit[constants.STORAGE_PATH] = relative_path
+                unit[constants.RELATIVE_PATH] = relative_path
+                unit[constants.FILE_SIZE] = file_size
+            writer.add(unit)
+    manifest = Manifest(parent_dir, 'benchmark')
+    manifest.units_published(writer)
+    manifest.published({constants.BASE_URL: base_url})
+    manifest.write()
+    return base_url + MANIFEST_FILE_NAME
+
+
+def synchronize(manifest_url, working_dir, strategy_name):
+    """
+    Synchronize the child repository from the fixture.
+    :return: The conduit and summary report.
+    """
+    conduit = Conduit()
+    summary = SummaryReport()
+    request = Request(
+        Event(),
+        conduit=conduit,
+        config={constants.MANIFEST_URL_KEYWORD: manifest_url},
+        downloader=HTTPThreadedDownloader(DownloaderConfig()),
+        progress=RepositoryProgress(REPO_ID, ProgressListener(conduit)),
+        summary=summary,
+        repo=Repository(working_dir))
+    strategy = find_strategy(strategy_name)()
+    strategy.synchronize(request)
+    return conduit, summary
+
+
+def main():
+    parser = OptionParser(description=__doc__.strip().split('\n')[0])
+    parser.add_option('--units', type='int', default=100000, help='number of units published')
+    parser.add_option('--files', type='int', default=1000, help='number of units with a file')
+    parser.add_option('--file-size', type='int', default=4096, help='size of each file in bytes')
+    parser.add_option('--strategy', default=constants.MIRROR_STRATEGY,
+                      choices=constants.STRATEGIES, help='importer strategy')
+    options, args = parser.parse_args()
+
+    connection.initialize()
+
+    tmp_dir = tempfile.mkdtemp(prefix='node-sync-benchmark-')
+    storage_dir = os.path.join(tmp_dir, 'storage')
+    parent_dir = os.path.join(tmp_dir, 'parent')
+    working_dir = os.path.join(tmp_dir, 'working')
+    os.makedirs(parent_dir)
+    os.makedirs(working_dir)
+    pulp_conf.set('server', 'storage_dir', storage_dir)
+    try:
+        base_url = serve(parent_dir)
+        started = time.time()
+        manifest_url = publish(
+            parent_dir, base_url, options.units, options.files, options.file_size)
+        print 'published %d units (%d files) in %.2fs' % (
+            options.units, options.files, time.time() - started)
+
+        started = time.time()
+        conduit, summary = synchronize(manifest_url, working_dir, options.strategy)
+        elapsed = time.time() - started
+        print 'synchronized in %.2fs: %d units added, %d removed, %d errors' % (
+            elapsed, conduit.saved, conduit.removed, len(summary.errors))
+        print '%.0f units/s' % (conduit.saved / elapsed if elapsed else 0)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
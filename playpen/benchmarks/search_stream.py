@@ -0,0 +1,93 @@
+#!/usr/bin/env python2
+"""
+Benchmark buffered, streamed and cursor paged search view responses.
+
+A search view is backed by a manager generating documents in memory (no
+database is needed) so the numbers reflect the serialization and response
+handling of the view. Each mode runs in a forked process and reports the
+time to the first byte of the response, the total time and the peak RSS of
+the process.
+"""
+
+import os
+import resource
+import sys
+import time
+from optparse import OptionParser
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pulp.server.webservices.settings')
+
+from pulp.server.webservices.views import search  # noqa
+
+
+class Manager(object):
+    """
+    Generates documents ordered by _id supporting keyset pagination.
+    """
+
+    def __init__(self, count, size):
+        self.count = count
+        self.padding = 'x' * size
+
+    def find_by_criteria(self, query):
+        start = 0
+        filters = query.filters or {}
+        for clause in filters.get('$and', [filters]):
+            if '_id' in clause:
+                start = int(clause['_id']['$gt']) + 1
+        skip = query.skip or 0
+        stop = self.count
+        if query.limit:
+            stop = min(stop, start + skip + query.limit)
+        for n in xrange(start + skip, stop):
+            yield {'_id': '%012d' % n, 'n': n, 'description': self.padding}
+
+
+def measure(view, query, options):
+    """
+    Generate the response and consume it.
+    :return: (time to first byte, total time, bytes)
+    """
+    started = time.time()
+    response = view._generate_response(query, options)
+    if response.streaming:
+        chunks = iter(response.streaming_content)
+    else:
+        chunks = iter([response.content])
+    size = len(next(chunks))
+    first = time.time() - started
+    for chunk in chunks:
+        size += len(chunk)
+    return first, time.time() - started, size
+
+
+def run(label, view, query, options):
+    pid = os.fork()
+    if pid == 0:
+        first, total, size = measure(view, query, options)
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+        print '%-10s first byte %7.3fs  total %7.3fs  %8.1f MB sent  peak RSS %7.1f MB' % (
+            label, first, total, size / 1048576.0, rss)
+        sys.stdout.flush()
+        os._exit(0)
+    os.waitpid(pid, 0)
+
+
+def main():
+    parser = OptionParser(description=__doc__.strip().split('\n')[0])
+    parser.add_option('--documents', type='int', default=200000, help='number of documents')
+    parser.add_option('--size', type='int', default=200, help='padding in each document')
+    parser.add_option('--page', type='int', default=1000, help='cursor page size')
+    options, args = parser.parse_args()
+
+    class View(search.SearchView):
+        manager = Manager(options.documents, options.size)
+
+    run('buffered', View, {}, {})
+    run('streamed', View, {}, {search.STREAM: True})
+    run('cursor', View, {'limit': options.page}, {search.CURSOR: ''})
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+#!/usr/bin/env python2
+"""
+Benchmark associating units with a repository, as done when copying units.
+
+Units are associated with a scratch repository one at a time, the way
+associate_all_by_ids did before it used bulk writes, and with unordered bulk
+upserts of a range of batch sizes. Each mode is timed associating new units,
+then again associating units that are all already in the repository. The unit
+documents themselves are not created, only their associations. Needs a
+running mongod; the scratch repository and its associations are removed
+afterwards.
+"""
+
+import sys
+import time
+import uuid
+from optparse import OptionParser
+
+from pulp.server.db import connection
+from pulp.server.db import model
+from pulp.server.db.model.repository import RepoContentUnit
+from pulp.server.managers.repo.unit_association import RepoUnitAssociationManager
+
+TYPE_ID = 'benchmark'
+
+
+def one_at_a_time(manager, repo_id, unit_ids):
+    unique_count = 0
+    for unit_id in unit_ids:
+        if not manager.association_exists(repo_id, unit_id, TYPE_ID):
+            unique_count += 1
+        manager.associate_unit_by_id(repo_id, TYPE_ID, unit_id, False)
+    return unique_count
+
+
+def bulk(batch_size):
+    def associate(manager, repo_id, unit_ids):
+        units = ((TYPE_ID, unit_id) for unit_id in unit_ids)
+        added = manager.associate_units(repo_id, units, batch_size=batch_size)
+        return added.get(TYPE_ID, 0)
+    return associate
+
+
+def run(label, associate, count):
+    repo_id = 'benchmark-%s' % uuid.uuid4().hex
+    model.Repository(repo_id=repo_id).save()
+    manager = RepoUnitAssociationManager()
+    unit_ids = [uuid.uuid4().hex for n in xrange(count)]
+    try:
+        for phase in ('new', 'existing'):
+            started = time.time()
+            added = associate(manager, repo_id, unit_ids)
+            elapsed = time.time() - started
+            print '%-22s %-8s %8d added in %7.2fs %10.0f units/s' % (
+                label, phase, added, elapsed, count / elapsed)
+    finally:
+        RepoContentUnit.get_collection().delete_many({'repo_id': repo_id})
+        model.Repository.objects(repo_id=repo_id).delete()
+
+
+def main():
+    parser = OptionParser(description=__doc__.strip().split('\n')[0])
+    parser.add_option('--units', type='int', default=20000, help='number of units copied')
+    parser.add_option('--batch-sizes', default='500,5000',
+                      help='comma separated bulk write batch sizes')
+    options, args = parser.parse_args()
+
+    connection.initialize()
+    run('one at a time', one_at_a_time, options.units)
+    for batch_size in [int(size) for size in options.batch_sizes.split(',')]:
+        run('bulk, batches of %d' % batch_size, bulk(batch_size), options.units)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,61 @@
+#!/usr/bin/env python2
+"""
+Benchmark signing and validating lazy content redirect URLs.
+
+Compares RSA and shared secret (HMAC) signing as done by the content web
+view, and validation with and without the ValidationCache used by the
+streamer.  The cached validation replays a fixed set of signed URLs the way
+a client retrying or fetching ranges of the same file does.  No database or
+configuration is needed; the RSA key is generated by the script.
+"""
+
+import sys
+import time
+from optparse import OptionParser
+
+from M2Crypto import RSA
+
+from pulp.server.lazy.url import HMACKey, URL, ValidationCache
+
+
+REMOTE_IP = '10.1.1.1'
+
+
+def timed(label, count, fn):
+    """
+    Call fn() count times and print the rate.
+    """
+    started = time.time()
+    for n in xrange(count):
+        fn(n)
+    elapsed = time.time() - started
+    print '%-28s %8d in %6.2fs %10.0f/s' % (label, count, elapsed, count / elapsed)
+
+
+def run(label, private, public, count, distinct):
+    urls = [URL('https://pulp.example.com/streamer/content/%d.rpm' % n) for n in range(distinct)]
+    signed = [url.sign(private, remote_ip=REMOTE_IP) for url in urls]
+    timed('%s sign' % label, count, lambda n: urls[n % distinct].sign(private, remote_ip=REMOTE_IP))
+    timed('%s validate' % label, count, lambda n: signed[n % distinct].validate(
+        public, remote_ip=REMOTE_IP))
+    cache = ValidationCache()
+    timed('%s validate (cached)' % label, count, lambda n: cache.validate(
+        signed[n % distinct], public, remote_ip=REMOTE_IP))
+
+
+def main():
+    parser = OptionParser(description=__doc__.strip().split('\n')[0])
+    parser.add_option('--count', type='int', default=5000, help='operations per measurement')
+    parser.add_option('--urls', type='int', default=100, help='number of distinct URLs')
+    parser.add_option('--bits', type='int', default=2048, help='RSA key size')
+    options, args = parser.parse_args()
+
+    rsa = RSA.gen_key(options.bits, 65537, callback=lambda *unused: None)
+    run('rsa', rsa, rsa, options.count, options.urls)
+    key = HMACKey('benchmark-secret')
+    run('hmac', key, key, options.count, options.urls)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
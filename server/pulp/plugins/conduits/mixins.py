@@ -1,6 +1,9 @@
+from contextlib import contextmanager
 from gettext import gettext as _
+import datetime
 import logging
 import sys
+import threading
 
 from pymongo.errors import DuplicateKeyError
 
@@ -16,6 +19,9 @@ import pulp.server.managers.factory as manager_factory
 
 _logger = logging.getLogger(__name__)
 
+# Default number of units saved together by a conduit buffering its saves
+SAVE_BATCH_SIZE = 1000
+
 
 class ImporterConduitException(Exception):
     """
@@ -413,6 +419,30 @@ class AddUnitMixin(object):
         self._added_count = 0
         self._updated_count = 0
 
+        self._lock = threading.RLock()
+        self._batch_size = 0
+        self._pending = []
+        self._pending_keys = set()
+
+    def buffer_saves(self, batch_size=SAVE_BATCH_SIZE):
+        """
+        Buffers the units passed to save_unit so they are saved and associated to the repository
+        in batches instead of with several queries per unit. The existing units of a batch are
+        looked up 50 unit keys per query, and the units are then added, updated and associated
+        with bulk writes.
+
+        Buffered units are saved when batch_size of them are pending, when flush or finalize is
+        called, and before any other call to this conduit that changes the repository. Their id
+        field is only populated once they are saved, so an importer that needs the id of a unit
+        right after saving it should call flush first. The Pulp server calls finalize after the
+        importer returns.
+
+        @param batch_size: number of units saved together
+        @type  batch_size: int
+        """
+        with self._lock:
+            self._batch_size = batch_size
+
     def init_unit(self, type_id, unit_key, metadata, relative_path):
         """
         Initializes the Pulp representation of a content unit. The conduit will
@@ -485,6 +515,18 @@ class AddUnitMixin(object):
         :return: object reference to the provided unit, its state updated from the call
         :rtype:  Unit
         """
+        if self._batch_size:
+            with self._lock:
+                # a unit saved twice in a batch is saved in order
+                key = self._pending_key(unit)
+                if key in self._pending_keys:
+                    self.flush()
+                self._pending.append(unit)
+                self._pending_keys.add(key)
+                if len(self._pending) >= self._batch_size:
+                    self.flush()
+            return unit
+
         try:
             association_manager = manager_factory.repo_unit_association_manager()
 
@@ -553,6 +595,120 @@ class AddUnitMixin(object):
             _logger.debug(_('cannot add unit; already exists. updating instead.'))
             return self._update_unit(unit, pulp_unit)
 
+    def flush(self):
+        """
+        Saves and associates to the repository the units buffered by save_unit, populating their
+        id field. The result is the same as saving each of them unbuffered, in order.
+        """
+        with self._lock:
+            units, self._pending = self._pending, []
+            self._pending_keys = set()
+            if not units:
+                return
+            try:
+                by_type = {}
+                type_ids = []
+                for unit in units:
+                    if unit.type_id not in by_type:
+                        by_type[unit.type_id] = []
+                        type_ids.append(unit.type_id)
+                    by_type[unit.type_id].append(unit)
+                for type_id in type_ids:
+                    self._save_units(type_id, by_type[type_id])
+
+                association_manager = manager_factory.repo_unit_association_manager()
+                association_manager.associate_units(
+                    self.repo_id, ((unit.type_id, unit.id) for unit in units),
+                    refresh_existing=False)
+            except Exception, e:
+                _logger.exception(_('Content unit association failed for %(n)d units') %
+                                  {'n': len(units)})
+                raise ImporterConduitException(e), None, sys.exc_info()[2]
+
+    def finalize(self):
+        """
+        Saves the units still buffered by save_unit. Called by the Pulp server once the importer
+        is done with this conduit.
+        """
+        self.flush()
+
+    @staticmethod
+    def _pending_key(unit):
+        """
+        :param unit: unit passed to save_unit
+        :type  unit: pulp.plugins.model.Unit
+
+        :return: hashable identity of the unit, derived from its type and unit key
+        :rtype:  tuple
+        """
+        return unit.type_id, _normalize_key_value(unit.unit_key)
+
+    def _save_units(self, type_id, units):
+        """
+        Add the units of a type that do not exist yet and update the others, with bulk writes.
+        Units added by another workflow in the meantime are updated instead.
+
+        :param type_id: type of the units
+        :type  type_id: basestring
+        :param units:   units of the type, each with a different unit key
+        :type  units:   list of pulp.plugins.model.Unit
+        """
+        content_manager = manager_factory.content_manager()
+        for unit in units:
+            unit.id = None
+        self._find_unit_ids(type_id, units)
+        to_update = [unit for unit in units if unit.id is not None]
+
+        new_units = [unit for unit in units if unit.id is None]
+        unit_ids = content_manager.add_content_units(
+            type_id, [common_utils.to_pulp_unit(unit) for unit in new_units])
+        duplicates = []
+        for unit, unit_id in zip(new_units, unit_ids):
+            if unit_id is None:
+                duplicates.append(unit)
+            else:
+                unit.id = unit_id
+                self._added_count += 1
+        if duplicates:
+            _logger.debug(_('cannot add %(n)d units; already exist. updating instead.') %
+                          {'n': len(duplicates)})
+            self._find_unit_ids(type_id, duplicates)
+            to_update.extend(unit for unit in duplicates if unit.id is not None)
+
+        content_manager.update_content_units(
+            type_id, dict((unit.id, common_utils.to_pulp_unit(unit)) for unit in to_update))
+        self._updated_count += len(to_update)
+
+        # Duplicates that were not found again were removed by another workflow, or have a key
+        # the database stores differently than the importer passed it. Saving them one at a
+        # time looks them up by their key as given.
+        for unit in duplicates:
+            if unit.id is None:
+                unit.id = self._update_unit(unit, common_utils.to_pulp_unit(unit))
+
+    @classmethod
+    def _find_unit_ids(cls, type_id, units):
+        """
+        Set the id field of the units that exist in the database. The units are looked up 50
+        unit keys per query, and matched on their unit key values as the database compares
+        them, so for example 1 matches 1.0.
+
+        :param type_id: type of the units
+        :type  type_id: basestring
+        :param units:   units of the type
+        :type  units:   list of pulp.plugins.model.Unit
+        """
+        content_query_manager = manager_factory.content_query_manager()
+        key_fields = list(units[0].unit_key.keys())
+        by_key = dict((cls._pending_key(unit), unit) for unit in units)
+        existing = content_query_manager.get_multiple_units_by_keys_dicts(
+            type_id, [unit.unit_key for unit in units], model_fields=['_id'] + key_fields)
+        for unit_dict in existing:
+            unit_key = dict((field, unit_dict.get(field)) for field in key_fields)
+            unit = by_key.get((type_id, _normalize_key_value(unit_key)))
+            if unit is not None:
+                unit.id = unit_dict['_id']
+
     def link_unit(self, from_unit, to_unit, bidirectional=False):
         """
         Creates a reference between two content units. The semantics of what
@@ -572,6 +728,7 @@ class AddUnitMixin(object):
         @param to_unit: will be referenced by the from_unit
         @type  to_unit: L{Unit}
         """
+        self.flush()
         content_manager = manager_factory.content_manager()
 
         try:
@@ -587,6 +744,70 @@ class AddUnitMixin(object):
             raise ImporterConduitException(e), None, sys.exc_info()[2]
 
 
+@contextmanager
+def finalizing(conduit):
+    """
+    Call the finalize method of a conduit once the importer is done with it, saving the units
+    it buffered. When the importer raises an exception, a failure to finalize is logged and
+    the importer's exception is raised.
+
+    :param conduit: conduit given to the importer
+    :type  conduit: AddUnitMixin
+    """
+    try:
+        yield conduit
+    except:
+        exc_info = sys.exc_info()
+        try:
+            conduit.finalize()
+        except Exception:
+            _logger.exception(_('Saving the units buffered by the importer failed'))
+        raise exc_info[0], exc_info[1], exc_info[2]
+    conduit.finalize()
+
+
+def _normalize_key_value(value):
+    """
+    Convert a unit key, or a value in one, to a hashable value that is equal for the values
+    MongoDB considers equal: numbers of any type with the same value, byte and unicode
+    strings with the same text, and datetimes that only differ in precision below a
+    millisecond or in time zone.
+
+    :param value: unit key or unit key value
+    :type  value: object
+
+    :return: hashable normalized value, tagged with its kind so that values MongoDB does not
+             consider equal, such as True and 1, stay different
+    :rtype:  tuple
+    """
+    if isinstance(value, bool):
+        return 'bool', value
+    if isinstance(value, (int, long, float)):
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        return 'number', value
+    if isinstance(value, str):
+        try:
+            value = value.decode('utf-8')
+        except UnicodeDecodeError:
+            return 'bytes', value
+    if isinstance(value, unicode):
+        return 'string', value
+    if isinstance(value, dict):
+        return 'dict', tuple(sorted((k, _normalize_key_value(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return 'list', tuple(_normalize_key_value(v) for v in value)
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is not None:
+            value = (value - value.utcoffset()).replace(tzinfo=None)
+        return 'datetime', value.replace(microsecond=value.microsecond // 1000 * 1000)
+    try:
+        hash(value)
+    except TypeError:
+        return 'other', repr(value)
+    return 'other', value
+
+
 class StatusMixin(object):
 
     def __init__(self, report_id, exception_class):
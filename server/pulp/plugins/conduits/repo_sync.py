@@ -99,6 +99,7 @@ class RepoSyncConduit(RepoScratchPadMixin, ImporterScratchPadMixin, AddUnitMixin
         @param unit: unit object (must have its id value set)
         @type  unit: L{Unit}
         """
+        self.flush()
 
         try:
             self._association_manager.unassociate_unit_by_id(
@@ -118,6 +119,7 @@ class RepoSyncConduit(RepoScratchPadMixin, ImporterScratchPadMixin, AddUnitMixin
                              (example: list of unit key dicts)
         :type  search_dicts: list of dicts
         """
+        self.flush()
         unit_ids = self._content_query_manager.get_content_unit_ids(unit_type_id, search_dicts)
         self._association_manager.associate_all_by_ids(self.repo_id, unit_type_id, unit_ids)
 
@@ -137,6 +139,7 @@ class RepoSyncConduit(RepoScratchPadMixin, ImporterScratchPadMixin, AddUnitMixin
         @param details: potentially longer log of the sync; may be None
         @type  details: any serializable
         """
+        self.flush()
         r = SyncReport(True, self._added_count, self._updated_count,
                        self._removed_count, summary, details)
         return r
@@ -162,6 +165,7 @@ class RepoSyncConduit(RepoScratchPadMixin, ImporterScratchPadMixin, AddUnitMixin
         @param details: potentially longer log of the sync; may be None
         @type  details: any serializable
         """
+        self.flush()
         r = SyncReport(False, self._added_count, self._updated_count,
                        self._removed_count, summary, details)
         return r
@@ -186,6 +190,7 @@ class RepoSyncConduit(RepoScratchPadMixin, ImporterScratchPadMixin, AddUnitMixin
         @param details: potentially longer log of the sync; may be None
         @type  details: any serializable
         """
+        self.flush()
         r = SyncReport(False, self._added_count, self._updated_count,
                        self._removed_count, summary, details)
         r.canceled_flag = True
@@ -5,7 +5,32 @@ from pulp.plugins.conduits.mixins import (
 
 class UploadConduit(AddUnitMixin, SingleRepoUnitsMixin, SearchUnitsMixin):
 
-    def __init__(self, repo_id, importer_id):
+    def __init__(self, repo_id, importer_id, upload_checksum=None):
+        """
+        :param upload_checksum: tuple of checksum type and value of the uploaded file, if it
+                                was calculated by the server while the file was uploaded
+        :type  upload_checksum: tuple or None
+        """
         AddUnitMixin.__init__(self, repo_id, importer_id)
         SingleRepoUnitsMixin.__init__(self, repo_id, ImporterConduitException)
         SearchUnitsMixin.__init__(self, ImporterConduitException)
+
+        self.upload_checksum = upload_checksum
+
+    def get_upload_checksum(self, checksum_type):
+        """
+        Returns the checksum of the uploaded file if the server already calculated it
+        while the file was being uploaded. Importers should use this before reading the
+        file to calculate the checksum themselves.
+
+        :param checksum_type: type of checksum the importer needs, e.g. "sha256"
+        :type  checksum_type: str
+        :return: the checksum value, or None if it is not known for the given type
+        :rtype:  str or None
+        """
+        if self.upload_checksum is None:
+            return None
+        known_type, checksum = self.upload_checksum
+        if known_type.lower() != checksum_type.lower():
+            return None
+        return checksum
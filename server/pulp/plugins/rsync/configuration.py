@@ -135,6 +135,16 @@ def validate_config(repo, config, config_conduit):
         if not valid:
             err_list.append("rsync_extra_args: %s" % err)
 
+    if "rsync_shards" in _config:
+        shards = _config["rsync_shards"]
+        if not isinstance(shards, int) or isinstance(shards, bool) or shards < 1:
+            err_list.append(_("rsync_shards: must be a positive integer"))
+
+    if "manifest_verify_interval" in _config:
+        interval = _config["manifest_verify_interval"]
+        if not isinstance(interval, int) or isinstance(interval, bool) or interval < 0:
+            err_list.append(_("manifest_verify_interval: must be a non-negative integer"))
+
     if "remote" not in _config or ("remote" in _config and not isinstance(_config["remote"], dict)):
         err_list.append("'remote' dict missing in distributor's configuration")
     else:
@@ -0,0 +1,176 @@
+from gettext import gettext as _
+import hashlib
+import json
+import logging
+import os
+
+from pulp.server.config import config as pulp_config
+
+
+# Directory in the server working directory holding the manifests of the remote servers
+MANIFEST_DIR = 'rsync_manifests'
+
+_logger = logging.getLogger(__name__)
+
+
+class RemoteManifest(object):
+    """
+    Files and symlinks that were successfully rsynced to a remote server, stored as JSON in the
+    server working directory. Fast forward publishes skip the content units and symlinks that are
+    already on the remote server according to the manifest.
+
+    Files removed from the remote server by other means are not noticed by the manifest, so
+    every interval publishes of a repository verify the remote state instead: nothing is skipped
+    and rsync compares every file. The manifest is updated with what a publish staged only once the
+    whole publish succeeded.
+
+    Content units are shared by the repositories published to a remote server, so a manifest
+    covers every repository published to the same user, host and root, and records which
+    repositories published each entry. Publishes running at the same time merge their entries
+    when the manifest is saved. A verifying publish replaces the entries of its repository, so
+    the files and symlinks it no longer publishes are dropped unless another repository
+    published them, and a publish deleting remote files with rsync --delete drops every entry it
+    did not stage.
+    """
+
+    def __init__(self, path, repo_id, interval, verify=False, delete=False):
+        """
+        :param path:        full path to the manifest file
+        :type  path:        basestring
+        :param repo_id:     id of the repository being published
+        :type  repo_id:     basestring
+        :param interval:    number of publishes of a repository between verifications
+        :type  interval:    int
+        :param verify:      verify the remote state in this publish regardless of the interval
+        :type  verify:      bool
+        :param delete:      this publish deletes the remote files it does not rsync
+        :type  delete:      bool
+        """
+        self.path = path
+        self.repo_id = repo_id
+        self.files, self.links, self.publishes, self.owners = self._load()
+        count = self.publishes.get(repo_id)
+        self.verify = verify or delete or count is None or count >= interval
+        self.delete = delete
+        self.new_files = {}
+        self.new_links = {}
+
+    @classmethod
+    def for_remote(cls, remote, repo_id, interval, verify=False, delete=False):
+        """
+        :param remote:      'remote' section of the distributor configuration
+        :type  remote:      dict
+        :param repo_id:     id of the repository being published
+        :type  repo_id:     basestring
+        :param interval:    number of publishes of a repository between verifications
+        :type  interval:    int
+        :param verify:      verify the remote state in this publish regardless of the interval
+        :type  verify:      bool
+        :param delete:      this publish deletes the remote files it does not rsync
+        :type  delete:      bool
+
+        :return: the manifest of the remote server
+        :rtype:  RemoteManifest
+        """
+        destination = '%s@%s:%s' % (remote['ssh_user'], remote['host'], remote['root'])
+        path = os.path.join(pulp_config.get('server', 'working_directory'), MANIFEST_DIR,
+                            '%s.json' % hashlib.sha256(destination).hexdigest())
+        return cls(path, repo_id, interval, verify, delete)
+
+    def _load(self):
+        """
+        :return: files, symlinks, publish counts and the paths of the files and symlinks published
+                 by each repository in the manifest file, all empty if there is no readable
+                 manifest
+        :rtype:  tuple of four dicts
+        """
+        try:
+            with open(self.path) as open_file:
+                data = json.load(open_file)
+            # manifests saved before entries had owners have none
+            return data['files'], data['links'], data['publishes'], data.get('owners', {})
+        except (IOError, ValueError, KeyError, TypeError, AttributeError):
+            return {}, {}, {}, {}
+
+    def has_file(self, path, size, checksum):
+        """
+        Tells whether a file has to be rsynced, and if so remembers it to be added to the manifest.
+
+        :param path:        path of the file relative to the remote root
+        :type  path:        basestring
+        :param size:        size of the file in bytes
+        :type  size:        int
+        :param checksum:    checksum of the file, None if it is not known
+        :type  checksum:    basestring
+
+        :return: True if the file is already on the remote server
+        :rtype:  bool
+        """
+        entry = [size, checksum]
+        if not self.verify and self.files.get(path) == entry:
+            return True
+        self.new_files[path] = entry
+        return False
+
+    def has_link(self, path, target):
+        """
+        Tells whether a symlink has to be rsynced, and if so remembers it to be added to the
+        manifest.
+
+        :param path:    path of the symlink relative to the remote root
+        :type  path:    basestring
+        :param target:  path the symlink points to, relative to the remote root
+        :type  target:  basestring
+
+        :return: True if the symlink is already on the remote server
+        :rtype:  bool
+        """
+        if not self.verify and self.links.get(path) == target:
+            return True
+        self.new_links[path] = target
+        return False
+
+    def save(self):
+        """
+        Add the files and symlinks rsynced by this publish to the manifest file. A verifying
+        publish replaces the entries of its repository instead. Failing to write the manifest is
+        logged and otherwise ignored, the next publish transfers more than needed.
+        """
+        files, links, publishes, owners = self._load()
+        previous = owners.get(self.repo_id, {'files': [], 'links': []})
+        if self.delete:
+            # rsync --delete removed what this publish did not stage
+            files, links, owners = {}, {}, {}
+        elif self.verify:
+            others = set()
+            for repo_id, owned in owners.items():
+                if repo_id != self.repo_id:
+                    others.update(owned['files'])
+            for path in previous['files']:
+                if path not in self.new_files and path not in others:
+                    files.pop(path, None)
+            for path in previous['links']:
+                if path not in self.new_links:
+                    links.pop(path, None)
+        files.update(self.new_files)
+        links.update(self.new_links)
+        if self.verify:
+            owners[self.repo_id] = {'files': sorted(self.new_files),
+                                    'links': sorted(self.new_links)}
+            publishes[self.repo_id] = 1
+        else:
+            owners[self.repo_id] = {
+                'files': sorted(set(previous['files']).union(self.new_files)),
+                'links': sorted(set(previous['links']).union(self.new_links))}
+            publishes[self.repo_id] = publishes.get(self.repo_id, 0) + 1
+        temp_path = '%s.%d' % (self.path, os.getpid())
+        try:
+            if not os.path.isdir(os.path.dirname(self.path)):
+                os.makedirs(os.path.dirname(self.path))
+            with open(temp_path, 'w') as open_file:
+                json.dump({'files': files, 'links': links, 'publishes': publishes,
+                           'owners': owners}, open_file)
+            os.rename(temp_path, self.path)
+        except (IOError, OSError), e:
+            _logger.warning(_('Could not save the rsync manifest %(p)s: %(e)s') %
+                            {'p': self.path, 'e': e})
@@ -1,4 +1,5 @@
 from gettext import gettext as _
+from multiprocessing.pool import ThreadPool
 import logging
 import os
 import time
@@ -9,6 +10,7 @@ import kobo.shortcuts
 import mongoengine
 
 from pulp.common import dateutils
+from pulp.plugins.rsync.manifest import RemoteManifest
 from pulp.plugins.util.publish_step import PublishStep
 from pulp.server.config import config as pulp_config
 from pulp.server.exceptions import PulpCodedException
@@ -20,6 +22,15 @@ ASSOCIATED_UNIT_DATE_KEYWORD = "created"
 START_DATE_KEYWORD = 'start_date'
 END_DATE_KEYWORD = 'end_date'
 
+# Number of rsync processes a file list is split between, set with the rsync_shards option
+DEFAULT_SHARDS = 1
+
+# Seconds an idle shared ssh connection is kept open for later rsync calls
+SSH_CONTROL_PERSIST = 60
+
+# Directory in the server working directory holding the sockets of shared ssh connections
+SSH_CONTROL_DIR = 'rsync-ssh'
+
 _logger = logging.getLogger(__name__)
 
 
@@ -76,7 +87,7 @@ class RSyncPublishStep(PublishStep):
         tmpdir = os.path.join(self.get_working_dir(), '.tmp')
         os.makedirs(os.path.join(tmpdir, path.lstrip("/")))
         args = ['rsync', '-avrK', '--ignore-existing', '-f+ */']
-        args.extend(self.make_authentication())
+        args.extend(self.make_authentication(self._connection(0)))
         args.extend(self.make_extra_args())
         args.append("%s/" % tmpdir)
         args.append(self.make_destination(path).replace(str(path), ""))
@@ -86,12 +97,14 @@ class RSyncPublishStep(PublishStep):
         shutil.rmtree(tmpdir)
         return is_ok, output
 
-    def make_ssh_cmd(self, args=None):
+    def make_ssh_cmd(self, args=None, connection=None):
         """
         Returns a list of arguments needed to form an ssh command for connecting to remote server.
 
         :param args:list of extra args to append to the standard ssh command
         :type args: list
+        :param connection: index of the shared ssh connection to use, None for a new connection
+        :type connection: int
 
         :return: list of arguments for ssh portion of command
         :rtype: list
@@ -104,21 +117,60 @@ class RSyncPublishStep(PublishStep):
         cmd += ['-i', key,
                 '-o', 'StrictHostKeyChecking no',
                 '-o', 'UserKnownHostsFile /dev/null']
+        control_dir = self.get_ssh_control_dir() if connection is not None else None
+        if control_dir:
+            # %C is a hash of the user, host and port, so publishes to the same host share the
+            # connections. ssh falls back to a connection of its own if the socket is unusable.
+            cmd += ['-o', 'ControlMaster auto',
+                    '-o', 'ControlPath %s' % os.path.join(control_dir, '%%C-%d' % connection),
+                    '-o', 'ControlPersist %d' % SSH_CONTROL_PERSIST]
         if args:
             cmd += args
         return cmd
 
-    def make_authentication(self):
+    @staticmethod
+    def get_ssh_control_dir():
+        """
+        Returns the directory holding the sockets of shared ssh connections, creating it if needed.
+
+        :return: path to the directory, or None if it cannot be created
+        :rtype: str
+        """
+        control_dir = os.path.join(pulp_config.get('server', 'working_directory'),
+                                   SSH_CONTROL_DIR)
+        try:
+            os.makedirs(control_dir, 0700)
+        except OSError:
+            if not os.path.isdir(control_dir):
+                _logger.warning(_('Cannot create %(d)s, ssh connections are not shared') %
+                                {'d': control_dir})
+                return None
+        return control_dir
+
+    def get_shards(self):
+        """
+        Returns the number of rsync processes the file list is split between, given by the
+        'rsync_shards' config option.
+
+        :return: number of shards
+        :rtype: int
+        """
+        return self.get_config().get("rsync_shards", DEFAULT_SHARDS)
+
+    def make_authentication(self, connection=None):
         """
         Returns a list of strings representing args for command for authenticating against a remote
         server.
 
+        :param connection: index of the shared ssh connection to use, None for a new connection
+        :type connection: int
+
         :return: list of arguments for auth. e.g., ['-e',  'ssh, '-l', 'ssh_user', '-i',
                                                     '/ssh_identity_file', 'hostname']
         :rtype: list
         """
         ssh_parts = []
-        for arg in self.make_ssh_cmd():
+        for arg in self.make_ssh_cmd(connection=connection):
             if " " in arg:
                 ssh_parts.append('"%s"' % arg)
             else:
@@ -190,7 +242,8 @@ class RSyncPublishStep(PublishStep):
             message = out
         return (rv == 0, message)
 
-    def make_rsync_args(self, files_from, source_prefix, dest_prefix, exclude=None):
+    def make_rsync_args(self, files_from, source_prefix, dest_prefix, exclude=None,
+                        connection=None):
         """
         Creates a list of arguments for the rsync command
 
@@ -202,6 +255,8 @@ class RSyncPublishStep(PublishStep):
         :type dest_prefix: str
         :param exclude: list of file/directory paths to exclude
         :type exclude: list
+        :param connection: index of the shared ssh connection to use, None for a new connection
+        :type connection: int
 
         :return: list of arguments for rsync command
         :rtype: list of strings
@@ -213,7 +268,7 @@ class RSyncPublishStep(PublishStep):
         if exclude:
             for x in exclude:
                 args.extend(["--exclude", x])
-        args.extend(self.make_authentication())
+        args.extend(self.make_authentication(connection))
         if self.delete:
             args.append("--delete")
         if self.links:
@@ -231,6 +286,11 @@ class RSyncPublishStep(PublishStep):
         This method formulates the rsync command based on parameters passed in to the __init__ and
         then executes it.
 
+        When the 'rsync_shards' config option is greater than one, the sorted file list is split
+        into that many parts of about the same size in bytes, which are transferred by concurrent
+        rsync processes over shared ssh connections. This returns once every part is transferred,
+        so files rsynced by later steps, such as metadata, still arrive after the content.
+
         :return: (boolean indicating success or failure, str made up of stdout and stderr
                   generated by rsync command)
         :rtype: tuple
@@ -241,8 +301,6 @@ class RSyncPublishStep(PublishStep):
             os.makedirs(self.src_directory)
 
         output = ""
-        list_of_files = os.path.join(self.get_working_dir(), str(uuid.uuid4()))
-        open(list_of_files, 'w').write("\n".join(sorted(self.file_list)))
 
         # copy files here, not symlinks
         (is_successful, this_output) = self.remote_mkdir(self.dest_directory)
@@ -251,9 +309,17 @@ class RSyncPublishStep(PublishStep):
             _logger.error(_("Cannot create directory %(directory)s: %(output)s") % params)
             return (is_successful, this_output)
         output += this_output
-        rsync_args = self.make_rsync_args(list_of_files, self.src_directory,
-                                          self.dest_directory, self.exclude)
-        (is_successful, this_output) = self.call(rsync_args)
+
+        shards = self.get_shards()
+        if shards > 1 and not self.delete and len(self.file_list) > 1:
+            (is_successful, this_output) = self.rsync_shards(shards)
+        else:
+            list_of_files = os.path.join(self.get_working_dir(), str(uuid.uuid4()))
+            open(list_of_files, 'w').write("\n".join(sorted(self.file_list)))
+            rsync_args = self.make_rsync_args(list_of_files, self.src_directory,
+                                              self.dest_directory, self.exclude,
+                                              self._connection(0))
+            (is_successful, this_output) = self.call(rsync_args)
         _logger.info(this_output)
         if not is_successful:
             _logger.error(this_output)
@@ -261,6 +327,68 @@ class RSyncPublishStep(PublishStep):
         output += this_output
         return (is_successful, output)
 
+    def rsync_shards(self, shards):
+        """
+        Splits the file list into shards and rsyncs them concurrently, each shard over its own
+        shared ssh connection.
+
+        Every shard is a success of this step in the progress report and progress_bytes counts the
+        size of the files in the shards transferred.
+
+        :param shards: number of shards to split the file list into
+        :type shards: int
+
+        :return: (boolean indicating whether every shard succeeded, outputs of all the shards)
+        :rtype: tuple
+        """
+        parts = split_file_list(self.file_list, self.src_directory, shards,
+                                follow_links=not self.links)
+        self.total_units = len(parts)
+        self.progress_bytes = 0
+        self.report_progress(force=True)
+
+        def rsync_part(index):
+            files, size = parts[index]
+            list_of_files = os.path.join(self.get_working_dir(), str(uuid.uuid4()))
+            open(list_of_files, 'w').write("\n".join(files))
+            rsync_args = self.make_rsync_args(list_of_files, self.src_directory,
+                                              self.dest_directory, self.exclude, index)
+            return self.call(rsync_args)
+
+        pool = ThreadPool(len(parts))
+        try:
+            results = pool.map(rsync_part, range(len(parts)))
+        finally:
+            pool.close()
+            pool.join()
+
+        outputs = []
+        for index, (is_successful, this_output) in enumerate(results):
+            files, size = parts[index]
+            if is_successful:
+                self.progress_successes += 1
+                self.progress_bytes += size
+                status = _('succeeded')
+            else:
+                status = _('failed')
+            params = {'n': index + 1, 'total': len(parts), 'files': len(files),
+                      'status': status}
+            outputs.append(_("rsync shard %(n)d of %(total)d, %(files)d files, %(status)s:") %
+                           params)
+            outputs.append(this_output)
+        self.report_progress(force=True)
+        return (all(result[0] for result in results), "\n".join(outputs))
+
+    def _connection(self, index):
+        """
+        :param index: index of a shared ssh connection
+        :type index: int
+
+        :return: the index when rsync is sharded, None otherwise so ssh connects on its own
+        :rtype: int
+        """
+        return index if self.get_shards() > 1 else None
+
     def process_main(self):
         """
         This method is the main method executed when the step system executes a step.
@@ -270,6 +398,47 @@ class RSyncPublishStep(PublishStep):
             raise PulpCodedException(message=output)
 
 
+def split_file_list(file_list, src_directory, shards, follow_links=True):
+    """
+    Splits the sorted file list into consecutive parts of about the same total size, keeping
+    files of the same directory together as much as possible.
+
+    :param file_list: list of paths relative to src_directory
+    :type file_list: list
+    :param src_directory: absolute path to directory which contains all items in file_list
+    :type src_directory: str
+    :param shards: maximum number of parts
+    :type shards: int
+    :param follow_links: size symlinks by the file they point to, as rsync --copy-links does
+    :type follow_links: bool
+
+    :return: list of (sorted list of paths, total size in bytes) tuples, with no empty parts
+    :rtype: list
+    """
+    stat = os.stat if follow_links else os.lstat
+    sized = []
+    for path in sorted(file_list):
+        try:
+            size = stat(os.path.join(src_directory, path)).st_size
+        except OSError:
+            # rsync reports the missing file
+            size = 0
+        sized.append((path, size))
+
+    total = sum(size for path, size in sized)
+    parts = [([], 0)]
+    running = 0
+    for path, size in sized:
+        files, part_size = parts[-1]
+        if files and len(parts) < shards and running >= total * len(parts) / float(shards):
+            parts.append(([], 0))
+            files, part_size = parts[-1]
+        files.append(path)
+        parts[-1] = (files, part_size + size)
+        running += size
+    return parts
+
+
 class UpdateLastPredistDateStep(PublishStep):
     """
     After a publish of the Predistributor completes, store the date in the scratchpad.
@@ -315,6 +484,8 @@ class Publisher(PublishStep):
         :ivar symlink_list: list of symlinks to rsync
         :ivar content_unit_file_list: list of content units to rsync
         :ivar symlink_src: path to directory containing all symlinks
+        :ivar remote_manifest: what was rsynced to the remote server before, None unless the
+                               'manifest_verify_interval' config option is set
         """
 
         super(Publisher, self).__init__("Repository publish", repo,
@@ -368,8 +539,25 @@ class Publisher(PublishStep):
         self.content_unit_file_list = []
         self.symlink_src = os.path.join(self.get_working_dir(), '.relative/')
 
+        self.remote_manifest = None
+        interval = self.get_config().get("manifest_verify_interval", 0)
+        if interval:
+            # a full publish transfers everything, it verifies the remote state
+            self.remote_manifest = RemoteManifest.for_remote(
+                self.get_config().flatten()["remote"], repo.id, interval,
+                verify=not self.is_fastforward(), delete=self.get_config().get("delete", False))
+
         self._add_necesary_steps(date_filter=date_filter, config=config)
 
+    def post_process(self):
+        """
+        Record what this publish rsynced in the manifest of the remote server, this is only called
+        when every step succeeded.
+        """
+        super(Publisher, self).post_process()
+        if self.remote_manifest is not None:
+            self.remote_manifest.save()
+
     def is_fastforward(self):
         """
         This method checks whether this publish should be a fastforward publish.
@@ -0,0 +1,227 @@
+"""
+File like objects compressing what is written to them into another file, for writers such as
+tarfile in stream mode that only write sequentially.
+"""
+from collections import deque
+from gettext import gettext as _
+from multiprocessing.pool import ThreadPool
+import struct
+import subprocess
+import tempfile
+import time
+import zlib
+
+
+GZIP = 'gz'
+XZ = 'xz'
+COMPRESSION_TYPES = (GZIP, XZ)
+
+# Number of chunks compressed concurrently, in threads: zlib releases the GIL while compressing.
+COMPRESSION_WORKERS = 4
+
+# Amount of uncompressed data compressed as a unit by a worker
+GZIP_CHUNK_SIZE = 2 ** 20
+
+GZIP_LEVEL = 6
+
+XZ_COMMAND = 'xz'
+
+
+def compressed_writer(fileobj, compression, workers=COMPRESSION_WORKERS):
+    """
+    :param fileobj:     file the compressed data is written to
+    :type  fileobj:     file
+    :param compression: one of COMPRESSION_TYPES, or None to write the data uncompressed
+    :type  compression: basestring
+    :param workers:     number of threads or processes compressing the data
+    :type  workers:     int
+    :return: file like object to write the uncompressed data to. It must be closed to write
+             the end of the compressed data, or aborted when the data is not complete, to
+             release the threads or process compressing it. fileobj is not closed.
+    :raises ValueError: if the compression type is not supported
+    """
+    if compression is None:
+        return UncompressedWriter(fileobj)
+    if compression == GZIP:
+        return GzipWriter(fileobj, workers)
+    if compression == XZ:
+        return XzWriter(fileobj, workers)
+    raise ValueError(_('Unsupported compression type: %(c)s') % {'c': compression})
+
+
+class UncompressedWriter(object):
+    """
+    Writes the data to the file as it is.
+    """
+
+    def __init__(self, fileobj):
+        """
+        :param fileobj: file the data is written to
+        :type  fileobj: file
+        """
+        self.fileobj = fileobj
+
+    def write(self, data):
+        self.fileobj.write(data)
+
+    def close(self):
+        pass
+
+    def abort(self):
+        pass
+
+
+class GzipWriter(object):
+    """
+    Writes a gzip file, compressing chunks of the data concurrently.
+
+    Each chunk is compressed as a separate raw deflate stream ending with a sync flush, the
+    way pigz does it, so the concatenated streams form the single member of a regular gzip
+    file. Chunks do not share a compression dictionary, which costs a little in compression
+    ratio. The compressed chunks are written in order and at most twice as many chunks as
+    there are workers are held in memory.
+    """
+
+    def __init__(self, fileobj, workers=COMPRESSION_WORKERS, level=GZIP_LEVEL,
+                 chunk_size=GZIP_CHUNK_SIZE):
+        """
+        :param fileobj:     file the compressed data is written to
+        :type  fileobj:     file
+        :param workers:     number of chunks compressed concurrently
+        :type  workers:     int
+        :param level:       compression level, 1 to 9
+        :type  level:       int
+        :param chunk_size:  number of bytes of uncompressed data in a chunk
+        :type  chunk_size:  int
+        """
+        self.fileobj = fileobj
+        self.workers = workers
+        self.level = level
+        self.chunk_size = chunk_size
+        self.buffer = []
+        self.buffered = 0
+        self.crc = zlib.crc32('')
+        self.size = 0
+        self.pending = deque()
+        self.pool = ThreadPool(workers) if workers > 1 else None
+        # header with no file name, the modification time, no extra flags and an unknown OS
+        self.fileobj.write(struct.pack('<4sIBB', '\x1f\x8b\x08\x00', int(time.time()), 0, 255))
+
+    def write(self, data):
+        self.crc = zlib.crc32(data, self.crc)
+        self.size += len(data)
+        self.buffer.append(data)
+        self.buffered += len(data)
+        if self.buffered >= self.chunk_size:
+            self._compress(''.join(self.buffer))
+            self.buffer = []
+            self.buffered = 0
+
+    def _compress(self, chunk):
+        """
+        Compress a chunk, or queue it to be compressed, and write the compressed chunks that
+        are ready in order.
+
+        :param chunk: uncompressed data
+        :type  chunk: str
+        """
+        if self.pool is None:
+            self.fileobj.write(deflate(chunk, self.level))
+            return
+        self.pending.append(self.pool.apply_async(deflate, (chunk, self.level)))
+        while len(self.pending) > self.workers * 2:
+            self.fileobj.write(self.pending.popleft().get())
+
+    def close(self):
+        """
+        Compress the remaining data and write the end of the gzip file.
+        """
+        try:
+            if self.buffered:
+                self._compress(''.join(self.buffer))
+                self.buffer = []
+                self.buffered = 0
+            while self.pending:
+                self.fileobj.write(self.pending.popleft().get())
+        finally:
+            if self.pool is not None:
+                self.pool.close()
+                self.pool.join()
+                self.pool = None
+        # an empty final block ends the deflate stream
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        self.fileobj.write(compressor.flush(zlib.Z_FINISH))
+        self.fileobj.write(struct.pack('<II', self.crc & 0xffffffff, self.size & 0xffffffff))
+
+    def abort(self):
+        """
+        Stop compressing without writing the end of the gzip file.
+        """
+        self.pending.clear()
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+
+def deflate(chunk, level=GZIP_LEVEL):
+    """
+    :param chunk:   uncompressed data
+    :type  chunk:   str
+    :param level:   compression level, 1 to 9
+    :type  level:   int
+    :return: the data as a raw deflate stream that is not final and ends on a byte boundary,
+             so another stream can follow it
+    :rtype:  str
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+class XzWriter(object):
+    """
+    Writes an xz file by piping the data through the xz command, which compresses with
+    several threads. Python 2 has no lzma module; xz is installed wherever pulp is.
+    """
+
+    def __init__(self, fileobj, workers=COMPRESSION_WORKERS):
+        """
+        :param fileobj: file the compressed data is written to, it must have a file descriptor
+        :type  fileobj: file
+        :param workers: number of threads xz compresses with
+        :type  workers: int
+        """
+        fileobj.flush()
+        # a file rather than a pipe, which xz could fill and block on while data is written
+        self.errors = tempfile.TemporaryFile()
+        self.process = subprocess.Popen([XZ_COMMAND, '-c', '-T', str(workers)],
+                                        stdin=subprocess.PIPE, stdout=fileobj,
+                                        stderr=self.errors, close_fds=True)
+
+    def write(self, data):
+        self.process.stdin.write(data)
+
+    def close(self):
+        """
+        Wait for xz to write the end of the file.
+
+        :raises IOError: if xz failed
+        """
+        self.process.stdin.close()
+        returncode = self.process.wait()
+        self.errors.seek(0)
+        error = self.errors.read()
+        self.errors.close()
+        if returncode != 0:
+            raise IOError(_('%(c)s failed: %(e)s') % {'c': XZ_COMMAND, 'e': error.strip()})
+
+    def abort(self):
+        """
+        Kill xz without waiting for it to write the end of the file.
+        """
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        if not self.process.stdin.closed:
+            self.process.stdin.close()
+        self.errors.close()
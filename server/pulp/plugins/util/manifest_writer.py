@@ -1,33 +1,180 @@
+from collections import defaultdict
+from gettext import gettext as _
+from multiprocessing.pool import ThreadPool
 import csv
 import hashlib
+import json
+import logging
 import os
+import time
 
 from pulp.common.plugins.distributor_constants import MANIFEST_FILENAME
+from pulp.plugins.loader import api as plugin_api
+from pulp.server.config import config as pulp_config
+from pulp.server.content import storage as content_storage
 
 
+_logger = logging.getLogger(__name__)
+
 # not much science behind this
 CHUNK_SIZE = 2 ** 16
 
+# Number of files hashed concurrently. Threads are used rather than a multiprocessing pool
+# because this runs in a daemonic celery worker process, from which multiprocessing cannot
+# start processes; hashlib and file reads release the GIL so the hashing still runs in parallel.
+HASH_WORKERS = 4
+
+# Name of the file in the server working directory caching checksums between publishes.
+CHECKSUM_CACHE_FILE = 'manifest_checksums.json'
+
+# Maximum number of entries kept in the checksum cache, the least recently used are dropped.
+CHECKSUM_CACHE_SIZE = 100000
+
+# Content unit fields holding the type of the unit's checksum field, in order of preference.
+CHECKSUM_TYPE_FIELDS = ('checksumtype', 'checksum_type', 'checksum_algorithm')
+SHA256_TYPES = ('sha256', 'SHA256')
+
+# Number of storage paths looked up in a single query.
+UNIT_QUERY_SIZE = 1000
 
-def make_manifest_for_dir(path):
+
+def make_manifest_for_dir(path, workers=HASH_WORKERS, cache_path=None, unit_checksums=True):
     """
     creates a PULP_MANIFEST file in the specified directory
 
     The file is CSV with three fields: filename, sha256 checksum value, and size in bytes
 
+    The checksum of a file that is a symlink into content storage is taken from its content
+    unit when the unit stores a sha256 checksum, or from the name of the blob it resolves to
+    in the blob store. Checksums found in the cache are used next,
+    and the remaining files are hashed concurrently.
+
     :param path:    full path to the directory where the manifest should be created
     :type  path:    basestring
+    :param workers: number of files hashed concurrently
+    :type  workers: int
+    :param cache_path: full path to a file caching checksums between calls, keyed by the
+                       device, inode, modification time and size of each file. No cache is
+                       used if None.
+    :type  cache_path: basestring
+    :param unit_checksums: use the checksums stored on content units
+    :type  unit_checksums: bool
     """
     file_paths = [os.path.join(path, filename) for filename in os.listdir(path)
                   if filename != MANIFEST_FILENAME]
+    files = [(fullpath, os.stat(fullpath)) for fullpath in filter(os.path.isfile, file_paths)]
+
+    checksums = {}
+    if unit_checksums:
+        links = dict((os.path.realpath(fullpath), fullpath) for fullpath, stat in files
+                     if os.path.islink(fullpath))
+        if links:
+            checksums.update(get_unit_checksums(links))
+
+    cache = None
+    if cache_path:
+        cache = ChecksumCache(cache_path)
+    to_hash = []
+    for fullpath, stat in files:
+        if fullpath in checksums:
+            continue
+        checksum = cache.get(stat) if cache else None
+        if checksum:
+            checksums[fullpath] = checksum
+        else:
+            to_hash.append(fullpath)
+
+    checksums.update(hash_files(to_hash, workers))
+
+    if cache:
+        for fullpath, stat in files:
+            cache.set(stat, checksums[fullpath])
+        cache.save()
+
     with open(os.path.join(path, MANIFEST_FILENAME), 'w') as open_file:
         writer = csv.writer(open_file)
-        for fullpath in filter(os.path.isfile, file_paths):
-            size = os.path.getsize(fullpath)
+        for fullpath, stat in files:
             filename = os.path.basename(fullpath)
-            checksum = get_sha256_checksum(fullpath)
+            writer.writerow([filename, checksums[fullpath], stat.st_size])
+
+
+def checksum_cache_path():
+    """
+    :return: full path to the checksum cache shared by the publishes on this server
+    :rtype:  basestring
+    """
+    return os.path.join(pulp_config.get('server', 'working_directory'), CHECKSUM_CACHE_FILE)
+
 
-            writer.writerow([filename, checksum, size])
+def hash_files(paths, workers=HASH_WORKERS):
+    """
+    Calculate the sha256 checksums of files, several at a time.
+
+    :param paths:   full paths to the files
+    :type  paths:   list
+    :param workers: number of files hashed concurrently
+    :type  workers: int
+
+    :return:    sha256 checksums keyed by path
+    :rtype:     dict
+    """
+    if workers <= 1 or len(paths) <= 1:
+        return dict((path, get_sha256_checksum(path)) for path in paths)
+    pool = ThreadPool(min(workers, len(paths)))
+    try:
+        return dict(zip(paths, pool.map(get_sha256_checksum, paths)))
+    finally:
+        pool.close()
+        pool.join()
+
+
+def get_unit_checksums(paths):
+    """
+    Look up the sha256 checksums stored on the content units that own files in content storage.
+    The checksum of a file in the blob store, which unit storage paths are symbolic links to when
+    content storage is deduplicated with symbolic links, is the name of the blob.
+
+    Files outside of content storage, of unknown types, and of types that do not store a sha256
+    checksum are left out.
+
+    :param paths:   mapping of the real path of a file to the path it is reported by
+    :type  paths:   dict
+
+    :return:    sha256 checksums keyed by reported path
+    :rtype:     dict
+    """
+    storage_dir = os.path.join(pulp_config.get('server', 'storage_dir'), 'content', 'units')
+    real_storage_dir = os.path.realpath(storage_dir)
+    by_type = defaultdict(dict)
+    checksums = {}
+    for real_path, path in paths.items():
+        digest = content_storage.blob_digest(real_path)
+        if digest:
+            checksums[path] = digest
+            continue
+        relative_path = os.path.relpath(real_path, real_storage_dir)
+        if relative_path.startswith(os.pardir):
+            continue
+        # units are stored under a directory named for their type
+        type_id = relative_path.split(os.sep)[0]
+        by_type[type_id][os.path.join(storage_dir, relative_path)] = path
+
+    for type_id, storage_paths in by_type.items():
+        unit_model = plugin_api.get_unit_model_by_id(type_id)
+        if unit_model is None or 'checksum' not in unit_model._fields:
+            continue
+        type_fields = [f for f in CHECKSUM_TYPE_FIELDS if f in unit_model._fields]
+        if not type_fields:
+            continue
+        query = {'%s__in' % type_fields[0]: SHA256_TYPES}
+        storage_path_list = storage_paths.keys()
+        for i in xrange(0, len(storage_path_list), UNIT_QUERY_SIZE):
+            units = unit_model.objects(
+                _storage_path__in=storage_path_list[i:i + UNIT_QUERY_SIZE], **query)
+            for storage_path, checksum in units.scalar('_storage_path', 'checksum'):
+                if checksum:
+                    checksums[storage_paths[storage_path]] = checksum.lower()
+    return checksums
 
 
 def get_sha256_checksum(path):
@@ -47,3 +194,81 @@ def get_sha256_checksum(path):
             hasher.update(chunk)
             chunk = open_file.read(CHUNK_SIZE)
     return hasher.hexdigest()
+
+
+class ChecksumCache(object):
+    """
+    sha256 checksums of files keyed by the device, inode, modification time and size of
+    the file, stored as JSON. A file that is rewritten gets a new modification time, so
+    its cached checksum is not used.
+
+    The cache is shared by concurrent publishes. It is replaced atomically when saved and
+    the last save wins, entries added by another publish in the meantime are lost.
+    """
+
+    def __init__(self, path, size=CHECKSUM_CACHE_SIZE):
+        """
+        :param path:    full path to the cache file
+        :type  path:    basestring
+        :param size:    maximum number of entries kept when the cache is saved
+        :type  size:    int
+        """
+        self.path = path
+        self.size = size
+        self.entries = {}
+        try:
+            with open(path) as open_file:
+                self.entries = json.load(open_file)
+        except (IOError, ValueError):
+            pass
+        self.now = int(time.time())
+
+    @staticmethod
+    def key(stat):
+        """
+        :param stat:    stat of a file
+        :type  stat:    posix.stat_result
+        :return:    the cache key of the file
+        :rtype:     str
+        """
+        return '%d:%d:%r:%d' % (stat.st_dev, stat.st_ino, stat.st_mtime, stat.st_size)
+
+    def get(self, stat):
+        """
+        :param stat:    stat of a file
+        :type  stat:    posix.stat_result
+        :return:    the cached checksum of the file or None
+        :rtype:     basestring
+        """
+        entry = self.entries.get(self.key(stat))
+        if entry is None:
+            return None
+        entry[1] = self.now
+        return entry[0]
+
+    def set(self, stat, checksum):
+        """
+        :param stat:        stat of a file
+        :type  stat:        posix.stat_result
+        :param checksum:    checksum of the file
+        :type  checksum:    basestring
+        """
+        self.entries[self.key(stat)] = [checksum, self.now]
+
+    def save(self):
+        """
+        Write the most recently used entries to the cache file. Failing to write the cache is
+        logged and otherwise ignored.
+        """
+        entries = self.entries
+        if len(entries) > self.size:
+            recent = sorted(entries.items(), key=lambda item: item[1][1], reverse=True)
+            entries = dict(recent[:self.size])
+        temp_path = '%s.%d' % (self.path, os.getpid())
+        try:
+            with open(temp_path, 'w') as open_file:
+                json.dump(entries, open_file)
+            os.rename(temp_path, self.path)
+        except (IOError, OSError), e:
+            _logger.warning(_('Could not save the checksum cache %(p)s: %(e)s') %
+                            {'p': self.path, 'e': e})
@@ -1,9 +1,9 @@
 from gettext import gettext as _
 import glob
 import gzip
+import json
 import logging
 import os
-import shutil
 import traceback
 
 
@@ -11,10 +11,12 @@ from xml.sax.saxutils import XMLGenerator
 
 from pulp.common import error_codes
 from pulp.server.exceptions import PulpCodedValidationException, PulpCodedException
-from pulp.server.util import CHECKSUM_FUNCTIONS
+from pulp.server.util import CHECKSUM_FUNCTIONS, calculate_checksums
 
 _LOG = logging.getLogger(__name__)
-BUFFER_SIZE = 1024
+BUFFER_SIZE = 64 * 1024
+CHECKSUM_BUFFER_SIZE = 64 * 1024
+OFFSET_INDEX_SUFFIX = '.offsets'
 
 
 class MetadataFileContext(object):
@@ -22,7 +24,7 @@ class MetadataFileContext(object):
     Context manager class for metadata file generation.
     """
 
-    def __init__(self, metadata_file_path, checksum_type=None):
+    def __init__(self, metadata_file_path, checksum_type=None, checksum_types=None):
         """
         :param metadata_file_path: full path to metadata file to be generated
         :type  metadata_file_path: str
@@ -30,18 +32,41 @@ class MetadataFileContext(object):
                               to the file names of files. If checksum_type is None,
                               no checksum is added to the filename
         :type checksum_type: str or None
+        :param checksum_types: additional checksum types to calculate for the file. All of the
+                               checksums are available in the checksums attribute once the
+                               file has been finalized.
+        :type  checksum_types: list or None
         """
 
         self.metadata_file_path = metadata_file_path
         self.metadata_file_handle = None
         self.checksum_type = checksum_type
         self.checksum = None
+        self.checksums = {}
+        self.checksum_constructors = {}
+        self.checksum_file = None
         if self.checksum_type is not None:
-            checksum_function = CHECKSUM_FUNCTIONS.get(checksum_type)
-            if not checksum_function:
-                raise PulpCodedValidationException(
-                    [PulpCodedException(error_codes.PLP1005, checksum_type=checksum_type)])
-            self.checksum_constructor = checksum_function
+            self.checksum_constructor = self._checksum_function(checksum_type)
+            self.checksum_constructors[checksum_type] = self.checksum_constructor
+        for extra_type in checksum_types or []:
+            self.checksum_constructors[extra_type] = self._checksum_function(extra_type)
+
+    @staticmethod
+    def _checksum_function(checksum_type):
+        """
+        Look up the function that constructs a hasher for the given checksum type.
+
+        :param checksum_type: checksum type
+        :type  checksum_type: str
+        :return: hasher constructor
+        :rtype:  callable
+        :raises PulpCodedValidationException: if the checksum type is not supported
+        """
+        checksum_function = CHECKSUM_FUNCTIONS.get(checksum_type)
+        if not checksum_function:
+            raise PulpCodedValidationException(
+                [PulpCodedException(error_codes.PLP1005, checksum_type=checksum_type)])
+        return checksum_function
 
     def __enter__(self):
 
@@ -93,13 +118,19 @@ class MetadataFileContext(object):
         except Exception, e:
             _LOG.exception(e)
 
+        if self.checksum_constructors:
+            if self.checksum_file is not None:
+                self.checksums = self.checksum_file.hexdigests()
+            else:
+                # the file was not written through a ChecksumFile, read it back
+                with open(self.metadata_file_path, 'rb') as file_handle:
+                    self.checksums = calculate_checksums(file_handle,
+                                                         self.checksum_constructors.keys())
+
         # Add calculated checksum to the filename
         file_name = os.path.basename(self.metadata_file_path)
         if self.checksum_type is not None:
-            with open(self.metadata_file_path, 'rb') as file_handle:
-                content = file_handle.read()
-                checksum = self.checksum_constructor(content).hexdigest()
-
+            checksum = self.checksums[self.checksum_type]
             self.checksum = checksum
             file_name_with_checksum = checksum + '-' + file_name
             new_file_path = os.path.join(os.path.dirname(self.metadata_file_path),
@@ -142,11 +173,22 @@ class MetadataFileContext(object):
         msg = _('Opening metadata file handle for [%(p)s]')
         _LOG.debug(msg % {'p': self.metadata_file_path})
 
+        file_handle = open(self.metadata_file_path, 'wb')
+        if self.checksum_constructors:
+            # The checksums are calculated from the bytes written to disk, which are the
+            # compressed bytes for a gzip file.
+            self.checksum_file = ChecksumFile(file_handle, self.checksum_constructors)
+            file_handle = self.checksum_file
+
         if self.metadata_file_path.endswith('.gz'):
-            self.metadata_file_handle = gzip.open(self.metadata_file_path, 'w')
+            # The file name is passed so the gzip header matches gzip.open()
+            self.metadata_file_handle = gzip.GzipFile(self.metadata_file_path, 'wb',
+                                                      fileobj=file_handle)
+            # Let the GzipFile close the file it was given, the same as one it opened itself
+            self.metadata_file_handle.myfileobj = file_handle
 
         else:
-            self.metadata_file_handle = open(self.metadata_file_path, 'w')
+            self.metadata_file_handle = file_handle
 
     def _write_file_header(self):
         """
@@ -195,6 +237,85 @@ class MetadataFileContext(object):
                 raise
 
 
+class ChecksumFile(object):
+    """
+    Wraps a file opened for writing and updates one or more hashers with everything written
+    to it, so the checksums of the file are known once it is written without reading it back.
+
+    Writes are buffered and passed to the file and the hashers in blocks, the XML generator
+    makes many small writes.
+    """
+
+    def __init__(self, file_object, checksum_constructors):
+        """
+        :param file_object: file opened for writing
+        :type  file_object: file
+        :param checksum_constructors: hasher constructors keyed by checksum type
+        :type  checksum_constructors: dict
+        """
+        self.file_object = file_object
+        self.hashers = dict((checksum_type, constructor())
+                            for checksum_type, constructor in checksum_constructors.items())
+        self._buffer = []
+        self._buffered = 0
+
+    @property
+    def closed(self):
+        return self.file_object.closed
+
+    @property
+    def name(self):
+        return self.file_object.name
+
+    def write(self, data):
+        """
+        Write data to the file and update the hashers.
+
+        :param data: data to be written
+        :type  data: str
+        """
+        self._buffer.append(data)
+        self._buffered += len(data)
+        if self._buffered >= CHECKSUM_BUFFER_SIZE:
+            self._write_buffer()
+
+    def _write_buffer(self):
+        """
+        Pass the buffered data to the hashers and the file.
+        """
+        if not self._buffer:
+            return
+        data = ''.join(self._buffer)
+        self._buffer = []
+        self._buffered = 0
+        for hasher in self.hashers.itervalues():
+            hasher.update(data)
+        self.file_object.write(data)
+
+    def flush(self):
+        self._write_buffer()
+        self.file_object.flush()
+
+    def fileno(self):
+        return self.file_object.fileno()
+
+    def tell(self):
+        return self.file_object.tell() + self._buffered
+
+    def close(self):
+        self._write_buffer()
+        self.file_object.close()
+
+    def hexdigests(self):
+        """
+        :return: the checksums of the data written so far keyed by checksum type
+        :rtype:  dict
+        """
+        self._write_buffer()
+        return dict((checksum_type, hasher.hexdigest())
+                    for checksum_type, hasher in self.hashers.items())
+
+
 class JSONArrayFileContext(MetadataFileContext):
     """
     Context manager for writing out units as a json array.
@@ -286,6 +407,13 @@ class XmlFileContext(MetadataFileContext):
 class FastForwardXmlFileContext(XmlFileContext):
     """
     Context manager for reopening an existing XML file context to insert more data.
+
+    The content of the existing file is copied into the new one in a single forward pass while
+    it is read, decompressing it on the fly if it is a gzip file.
+
+    If offset_index is True, a sidecar file with the offsets of the content in the new file is
+    written next to it. The next fast forward of that file uses the offsets instead of
+    searching for the tags, unless the file was modified since.
     """
 
     def __init__(self, metadata_file_path, root_tag, search_tag, root_attributes=None,
@@ -301,22 +429,29 @@ class FastForwardXmlFileContext(XmlFileContext):
         :type root_attributes: dict of str, str
         :param args: any positional arguments to be passed to the superclass
         :type  args: list
-        :param kwargs: any keyword arguments to be passed to the superclass
+        :param kwargs: any keyword arguments to be passed to the superclass. offset_index
+                       is consumed to enable the offset index sidecar file.
         :type  kwargs: dict
         """
+        self.offset_index = kwargs.pop('offset_index', False)
         super(FastForwardXmlFileContext, self).__init__(metadata_file_path, root_tag,
                                                         root_attributes, *args, **kwargs)
         self.fast_forward = False
         self.search_tag = search_tag
         self.existing_file = None
+        self.remove_existing_file = False
+        self.existing_offsets = None
+        self.original_file_handle = None
         self.xml_generator = None
+        self.payload_start = None
+        self.payload_end = None
 
     def _open_metadata_file_handle(self):
         """
         Open the metadata file handle, creating any missing parent directories.
 
-        If the file already exists, this will copy it to a new name and open it as an input
-        for filtering/modification.
+        If the file already exists, it is opened as an input for filtering/modification. An
+        existing file with the same name as the new file is moved out of the way first.
         """
         # Figure out if we are fast forwarding a file
         # find the primary file
@@ -327,113 +462,190 @@ class FastForwardXmlFileContext(XmlFileContext):
             expression = os.path.join(working_dir, expression)
             file_list = glob.glob(expression)
             if file_list:
-                # We only want to work on the latest one
+                # We only want to work on the latest one. It is preserved (5573), the new
+                # file is written to a different name.
                 stat_files = ((os.stat(path).st_mtime, path) for path in file_list)
                 sorted_files = sorted(stat_files, reverse=True)
-                working_dir, existing_file_name = os.path.split(sorted_files[0][1])
-                self.existing_file = existing_file_name
+                self.existing_file = sorted_files[0][1]
                 self.fast_forward = True
         elif not self.checksum_type and os.path.exists(self.metadata_file_path):
-            self.existing_file = file_name
+            self.existing_file = self.metadata_file_path
             self.fast_forward = True
 
         if self.fast_forward:
-            # move the file so that we can still process it if the name is the same
-            if self.existing_file:
-                new_file_name = 'original.%s' % self.existing_file
-                shutil.copy(os.path.join(working_dir, self.existing_file),
-                            os.path.join(working_dir, new_file_name))
-                self.existing_file = new_file_name
+            if self.offset_index:
+                self.existing_offsets = self._read_offset_index(self.existing_file)
 
-            self.existing_file = os.path.join(working_dir, self.existing_file)
+            if self.existing_file == self.metadata_file_path:
+                # move the file so that we can still read it while the new one is written
+                new_file_path = os.path.join(working_dir, 'original.%s' % file_name)
+                os.rename(self.existing_file, new_file_path)
+                self.existing_file = new_file_path
+                self.remove_existing_file = True
 
-            # Open the file, unzip if necessary so that seek operations can be performed
-            self.original_file_handle = None
             if self.existing_file.endswith('.gz'):
-                non_compressed_file = self.existing_file[:self.existing_file.rfind('.gz')]
-                with open(os.path.join(working_dir, non_compressed_file), 'wb') as plain_handle:
-                    gzip_handle = gzip.open(os.path.join(working_dir, self.existing_file), 'rb')
-                    try:
-                        content = gzip_handle.read(BUFFER_SIZE)
-                        while content:
-                            plain_handle.write(content)
-                            content = gzip_handle.read(BUFFER_SIZE)
-                    finally:
-                        if gzip_handle:
-                            gzip_handle.close()
-                # clean up the zipped file
-                os.unlink(self.existing_file)
-                self.existing_file = non_compressed_file
-
-            self.original_file_handle = open(os.path.join(working_dir, self.existing_file), 'r')
+                self.original_file_handle = gzip.open(self.existing_file, 'rb')
+            else:
+                self.original_file_handle = open(self.existing_file, 'rb')
 
         super(FastForwardXmlFileContext, self)._open_metadata_file_handle()
 
     def _write_file_header(self):
         """
-        Write out the beginning of the file only if we are not in fast forward mode.
+        Write out the beginning of the file and, when fast forwarding, the content of the
+        existing file.
 
         No fast forward will happen if search_tag attribute is None or not found.
         """
         super(FastForwardXmlFileContext, self)._write_file_header()
+        if self.offset_index:
+            self.payload_start = self.metadata_file_handle.tell()
         if self.fast_forward and self.search_tag is not None:
-            start_tag = '<%s' % self.search_tag
-            end_tag = '</%s' % self.root_tag
-
-            # Find the start offset
-            content = ''
-            index = -1
-            while index < 0:
-                content_buffer = self.original_file_handle.read(BUFFER_SIZE)
-                if not content_buffer:
-                    # The search tag was never found, This is an empty file where no FF is necessary
-                    msg = _('When attempting to fast forward the file %(file)s, the search tag '
-                            '%(tag)s was not found so the assumption is that no fast forward is to '
-                            'take place.')
-                    _LOG.debug(msg, {'file': self.metadata_file_path, 'tag': start_tag})
-                    return
-                content += content_buffer
-                index = content.find(start_tag)
-            start_offset = index
-
-            # Find the end offset
-            content = ''
-            index = -1
-            self.original_file_handle.seek(0, os.SEEK_END)
-            while index < 0:
-                amount_to_read = min(BUFFER_SIZE, self.original_file_handle.tell())
-                self.original_file_handle.seek(-amount_to_read, os.SEEK_CUR)
-                content_buffer = self.original_file_handle.read(amount_to_read)
-                if not content_buffer:
-                    raise Exception(_('Error: %(tag)s not found in the xml file.')
-                                    % {'tag': end_tag})
-                bytes_read = len(content_buffer)
-                self.original_file_handle.seek(-bytes_read, os.SEEK_CUR)
-                content = content_buffer + content
-                index = content.rfind(end_tag)
-            end_offset = self.original_file_handle.tell() + index
-
-            # stream out the content
-            self.original_file_handle.seek(start_offset)
-            bytes_to_read = end_offset - start_offset
+            if self.existing_offsets is None or not self._copy_indexed_content(
+                    *self.existing_offsets):
+                self._copy_content()
+
+    def _write_file_footer(self):
+        """
+        Write out the end of the file, recording where the content ends for the offset index.
+        """
+        if self.offset_index:
+            self.payload_end = self.metadata_file_handle.tell()
+        super(FastForwardXmlFileContext, self)._write_file_footer()
+
+    def _copy_content(self):
+        """
+        Copy the content of the existing file, from the first search tag up to the last root
+        end tag, in a single pass over the file.
+        """
+        start_tag = '<%s' % self.search_tag
+        end_tag = '</%s' % self.root_tag
+
+        # Find the start of the content, keeping enough of each read to find a tag that
+        # spans two reads
+        content = ''
+        index = -1
+        while index < 0:
+            content_buffer = self.original_file_handle.read(BUFFER_SIZE)
+            if not content_buffer:
+                # The search tag was never found, This is an empty file where no FF is necessary
+                msg = _('When attempting to fast forward the file %(file)s, the search tag '
+                        '%(tag)s was not found so the assumption is that no fast forward is to '
+                        'take place.')
+                _LOG.debug(msg, {'file': self.metadata_file_path, 'tag': start_tag})
+                return
+            content = content[-len(start_tag):] + content_buffer
+            index = content.find(start_tag)
+        content = content[index:]
+
+        # Stream out the content. Everything up to the last end tag seen so far is written,
+        # and without one, everything except what could be the beginning of the end tag.
+        while True:
+            index = content.rfind(end_tag)
+            if index < 0:
+                index = max(len(content) - len(end_tag) + 1, 0)
+            self.metadata_file_handle.write(content[:index])
+            content = content[index:]
             content_buffer = self.original_file_handle.read(BUFFER_SIZE)
-            while bytes_to_read > 0:
-                buffer_size = len(content_buffer)
-                if buffer_size > bytes_to_read:
-                    content_buffer = content_buffer[:bytes_to_read]
-                self.metadata_file_handle.write(content_buffer)
-                bytes_to_read -= buffer_size
-                content_buffer = self.original_file_handle.read(BUFFER_SIZE)
+            if not content_buffer:
+                break
+            content += content_buffer
+
+        if not content.startswith(end_tag):
+            raise Exception(_('Error: %(tag)s not found in the xml file.') % {'tag': end_tag})
+
+    def _copy_indexed_content(self, start, end):
+        """
+        Copy the content of the existing file using the offsets from its offset index.
+
+        :param start: offset of the content in the uncompressed file
+        :type  start: int
+        :param end: offset of the end of the content in the uncompressed file
+        :type  end: int
+        :return: True if the content was copied, False if it was not found at the offsets
+        :rtype:  bool
+        """
+        remaining = end - start
+        self.original_file_handle.seek(start)
+        content = self.original_file_handle.read(min(BUFFER_SIZE, remaining))
+        if remaining > 0 and not content.lstrip().startswith('<%s' % self.search_tag):
+            _LOG.debug('Offset index of %s does not match, searching for the content.' %
+                       self.existing_file)
+            self.original_file_handle.seek(0)
+            return False
+        while remaining > 0:
+            if not content:
+                raise Exception(_('Error: %(f)s is shorter than its offset index.')
+                                % {'f': self.existing_file})
+            self.metadata_file_handle.write(content)
+            remaining -= len(content)
+            content = self.original_file_handle.read(min(BUFFER_SIZE, remaining))
+        return True
+
+    def finalize(self):
+        """
+        Write the footer into the metadata file and close it, then write the offset index.
+        """
+        super(FastForwardXmlFileContext, self).finalize()
+        if self.payload_end is None:
+            return
+        try:
+            self._write_offset_index()
+        except Exception, e:
+            _LOG.exception(e)
+        self.payload_end = None
+
+    @staticmethod
+    def _offset_index_path(path):
+        """
+        :param path: path to a metadata file
+        :type  path: str
+        :return: path to the offset index of the metadata file
+        :rtype:  str
+        """
+        return path + OFFSET_INDEX_SUFFIX
+
+    def _write_offset_index(self):
+        """
+        Write the offsets of the content of the finished metadata file, along with its size
+        and modification time, into the offset index sidecar file.
+        """
+        stat = os.stat(self.metadata_file_path)
+        document = {'size': stat.st_size,
+                    'mtime': stat.st_mtime,
+                    'start': self.payload_start,
+                    'end': self.payload_end}
+        with open(self._offset_index_path(self.metadata_file_path), 'w') as index_file:
+            json.dump(document, index_file)
+
+    def _read_offset_index(self, path):
+        """
+        Read the offset index of a metadata file.
+
+        :param path: path to the metadata file
+        :type  path: str
+        :return: the (start, end) offsets of the content, or None if there is no valid index
+                 for the file as it is now
+        :rtype:  tuple or None
+        """
+        try:
+            with open(self._offset_index_path(path)) as index_file:
+                document = json.load(index_file)
+            stat = os.stat(path)
+            if document['size'] != stat.st_size or document['mtime'] != stat.st_mtime:
+                return None
+            return int(document['start']), int(document['end'])
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            return None
 
     def _close_metadata_file_handle(self):
         """
-        Close any open file handles and remove the original file if a new one
-        was generated
+        Close any open file handles and remove the original file if it was moved out of
+        the way of the new one.
         """
         super(FastForwardXmlFileContext, self)._close_metadata_file_handle()
-        # Close & remove the existing file that was copied
         if self.fast_forward:
             if not self._is_closed(self.original_file_handle):
                 self.original_file_handle.close()
-            # We will always have renamed the original file so remove it
-            os.unlink(self.existing_file)
+            if self.remove_existing_file:
+                os.unlink(self.existing_file)
@@ -8,6 +8,7 @@ import os
 import shutil
 import sys
 import tarfile
+import tempfile
 import time
 import traceback
 import uuid
@@ -19,7 +20,9 @@ from pulp.common import error_codes
 from pulp.common.plugins import reporting_constants, importer_constants
 from pulp.common.util import encode_unicode
 from pulp.plugins.util import manifest_writer, misc
+from pulp.plugins.util.compression import COMPRESSION_WORKERS, compressed_writer
 from pulp.plugins.util.nectar_config import importer_config_to_nectar_config
+from pulp.server.async import instrumentation
 from pulp.server.controllers import repository as repo_controller
 from pulp.server.db.model.criteria import Criteria, UnitAssociationCriteria
 from pulp.server.exceptions import PulpCodedTaskFailedException
@@ -30,7 +33,7 @@ from nectar.downloaders.threaded import HTTPThreadedDownloader
 from pulp.server.config import config as pulp_config
 import pulp.server.managers.factory as manager_factory
 from pulp.server.managers.repo import _common as common_utils
-from pulp.server.util import copytree
+from pulp.server.util import clone_tree, copytree
 
 
 _logger = logging.getLogger(__name__)
@@ -98,6 +101,8 @@ class Step(object):
         self.canceled = False
         self.description = ""
         self.progress_details = ""
+        # Steps that copy or write data may track the number of bytes, it is reported if set
+        self.progress_bytes = None
         self.state = reporting_constants.STATE_NOT_STARTED
         self.progress_successes = 0
         self.progress_failures = 0
@@ -224,12 +229,16 @@ class Step(object):
 
         self.state = reporting_constants.STATE_RUNNING
 
+        phase = 'initialize'
+        started = time.time()
         try:
             try:
                 self.total_units = self._get_total()
                 self.report_progress()
                 self.initialize()
                 self.report_progress()
+                started = self._record_phase(phase, started)
+                phase = 'process'
                 item_iterator = self.get_iterator()
                 if item_iterator is not None:
                     # We are using a generator and will call _process_block for each item
@@ -260,12 +269,15 @@ class Step(object):
                 if self.canceled:
                     return
             finally:
+                started = self._record_phase(phase, started)
                 # Always call finalize to allow cleanup of file handles
                 try:
                     self.finalize()
                 except Exception:
                     _logger.exception(_('Finalizing failed'))
+                started = self._record_phase('finalize', started)
             self.post_process()
+            self._record_phase('post_process', started)
         except Exception as e:
             tb = sys.exc_info()[2]
             if not isinstance(e, PulpCodedTaskFailedException):
@@ -290,6 +302,22 @@ class Step(object):
         """
         pass
 
+    def _record_phase(self, phase, started):
+        """
+        Add the time spent in a phase of this step to the metrics of the running task.
+
+        :param phase:   name of the phase
+        :type  phase:   basestring
+        :param started: time the phase started
+        :type  started: float
+
+        :return: the current time, when the next phase starts
+        :rtype:  float
+        """
+        now = time.time()
+        instrumentation.record_step(self.step_id, phase, now - started)
+        return now
+
     def _process_block(self, item=None):
         """
         This is part of the workflow internals that should not be overridden unless you are sure of
@@ -371,6 +399,8 @@ class Step(object):
             reporting_constants.PROGRESS_DESCRIPTION_KEY: self.description,
             reporting_constants.PROGRESS_DETAILS_KEY: self.progress_details
         }
+        if self.progress_bytes is not None:
+            report[reporting_constants.PROGRESS_NUM_BYTES_KEY] = self.progress_bytes
         if self.children:
             child_reports = []
             for step in self.children:
@@ -862,8 +892,15 @@ class UnitPublishStep(PublishStep):
 class AtomicDirectoryPublishStep(PluginStep):
     """
     Perform a publish of a working directory to a published directory with an atomic action.
-    This works by first copying the files to a master directory and creating or updating a symbolic
-    links in the publish locations
+    This works by first moving the files to a master directory and creating or updating a symbolic
+    links in the publish locations.
+
+    When the master directory is on a different file system than the working directory, the tree
+    is built in a staging directory next to the master directory and renamed into place once it
+    is complete. Files unchanged since the previous master are hard linked to it. Changed files
+    are cloned from their previous version and updated where they differ when the file system
+    supports reflinks, and copied otherwise; the number of bytes written is reported in the
+    progress report.
 
     :param source_dir: The source directory to be copied
     :type source_dir: str
@@ -900,22 +937,20 @@ class AtomicDirectoryPublishStep(PluginStep):
         timestamp_master_dir = os.path.join(self.master_publish_dir,
                                             self.parent.timestamp)
 
-        # Given that it is timestamped for this publish/repo we could skip the copytree
-        # for items where http & https are published to a separate directory
-
         _logger.debug('Copying tree from %s to %s' % (self.source_dir, timestamp_master_dir))
 
         misc.mkdir(os.path.dirname(timestamp_master_dir))
 
+        self.progress_bytes = 0
         try:
             os.rename(self.source_dir, timestamp_master_dir)
-            if selinux.is_selinux_enabled():
-                selinux.restorecon(timestamp_master_dir.encode('utf-8'), recursive=True)
         except OSError as e:
             if e.errno == errno.EXDEV:
-                copytree(self.source_dir, timestamp_master_dir, symlinks=True)
+                self._stage_master_dir(timestamp_master_dir)
             else:
                 raise
+        if selinux.is_selinux_enabled():
+            selinux.restorecon(timestamp_master_dir.encode('utf-8'), recursive=True)
 
         for source_relative_location, publish_location in self.publish_locations:
             if source_relative_location.startswith('/'):
@@ -961,48 +996,143 @@ class AtomicDirectoryPublishStep(PluginStep):
         # Clear out any previously published masters
         misc.clear_directory(self.master_publish_dir, skip_list=[self.parent.timestamp])
 
+    def _stage_master_dir(self, timestamp_master_dir):
+        """
+        Build the master directory on its own file system, from the source directory on another
+        one, and rename it into place once it is complete.
+
+        :param timestamp_master_dir: The master directory for this publish
+        :type  timestamp_master_dir: str
+        """
+        # A staging directory left behind by a failed publish is removed with the old masters
+        staging_dir = os.path.join(self.master_publish_dir, '.%s' % self.parent.timestamp)
+        if os.path.exists(staging_dir):
+            shutil.rmtree(staging_dir)
+        previous_master_dir = self._previous_master_dir()
+        _logger.debug('Staging tree from %s in %s using %s' %
+                      (self.source_dir, staging_dir, previous_master_dir))
+        self.progress_bytes = clone_tree(self.source_dir, staging_dir, previous_master_dir)
+        os.rename(staging_dir, timestamp_master_dir)
+
+    def _previous_master_dir(self):
+        """
+        Find the most recent master directory published before this one.
+
+        :return: path to the previous master directory or None if there is none
+        :rtype:  str or None
+        """
+        timestamps = []
+        for name in os.listdir(self.master_publish_dir):
+            if name == self.parent.timestamp:
+                continue
+            try:
+                timestamps.append((float(name), name))
+            except ValueError:
+                # staging directories and other files
+                continue
+        if not timestamps:
+            return None
+        return os.path.join(self.master_publish_dir, max(timestamps)[1])
+
 
 class SaveTarFilePublishStep(PublishStep):
     """
     Save a directory as a tar file
+
+    The tar file is streamed, optionally compressed, to a temporary file next to the final
+    location and renamed into place once it is complete. The number of bytes of the tar file,
+    before compression, is reported in the progress report.
+
     :param source_dir: The directory to turn into a tar file
     :type source_dir: str
     :param publish_file: Fully qualified name of the final location for the generated tar file
     :type publish_file: str
     :param step_id: The id of the step, so that this step can be used with custom names.
     :type step_id: str
+    :param compression: one of pulp.plugins.util.compression.COMPRESSION_TYPES, or None for an
+                        uncompressed tar file
+    :type compression: str
+    :param workers: The number of threads compressing the tar file
+    :type workers: int
     """
-    def __init__(self, source_dir, publish_file, step_type=None):
+
+    # Number of bytes written between progress reports
+    PROGRESS_INTERVAL = 64 * 2 ** 20
+
+    def __init__(self, source_dir, publish_file, step_type=None, compression=None,
+                 workers=COMPRESSION_WORKERS):
         step_type = step_type if step_type else reporting_constants.PUBLISH_STEP_TAR
         super(SaveTarFilePublishStep, self).__init__(step_type)
         self.source_dir = source_dir
         self.publish_file = publish_file
+        self.compression = compression
+        self.workers = workers
         self.description = _('Saving tar file.')
 
     def process_main(self):
         """
         Publish a directory from to a tar file
         """
-        # Generate the tar file in the working directory
-        tar_file_name = os.path.join(self.source_dir, os.path.basename(self.publish_file))
-        tar_file = tarfile.TarFile(name=tar_file_name, mode='w', dereference=True)
-        try:
-            tar_file.add(name=self.source_dir, arcname='')
-        finally:
-            tar_file.close()
-
-        # Move the tar file to the final location
         publish_dir_parent = os.path.dirname(self.publish_file)
         if not os.path.exists(publish_dir_parent):
             misc.mkdir(publish_dir_parent, 0750)
-        shutil.copy(os.path.join(self.source_dir, tar_file_name), self.publish_file)
+
+        fd, temp_file_name = tempfile.mkstemp(
+            dir=publish_dir_parent, prefix='.%s.' % os.path.basename(self.publish_file))
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                writer = compressed_writer(temp_file, self.compression, self.workers)
+                try:
+                    tar_file = tarfile.open(fileobj=_ProgressWriter(writer, self), mode='w|',
+                                            dereference=True)
+                    try:
+                        tar_file.add(name=self.source_dir, arcname='')
+                    finally:
+                        tar_file.close()
+                    writer.close()
+                except Exception:
+                    # release the compression threads or process
+                    writer.abort()
+                    raise
+            # mkstemp creates the file readable only by its owner
+            os.chmod(temp_file_name, 0644)
+            os.rename(temp_file_name, self.publish_file)
+        except Exception:
+            os.unlink(temp_file_name)
+            raise
+
+
+class _ProgressWriter(object):
+    """
+    Counts the bytes written through it in the progress of a step.
+    """
+
+    def __init__(self, fileobj, step):
+        """
+        :param fileobj: file the data is written to
+        :type  fileobj: file
+        :param step: the step reporting the progress
+        :type  step: SaveTarFilePublishStep
+        """
+        self.fileobj = fileobj
+        self.step = step
+        self.step.progress_bytes = 0
+        self.next_report = step.PROGRESS_INTERVAL
+
+    def write(self, data):
+        self.fileobj.write(data)
+        self.step.progress_bytes += len(data)
+        if self.step.progress_bytes >= self.next_report:
+            self.next_report += self.step.PROGRESS_INTERVAL
+            self.step.report_progress()
 
 
 class CreatePulpManifestStep(Step):
     """
     This will create a PULP_MANIFEST file in the specified directory. This step should be used when
-    the checksums of the files are not already known, because it will read and calculate new
-    checksums for each one.
+    the checksums of the files are not already known. Checksums stored on the content units of
+    files linked into content storage, and checksums cached by previous publishes, are reused;
+    the checksums of the remaining files are calculated.
 
     If you already know the SHA256 checksums of the files going in the manifest, see an example
     in the FileDistributor that creates this file in a different way.
@@ -1023,7 +1153,8 @@ class CreatePulpManifestStep(Step):
 
         :param item:    not used
         """
-        manifest_writer.make_manifest_for_dir(self.target_dir)
+        manifest_writer.make_manifest_for_dir(self.target_dir,
+                                              cache_path=manifest_writer.checksum_cache_path())
 
 
 class CopyDirectoryStep(PublishStep):
@@ -1163,9 +1294,10 @@ class DownloadStep(PluginStep, listener.DownloadEventListener):
         This is the callback that we will get from the downloader library when any individual
         download succeeds. Bump the successes counter and report progress.
 
-        :param report: report (passed in from nectar but currently not used)
+        :param report: report of the download, used for the number of bytes downloaded
         :type  report: nectar.report.DownloadReport
         """
+        instrumentation.record_bytes(downloaded=report.bytes_downloaded)
         self.progress_successes += 1
         self.report_progress()
 
@@ -1262,9 +1394,11 @@ class GetLocalUnitsStep(SaveUnitsStep):
         else:
             available_units = self.parent.available_units
 
+        association_manager = manager_factory.repo_unit_association_manager()
         for units_group in misc.paginate(available_units, self.unit_pagination_size):
             # any units that are already in pulp
             units_we_already_had = set()
+            found_units = []
 
             # Get this group of units
             query = units_controller.find_units(units_group)
@@ -1274,7 +1408,13 @@ class GetLocalUnitsStep(SaveUnitsStep):
                     self.parent.conduit.remove_unit(found_unit)
                 else:
                     units_we_already_had.add(hash(found_unit))
-                    repo_controller.associate_single_unit(self.get_repo().repo_obj, found_unit)
+                    found_units.append((found_unit._content_type_id, found_unit.id))
+
+            # associate the group with one bulk write, and adjust the orphan counts with one
+            # query, rather than for each unit
+            if found_units:
+                association_manager.associate_units(self.get_repo().id, found_units,
+                                                    refresh_existing=True)
 
             for unit in units_group:
                 if hash(unit) not in units_we_already_had:
@@ -1310,6 +1450,10 @@ class RSyncFastForwardUnitPublishStep(UnitModelPluginStep):
         self.description = _('Generating relative symlinks')
         self.remote_repo_path = remote_repo_path
         self.published_unit_path = published_unit_path
+        # directories known to exist under the working directory
+        self._link_dirs = set()
+        # number of units that are already on the remote server
+        self.units_skipped = 0
 
         super(RSyncFastForwardUnitPublishStep,
               self).__init__(step_type, model_classes, repo=repo, config=config,
@@ -1320,12 +1464,13 @@ class RSyncFastForwardUnitPublishStep(UnitModelPluginStep):
         Creates symlink for a unit and appends the symlink to a list used to perform rsync later.
         This also generates the list of actual content units that need to be rsynced later.
 
+        Units and symlinks the parent's remote manifest lists as already rsynced are left out.
+
         :param unit: Content type unit
         :type unit: ContentUnit
         """
         storage_dir = os.path.join(pulp_config.get('server', 'storage_dir'), 'content', 'units')
         relative_content_unit_path = os.path.relpath(item.storage_path, storage_dir)
-        self.parent.content_unit_file_list.append(relative_content_unit_path)
         if self.published_unit_path:
             filename = item.get_symlink_name()
             published_unit_path = self.published_unit_path
@@ -1333,11 +1478,36 @@ class RSyncFastForwardUnitPublishStep(UnitModelPluginStep):
             dirname, filename = os.path.split(item.get_symlink_name())
             published_unit_path = dirname.split('/')
 
-        symlink = self.make_link_unit(item, filename, self.get_working_dir(),
-                                      self.remote_repo_path,
-                                      self.get_config().get("remote")["root"],
-                                      published_unit_path)
-        self.parent.symlink_list.append(symlink)
+        manifest = getattr(self.parent, 'remote_manifest', None)
+        if manifest is not None:
+            origin_path = self.get_origin_rel_path(item)
+            link_path = os.path.normpath(os.path.join(self.remote_repo_path.lstrip('/'),
+                                                      *(published_unit_path + [filename])))
+            has_file = manifest.has_file(origin_path, os.path.getsize(item.storage_path),
+                                         getattr(item, 'checksum', None))
+            has_link = manifest.has_link(link_path, origin_path)
+            if has_file and has_link:
+                self.units_skipped += 1
+                return
+        else:
+            has_file = has_link = False
+
+        if not has_file:
+            self.parent.content_unit_file_list.append(relative_content_unit_path)
+        if not has_link:
+            symlink = self.make_link_unit(item, filename, self.get_working_dir(),
+                                          self.remote_repo_path,
+                                          self.get_config().get("remote")["root"],
+                                          published_unit_path)
+            self.parent.symlink_list.append(symlink)
+
+    def finalize(self):
+        """
+        Log the number of units that did not need to be rsynced.
+        """
+        if self.units_skipped:
+            _logger.info(_('%(n)d units are already on the remote server') %
+                         {'n': self.units_skipped})
 
     def make_link_unit(self, unit, filename, working_dir, remote_repo_path, remote_root,
                        published_unit_path):
@@ -1360,8 +1530,11 @@ class RSyncFastForwardUnitPublishStep(UnitModelPluginStep):
 
         """
         extra_src_path = ['.relative'] + published_unit_path
-        if not os.path.exists(os.path.join(working_dir, *extra_src_path)):
-            os.makedirs(os.path.join(working_dir, *extra_src_path))
+        link_dir = os.path.join(working_dir, *extra_src_path)
+        if link_dir not in self._link_dirs:
+            if not os.path.exists(link_dir):
+                os.makedirs(link_dir)
+            self._link_dirs.add(link_dir)
 
         origin_path = self.get_origin_rel_path(unit)
 
@@ -10,7 +10,7 @@ from datetime import datetime, timedelta
 from gettext import gettext as _
 
 from celery import bootsteps
-from celery.signals import celeryd_after_setup, worker_process_init
+from celery.signals import celeryd_after_setup, worker_process_init, worker_process_shutdown
 import mongoengine
 
 from pulp.common import constants, dateutils
@@ -19,6 +19,7 @@ from pulp.server.async import tasks, worker_watcher
 from pulp.server.constants import PULP_PROCESS_HEARTBEAT_INTERVAL, PULP_PROCESS_TIMEOUT_INTERVAL
 from pulp.server.db.model import Worker, ResourceManagerLock
 from pulp.server.db.connection import reconnect
+from pulp.server.event import delivery
 from pulp.server.managers.repo import _common as common_utils
 
 # This import will load our configs
@@ -189,6 +190,15 @@ def reconnect_services(sender, **kwargs):
     reconnect()
 
 
+@worker_process_shutdown.connect
+def deliver_queued_events(sender=None, **kwargs):
+    """
+    Wait for the event notifications queued by a worker child process before it exits. billiard
+    ends child processes with os._exit, which does not run exit handlers.
+    """
+    delivery.drain(delivery.EXIT_TIMEOUT)
+
+
 def get_resource_manager_lock(name):
     """
     Tries to acquire the resource manager lock.
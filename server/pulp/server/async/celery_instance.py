@@ -37,6 +37,11 @@ CELERYBEAT_SCHEDULE = {
         'schedule': timedelta(minutes=config.getint('lazy', 'download_interval')),
         'args': tuple(),
     },
+    'reconcile_orphan_counts': {
+        'task': 'pulp.server.managers.content.orphan.queue_reconcile_orphan_counts',
+        'schedule': timedelta(days=1),
+        'args': tuple(),
+    },
 }
 
 
@@ -0,0 +1,208 @@
+"""
+Low overhead measurements of the tasks run by a worker, stored with the TaskStatus of each task
+as its metrics:
+
+* wall time of the task, and of each phase of each publish_step.Step it processed
+* number and time of the database commands it sent, by command
+* bytes downloaded by download steps and written to content storage
+* peak resident memory of the worker process
+
+Worker processes run one task at a time, so the measurements of the threads a task starts are
+added to the task.
+"""
+from gettext import gettext as _
+import logging
+import os
+import random
+import resource
+import threading
+import time
+
+from pymongo import monitoring
+
+from pulp.server.config import config
+
+
+_logger = logging.getLogger(__name__)
+
+# Metrics of the task running in this process, None when no task is measured
+_current = None
+
+_listener_registered = False
+
+
+class TaskMetrics(object):
+    """
+    Measurements of a task, updated by the threads of the task.
+
+    :ivar started:          time the task started
+    :type started:          float
+    :ivar steps:            seconds spent in each phase of each step, by step id and phase
+    :type steps:            dict
+    :ivar mongo:            number of database commands and seconds spent, by command name
+    :type mongo:            dict
+    :ivar bytes_downloaded: number of bytes downloaded
+    :type bytes_downloaded: int
+    :ivar bytes_written:    number of bytes written to content storage
+    :type bytes_written:    int
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.steps = {}
+        self.mongo = {}
+        self.bytes_downloaded = 0
+        self.bytes_written = 0
+
+    def add_step_time(self, step_id, phase, seconds):
+        with self._lock:
+            phases = self.steps.setdefault(step_id, {})
+            phases[phase] = phases.get(phase, 0.0) + seconds
+
+    def add_mongo_command(self, name, seconds):
+        with self._lock:
+            count, total = self.mongo.get(name, (0, 0.0))
+            self.mongo[name] = (count + 1, total + seconds)
+
+    def add_bytes(self, downloaded=0, written=0):
+        with self._lock:
+            self.bytes_downloaded += downloaded
+            self.bytes_written += written
+
+    def to_dict(self):
+        """
+        :return: the measurements, in the form stored with the TaskStatus
+        :rtype:  dict
+        """
+        with self._lock:
+            commands = dict((name, {'count': count, 'time': total})
+                            for name, (count, total) in self.mongo.items())
+            return {
+                'wall_time': time.time() - self.started,
+                'steps': dict((step_id, dict(phases)) for step_id, phases in self.steps.items()),
+                'mongo': {
+                    'count': sum(command['count'] for command in commands.values()),
+                    'time': sum(command['time'] for command in commands.values()),
+                    'commands': commands,
+                },
+                'bytes_downloaded': self.bytes_downloaded,
+                'bytes_written': self.bytes_written,
+                # kilobytes on Linux
+                'max_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            }
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """
+    Adds the database commands sent while a task is measured to its metrics.
+    """
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        metrics = _current
+        if metrics is not None:
+            metrics.add_mongo_command(event.command_name, event.duration_micros / 1e6)
+
+    def failed(self, event):
+        self.succeeded(event)
+
+
+def enabled():
+    """
+    :return: whether tasks are measured
+    :rtype:  bool
+    """
+    return config.getboolean('profiling', 'instrumentation')
+
+
+def register_mongo_listener():
+    """
+    Register the listener adding database commands to the metrics of the running task. Only
+    connections created afterwards notify it.
+    """
+    global _listener_registered
+    if enabled() and not _listener_registered:
+        monitoring.register(MongoCommandListener())
+        _listener_registered = True
+
+
+def start():
+    """
+    Start measuring a task, if instrumentation is enabled.
+    """
+    global _current
+    _current = TaskMetrics() if enabled() else None
+
+
+def stop():
+    """
+    Stop measuring the running task.
+
+    :return: the measurements of the task, None if it was not measured
+    :rtype:  dict or None
+    """
+    global _current
+    metrics, _current = _current, None
+    if metrics is None:
+        return None
+    return metrics.to_dict()
+
+
+def record_step(step_id, phase, seconds):
+    """
+    Add the time spent in a phase of a step to the running task.
+
+    :param step_id: id of the step
+    :type  step_id: basestring
+    :param phase:   name of the phase, such as 'initialize' or 'process'
+    :type  phase:   basestring
+    :param seconds: time spent
+    :type  seconds: float
+    """
+    metrics = _current
+    if metrics is not None:
+        metrics.add_step_time(step_id, phase, seconds)
+
+
+def record_bytes(downloaded=0, written=0):
+    """
+    Add bytes downloaded or written to content storage to the running task.
+
+    :param downloaded:  number of bytes downloaded
+    :type  downloaded:  int
+    :param written:     number of bytes written
+    :type  written:     int
+    """
+    metrics = _current
+    if metrics is not None:
+        metrics.add_bytes(downloaded, written)
+
+
+def record_file_written(path):
+    """
+    Add the size of a file written to content storage to the running task.
+
+    :param path: absolute path to the file
+    :type  path: basestring
+    """
+    metrics = _current
+    if metrics is not None:
+        metrics.add_bytes(written=os.path.getsize(path))
+
+
+def sample_profile():
+    """
+    :return: whether the task starting should be profiled with cProfile, which is the case for
+             one in sample_rate tasks, chosen randomly
+    :rtype:  bool
+    """
+    sample_rate = config.getint('profiling', 'sample_rate')
+    if sample_rate < 1:
+        return False
+    sampled = random.randint(1, sample_rate) == 1
+    if sampled:
+        _logger.debug(_('Profiling this task'))
+    return sampled
@@ -20,6 +20,7 @@ from mongoengine.errors import NotUniqueError
 
 from pulp.common.constants import RESOURCE_MANAGER_WORKER_NAME, SCHEDULER_WORKER_NAME
 from pulp.common import constants, dateutils, tags
+from pulp.server.async import instrumentation
 from pulp.server.async.celery_instance import celery, RESOURCE_MANAGER_QUEUE, \
     DEDICATED_QUEUE_EXCHANGE
 from pulp.server.exceptions import PulpException, MissingResource, \
@@ -679,7 +680,11 @@ class Task(PulpTask, ReservedTaskMixin):
         # Run the actual task
         _logger.debug("Running task : [%s]" % self.request.id)
 
-        if config.getboolean('profiling', 'enabled') is True:
+        if not self.request.called_directly:
+            instrumentation.start()
+
+        self.pr = None
+        if config.getboolean('profiling', 'enabled') is True or instrumentation.sample_profile():
             self.pr = cProfile.Profile()
             self.pr.enable()
 
@@ -731,6 +736,9 @@ class Task(PulpTask, ReservedTaskMixin):
                 task_status['spawned_tasks'] = [retval.task_id, ]
                 task_status['result'] = None
 
+            metrics = instrumentation.stop()
+            if metrics is not None:
+                task_status['metrics'] = metrics
             task_status.save()
             self._handle_cProfile(task_id)
             common_utils.delete_working_directory()
@@ -766,18 +774,21 @@ class Task(PulpTask, ReservedTaskMixin):
             if not isinstance(exc, PulpException):
                 exc = PulpException(str(exc))
             task_status['error'] = exc.to_dict()
+            metrics = instrumentation.stop()
+            if metrics is not None:
+                task_status['metrics'] = metrics
             task_status.save()
             self._handle_cProfile(task_id)
             common_utils.delete_working_directory()
 
     def _handle_cProfile(self, task_id):
         """
-        If cProfiling is enabled, stop the profiler and write out the data.
+        If the task is profiled, stop the profiler and write out the data.
 
         :param task_id: the id of the task
         :type task_id: unicode
         """
-        if config.getboolean('profiling', 'enabled') is True:
+        if getattr(self, 'pr', None) is not None:
             self.pr.disable()
             profile_directory = config.get('profiling', 'directory')
             try:
@@ -786,6 +797,7 @@ class Task(PulpTask, ReservedTaskMixin):
                 if exc.errno != errno.EEXIST:
                     raise
             self.pr.dump_stats("%s/%s" % (profile_directory, task_id))
+            self.pr = None
 
 
 def cancel(task_id, revoke_task=True):
@@ -4,8 +4,12 @@
 Utility functions to manage permissions and roles in pulp.
 """
 
+from collections import OrderedDict
+from threading import Lock
 import logging
 
+from pulp.server.db.model.auth import Permission, PermissionVersion
+
 _log = logging.getLogger(__name__)
 
 # operation names and values --------------------------------------------------
@@ -17,6 +21,9 @@ UPDATE = 2
 DELETE = 3
 EXECUTE = 4
 
+# id of the PermissionVersion document counting changes to user permissions
+PERMISSION_VERSION_ID = 'permissions'
+
 # utilities -------------------------------------------------------------------
 
 
@@ -71,3 +78,158 @@ def _lookup_operation_name(operation_value):
         return 'EXECUTE'
     msg_string = 'Could not find a valid name for authorization value %s'
     raise KeyError(msg_string % operation_value)
+
+
+# permission resolution -------------------------------------------------------
+
+
+class PermissionTree(object):
+    """
+    The operations granted to a user on resources, as a prefix tree of resource
+    path segments. Each node holds a bit mask of the operations granted on the
+    resource it represents, which are also granted on all resources below it.
+    """
+
+    def __init__(self):
+        # a node is [bit mask of operations, {path segment: node}]
+        self._root = [0, {}]
+
+    def add(self, resource, operations):
+        """
+        Grant operations on a resource.
+
+        @type resource: str
+        @param resource: resource path, starting and ending with a /
+        @type operations: list or tuple of int's
+        @param operations: operations granted
+        """
+        parts = [p for p in resource.split('/') if p]
+        # resources that are not in the canonical /a/b/ form are never matched
+        if resource != ('/%s/' % '/'.join(parts) if parts else '/'):
+            return
+        node = self._root
+        for part in parts:
+            node = node[1].setdefault(part, [0, {}])
+        for operation in operations:
+            node[0] |= 1 << operation
+
+    def is_authorized(self, resource, operation):
+        """
+        Check if an operation is granted on a resource or any of its base resources.
+
+        @type resource: str
+        @param resource: resource path
+        @type operation: int
+        @param operation: operation to be performed on the resource
+        @rtype: bool
+        @return: True if the operation is granted, False otherwise
+        """
+        bit = 1 << operation
+        node = self._root
+        if node[0] & bit:
+            return True
+        for part in resource.split('/'):
+            if not part:
+                continue
+            node = node[1].get(part)
+            if node is None:
+                return False
+            if node[0] & bit:
+                return True
+        return False
+
+    @classmethod
+    def load(cls, login):
+        """
+        Load the permissions granted to a user, with a single query.
+
+        @type login: str
+        @param login: login of the user
+        @rtype: L{PermissionTree}
+        @return: the operations granted to the user
+        """
+        tree = cls()
+        permissions = Permission.get_collection().find(
+            {'users.username': login},
+            {'resource': 1, 'users': {'$elemMatch': {'username': login}}})
+        for permission in permissions:
+            for user_permission in permission.get('users', []):
+                tree.add(permission['resource'], user_permission['permissions'])
+        return tree
+
+
+def permission_version():
+    """
+    @rtype: int
+    @return: the number of changes made to user permissions
+    """
+    document = PermissionVersion.get_collection().find_one({'_id': PERMISSION_VERSION_ID})
+    if document is None:
+        return 0
+    return document['version']
+
+
+def permissions_changed():
+    """
+    Record a change to user permissions, so permissions cached by any process are reloaded.
+    This must be called after each change to the permissions collection.
+    """
+    PermissionVersion.get_collection().update(
+        {'_id': PERMISSION_VERSION_ID}, {'$inc': {'version': 1}}, upsert=True)
+
+
+class PermissionCache(object):
+    """
+    A cache of the permissions granted to users, as L{PermissionTree}s keyed by
+    login. An entry is used while the permission version it was loaded at is
+    current, so checking permissions takes a single lookup of the version.
+
+    @ivar capacity: The maximum number of entries.  The oldest entry
+        is evicted when the cache is full.
+    @type capacity: int
+    """
+
+    CAPACITY = 1000
+
+    def __init__(self, capacity=CAPACITY):
+        """
+        @type capacity: int
+        @param capacity: The maximum number of entries.
+        """
+        self.capacity = capacity
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, login):
+        """
+        @type login: str
+        @param login: login of the user
+        @rtype: L{PermissionTree}
+        @return: the operations granted to the user
+        """
+        # the version is read first so changes made while loading cause a reload next time
+        version = permission_version()
+        with self._lock:
+            entry = self._entries.get(login)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        tree = PermissionTree.load(login)
+        with self._lock:
+            self._entries.pop(login, None)
+            self._entries[login] = (version, tree)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+        return tree
+
+    def clear(self):
+        """
+        Remove all entries.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+permission_cache = PermissionCache()
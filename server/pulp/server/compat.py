@@ -14,6 +14,33 @@ try:
     import json
 except ImportError:
     import simplejson as json  # noqa
+try:
+    from hashlib import pbkdf2_hmac
+except ImportError:
+    # python < 2.7.8
+    import hashlib
+    import hmac
+    import struct
+
+    def pbkdf2_hmac(hash_name, password, salt, iterations, dklen=None):
+        # pure python PBKDF2 (RFC 2898) with the signature of hashlib.pbkdf2_hmac
+        mac = hmac.new(password, None, lambda *args: hashlib.new(hash_name, *args))
+        dklen = dklen or mac.digest_size
+        blocks = []
+        block = 1
+        while len(blocks) * mac.digest_size < dklen:
+            prf = mac.copy()
+            prf.update(salt + struct.pack('>I', block))
+            u = prf.digest()
+            result = int(u.encode('hex'), 16)
+            for i in xrange(iterations - 1):
+                prf = mac.copy()
+                prf.update(u)
+                u = prf.digest()
+                result ^= int(u.encode('hex'), 16)
+            blocks.append(('%0*x' % (mac.digest_size * 2, result)).decode('hex'))
+            block += 1
+        return ''.join(blocks)[:dklen]
 
 
 try:
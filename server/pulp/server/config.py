@@ -51,6 +51,8 @@ _default_values = {
     'authentication': {
         'rsa_key': '/etc/pki/pulp/rsa.key',
         'rsa_pub': '/etc/pki/pulp/rsa_pub.key',
+        'url_signing_secret': '',
+        'credential_cache_ttl': '0',
     },
     'consumer_history': {
         'lifetime': '180',  # in days
@@ -75,6 +77,7 @@ _default_values = {
         'verify_ssl': 'true',
         'ca_path': DEFAULT_CA_PATH,
         'unsafe_autoretry': 'false',
+        'unsafe_autoretry_budget': '300',
         'write_concern': 'majority',
         'x509_auth': 'false',
     },
@@ -84,6 +87,12 @@ _default_values = {
         'enabled': 'false',
         'from': 'pulp@localhost',
     },
+    'notifications': {
+        'queue_size': '1000',
+        'batch_size': '100',
+        'retries': '3',
+        'retry_delay': '1',
+    },
     'oauth': {
         'enabled': 'true',
         'oauth_key': '',
@@ -122,7 +131,9 @@ _default_values = {
         'log_type': 'syslog',
         'key_url': '/pulp/gpg',
         'ks_url': '/pulp/ks',
-        'working_directory': '/var/cache/pulp'
+        'working_directory': '/var/cache/pulp',
+        'repo_membership_cache': 'false',
+        'dedup_storage': 'false',
     },
     'tasks': {
         'broker_url': 'qpid://localhost/',
@@ -143,7 +154,9 @@ _default_values = {
     },
     'profiling': {
         'enabled': 'false',
-        'directory': '/var/lib/pulp/c_profiles'
+        'directory': '/var/lib/pulp/c_profiles',
+        'instrumentation': 'true',
+        'sample_rate': '0',
     }
 }
 
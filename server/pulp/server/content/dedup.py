@@ -0,0 +1,201 @@
+"""
+Deduplicates the content files stored before the blob store was enabled, and removes the blobs
+no longer referenced by any content file. See FileStorage for the blob store.
+"""
+from gettext import gettext as _
+from optparse import OptionParser
+import errno
+import logging
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import time
+
+from pulp.server.config import config
+from pulp.server.content import storage
+
+
+_logger = logging.getLogger(__name__)
+
+# Seconds since a blob was last referenced before it can be removed, so the blobs stored by
+# running tasks are not removed before the task links them
+BLOB_GRACE_PERIOD = 3600
+
+# Directories in <storage_dir>/content not holding unit files that are deduplicated
+EXCLUDED_DIRS = ('blobs', 'shared')
+
+
+def content_files():
+    """
+    :return: absolute paths to the files and symbolic links in content storage, outside of the
+             blob store and shared storage
+    :rtype:  generator
+    """
+    content_dir = os.path.join(config.get('server', 'storage_dir'), 'content')
+    for root, dirs, files in os.walk(content_dir):
+        if root == content_dir:
+            dirs[:] = [d for d in dirs if d not in EXCLUDED_DIRS]
+        for name in files:
+            yield os.path.join(root, name)
+
+
+def dedupe_file(path, mode, digests=None):
+    """
+    Move the content of a file to the blob store, unless a blob with the same content is already
+    there, and replace the file with a link to the blob.
+
+    :param path:    absolute path to the file
+    :type  path:    str
+    :param mode:    'hardlink' or 'symlink'
+    :type  mode:    str
+    :param digests: when given, nothing is changed and the digest of the file is added to this
+                    set of digests of the blobs that would have been stored
+    :type  digests: set
+
+    :return: number of bytes freed, None if the file is a symbolic link or is already a link to
+             its blob
+    :rtype:  int or None
+    """
+    st = os.lstat(path)
+    if not stat.S_ISREG(st.st_mode):
+        return None
+    digest = storage.file_digest(path)
+    blob = storage.blob_path(digest)
+    # other hard links keep the content of the file
+    freed = st.st_size if st.st_nlink == 1 else 0
+    if os.path.lexists(blob):
+        if mode == 'hardlink' and os.path.samefile(blob, path):
+            return None
+    elif digests is not None:
+        if digest not in digests:
+            digests.add(digest)
+            return 0
+    else:
+        # the file becomes the blob, without copying its content
+        storage.mkdir(os.path.dirname(blob))
+        try:
+            os.link(path, blob)
+        except OSError, e:
+            if e.errno != errno.EXDEV or mode == 'hardlink':
+                raise
+            # symbolic links can reference a blob store on another filesystem
+            fd, temp_blob = tempfile.mkstemp(dir=storage.blobs_dir())
+            os.close(fd)
+            shutil.copy2(path, temp_blob)
+            os.rename(temp_blob, blob)
+        if mode == 'hardlink':
+            return 0
+        freed = 0
+    if digests is None:
+        storage.link_blob(blob, path, mode)
+    return freed
+
+
+def dedupe(mode, dry_run=False):
+    """
+    Deduplicate the files in content storage. Blobs are created by hard linking the first file
+    with their content, so in hardlink mode the files have to be on the filesystem of the blob
+    store.
+
+    :param mode:    'hardlink' or 'symlink'
+    :type  mode:    str
+    :param dry_run: only report what would be done
+    :type  dry_run: bool
+
+    :return: number of files deduplicated, bytes freed and files that failed
+    :rtype:  dict
+    """
+    digests = set() if dry_run else None
+    report = {'deduplicated': 0, 'bytes_freed': 0, 'failed': 0}
+    for path in content_files():
+        try:
+            freed = dedupe_file(path, mode, digests)
+        except (IOError, OSError), e:
+            _logger.error(_('Could not deduplicate %(p)s: %(e)s') % {'p': path, 'e': e})
+            report['failed'] += 1
+            continue
+        if freed is not None:
+            report['deduplicated'] += 1
+            report['bytes_freed'] += freed
+    return report
+
+
+def collect_blobs(dry_run=False, grace_period=BLOB_GRACE_PERIOD):
+    """
+    Remove the blobs that no content file references. Blobs referenced by hard links are removed
+    when their last hard link is deleted as an orphan, so this is needed for the blobs referenced
+    by symbolic links, and for the blobs and temporary files left by interrupted tasks.
+
+    :param dry_run:         only report what would be done
+    :type  dry_run:         bool
+    :param grace_period:    seconds since a blob was last referenced before it can be removed
+    :type  grace_period:    int
+
+    :return: number of blobs removed and bytes freed
+    :rtype:  dict
+    """
+    referenced = set()
+    for path in content_files():
+        if os.path.islink(path):
+            referenced.add(os.path.realpath(path))
+
+    report = {'removed': 0, 'bytes_freed': 0}
+    oldest = time.time() - grace_period
+    for root, dirs, files in os.walk(storage.blobs_dir()):
+        for name in files:
+            path = os.path.join(root, name)
+            st = os.lstat(path)
+            if st.st_nlink > 1 or st.st_ctime > oldest or os.path.realpath(path) in referenced:
+                continue
+            if not dry_run:
+                try:
+                    os.unlink(path)
+                except OSError, e:
+                    if e.errno != errno.ENOENT:
+                        raise
+                    continue
+            report['removed'] += 1
+            report['bytes_freed'] += st.st_size
+    return report
+
+
+def parse_args():
+    """
+    Parse the command line arguments into the flags that we accept. Returns the parsed options.
+    """
+    parser = OptionParser(description=_('Deduplicate content storage into the blob store.'))
+    parser.add_option('--mode', choices=storage.DEDUP_MODES, default=storage.dedup_mode(),
+                      help=_('hardlink or symlink, defaults to the dedup_storage server setting'))
+    parser.add_option('--collect', action='store_true', dest='collect', default=False,
+                      help=_('Only remove the blobs no content file references'))
+    parser.add_option('--dry-run', action='store_true', dest='dry_run', default=False,
+                      help=_('Report what would be done without changing anything'))
+    options, args = parser.parse_args()
+    if args:
+        parser.error(_('Unknown arguments: %s') % ', '.join(args))
+    if not options.collect and options.mode is None:
+        parser.error(_('--mode is required when dedup_storage is not enabled'))
+    return options
+
+
+def main():
+    """
+    This is the high level entry method.
+    """
+    if os.getuid() == 0:
+        print >> sys.stderr, _('This must not be run as root, but as the same user apache runs as.')
+        return os.EX_USAGE
+    options = parse_args()
+    logging.basicConfig(level=logging.INFO)
+    failed = 0
+    if not options.collect:
+        report = dedupe(options.mode, options.dry_run)
+        failed = report['failed']
+        print _('%(n)d files deduplicated, %(b)d bytes freed, %(f)d failed') % {
+            'n': report['deduplicated'], 'b': report['bytes_freed'], 'f': failed}
+    report = collect_blobs(options.dry_run)
+    print _('%(n)d unreferenced blobs removed, %(b)d bytes freed') % {
+        'n': report['removed'], 'b': report['bytes_freed']}
+    return 1 if failed else os.EX_OK
@@ -1,13 +1,23 @@
 import os
 import errno
 import shutil
+import stat
 import tempfile
 
 from hashlib import sha256
 
+from pulp.server.async import instrumentation
 from pulp.server.config import config
 
 
+# Values of the dedup_storage server setting that enable the blob store, by how unit storage paths
+# reference their blob
+DEDUP_MODES = ('hardlink', 'symlink')
+
+# Number of bytes read at a time when hashing files
+CHUNK_SIZE = 1024 * 1024
+
+
 def mkdir(path):
     """
     Create a directory at the specified path.
@@ -24,6 +34,159 @@ def mkdir(path):
             raise
 
 
+def dedup_mode():
+    """
+    :return: how files put in FileStorage reference the blob store, 'hardlink' or 'symlink',
+             None if files are not deduplicated
+    :rtype:  str or None
+    """
+    mode = config.get('server', 'dedup_storage').lower()
+    if mode in DEDUP_MODES:
+        return mode
+    return None
+
+
+def blobs_dir():
+    """
+    :return: absolute path to the blob store, where the content of deduplicated files is stored
+             once by its sha256 digest
+    :rtype:  str
+    """
+    return os.path.join(config.get('server', 'storage_dir'), 'content', 'blobs')
+
+
+def blob_path(digest):
+    """
+    :param digest: sha256 hex digest of the content
+    :type  digest: str
+
+    :return: absolute path to the blob holding the content:
+             <storage_dir>/content/blobs/<digest>[0:2]/<digest>[2:]
+    :rtype:  str
+    """
+    return os.path.join(blobs_dir(), digest[0:2], digest[2:])
+
+
+def blob_digest(path):
+    """
+    :param path: absolute path to a file, with its symbolic links resolved
+    :type  path: str
+
+    :return: sha256 hex digest of the content of the file when it is a blob, which is named for
+             its digest, None if the file is not in the blob store
+    :rtype:  str or None
+    """
+    relative_path = os.path.relpath(path, os.path.realpath(blobs_dir()))
+    parts = relative_path.split(os.sep)
+    if len(parts) != 2 or len(parts[0]) != 2 or len(parts[1]) != 62:
+        return None
+    digest = ''.join(parts).lower()
+    if digest.strip('0123456789abcdef'):
+        return None
+    return digest
+
+
+def file_digest(path):
+    """
+    :param path: absolute path to a file
+    :type  path: str
+
+    :return: sha256 hex digest of the file content
+    :rtype:  str
+    """
+    digest = sha256()
+    with open(path, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(CHUNK_SIZE), ''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def copy_with_digest(path, destination):
+    """
+    Copy a file and its permission bits, hashing the content as it is copied.
+
+    :param path:        absolute path to the file to copy
+    :type  path:        str
+    :param destination: absolute path to the copy
+    :type  destination: str
+
+    :return: sha256 hex digest of the file content
+    :rtype:  str
+    """
+    digest = sha256()
+    with open(path, 'rb') as source:
+        with open(destination, 'wb') as target:
+            for chunk in iter(lambda: source.read(CHUNK_SIZE), ''):
+                digest.update(chunk)
+                target.write(chunk)
+    shutil.copymode(path, destination)
+    return digest.hexdigest()
+
+
+def link_blob(blob, destination, mode):
+    """
+    Atomically replace the file at destination, if any, with a link to a blob.
+
+    :param blob:        absolute path to the blob
+    :type  blob:        str
+    :param destination: absolute path to the link
+    :type  destination: str
+    :param mode:        'hardlink' or 'symlink'
+    :type  mode:        str
+    """
+    fd, temp_destination = tempfile.mkstemp(dir=os.path.dirname(destination))
+    os.close(fd)
+    os.remove(temp_destination)
+    try:
+        if mode == 'symlink':
+            os.symlink(blob, temp_destination)
+        else:
+            os.link(blob, temp_destination)
+        os.rename(temp_destination, destination)
+    except OSError:
+        if os.path.lexists(temp_destination):
+            os.remove(temp_destination)
+        raise
+
+
+def unreferenced_blob(path):
+    """
+    Find the blob no longer referenced once a hard link to it is deleted. The number of hard links
+    to a blob is its reference count: the blob itself and one per unit storage path. Blobs
+    referenced by symbolic links are not counted, pulp-dedup-storage --collect removes them once
+    no symbolic link points to them.
+
+    Files are only hashed to find their blob when the files put in storage are hard linked to
+    the blob store on the same filesystem. Blobs left unreferenced while that is not the case,
+    for example after dedup_storage was changed, are also removed by pulp-dedup-storage
+    --collect.
+
+    :param path: absolute path to a file about to be deleted
+    :type  path: str
+
+    :return: absolute path to the blob that is only referenced by the file, None if there is none
+    :rtype:  str or None
+    """
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return None
+    if not stat.S_ISREG(st.st_mode) or st.st_nlink != 2 or dedup_mode() != 'hardlink':
+        return None
+    try:
+        if os.stat(blobs_dir()).st_dev != st.st_dev:
+            return None
+    except OSError:
+        return None
+    blob = blob_path(file_digest(path))
+    try:
+        if os.path.samefile(blob, path):
+            return blob
+    except OSError:
+        pass
+    return None
+
+
 class ContentStorage(object):
     """
     Base class for content storage.
@@ -79,6 +242,10 @@ class ContentStorage(object):
 class FileStorage(ContentStorage):
     """
     Direct file storage.
+
+    When the dedup_storage server setting is 'hardlink' or 'symlink', the content of each file
+    is stored once in the blob store, keyed by its sha256 digest, and the unit storage path is a
+    hard or symbolic link to the blob. Units having identical files then share their storage.
     """
 
     @staticmethod
@@ -125,6 +292,10 @@ class FileStorage(ContentStorage):
         if location:
             destination = os.path.join(destination, location.lstrip('/'))
         mkdir(os.path.dirname(destination))
+        mode = dedup_mode()
+        if mode:
+            self._put_blob(unit, path, destination, mode)
+            return
         fd, temp_destination = tempfile.mkstemp(dir=os.path.dirname(destination))
 
         # to avoid a file descriptor leak, close the one opened by tempfile.mkstemp which we are not
@@ -132,6 +303,7 @@ class FileStorage(ContentStorage):
         os.close(fd)
 
         shutil.copy(path, temp_destination)
+        instrumentation.record_file_written(temp_destination)
 
         try:
             unit.verify_size(temp_destination)
@@ -144,6 +316,46 @@ class FileStorage(ContentStorage):
 
         os.rename(temp_destination, destination)
 
+    @staticmethod
+    def _put_blob(unit, path, destination, mode):
+        """
+        Put a file in the blob store, unless a blob with the same content is already there, and
+        link the destination to the blob.
+
+        :param unit: The content unit to be stored.
+        :type unit: pulp.sever.db.model.ContentUnit
+        :param path: The absolute path to the file to be stored.
+        :type path: str
+        :param destination: The absolute path to where the unit file is stored.
+        :type destination: str
+        :param mode: 'hardlink' or 'symlink'
+        :type mode: str
+        """
+        mkdir(blobs_dir())
+        fd, temp_blob = tempfile.mkstemp(dir=blobs_dir())
+        os.close(fd)
+        try:
+            digest = copy_with_digest(path, temp_blob)
+            try:
+                unit.verify_size(temp_blob)
+            except AttributeError:
+                # verify_size method is not implemented for the unit
+                pass
+
+            blob = blob_path(digest)
+            mkdir(os.path.dirname(blob))
+            try:
+                os.link(temp_blob, blob)
+                instrumentation.record_file_written(blob)
+            except OSError, e:
+                if e.errno != errno.EEXIST:
+                    raise
+                # referenced again, so a running collection of unreferenced blobs skips it
+                os.utime(blob, None)
+            link_blob(blob, destination, mode)
+        finally:
+            os.remove(temp_blob)
+
     def get(self, unit):
         """
         Get the content (bits) associated with the specified content unit from storage.
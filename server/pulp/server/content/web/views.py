@@ -100,8 +100,8 @@ class ContentView(View):
 
         :param request: The WSGI request object.
         :type request: django.core.handlers.wsgi.WSGIRequest
-        :param key: A private RSA key.
-        :type key: RSA.RSA
+        :param key: A private RSA key or shared secret key.
+        :type key: RSA.RSA|pulp.server.lazy.url.HMACKey
         :return: A redirect or not-found reply.
         :rtype: django.http.HttpResponse
         """
@@ -130,7 +130,7 @@ class ContentView(View):
 
     def __init__(self, **kwargs):
         super(ContentView, self).__init__(**kwargs)
-        self.key = Key.load(pulp_conf.get('authentication', 'rsa_key'))
+        self.key = Key.signing_key(pulp_conf)
         # Make sure all requested paths fall under these sub-directories, otherwise
         # we might find ourselves serving private keys to all and sundry.
         local_storage = pulp_conf.get('server', 'storage_dir')
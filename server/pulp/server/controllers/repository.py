@@ -21,6 +21,7 @@ from pulp.common import dateutils, error_codes, tags
 from pulp.common.config import parse_bool, Unparsable
 from pulp.common.plugins import reporting_constants, importer_constants
 from pulp.common.tags import resource_tag, RESOURCE_REPOSITORY_TYPE, action_tag
+from pulp.plugins.conduits.mixins import finalizing
 from pulp.plugins.conduits.repo_sync import RepoSyncConduit
 from pulp.plugins.conduits.repo_publish import RepoPublishConduit
 from pulp.plugins.config import PluginCallConfiguration
@@ -39,6 +40,7 @@ from pulp.server.content.storage import mkdir
 from pulp.server.controllers import consumer as consumer_controller
 from pulp.server.controllers import distributor as dist_controller
 from pulp.server.controllers import importer as importer_controller
+from pulp.server.controllers import units as units_controller
 from pulp.server.db import connection, model
 from pulp.server.db.model.repository import (
     RepoContentUnit, RepoSyncResult, RepoPublishResult)
@@ -339,10 +341,16 @@ def associate_single_unit(repository, unit):
         repo_id=repository.repo_id,
         unit_id=unit.id,
         unit_type_id=unit._content_type_id)
-    qs.update_one(
+    result = qs.update_one(
         set_on_insert__created=formatted_datetime,
         set__updated=formatted_datetime,
-        upsert=True)
+        upsert=True,
+        full_result=True)
+    if not result.get('updatedExisting', True):
+        update_unit_count(repository.repo_id, unit._content_type_id, 1)
+        model.OrphanCount.units_associated(unit._content_type_id, [unit.id])
+        units_controller.add_repo_memberships(repository.repo_id, unit._content_type_id,
+                                              [unit.id])
 
 
 def disassociate_units(repository, unit_iterable):
@@ -361,13 +369,37 @@ def disassociate_units(repository, unit_iterable):
         unit_id_list = [unit.id for unit in unit_group]
         qs = model.RepositoryContentUnit.objects(
             repo_id=repository.repo_id, unit_id__in=unit_id_list)
+        type_ids = dict((unit.id, unit._content_type_id) for unit in unit_group)
+        removed_ids = qs.distinct('unit_id')
         # queryset delete returns the number of records deleted
         units_removed += qs.delete()
+        for type_id, unit_ids in _group_by_type(removed_ids, type_ids).items():
+            update_unit_count(repository.repo_id, type_id, -len(unit_ids))
+            model.OrphanCount.units_unassociated(type_id, unit_ids)
+            units_controller.remove_repo_memberships(repository.repo_id, type_id, unit_ids)
 
     if units_removed:
         update_last_unit_removed(repository.repo_id)
 
 
+def _group_by_type(unit_ids, type_ids):
+    """
+    Group unit ids by content type.
+
+    :param unit_ids: ids of units
+    :type  unit_ids: iterable of str
+    :param type_ids: content type id of each unit, by unit id
+    :type  type_ids: dict
+
+    :return: lists of unit ids, by content type id
+    :rtype:  dict
+    """
+    grouped = {}
+    for unit_id in unit_ids:
+        grouped.setdefault(type_ids[unit_id], []).append(unit_id)
+    return grouped
+
+
 def create_repo(repo_id, display_name=None, description=None, notes=None, importer_type_id=None,
                 importer_repo_plugin_config=None, distributor_list=None):
     """
@@ -559,6 +591,12 @@ def delete(repo_id):
         _logger.exception(msg)
         error_tuples.append(e)
 
+    # The associations are gone, so a count computed from now on includes the units that
+    # became orphans. Looking for them would take too long.
+    model.OrphanCount.mark_stale(repo.content_unit_counts.keys())
+    for type_id in repo.content_unit_counts:
+        units_controller.remove_repo_memberships(repo_id, type_id)
+
     # remove the repo from any groups it was a member of
     group_manager = manager_factory.repo_group_manager()
     group_manager.remove_repo_from_groups(repo_id)
@@ -800,7 +838,8 @@ def sync(repo_id, sync_config_override=None, scheduled_call_id=None):
         # Replace the Importer's sync_repo() method with our register_sigterm_handler decorator,
         # which will set up cancel_sync_repo() as the target for the signal handler
         sync_repo = register_sigterm_handler(importer.sync_repo, importer.cancel_sync_repo)
-        sync_report = sync_repo(transfer_repo, conduit, call_config)
+        with finalizing(conduit):
+            sync_report = sync_repo(transfer_repo, conduit, call_config)
 
     except Exception, e:
         sync_end_timestamp = _now_timestamp()
@@ -1510,7 +1549,7 @@ def _create_download_requests(content_units):
     """
     requests = []
     working_dir = common_utils.get_working_directory()
-    signing_key = Key.load(pulp_conf.get('authentication', 'rsa_key'))
+    signing_key = Key.signing_key(pulp_conf)
 
     for content_unit in content_units:
         # All files in the unit; every request for a unit has a reference to this dict.
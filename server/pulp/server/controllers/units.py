@@ -1,8 +1,14 @@
 import mongoengine
+from pymongo import UpdateOne
 
 from pulp.plugins.loader import api as plugin_api
 from pulp.plugins.types import database as types_db
 from pulp.plugins.util import misc
+from pulp.server.config import config
+
+
+# Field of content unit documents caching the ids of the repositories the unit is in
+REPO_MEMBERSHIPS_FIELD = '_repo_memberships'
 
 
 def find_units(units, pagination_size=50):
@@ -95,3 +101,83 @@ def get_model_serializer_for_type(type_id):
         serializer.model = model_class
         # instantiate the serializer before returning
         return serializer()
+
+
+def repo_membership_cache_enabled():
+    """
+    :return: whether content units cache the ids of the repositories they are in
+    :rtype:  bool
+    """
+    return config.getboolean('server', 'repo_membership_cache')
+
+
+def add_repo_memberships(repo_id, type_id, unit_ids):
+    """
+    Add a repository to the cached memberships of units that were associated with it. Units
+    without cached memberships are left alone.
+
+    :param repo_id: id of the repository
+    :type  repo_id: str
+    :param type_id: content type id of the units
+    :type  type_id: str
+    :param unit_ids: ids of the units
+    :type  unit_ids: list of str
+    """
+    if not unit_ids or not repo_membership_cache_enabled():
+        return
+    types_db.type_units_collection(type_id).update_many(
+        {'_id': {'$in': list(unit_ids)}, REPO_MEMBERSHIPS_FIELD: {'$exists': True}},
+        {'$addToSet': {REPO_MEMBERSHIPS_FIELD: repo_id}})
+
+
+def remove_repo_memberships(repo_id, type_id, unit_ids=None):
+    """
+    Remove a repository from the cached memberships of units that were unassociated from it.
+
+    :param repo_id: id of the repository
+    :type  repo_id: str
+    :param type_id: content type id of the units
+    :type  type_id: str
+    :param unit_ids: ids of the units, None for all the units of the type
+    :type  unit_ids: list of str or None
+    """
+    if (unit_ids is not None and not unit_ids) or not repo_membership_cache_enabled():
+        return
+    spec = {REPO_MEMBERSHIPS_FIELD: repo_id}
+    if unit_ids is not None:
+        spec['_id'] = {'$in': list(unit_ids)}
+    types_db.type_units_collection(type_id).update_many(
+        spec, {'$pull': {REPO_MEMBERSHIPS_FIELD: repo_id}})
+
+
+def cache_repo_memberships(type_id, unit_ids, find_memberships):
+    """
+    Start caching the memberships of units that do not cache them yet.
+
+    The cache is created empty before the memberships are looked up, so associations changed
+    concurrently are either found by the lookup or added to the cache.
+
+    :param type_id: content type id of the units
+    :type  type_id: str
+    :param unit_ids: ids of the units
+    :type  unit_ids: list of str
+    :param find_memberships: function returning the ids of the repositories each unit is in,
+                             as a dict of sets indexed by unit id, when passed the unit ids
+    :type  find_memberships: callable
+
+    :return: ids of the repositories each unit is in, indexed by unit id
+    :rtype:  dict
+    """
+    if not repo_membership_cache_enabled():
+        return find_memberships(unit_ids)
+    collection = types_db.type_units_collection(type_id)
+    collection.update_many(
+        {'_id': {'$in': list(unit_ids)}, REPO_MEMBERSHIPS_FIELD: {'$exists': False}},
+        {'$set': {REPO_MEMBERSHIPS_FIELD: []}})
+    memberships = find_memberships(unit_ids)
+    requests = [UpdateOne({'_id': unit_id},
+                          {'$addToSet': {REPO_MEMBERSHIPS_FIELD: {'$each': list(repo_ids)}}})
+                for unit_id, repo_ids in memberships.items() if repo_ids]
+    if requests:
+        collection.bulk_write(requests, ordered=False)
+    return memberships
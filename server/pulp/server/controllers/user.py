@@ -3,9 +3,10 @@ from gettext import gettext as _
 from mongoengine import NotUniqueError, ValidationError
 
 from pulp.server import exceptions as pulp_exceptions
+from pulp.server.auth import authorization
 from pulp.server.constants import SUPER_USER_ROLE
 from pulp.server.db import model
-from pulp.server.db.model.auth import Permission, Role
+from pulp.server.db.model.auth import Role
 from pulp.server.managers import factory as manager_factory
 
 
@@ -135,39 +136,32 @@ def is_last_super_user(login):
     return True
 
 
-def is_authorized(resource, login, operation):
+def is_authorized(resource, login, operation, user=None):
     """
     Check to see if a user is authorized to perform an operation on a resource.
 
+    The permissions granted to the user are loaded with a single query and cached until
+    permissions change.
+
     :param resource: pulp resource url
     :type  resource: str
     :param login: login of user to check permissions for
     :type  login: str
     :param operation: operation to be performed on resource
     :type  operation: int
+    :param user: the user with the login, if already loaded
+    :type  user: pulp.server.db.model.User
 
     :return: True if the user is authorized for the operation on the resource, False otherwise
     :rtype: bool
     """
-    user = model.User.objects.get_or_404(login=login)
+    if user is None:
+        user = model.User.objects.get_or_404(login=login)
     if user.is_superuser():
         return True
 
-    permission_query_manager = manager_factory.permission_query_manager()
-
     # User is authorized if they have access to the resource or any of the its base resources.
-    parts = [p for p in resource.split('/') if p]
-    while parts:
-        current_resource = '/%s/' % '/'.join(parts)
-        permission = permission_query_manager.find_by_resource(current_resource)
-        if permission is not None:
-            if operation in permission_query_manager.find_user_permission(permission, login):
-                return True
-        parts = parts[:-1]
-
-    permission = Permission.get_collection().find_one({'resource': '/'})
-    return (permission is not None and
-            operation in permission_query_manager.find_user_permission(permission, login))
+    return authorization.permission_cache.get(login).is_authorized(resource, operation)
 
 
 def find_users_belonging_to_role(role_id):
@@ -3,7 +3,9 @@
 import copy
 import itertools
 import logging
+import random
 import ssl
+import threading
 import time
 from gettext import gettext as _
 
@@ -23,6 +25,7 @@ from pymongo.son_manipulator import NamespaceInjector
 from pulp.common import error_codes
 
 from pulp.server import config
+from pulp.server.async import instrumentation
 from pulp.server.compat import wraps
 from pulp.server.exceptions import PulpCodedException, PulpException
 
@@ -37,6 +40,11 @@ _DEFAULT_MAX_POOL_SIZE = 10
 MONGO_MINIMUM_VERSION = semantic_version.Version("2.4.0")
 MONGO_WRITE_CONCERN_VERSION = semantic_version.Version("2.6.0")
 
+# Seconds before the first retry of an operation that failed with AutoReconnect. The delay
+# doubles for each following retry up to RETRY_MAX_DELAY, and a random part of it is used.
+RETRY_BASE_DELAY = 0.3
+RETRY_MAX_DELAY = 10
+
 _logger = logging.getLogger(__name__)
 
 
@@ -114,6 +122,9 @@ def initialize(name=None, seeds=None, max_pool_size=None, replica_set=None, max_
             raise Exception(_("The server config specified a database password, but is "
                               "missing a database username."))
 
+        # Only connections created after the listener is registered notify it
+        instrumentation.register_mongo_listener()
+
         # Wait until the Mongo database is available
         mongo_retry_timeout_seconds_generator = itertools.chain([1, 2, 4, 8, 16],
                                                                 itertools.repeat(32))
@@ -218,6 +229,120 @@ class PulpCollectionFailure(PulpException):
     """
 
 
+class CircuitBreaker(object):
+    """
+    Shared by the operations retried on the database connection of a process. The circuit opens
+    when an operation fails with AutoReconnect. While it is open, one thread at a time probes the
+    database by retrying its operation, and the other threads wait for the probe instead of
+    sending their own operations. The first operation that succeeds closes the circuit.
+
+    :ivar opened:       time the circuit opened, None while it is closed
+    :type opened:       float
+    :ivar retries:      number of operations sent again after failing with AutoReconnect
+    :type retries:      int
+    :ivar given_up:     number of operations that failed for longer than their retry budget
+    :type given_up:     int
+    :ivar time_lost:    seconds operations spent failing, waiting and sleeping before succeeding
+                        or giving up
+    :type time_lost:    float
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._prober = None
+        self.opened = None
+        self.retries = 0
+        self.given_up = 0
+        self.time_lost = 0.0
+
+    def acquire(self, timeout):
+        """
+        Tell whether the calling thread may send its operation, which is the case when the
+        circuit is closed or when no other thread is probing the database. Otherwise wait up to
+        timeout seconds for the probe to succeed.
+
+        :param timeout: maximum number of seconds to wait for the probe of another thread
+        :type  timeout: float
+
+        :return: True if the operation may be sent, False if it should ask again
+        :rtype:  bool
+        """
+        if self.opened is None:
+            return True
+        with self._condition:
+            if self.opened is None:
+                return True
+            if self._prober is None:
+                self._prober = threading.current_thread().ident
+                return True
+            self._condition.wait(timeout)
+            return False
+
+    def succeeded(self):
+        """
+        Record that an operation succeeded, closing the circuit if it is open.
+        """
+        if self.opened is None:
+            return
+        with self._condition:
+            if self.opened is not None:
+                _logger.info(_('Database operations succeed again after failing for %(s).1f '
+                               'seconds') % {'s': time.time() - self.opened})
+            self.opened = None
+            self._prober = None
+            self._condition.notify_all()
+
+    def failed(self):
+        """
+        Record that an operation failed with AutoReconnect, opening the circuit if it is closed.
+        """
+        with self._condition:
+            if self.opened is None:
+                self.opened = time.time()
+            if self._prober == threading.current_thread().ident:
+                self._prober = None
+
+    def release(self):
+        """
+        Record that an operation was interrupted before the database answered, letting another
+        thread probe the database if the calling thread was probing it.
+        """
+        with self._condition:
+            if self._prober == threading.current_thread().ident:
+                self._prober = None
+                self._condition.notify_all()
+
+    def record(self, retries, time_lost, given_up=False):
+        """
+        Add the retries of an operation to the counters.
+
+        :param retries:     number of times the operation was sent again
+        :type  retries:     int
+        :param time_lost:   seconds the operation spent failing, waiting and sleeping
+        :type  time_lost:   float
+        :param given_up:    whether the operation ran out of retry budget
+        :type  given_up:    bool
+        """
+        with self._condition:
+            self.retries += retries
+            self.time_lost += time_lost
+            if given_up:
+                self.given_up += 1
+
+    def stats(self):
+        """
+        :return: whether the circuit is open, and the retries, operations given up and seconds
+                 lost by the operations of this process
+        :rtype:  dict
+        """
+        return {
+            'open': self.opened is not None,
+            'retries': self.retries,
+            'given_up': self.given_up,
+            'time_lost': self.time_lost,
+        }
+
+
 class UnsafeRetry(object):
     """
     Class that decorates PyMongo to retry in the event of AutoReconnect exceptions.
@@ -230,6 +355,11 @@ class UnsafeRetry(object):
                           'group', 'rename', 'distinct', 'map_reduce', 'inline_map_reduce',
                           'find_and_modify')
 
+    circuit_breaker = CircuitBreaker()
+
+    # number of decorated calls in progress in each thread
+    _local = threading.local()
+
     @classmethod
     def decorate_instance(cls, instance, full_name):
         """
@@ -249,29 +379,106 @@ class UnsafeRetry(object):
                 except AttributeError:
                     pass
 
+    @staticmethod
+    def retry_delay(attempt):
+        """
+        :param attempt: number of times the operation failed
+        :type  attempt: int
+
+        :return: seconds to wait before sending the operation again, random so the processes
+                 and threads waiting for the database do not retry in lockstep
+        :rtype:  float
+        """
+        return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1)))
+
+    @classmethod
+    def stats(cls):
+        """
+        :return: the counters of the circuit breaker, see CircuitBreaker.stats
+        :rtype:  dict
+        """
+        return cls.circuit_breaker.stats()
+
     @staticmethod
     def retry_decorator(full_name=None):
         """
         Recorator providing retry support for pymongo AutoReconnect exceptions.
 
+        Failed operations are retried with jittered exponential backoff, through the circuit
+        breaker shared by the process, until they have been failing for longer than the
+        unsafe_autoretry_budget setting. The AutoReconnect exception is then raised.
+
+        Decorated methods calling other decorated methods, such as find_one calling find, are
+        retried as a whole: only the outermost call of a thread goes through the circuit breaker,
+        so the thread probing the database does not wait for its own probe.
+
         :param full_name: the full name of the database collection
         :type  full_name: str
         """
 
         def _decorator(method):
 
+            def _check_budget(started, attempt):
+                """
+                Raise AutoReconnect if the operation has been failing for too long.
+                """
+                elapsed = time.time() - started
+                budget = config.config.getfloat('database', 'unsafe_autoretry_budget')
+                if budget and elapsed >= budget:
+                    UnsafeRetry.circuit_breaker.record(attempt, elapsed, given_up=True)
+                    msg = _('%(method)s operation on %(name)s failed for %(s)d seconds, '
+                            'giving up') % {'method': method.__name__, 'name': full_name,
+                                            's': elapsed}
+                    _logger.error(msg)
+                    raise AutoReconnect(msg)
+
             @wraps(method)
             def retry(*args, **kwargs):
+                local = UnsafeRetry._local
+                if getattr(local, 'depth', 0):
+                    return method(*args, **kwargs)
+                breaker = UnsafeRetry.circuit_breaker
+                started = None
+                attempt = 0
                 while True:
+                    if not breaker.acquire(UnsafeRetry.retry_delay(attempt + 1)):
+                        # another thread is probing the database
+                        if started is None:
+                            started = time.time()
+                        _check_budget(started, attempt)
+                        continue
+                    local.depth = 1
                     try:
-                        return method(*args, **kwargs)
-
+                        result = method(*args, **kwargs)
                     except AutoReconnect:
+                        breaker.failed()
+                    except Exception:
+                        # the database answered
+                        breaker.succeeded()
+                        raise
+                    except BaseException:
+                        # interrupted before the database answered
+                        breaker.release()
+                        raise
+                    else:
+                        breaker.succeeded()
+                        if started is not None:
+                            breaker.record(attempt, time.time() - started)
+                            _logger.debug(_('%(method)s operation on %(name)s succeeded after '
+                                            '%(n)d retries') % {'method': method.__name__,
+                                                                'name': full_name, 'n': attempt})
+                        return result
+                    finally:
+                        local.depth = 0
+                    if started is None:
+                        started = time.time()
+                    attempt += 1
+                    if attempt == 1:
                         msg = _('%(method)s operation failed on %(name)s') % {
                             'method': method.__name__, 'name': full_name}
                         _logger.error(msg)
-
-                        time.sleep(0.3)
+                    _check_budget(started, attempt)
+                    time.sleep(UnsafeRetry.retry_delay(attempt))
 
             return retry
 
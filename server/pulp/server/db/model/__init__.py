@@ -24,7 +24,7 @@ from pulp.server.constants import LOCAL_STORAGE, SUPER_USER_ROLE
 from pulp.server.content.storage import FileStorage, SharedStorage
 from pulp.server.async.emit import send as send_taskstatus_message
 from pulp.server.db.connection import UnsafeRetry
-from pulp.server.compat import digestmod
+from pulp.server.compat import digestmod, pbkdf2_hmac
 from pulp.server.db.fields import ISO8601StringField, UTCDateTimeField
 from pulp.server.db.model.reaper_base import ReaperMixin
 from pulp.server.db.model import base
@@ -41,6 +41,9 @@ _logger = logging.getLogger(__name__)
 SYSTEM_ID = '00000000-0000-0000-0000-000000000000'
 SYSTEM_LOGIN = u'SYSTEM'
 PASSWORD_ITERATIONS = 5000
+# Prefix of hashed passwords stored as <algorithm>$<iterations>$<salt>$<hash>. Passwords stored
+# without it are salt,hash from the iterated HMAC of User._pbkdf_sha256().
+PASSWORD_ALGORITHM = 'pbkdf2_sha256'
 
 
 class AutoRetryDocument(Document):
@@ -494,6 +497,8 @@ class TaskStatus(AutoRetryDocument, ReaperMixin):
     :type exception:   None
     :ivar traceback:   Deprecated. This is always None.
     :type traceback:   None
+    :ivar metrics:     measurements of the task, see pulp.server.async.instrumentation
+    :type metrics:     dict
     """
 
     task_id = StringField(required=True)
@@ -508,6 +513,7 @@ class TaskStatus(AutoRetryDocument, ReaperMixin):
     finish_time = ISO8601StringField()
     result = DynamicField()
     group_id = UUIDField(default=None)
+    metrics = DictField()
 
     # These are deprecated, and will always be None
     exception = StringField()
@@ -516,8 +522,15 @@ class TaskStatus(AutoRetryDocument, ReaperMixin):
     # For backward compatibility
     _ns = StringField(default='task_status')
 
+    # Bulk updates send a taskstatus message for each updated task, with the whole document
+    post_save_on_update = True
+
+    # The compound indexes back the task listing, which always filters on group_id and pages
+    # on _id, optionally filtered by state or by a start or finish time range.
     meta = {'collection': 'task_status',
-            'indexes': ['-tags', '-state', {'fields': ['-task_id'], 'unique': True}, '-group_id'],
+            'indexes': ['-tags', '-state', {'fields': ['-task_id'], 'unique': True}, '-group_id',
+                        ('group_id', 'state', 'id'), ('group_id', 'start_time'),
+                        ('group_id', 'finish_time')],
             'allow_inheritance': False,
             'queryset_class': CriteriaQuerySet}
 
@@ -628,12 +641,16 @@ class ContentUnit(AutoRetryDocument):
     :type _last_updated: mongoengine.IntField
     :ivar _storage_path: The absolute path to associated content files.
     :type _storage_path: mongoengine.StringField
+    :ivar _repo_memberships: ids of the repositories the unit is in, only set when the server
+                             caches repository memberships
+    :type _repo_memberships: mongoengine.ListField
     """
 
     id = StringField(primary_key=True, default=lambda: str(uuid.uuid4()))
     pulp_user_metadata = DictField()
     _last_updated = IntField(required=True)
     _storage_path = StringField()
+    _repo_memberships = ListField(StringField(), default=None)
 
     meta = {
         'abstract': True,
@@ -650,6 +667,7 @@ class ContentUnit(AutoRetryDocument):
         and all the correct signals will be applied.
         """
         signals.pre_save.connect(cls.pre_save_signal, sender=cls)
+        signals.post_save.connect(cls.post_save_signal, sender=cls)
 
     @classmethod
     def validate_model_definition(cls):
@@ -728,6 +746,20 @@ class ContentUnit(AutoRetryDocument):
         """
         document._last_updated = dateutils.now_utc_timestamp()
 
+    @classmethod
+    def post_save_signal(cls, sender, document, **kwargs):
+        """
+        The signal that is triggered after a unit is saved. A new unit is an orphan until it is
+        associated with a repository.
+
+        :param sender: sender class
+        :type sender: object
+        :param document: Document that sent the signal
+        :type document: ContentUnit
+        """
+        if kwargs.get('created'):
+            OrphanCount.adjust(document._content_type_id, 1)
+
     def get_repositories(self):
         """
         Get an iterable of Repository models for all the repositories that contain this unit
@@ -1171,6 +1203,99 @@ class DeferredDownload(AutoRetryDocument):
     _ns = StringField(default='deferred_download')
 
 
+class OrphanCount(AutoRetryDocument):
+    """
+    The number of orphaned content units of a content type, so the orphan summary does not have
+    to look for the orphans. The count is adjusted as units are created, associated, unassociated
+    and deleted. Changes that are too expensive to follow, such as deleting a repository, mark
+    the count stale instead, and a stale count is computed again before it is used. A periodic
+    task also computes every count again, correcting the counts that drifted because of
+    concurrent changes.
+
+    :ivar content_type_id: id of the content type
+    :type content_type_id: str
+    :ivar count:           number of orphaned units of the content type
+    :type count:           int
+    :ivar stale:           whether the count has to be computed again before it is used
+    :type stale:           bool
+    :ivar reconciled:      when the count was last computed
+    :type reconciled:      datetime.datetime
+    """
+    content_type_id = StringField(required=True)
+    count = IntField(default=0)
+    stale = BooleanField(default=False)
+    reconciled = UTCDateTimeField()
+
+    # For backward compatibility
+    _ns = StringField(default='orphan_counts')
+
+    meta = {'collection': 'orphan_counts',
+            'indexes': [{'fields': ['content_type_id'], 'unique': True}],
+            'allow_inheritance': False}
+
+    @classmethod
+    def adjust(cls, content_type_id, delta):
+        """
+        Add to the count of a content type. Nothing is done if the count was never computed.
+
+        :param content_type_id: id of the content type
+        :type  content_type_id: str
+        :param delta:           number of units that became orphans, negative for units that
+                                are no longer orphans
+        :type  delta:           int
+        """
+        if delta:
+            cls.objects(content_type_id=content_type_id).update_one(inc__count=delta)
+
+    @classmethod
+    def units_associated(cls, content_type_id, unit_ids):
+        """
+        Adjust the count of a content type for new associations of units. The units that have
+        no other association were orphans.
+
+        This costs an aggregation on the associations for each call, so units associated in
+        bulk should be passed together rather than one at a time.
+
+        :param content_type_id: id of the content type of the units
+        :type  content_type_id: str
+        :param unit_ids:        ids of the units that were associated with a repository
+        :type  unit_ids:        list of str
+        """
+        if not unit_ids:
+            return
+        pipeline = [{'$match': {'unit_id': {'$in': unit_ids}}},
+                    {'$group': {'_id': '$unit_id', 'associations': {'$sum': 1}}},
+                    {'$match': {'associations': 1}}]
+        result = RepositoryContentUnit._get_collection().aggregate(pipeline)
+        cls.adjust(content_type_id, -len(list(result)))
+
+    @classmethod
+    def units_unassociated(cls, content_type_id, unit_ids):
+        """
+        Adjust the count of a content type for removed associations of units. The units that
+        have no association left are orphans.
+
+        :param content_type_id: id of the content type of the units
+        :type  content_type_id: str
+        :param unit_ids:        ids of the units that were unassociated from a repository
+        :type  unit_ids:        list of str
+        """
+        if not unit_ids:
+            return
+        associated = RepositoryContentUnit.objects(unit_id__in=unit_ids).distinct('unit_id')
+        cls.adjust(content_type_id, len(set(unit_ids) - set(associated)))
+
+    @classmethod
+    def mark_stale(cls, content_type_ids):
+        """
+        Mark the counts of content types to be computed again before they are used.
+
+        :param content_type_ids: ids of the content types
+        :type  content_type_ids: iterable of str
+        """
+        cls.objects(content_type_id__in=list(content_type_ids)).update(set__stale=True)
+
+
 class User(AutoRetryDocument):
     """
     :ivar login: user's login name, must be unique for each user
@@ -1233,28 +1358,58 @@ class User(AutoRetryDocument):
         :return: True if password is correct, False otherwise
         :rtype:  bool
         """
+        if self.password.startswith(PASSWORD_ALGORITHM + '$'):
+            algorithm, iterations, salt, hashed_password = self.password.split('$')
+            pbkdf = pbkdf2_hmac('sha256', self._encode_password(plain_password),
+                                salt.decode('base64'), int(iterations))
+            return hashed_password.decode('base64') == pbkdf
         salt, hashed_password = self.password.split(",")
         salt = salt.decode("base64")
         hashed_password = hashed_password.decode("base64")
         pbkdbf = self._pbkdf_sha256(plain_password, salt, PASSWORD_ITERATIONS)
         return hashed_password == pbkdbf
 
-    def _hash_password(self, plain_password):
+    def password_needs_rehash(self):
         """
-        Creates a hashed password from a plaintext password.
+        Determine if the stored hashed password was created with an older algorithm or fewer
+        iterations than set_password() uses now.
 
-        _hash_password, check_password, _random_bytes, and _pbkdf_sha256 were taken from this
-        stackoverflow.com : http://tinyurl.com/2f6gx7s
+        :return: True if the password should be set again, False otherwise
+        :rtype:  bool
+        """
+        if self.password is None:
+            return False
+        if not self.password.startswith(PASSWORD_ALGORITHM + '$'):
+            return True
+        return int(self.password.split('$')[1]) < PASSWORD_ITERATIONS
+
+    def _hash_password(self, plain_password):
+        """
+        Creates a hashed password from a plaintext password using PBKDF2 with HMAC-SHA256.
 
         :param plain_password: plaintext password to be hashed
         :type  plain_password: str
 
-        :return: salt concatenated with the hashed password
+        :return: algorithm, iterations, salt and the hashed password separated by $
         :rtype:  str
         """
         salt = self._random_bytes(8)  # 64 bits
-        hashed_password = self._pbkdf_sha256(str(plain_password), salt, PASSWORD_ITERATIONS)
-        return salt.encode("base64").strip() + "," + hashed_password.encode("base64").strip()
+        hashed_password = pbkdf2_hmac('sha256', self._encode_password(plain_password), salt,
+                                      PASSWORD_ITERATIONS)
+        return '$'.join((PASSWORD_ALGORITHM, str(PASSWORD_ITERATIONS),
+                         salt.encode("base64").strip(), hashed_password.encode("base64").strip()))
+
+    @staticmethod
+    def _encode_password(plain_password):
+        """
+        :param plain_password: plaintext password
+        :type  plain_password: basestring
+        :return: the password as bytes
+        :rtype:  str
+        """
+        if isinstance(plain_password, unicode):
+            return plain_password.encode('utf-8')
+        return str(plain_password)
 
     def _random_bytes(self, num_bytes):
         """
@@ -1272,6 +1427,9 @@ class User(AutoRetryDocument):
         """
         Apply the salt to the password some number of times to increase randomness.
 
+        This is the hashing of passwords stored before PASSWORD_ALGORITHM was used, it is kept to
+        check them. It was taken from this stackoverflow.com : http://tinyurl.com/2f6gx7s
+
         :param password: plaintext password
         :type  password: str
         :param salt: random set of characters to encode the password
@@ -47,9 +47,26 @@ class Permission(Model):
 
     collection_name = 'permissions'
     unique_indices = ('resource',)
+    search_indices = ('users.username',)
 
     def __init__(self, resource, users=None):
         super(Permission, self).__init__()
 
         self.resource = resource
         self.users = users or []
+
+
+class PermissionVersion(Model):
+    """
+    A counter incremented whenever the permissions granted to users change, so permissions
+    cached by a process can be checked for staleness with a single lookup.
+
+    @ivar _id: name of the counter
+    @type _id: str
+
+    @ivar version: the number of changes
+    @type version: int
+    """
+
+    collection_name = 'permission_version'
+    unique_indices = ()
@@ -27,3 +27,19 @@ class EventListener(Model):
         self.notifier_type_id = notifier_type_id
         self.notifier_config = notifier_config
         self.event_types = event_types
+
+
+class EventListenerVersion(Model):
+    """
+    A counter incremented whenever event listeners are created, updated or deleted, so listeners
+    cached by a process can be checked for staleness with a single lookup.
+
+    @ivar _id: name of the counter
+    @type _id: str
+
+    @ivar version: the number of changes
+    @type version: int
+    """
+
+    collection_name = 'event_listener_version'
+    unique_indices = ()
@@ -2,6 +2,7 @@ from datetime import datetime, timedelta
 from gettext import gettext as _
 import operator
 
+from blinker import Namespace
 from mongoengine import Q
 from mongoengine.queryset import DoesNotExist, QuerySetNoCache
 from pymongo import ASCENDING
@@ -11,6 +12,16 @@ from pulp.server import exceptions as pulp_exceptions
 from pulp.server.constants import PULP_PROCESS_TIMEOUT_INTERVAL
 
 
+# Number of documents loaded at once when CriteriaQuerySet.update calls post_save() on them
+POST_SAVE_BATCH_SIZE = 1000
+
+_signals = Namespace()
+
+# Sent once by CriteriaQuerySet.update with the model class as sender, the raw filter of the
+# update as query, its mongoengine-style keyword arguments as update, and the update's result
+post_bulk_update = _signals.signal('post_bulk_update')
+
+
 class QuerySetPreventCache(QuerySetNoCache):
     """
     All custom QuerySet classes should inherit from this class rather than QuerySet
@@ -89,21 +100,34 @@ class CriteriaQuerySet(QuerySetPreventCache):
 
         return query_set
 
-    def update(self, *args, **kwargs):
+    def update(self, upsert=False, multi=True, write_concern=None, full_result=False, **update):
         """
-        This method emulates post_save() on Documents.
+        Perform the update, then send the post_bulk_update signal once for the whole update.
+
+        This method also emulates post_save() on Documents, for models that opt in by setting
+        post_save_on_update to True. The matched documents are then loaded again in batches of
+        POST_SAVE_BATCH_SIZE, limited to the fields listed in post_save_fields if the model
+        has it, and post_save() is called on each of them. Other models are not iterated.
 
-        It attempts to call post_save() on each Document in the query set. If
-        post_save() does not exist, it will do nothing.
+        The arguments are those of mongoengine's update().
 
+        :return: the number of updated documents, or the full result if full_result is True
+        :rtype:  int or dict
         """
-        super(CriteriaQuerySet, self).update(*args, **kwargs)
-        for doc in self:
-            try:
-                doc.post_save(type(doc).__name__, doc)
-            except AttributeError:
-                # if post_save() is not defined for this particular document, that's ok
-                pass
+        result = super(CriteriaQuerySet, self).update(
+            upsert=upsert, multi=multi, write_concern=write_concern, full_result=full_result,
+            **update)
+        model = self._document
+        post_bulk_update.send(model, query=self._query, update=update, result=result)
+
+        if getattr(model, 'post_save_on_update', False):
+            query_set = self.clone().batch_size(POST_SAVE_BATCH_SIZE)
+            fields = getattr(model, 'post_save_fields', None)
+            if fields:
+                query_set = query_set.only(*fields)
+            for doc in query_set:
+                doc.post_save(model.__name__, doc)
+        return result
 
     def get_or_404(self, **kwargs):
         """
@@ -0,0 +1,367 @@
+"""
+Delivers events to notifiers from a background thread, so notifiers that block on the network,
+such as HTTP and email, do not hold up the syncs and publishes firing the events.
+
+Events are queued in a bounded queue per process. The delivery thread takes the queued events in
+batches and hands each listener all of its events in the batch at once. Events a notifier failed
+to deliver are retried later with exponential backoff. When the queue is full, the event is
+delivered by the caller instead, so events are not lost and memory stays bounded.
+
+A process waits a few seconds for its queued events to be delivered when it exits: at exit for
+most processes, and when a celery worker child process shuts down, since billiard ends those with
+os._exit, which skips exit handlers. The events still queued or waiting for a retry after that
+are dropped and their number is logged. Events queued by a process that is killed are lost.
+"""
+from gettext import gettext as _
+import atexit
+import heapq
+import logging
+import os
+import Queue
+import threading
+import time
+
+from pulp.server.config import config
+from pulp.server.event import notifiers
+
+
+_logger = logging.getLogger(__name__)
+
+# Seconds the process waits at exit for queued events to be delivered
+EXIT_TIMEOUT = 5
+
+
+def deliver_now(listener, event):
+    """
+    Invokes the notifier of a listener for an event. An exception from the notifier is logged.
+
+    :param listener: event listener document
+    :type  listener: dict
+    :param event:    event to deliver
+    :type  event:    pulp.server.event.data.Event
+
+    :return: whether the notifier succeeded
+    :rtype:  bool
+    """
+    notifier_type_id = listener['notifier_type_id']
+    f = notifiers.get_notifier_function(notifier_type_id)
+    try:
+        f(listener['notifier_config'], event)
+        return True
+    except Exception:
+        _logger.exception('Exception from notifier of type [%s]' % notifier_type_id)
+        return False
+
+
+def deliver(listener, events):
+    """
+    Hands events to the notifier of a listener, using the notifier's batch function when it has
+    one. Exceptions from notifiers are logged.
+
+    :param listener: event listener document
+    :type  listener: dict
+    :param events:   events to deliver
+    :type  events:   list of pulp.server.event.data.Event
+
+    :return: the events that could not be delivered and should be retried
+    :rtype:  list of pulp.server.event.data.Event
+    """
+    notifier_type_id = listener['notifier_type_id']
+    batch_function = notifiers.get_notifier_batch_function(notifier_type_id)
+    if batch_function is not None:
+        try:
+            return batch_function(listener['notifier_config'], events)
+        except Exception:
+            _logger.exception('Exception from notifier of type [%s]' % notifier_type_id)
+            return events
+
+    return [event for event in events if not deliver_now(listener, event)]
+
+
+class Dispatcher(object):
+    """
+    Queues events and delivers them from a daemon thread, which is started by the first event
+    dispatched in a process.
+
+    :ivar queue_size:   maximum number of events queued, 0 to deliver events synchronously
+    :type queue_size:   int
+    :ivar batch_size:   maximum number of queued events delivered together
+    :type batch_size:   int
+    :ivar retries:      number of times the delivery of an event to a listener is retried
+    :type retries:      int
+    :ivar retry_delay:  seconds before the first retry, doubled for each following one
+    :type retry_delay:  float
+    """
+
+    def __init__(self, queue_size, batch_size, retries, retry_delay):
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._retry_heap = []
+        # orders retries due at the same time
+        self._retry_count = 0
+        self._reset_stats()
+
+    @classmethod
+    def from_config(cls):
+        """
+        :return: a dispatcher configured by the [notifications] section of the server config
+        :rtype:  Dispatcher
+        """
+        return cls(config.getint('notifications', 'queue_size'),
+                   config.getint('notifications', 'batch_size'),
+                   config.getint('notifications', 'retries'),
+                   config.getfloat('notifications', 'retry_delay'))
+
+    def _reset_stats(self):
+        self.delivered = 0
+        self.failed = 0
+        self.retried = 0
+        self.overflowed = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def dispatch(self, listeners, event):
+        """
+        Deliver an event to listeners, from the delivery thread unless the queue is disabled or
+        full. Events delivered by the caller are not retried.
+
+        :param listeners:   event listener documents
+        :type  listeners:   list of dict
+        :param event:       event to deliver
+        :type  event:       pulp.server.event.data.Event
+        """
+        if not listeners:
+            return
+        queued = time.time()
+        if self.queue_size > 0:
+            try:
+                self._get_queue().put_nowait((queued, listeners, event))
+                return
+            except Queue.Full:
+                self.overflowed += 1
+                _logger.warning(_('Event notification queue is full, delivering synchronously'))
+        for listener in listeners:
+            self._record(queued, deliver_now(listener, event))
+
+    def _get_queue(self):
+        """
+        :return: the queue of this process, creating it and starting the delivery thread if needed
+        :rtype:  Queue.Queue
+        """
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                # a forked child inherits the queue but not the thread delivering it
+                if self._pid != pid:
+                    self._queue = Queue.Queue(self.queue_size)
+                    self._retry_heap = []
+                    self._reset_stats()
+                    thread = threading.Thread(target=self._run, name='event-delivery')
+                    thread.daemon = True
+                    thread.start()
+                    self._pid = pid
+        return self._queue
+
+    def _run(self):
+        """
+        The delivery thread.
+        """
+        queue = self._queue
+        while True:
+            timeout = None
+            if self._retry_heap:
+                timeout = max(0, self._retry_heap[0][0] - time.time())
+            batch = []
+            try:
+                batch.append(queue.get(timeout=timeout))
+                while len(batch) < self.batch_size:
+                    batch.append(queue.get_nowait())
+            except Queue.Empty:
+                pass
+            try:
+                self._deliver_batch(batch)
+                self._deliver_retries()
+                _logger.debug(_('Event notification delivery: %(s)s') % {'s': self.stats()})
+            except Exception:
+                _logger.exception(_('Event notification delivery failed'))
+            finally:
+                for item in batch:
+                    queue.task_done()
+
+    def _deliver_batch(self, batch):
+        """
+        Deliver queued events, all the events of a listener at once.
+
+        :param batch: (time queued, listener documents, event) tuples
+        :type  batch: list
+        """
+        by_listener = {}
+        order = []
+        for queued, listeners, event in batch:
+            for listener in listeners:
+                if listener['_id'] not in by_listener:
+                    by_listener[listener['_id']] = (listener, [])
+                    order.append(listener['_id'])
+                by_listener[listener['_id']][1].append((queued, event))
+        for listener_id in order:
+            listener, items = by_listener[listener_id]
+            self._deliver(listener, items, 0)
+
+    def _deliver_retries(self):
+        """
+        Retry the deliveries that are due.
+        """
+        now = time.time()
+        while self._retry_heap and self._retry_heap[0][0] <= now:
+            due, count, attempt, listener, items = heapq.heappop(self._retry_heap)
+            self.retried += len(items)
+            self._deliver(listener, items, attempt)
+
+    def _deliver(self, listener, items, attempt):
+        """
+        Deliver events to a listener, scheduling a retry of those that failed.
+
+        :param listener:    event listener document
+        :type  listener:    dict
+        :param items:       (time queued, event) tuples
+        :type  items:       list
+        :param attempt:     number of earlier attempts to deliver these events
+        :type  attempt:     int
+        """
+        failed = deliver(listener, [event for queued, event in items])
+        failed_ids = set(id(event) for event in failed)
+        retry = []
+        for queued, event in items:
+            if id(event) not in failed_ids:
+                self._record(queued, True)
+            elif attempt < self.retries:
+                retry.append((queued, event))
+            else:
+                _logger.error(_('Giving up delivering %(e)s to a notifier of type %(t)s') %
+                              {'e': event, 't': listener['notifier_type_id']})
+                self._record(queued, False)
+        if retry:
+            due = time.time() + self.retry_delay * 2 ** attempt
+            self._retry_count += 1
+            heapq.heappush(self._retry_heap,
+                           (due, self._retry_count, attempt + 1, listener, retry))
+
+    def _record(self, queued, delivered):
+        """
+        Record the outcome of the delivery of an event to a listener.
+
+        :param queued:      time the event was queued
+        :type  queued:      float
+        :param delivered:   whether the event was delivered
+        :type  delivered:   bool
+        """
+        if not delivered:
+            self.failed += 1
+            return
+        latency = time.time() - queued
+        self.delivered += 1
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+
+    def wait(self, timeout=None):
+        """
+        Wait until the queued events have been delivered once, retries are not waited for.
+
+        :param timeout: maximum number of seconds to wait, None to wait indefinitely
+        :type  timeout: float
+
+        :return: True if the queue is empty
+        :rtype:  bool
+        """
+        queue = self._queue
+        if queue is None or self._pid != os.getpid():
+            return True
+        deadline = None if timeout is None else time.time() + timeout
+        while queue.unfinished_tasks:
+            if deadline is not None and time.time() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def drain(self, timeout):
+        """
+        Wait for the queued events to be delivered before the process exits, and log the
+        deliveries that are dropped because they are still queued or waiting for a retry.
+
+        :param timeout: maximum number of seconds to wait
+        :type  timeout: float
+
+        :return: number of events still queued and of deliveries waiting for a retry
+        :rtype:  int
+        """
+        queue = self._queue
+        if queue is None or self._pid != os.getpid():
+            return 0
+        self.wait(timeout)
+        queued = queue.unfinished_tasks
+        retries = sum(len(item[4]) for item in list(self._retry_heap))
+        if queued or retries:
+            _logger.warning(
+                _('Dropping %(q)d queued event notifications and %(r)d deliveries waiting for '
+                  'a retry as the process exits') % {'q': queued, 'r': retries})
+        return queued + retries
+
+    def stats(self):
+        """
+        :return: queue depth, pending retries, number of deliveries to listeners that succeeded,
+                 failed, were retried or made synchronously because the queue was full, and the
+                 average and maximum seconds from firing an event to its delivery
+        :rtype:  dict
+        """
+        queue = self._queue if self._pid == os.getpid() else None
+        return {
+            'queue_depth': queue.qsize() if queue is not None else 0,
+            'retries_pending': sum(len(item[4]) for item in list(self._retry_heap)),
+            'delivered': self.delivered,
+            'failed': self.failed,
+            'retried': self.retried,
+            'overflowed': self.overflowed,
+            'latency_avg': self.latency_total / self.delivered if self.delivered else 0.0,
+            'latency_max': self.latency_max,
+        }
+
+
+_dispatcher = None
+
+
+def get_dispatcher():
+    """
+    :return: the dispatcher of this process, created from the server configuration on first use
+    :rtype:  Dispatcher
+    """
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = Dispatcher.from_config()
+    return _dispatcher
+
+
+def reset():
+    """
+    Drop the dispatcher so the next one is created from the current configuration, as tests
+    changing the configuration need.
+    """
+    global _dispatcher
+    _dispatcher = None
+
+
+@atexit.register
+def drain(timeout=EXIT_TIMEOUT):
+    """
+    Wait for the events queued by this process to be delivered before it exits. Registered as an
+    exit handler, and called when a celery worker child process shuts down.
+
+    :param timeout: maximum number of seconds to wait
+    :type  timeout: float
+    """
+    if _dispatcher is not None:
+        _dispatcher.drain(timeout)
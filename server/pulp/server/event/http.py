@@ -13,7 +13,7 @@ import logging
 
 from pulp.server.compat import json, json_util
 
-from requests import post
+from requests import post, Session
 from requests.auth import HTTPBasicAuth
 
 
@@ -30,7 +30,32 @@ def handle_event(notifier_config, event):
     _send_post(notifier_config, json_body)
 
 
-def _send_post(notifier_config, json_body):
+def handle_events(notifier_config, events):
+    """
+    Sends a POST request for each event, reusing the connection to the notifier url.
+
+    :param notifier_config: The configuration for the HTTP notifier.
+    :type notifier_config:  dict
+    :param events:          events to send
+    :type events:           list of pulp.server.event.data.Event
+
+    :return: the events that could not be sent and should be retried
+    :rtype:  list of pulp.server.event.data.Event
+    """
+    session = Session()
+    try:
+        failed = []
+        for event in events:
+            json_body = json.dumps(event.data(), default=json_util.default)
+            _logger.info(json_body)
+            if not _send_post(notifier_config, json_body, session.post):
+                failed.append(event)
+        return failed
+    finally:
+        session.close()
+
+
+def _send_post(notifier_config, json_body, post_function=None):
     """
     Sends a POST request with the given data to the configured notifier url.
 
@@ -40,10 +65,16 @@ def _send_post(notifier_config, json_body):
     :type notifier_config:  dict
     :param json_body:       The POST data that has been serialized to JSON.
     :param json_body:       dict
+    :param post_function:   function sending the request, requests.post if None
+    :type post_function:    callable
+
+    :return: False if the request failed in a way that may not happen again, such as a connection
+             error or a server error, and should be retried
+    :rtype:  bool
     """
     if 'url' not in notifier_config or not notifier_config['url']:
         _logger.error(_('HTTP notifier configured without a URL; cannot fire event'))
-        return
+        return True
     url = notifier_config['url']
 
     # Process authentication
@@ -55,8 +86,11 @@ def _send_post(notifier_config, json_body):
     # CA path
     verify = notifier_config.get('ca_path') or True
 
+    if post_function is None:
+        post_function = post
+
     try:
-        response = post(
+        response = post_function(
             url,
             data=json_body,
             auth=auth,
@@ -65,8 +99,9 @@ def _send_post(notifier_config, json_body):
             timeout=15)
     except Exception:
         _logger.exception("HTTP Notification Failed")
-        return
+        return False
 
     if response.status_code != 200:
         _logger.error(_('Received HTTP {code} from HTTP notifier to {url}.').format(
             code=response.status_code, url=url))
+    return response.status_code < 500
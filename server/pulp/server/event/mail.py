@@ -1,5 +1,6 @@
 import logging
 import smtplib
+import socket
 import threading
 
 try:
@@ -42,6 +43,64 @@ def handle_event(notifier_config, event):
         thread.start()
 
 
+def handle_events(notifier_config, events):
+    """
+    If email is enabled in the server settings, sends an email for each event to each recipient
+    listed in the notifier_config over a single connection to the MTA.
+
+    :param notifier_config: dictionary with keys 'subject', which defines the
+                            subject of each email message, and 'addresses',
+                            which is a list of strings that are email addresses
+                            that should receive this notification.
+    :type  notifier_config: dict
+    :param events:  Event instances
+    :type  events:  list of pulp.server.event.data.event
+    :return: the events that could not be sent because the MTA could not be reached
+    :rtype:  list of pulp.server.event.data.event
+    """
+    if not config.getboolean('email', 'enabled'):
+        return []
+    subject = notifier_config['subject']
+    addresses = notifier_config['addresses']
+    host = config.get('email', 'host')
+    port = config.getint('email', 'port')
+    from_address = config.get('email', 'from')
+
+    try:
+        connection = smtplib.SMTP(host=host, port=port)
+    except (smtplib.SMTPException, socket.error):
+        _logger.exception('SMTP connection failed to %s on %s' % (host, port))
+        return events
+
+    try:
+        for event in events:
+            body = json.dumps(event.data(), indent=2, default=json_util.default)
+            for address in addresses:
+                message = _make_message(subject, body, from_address, address)
+                try:
+                    connection.sendmail(from_address, address, message.as_string())
+                except smtplib.SMTPException:
+                    _logger.exception('Error sending mail.')
+    finally:
+        try:
+            connection.quit()
+        except smtplib.SMTPException:
+            pass
+    return []
+
+
+def _make_message(subject, body, from_address, to_address):
+    """
+    :return: a text email
+    :rtype:  email.mime.text.MIMEText
+    """
+    message = MIMEText(body)
+    message['Subject'] = subject
+    message['From'] = from_address
+    message['To'] = to_address
+    return message
+
+
 def _send_email(subject, body, to_address):
     """
     Send a text email to one recipient
@@ -59,10 +118,7 @@ def _send_email(subject, body, to_address):
     port = config.getint('email', 'port')
     from_address = config.get('email', 'from')
 
-    message = MIMEText(body)
-    message['Subject'] = subject
-    message['From'] = from_address
-    message['To'] = to_address
+    message = _make_message(subject, body, from_address, to_address)
 
     try:
         connection = smtplib.SMTP(host=host, port=port)
@@ -12,6 +12,7 @@ from pulp.server.event import amqp, http, mail
 
 # Set in the reset() method
 NOTIFIER_FUNCTIONS = None
+NOTIFIER_BATCH_FUNCTIONS = None
 
 
 def is_valid_notifier_type_id(type_id):
@@ -43,18 +44,37 @@ def get_notifier_function(type_id):
     return NOTIFIER_FUNCTIONS[type_id]
 
 
+def get_notifier_batch_function(type_id):
+    """
+    Returns the function delivering several events to a notifier at once, if the notifier has
+    one. The function accepts the configuration of the notifier and a list of events, and
+    returns the list of events that could not be delivered and should be retried.
+
+    @param type_id: type of notifier to retrieve
+    @type  type_id: str
+
+    @return: function to invoke to deliver events, None if the notifier has none
+    @rtype:  callable
+    """
+    return NOTIFIER_BATCH_FUNCTIONS.get(type_id)
+
+
 def reset():
     """
     Initializes the mappings between notifier ID and method to invoke. This
     will automatically be called when the module is first loaded and should
     only need to be called again in unit test cleanup.
     """
-    global NOTIFIER_FUNCTIONS
+    global NOTIFIER_FUNCTIONS, NOTIFIER_BATCH_FUNCTIONS
     NOTIFIER_FUNCTIONS = {
         http.TYPE_ID: http.handle_event,
         mail.TYPE_ID: mail.handle_event,
         amqp.TYPE_ID: amqp.handle_event,
     }
+    NOTIFIER_BATCH_FUNCTIONS = {
+        http.TYPE_ID: http.handle_events,
+        mail.TYPE_ID: mail.handle_events,
+    }
 
 
 # Perform the initial populating of the notifier functions on module load
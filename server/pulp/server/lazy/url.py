@@ -15,11 +15,20 @@ W9uIjogMTQ0MjkzMTc4OH0%3D;signature=PTgdjh0uq1lXDfpvAbYXxF_TO8BKHT4Eo6OYo6M45UL0
 Lv3x7kfjAADA8Cpsk9iHBeeq3pKTX6Ogv_R-BkORxJAAzeM7et9M1HkyGKwBl8BTYAA3POQT0Ips4Zb0LN5uDHFPwclS-W1jvKD
 095g__lhvLmiiVLw5biVM3WFvlUl0-hd4ljzbvB4qrXRGbNtw1rnbCIowM0h2_SsoS_WzetJWsiZNdMVySfUXKJ4m3-du89wWB7
 zDFYRlosVNTom5YiKprVkJEAo3cbTOMoZss_NS-vpzauuk-qXwqj05gI7fJVsVD915gGcY0xPUbpCbVTg%3D%3D
+
+URLs are signed using either an RSA key pair or, when the web tier and the
+streamer share a secret, an HMAC key (see: HMACKey) which is much cheaper
+to sign and validate with.  The streamer may use a ValidationCache to skip
+validating the same signed URL again until the policy expires.
 """
 
+import hmac
+import os
 from base64 import urlsafe_b64encode, urlsafe_b64decode
+from collections import OrderedDict
 from gettext import gettext as _
 from hashlib import sha256
+from threading import Lock
 from time import time
 from urllib import quote, unquote
 from urlparse import ParseResult, urlparse, urlunparse
@@ -273,8 +282,8 @@ class Policy(object):
         """
         Decode and validate a policy.
 
-        :param key: A public RSA key.
-        :type key: RSA.RSA
+        :param key: A public RSA key or shared secret key.
+        :type key: RSA.RSA|HMACKey
         :param encoded: A base64 encoded json policy.
         :type encoded: str
         :param signature: A base64 encoded RSA signature.
@@ -327,8 +336,8 @@ class Policy(object):
         """
         Sign the policy using the specified private RSA key.
 
-        :param key: A private RSA key.
-        :type key: RSA.RSA
+        :param key: A private RSA key or shared secret key.
+        :type key: RSA.RSA|HMACKey
         :return A tuple of: (encoded-policy, base64-signature)
         :rtype tuple
         """
@@ -383,11 +392,56 @@ class Query(object):
         return ';'.join(encoded)
 
 
+class HMACKey(object):
+    """
+    A shared secret key used to sign and validate policies using HMAC-SHA256.
+    Provides the same sign() and verify() interface as an RSA key.
+
+    :ivar secret: The shared secret.
+    :type secret: str
+    """
+
+    def __init__(self, secret):
+        """
+        :param secret: The shared secret.
+        :type secret: str
+        """
+        self.secret = secret
+
+    def sign(self, digest):
+        """
+        Sign the specified digest.
+
+        :param digest: A policy digest.
+        :type digest: str
+        :return: The signature.
+        :rtype: str
+        """
+        return hmac.new(self.secret, digest, sha256).digest()
+
+    def verify(self, digest, signature):
+        """
+        Verify the signature of the specified digest.
+
+        :param digest: A policy digest.
+        :type digest: str
+        :param signature: The signature to be verified.
+        :type signature: str
+        :return: True if verified.
+        :rtype: bool
+        """
+        return hmac.compare_digest(self.sign(digest), signature)
+
+
 class Key(object):
     """
     Provides RSA key management.
+    Keys loaded by path are cached until the file is changed.
     """
 
+    _cache = {}
+    _lock = Lock()
+
     @staticmethod
     def load(path=None, pem=None):
         """
@@ -401,8 +455,7 @@ class Key(object):
         :rtype: RSA.RSA
         """
         if path:
-            with open(path) as fp:
-                pem = fp.read()
+            return Key._cached(path, Key._load_path)
         bfr = BIO.MemoryBuffer(pem)
         if 'PRIVATE' in pem:
             key = RSA.load_key_bio(bfr)
@@ -410,6 +463,107 @@ class Key(object):
             key = RSA.load_pub_key_bio(bfr)
         return key
 
+    @staticmethod
+    def load_secret(path):
+        """
+        Get/Load a shared secret key at the specified path.
+        Leading and trailing whitespace in the file is ignored.
+
+        :param path: An absolute path to a file containing the secret.
+        :type path: str
+        :return: The loaded key.
+        :rtype: HMACKey
+        """
+        return Key._cached(path, Key._load_secret)
+
+    @staticmethod
+    def signing_key(conf):
+        """
+        Get/Load the key used to sign URLs based on configuration.
+        The shared secret is used when configured.  Otherwise, the RSA private key.
+
+        :param conf: The server configuration.
+        :type conf: ConfigParser.ConfigParser
+        :return: The loaded key.
+        :rtype: RSA.RSA|HMACKey
+        """
+        path = conf.get('authentication', 'url_signing_secret')
+        if path:
+            return Key.load_secret(path)
+        return Key.load(conf.get('authentication', 'rsa_key'))
+
+    @staticmethod
+    def validation_key(conf):
+        """
+        Get/Load the key used to validate signed URLs based on configuration.
+        The shared secret is used when configured.  Otherwise, the RSA public key.
+
+        :param conf: The server configuration.
+        :type conf: ConfigParser.ConfigParser
+        :return: The loaded key.
+        :rtype: RSA.RSA|HMACKey
+        """
+        path = conf.get('authentication', 'url_signing_secret')
+        if path:
+            return Key.load_secret(path)
+        return Key.load(conf.get('authentication', 'rsa_pub'))
+
+    @staticmethod
+    def _cached(path, loader):
+        """
+        Get a key loaded from the specified path using the cache.
+        The cache entry is keyed by the path and the modification time and
+        size of the file so a replaced key is loaded again.
+
+        :param path: An absolute path to a key file.
+        :type path: str
+        :param loader: A function used to load the key: loader(path).
+        :type loader: callable
+        :return: The loaded key.
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            # let the loader report the error
+            return loader(path)
+        cache_key = (path, loader, stat.st_mtime, stat.st_size)
+        with Key._lock:
+            key = Key._cache.get(cache_key)
+        if key is None:
+            key = loader(path)
+            with Key._lock:
+                for k in [k for k in Key._cache if k[:2] == cache_key[:2]]:
+                    del Key._cache[k]
+                Key._cache[cache_key] = key
+        return key
+
+    @staticmethod
+    def _load_path(path):
+        """
+        Load an RSA key at the specified path.
+
+        :param path: An absolute path to a PEM encoded key.
+        :type path: str
+        :return: The loaded key.
+        :rtype: RSA.RSA
+        """
+        with open(path) as fp:
+            pem = fp.read()
+        return Key.load(pem=pem)
+
+    @staticmethod
+    def _load_secret(path):
+        """
+        Load a shared secret key at the specified path.
+
+        :param path: An absolute path to a file containing the secret.
+        :type path: str
+        :return: The loaded key.
+        :rtype: HMACKey
+        """
+        with open(path) as fp:
+            return HMACKey(fp.read().strip())
+
 
 class URL(object):
     """
@@ -491,7 +645,7 @@ class URL(object):
 
     def sign(self, key, expiration=90, **extensions):
         """
-        Sign the URL using the specified private RSA key.
+        Sign the URL using the specified private RSA key or shared secret key.
         Has the format of: <url>?policy=<policy>;signature=<signature>.
         The *policy* is: {resource: <resource>, expiration: <seconds>, extensions: <ext>}
         The *resource* is the path?query in the original URL.
@@ -499,8 +653,8 @@ class URL(object):
         The *signature* is RSA signature of the SHA256 digest of the
         json/base64 encoded policy.
 
-        :param key: A private RSA key.
-        :type key: RSA.RSA
+        :param key: A private RSA key or shared secret key.
+        :type key: RSA.RSA|HMACKey
         :param expiration: The signature expiration in seconds.
         :type expiration: int
         :param extensions: Optional policy extensions.
@@ -571,14 +725,14 @@ class SignedURL(URL):
 
     def validate(self, key, **extensions):
         """
-        Validate the URL *content* using the RSA signature and the
-        public key specified by *key*.  The policy is validated.
+        Validate the URL *content* using the signature and the
+        public RSA key or shared secret key specified by *key*.  The policy is validated.
         Then, the resource in the policy is matched against the resource
         specified in the URL.  Last, the policy extensions are matched
         against the specified extensions.
 
-        :param key: A public RSA key.
-        :type key: RSA.RSA
+        :param key: A public RSA key or shared secret key.
+        :type key: RSA.RSA|HMACKey
         :param extensions: Optional policy extensions.
         :type extensions: dict
         :return: The resource specified in the policy.
@@ -586,6 +740,16 @@ class SignedURL(URL):
         :raise NotValid: if the signature and policy digest cannot be
             validated using the public key. Or, that the policy has expired.
         """
+        return self._validate(key, **extensions).resource
+
+    def _validate(self, key, **extensions):
+        """
+        Validate the URL.  See: validate().
+
+        :return: The validated policy.
+        :rtype: Policy
+        :raise NotValid: when not valid.
+        """
         policy, signature = self.bundle
         policy = Policy.validate(key, policy, signature)
         if self.resource != policy.resource:
@@ -593,4 +757,71 @@ class SignedURL(URL):
         for k, v in policy.extensions.items():
             if extensions.get(k) != v:
                 raise ExtensionNotMatched(k)
+        return policy
+
+
+class ValidationCache(object):
+    """
+    A cache of recently validated signed URLs.
+    Successful validations are cached by the signed URL and extensions until
+    the policy expires so the signature is verified once for each signed URL
+    rather than for every request.  Only valid URLs are cached.  The signed URL
+    includes the policy (and expiration) so a cache entry cannot outlive it.
+
+    :ivar capacity: The maximum number of entries.  The oldest entry
+        is evicted when the cache is full.
+    :type capacity: int
+    """
+
+    CAPACITY = 10000
+
+    def __init__(self, capacity=CAPACITY):
+        """
+        :param capacity: The maximum number of entries.
+        :type capacity: int
+        """
+        self.capacity = capacity
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def validate(self, url, key, **extensions):
+        """
+        Validate the signed URL using the cache.
+        See: SignedURL.validate().
+
+        :param url: A signed URL.
+        :type url: SignedURL
+        :param key: A public RSA key or shared secret key.
+        :type key: RSA.RSA|HMACKey
+        :param extensions: Optional policy extensions.
+        :type extensions: dict
+        :return: The resource specified in the policy.
+        :rtype: str
+        :raise NotValid: if the signature and policy digest cannot be
+            validated using the public key. Or, that the policy has expired.
+        """
+        cache_key = (str(url), tuple(sorted(extensions.items())))
+        with self._lock:
+            entry = self._entries.get(cache_key)
+        if entry is not None:
+            expiration, resource = entry
+            if expiration > time():
+                return resource
+            with self._lock:
+                self._entries.pop(cache_key, None)
+        policy = url._validate(key, **extensions)
+        with self._lock:
+            self._entries[cache_key] = (policy.expiration, policy.resource)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
         return policy.resource
+
+    def clear(self):
+        """
+        Remove all entries.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
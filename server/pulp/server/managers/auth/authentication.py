@@ -1,5 +1,11 @@
+from collections import OrderedDict
 from gettext import gettext as _
+from hashlib import sha256
+from hmac import HMAC
+from threading import Lock
+from time import time
 import logging
+import os
 
 import oauth2
 
@@ -14,6 +20,94 @@ from pulp.server.managers import factory
 _logger = logging.getLogger(__name__)
 
 
+class CredentialCache(object):
+    """
+    A cache of recently authenticated credentials.
+
+    Entries are keyed by an HMAC of the credentials with a random key generated by each
+    process, so neither passwords nor certificates are held in memory. Only successful
+    authentications are cached, and each entry expires after the time to live configured by
+    credential_cache_ttl in the [authentication] section; the cache is disabled when it is 0.
+
+    :ivar capacity: The maximum number of entries.  The oldest entry
+        is evicted when the cache is full.
+    :type capacity: int
+    """
+
+    CAPACITY = 10000
+
+    def __init__(self, capacity=CAPACITY):
+        """
+        :param capacity: The maximum number of entries.
+        :type capacity: int
+        """
+        self.capacity = capacity
+        self._secret = os.urandom(32)
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    @staticmethod
+    def ttl():
+        """
+        :return: the configured number of seconds an entry is cached, 0 if caching is disabled
+        :rtype: int
+        """
+        return config.getint('authentication', 'credential_cache_ttl')
+
+    def key(self, *credentials):
+        """
+        :param credentials: The credentials, such as the kind of credentials and their values.
+        :type credentials: tuple of basestring
+        :return: The cache key of the credentials.
+        :rtype: str
+        """
+        encoded = [c.encode('utf-8') if isinstance(c, unicode) else c for c in credentials]
+        return HMAC(self._secret, '\0'.join(encoded), sha256).digest()
+
+    def get(self, key):
+        """
+        :param key: A cache key returned by key().
+        :type key: str
+        :return: The value cached for the credentials, None if there is no entry or it expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expiration, value = entry
+            if expiration > time():
+                return value
+            del self._entries[key]
+        return None
+
+    def set(self, key, value, ttl):
+        """
+        :param key: A cache key returned by key().
+        :type key: str
+        :param value: The value to cache for the credentials.
+        :param ttl: The number of seconds the entry is valid.
+        :type ttl: int
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time() + ttl, value)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Remove all entries.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+credential_cache = CredentialCache()
+
+
 class AuthenticationManager(object):
     """
     Manages user and consumer authentication in pulp.
@@ -43,9 +137,19 @@ class AuthenticationManager(object):
             return None
 
         if password is not None:
-            if not user.check_password(password):
-                _logger.debug('Password for user [%s] was incorrect' % username)
-                return None
+            # The stored hashed password is cached so the entry is not used once the password
+            # is changed, in any process.
+            ttl = credential_cache.ttl()
+            key = credential_cache.key('password', username, password) if ttl else None
+            if key is None or credential_cache.get(key) != user.password:
+                if not user.check_password(password):
+                    _logger.debug('Password for user [%s] was incorrect' % username)
+                    return None
+                if user.password_needs_rehash():
+                    user.set_password(password)
+                    user.save()
+                if key is not None:
+                    credential_cache.set(key, user.password, ttl)
 
         return user
 
@@ -110,6 +214,30 @@ class AuthenticationManager(object):
         :rtype: str or None
         :return: user login corresponding to the credentials
         """
+        # The user is still looked up when the certificate is cached, so it is not accepted once
+        # the user is deleted.
+        ttl = credential_cache.ttl()
+        key = credential_cache.key('user-cert', cert_pem) if ttl else None
+        username = credential_cache.get(key) if key is not None else None
+        if username is None:
+            username = self._decode_user_cert(cert_pem)
+            if username is None:
+                return None
+            if key is not None:
+                credential_cache.set(key, username, ttl)
+
+        return self.check_username_password(username)
+
+    def _decode_user_cert(self, cert_pem):
+        """
+        Verify a client ssl certificate and decode the user login from it.
+
+        :type cert_pem: str
+        :param cert_pem: pem encoded ssl certificate
+
+        :rtype: str or None
+        :return: user login in the certificate, None if the certificate is not valid
+        """
         cert = factory.certificate_manager(content=cert_pem)
         subject = cert.subject()
         encoded_user = subject.get('CN', None)
@@ -128,7 +256,7 @@ class AuthenticationManager(object):
         except PulpException:
             return None
 
-        return self.check_username_password(username)
+        return username
 
     def check_consumer_cert(self, cert_pem):
         """
@@ -141,6 +269,25 @@ class AuthenticationManager(object):
         :rtype: str or None
         :return: id of a consumer corresponding to the credentials
         """
+        ttl = credential_cache.ttl()
+        key = credential_cache.key('consumer-cert', cert_pem) if ttl else None
+        consumerid = credential_cache.get(key) if key is not None else None
+        if consumerid is None:
+            consumerid = self._verify_consumer_cert(cert_pem)
+            if consumerid is not None and key is not None:
+                credential_cache.set(key, consumerid, ttl)
+        return consumerid
+
+    def _verify_consumer_cert(self, cert_pem):
+        """
+        Verify a consumer ssl certificate.
+
+        :type cert_pem: str
+        :param cert_pem: pem encoded ssl certificate
+
+        :rtype: str or None
+        :return: id of the consumer in the certificate, None if the certificate is not valid
+        """
         cert = factory.certificate_manager(content=cert_pem)
         subject = cert.subject()
         consumerid = subject.get('CN', None)
@@ -1,10 +1,17 @@
 import uuid
 
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
 from pulp.common import dateutils
 from pulp.plugins.types import database as content_types_db
+from pulp.server.db import model
 from pulp.server.exceptions import InvalidValue
 
 
+DUPLICATE_KEY_ERROR = 11000
+
+
 class ContentManager(object):
     """
     Create, update and delete operations for content in pulp.
@@ -33,8 +40,63 @@ class ContentManager(object):
         }
         unit_doc.update(unit_metadata)
         collection.insert(unit_doc)
+        model.OrphanCount.adjust(content_type, 1)
         return unit_id
 
+    def add_content_units(self, content_type, units_metadata):
+        """
+        Add content units and their metadata to the corresponding pulp db
+        collection with an unordered bulk insert. A unit whose unit key is
+        already in the collection is not added.
+        @param content_type: unique id of content collection
+        @type content_type: str
+        @param units_metadata: metadata of each content unit
+        @type units_metadata: list of dict
+        @return: id of each unit, None for the units that already exist
+        @rtype: list
+        """
+        collection = content_types_db.type_units_collection(content_type)
+        now = dateutils.now_utc_timestamp()
+        unit_docs = []
+        for unit_metadata in units_metadata:
+            unit_doc = {
+                '_id': str(uuid.uuid4()),
+                '_content_type_id': content_type,
+                '_last_updated': now
+            }
+            unit_doc.update(unit_metadata)
+            unit_docs.append(unit_doc)
+        unit_ids = [doc['_id'] for doc in unit_docs]
+        if not unit_docs:
+            return unit_ids
+        try:
+            collection.bulk_write([InsertOne(doc) for doc in unit_docs], ordered=False)
+        except BulkWriteError, e:
+            if any(error['code'] != DUPLICATE_KEY_ERROR for error in e.details['writeErrors']):
+                raise
+            for error in e.details['writeErrors']:
+                unit_ids[error['index']] = None
+        model.OrphanCount.adjust(content_type, len(filter(None, unit_ids)))
+        return unit_ids
+
+    def update_content_units(self, content_type, units_metadata_deltas):
+        """
+        Update the stored metadata of content units with an unordered bulk write.
+        @param content_type: unique id of content collection
+        @type content_type: str
+        @param units_metadata_deltas: metadata fields that have changed, by unit id
+        @type units_metadata_deltas: dict
+        """
+        if not units_metadata_deltas:
+            return
+        now = dateutils.now_utc_timestamp()
+        requests = []
+        for unit_id, unit_metadata_delta in units_metadata_deltas.items():
+            unit_metadata_delta = dict(unit_metadata_delta, _last_updated=now)
+            requests.append(UpdateOne({'_id': unit_id}, {'$set': unit_metadata_delta}))
+        collection = content_types_db.type_units_collection(content_type)
+        collection.bulk_write(requests, ordered=False)
+
     def update_content_unit(self, content_type, unit_id, unit_metadata_delta):
         """
         Update a content unit's stored metadata.
@@ -60,6 +122,7 @@ class ContentManager(object):
         """
         collection = content_types_db.type_units_collection(content_type)
         collection.remove({'_id': unit_id})
+        model.OrphanCount.mark_stale([content_type])
 
     def link_referenced_content_units(self, from_type, from_id, to_type, to_ids):
         """
@@ -10,8 +10,11 @@ from celery import task
 from pulp.plugins.types import database as content_types_db
 from pulp.plugins.loader import api as plugin_api
 from pulp.plugins.util import misc as plugin_misc
+from pulp.common import constants, dateutils, tags
 from pulp.server import config as pulp_config, exceptions as pulp_exceptions
-from pulp.server.async.tasks import Task
+from pulp.server.async.celery_instance import celery
+from pulp.server.async.tasks import PulpTask, Task
+from pulp.server.content import storage as content_storage
 from pulp.server.controllers import units as units_controller
 from pulp.server.db.model.repository import RepoContentUnit
 from pulp.server.db import model
@@ -20,24 +23,57 @@ from pulp.server.exceptions import MissingResource
 
 _logger = logging.getLogger(__name__)
 
+# Number of units checked for associations with a single query
+ORPHAN_BATCH_SIZE = 1000
+
 
 class OrphanManager(object):
 
     def orphans_summary(self):
         """
         Return a summary of the orphaned units as a dictionary of
-        content type -> number of orphaned units
+        content type -> {'count': number of orphaned units, 'stale': count is out of date}
+
+        The stored counts are returned without counting the orphans. When a count is stale or
+        was never computed, a task is queued to count the orphans of its content type again.
 
         :return: summary of orphaned units
         :rtype: dict
         """
+        content_type_ids = set(content_types_db.all_type_ids())
+        content_type_ids.update(plugin_api.list_unit_models())
+        stored = dict((orphan_count.content_type_id, orphan_count)
+                      for orphan_count in model.OrphanCount.objects.only('content_type_id',
+                                                                         'count', 'stale'))
         summary = {}
-        for content_type_id in content_types_db.all_type_ids():
-            summary[content_type_id] = self.orphans_count_by_type(content_type_id)
-        for content_type_id in plugin_api.list_unit_models():
-            summary[content_type_id] = self.orphans_count_by_type(content_type_id)
+        for content_type_id in content_type_ids:
+            orphan_count = stored.get(content_type_id)
+            if orphan_count is None:
+                summary[content_type_id] = {'count': 0, 'stale': True}
+            else:
+                summary[content_type_id] = {'count': orphan_count.count,
+                                            'stale': orphan_count.stale}
+        stale = sorted(content_type_id for content_type_id, value in summary.items()
+                       if value['stale'])
+        if stale:
+            OrphanManager.queue_reconcile_counts(stale)
         return summary
 
+    @staticmethod
+    def queue_reconcile_counts(content_type_ids):
+        """
+        Queue a task to count the orphans of the given content types again, unless a task
+        counting orphans is already waiting or running.
+
+        :param content_type_ids: unique ids of the content types to count orphans of
+        :type content_type_ids: list
+        """
+        task_tag = tags.action_tag(tags.ACTION_RECONCILE_ORPHAN_COUNTS)
+        if model.TaskStatus.objects(tags=task_tag,
+                                    state__in=constants.CALL_INCOMPLETE_STATES).count():
+            return
+        reconcile_orphan_counts.apply_async(args=[content_type_ids], tags=[task_tag])
+
     def orphans_count_by_type(self, content_type_id):
         """
         Generate a count of the orphans of a given content type.
@@ -52,6 +88,41 @@ class OrphanManager(object):
             count += 1
         return count
 
+    @staticmethod
+    def reconcile_count_by_type(content_type_id):
+        """
+        Count the orphans of a given content type and store the count.
+
+        :param content_type_id: unique id of the content type to count orphans of
+        :type content_type_id: basestring
+        :return: count of orphaned units of the given type
+        :rtype: int
+        """
+        count = OrphanManager().orphans_count_by_type(content_type_id)
+        model.OrphanCount.objects(content_type_id=content_type_id).update_one(
+            set__count=count, set__stale=False,
+            set__reconciled=dateutils.now_utc_datetime_with_tzinfo(), upsert=True)
+        return count
+
+    @staticmethod
+    def reconcile_orphan_counts(content_type_ids=None):
+        """
+        Count the orphans of the given content types again, correcting the stored counts.
+
+        :param content_type_ids: unique ids of the content types to count orphans of;
+                                 every content type when None
+        :type content_type_ids: list or None
+        :return: count of orphaned units indexed by content_type_id
+        :rtype: dict
+        """
+        if content_type_ids is None:
+            content_type_ids = set(content_types_db.all_type_ids())
+            content_type_ids.update(plugin_api.list_unit_models())
+        counts = {}
+        for content_type_id in content_type_ids:
+            counts[content_type_id] = OrphanManager.reconcile_count_by_type(content_type_id)
+        return counts
+
     def generate_all_orphans(self, fields=None):
         """
         Return an generator of all orphaned content units.
@@ -85,9 +156,10 @@ class OrphanManager(object):
                 yield content_unit
 
     @staticmethod
-    def generate_orphans_by_type(content_type_id, fields=None):
+    def generate_orphans_by_type(content_type_id, fields=None, after=None):
         """
-        Return an generator of all orphaned content units of the given content type.
+        Return an generator of all orphaned content units of the given content type, in the
+        order of their ids.
 
         If fields is not specified, only the `_id` field will be present.
 
@@ -95,6 +167,8 @@ class OrphanManager(object):
         :type content_type_id: basestring
         :param fields: list of fields to include in each content unit
         :type fields: list or None
+        :param after: only generate the units whose id sorts after this one
+        :type after: basestring or None
         :return: generator of orphaned content units for the given content type
         :rtype: generator
         """
@@ -103,26 +177,32 @@ class OrphanManager(object):
         content_units_collection = content_types_db.type_units_collection(content_type_id)
         repo_content_units_collection = RepoContentUnit.get_collection()
 
-        for content_unit in content_units_collection.find({}, projection=fields).batch_size(100):
-
-            repo_content_units_cursor = repo_content_units_collection.find(
-                {'unit_id': content_unit['_id']})
+        spec = {'_id': {'$gt': after}} if after is not None else {}
+        cursor = content_units_collection.find(spec, projection=fields).sort('_id')
+        cursor = cursor.batch_size(ORPHAN_BATCH_SIZE)
 
-            if repo_content_units_cursor.count() > 0:
-                continue
+        for content_units in plugin_misc.paginate(cursor, ORPHAN_BATCH_SIZE):
+            unit_ids = [content_unit['_id'] for content_unit in content_units]
+            associated = set(repo_content_units_collection.find(
+                {'unit_id': {'$in': unit_ids}}).distinct('unit_id'))
 
-            yield content_unit
+            for content_unit in content_units:
+                if content_unit['_id'] not in associated:
+                    yield content_unit
 
     @staticmethod
-    def generate_orphans_by_type_with_unit_keys(content_type_id):
+    def generate_orphans_by_type_with_unit_keys(content_type_id, after=None):
         """
-        Return an generator of all orphaned content units of the given content type.
+        Return an generator of all orphaned content units of the given content type, in the
+        order of their ids.
 
         Each content unit will contain the fields specified in the content type
         definition's search indexes.
 
         :param content_type_id: id of the content type
         :type  content_type_id: basestring
+        :param after: only generate the units whose id sorts after this one
+        :type  after: basestring or None
         :return: generator of orphaned content units for the given content type
         :rtype: generator
         """
@@ -133,7 +213,7 @@ class OrphanManager(object):
         fields = ['_id', '_content_type_id']
         fields.extend(unit_key_fields)
 
-        for content_unit in OrphanManager.generate_orphans_by_type(content_type_id, fields):
+        for content_unit in OrphanManager.generate_orphans_by_type(content_type_id, fields, after):
             yield content_unit
 
     def get_orphan(self, content_type_id, content_unit_id):
@@ -251,6 +331,7 @@ class OrphanManager(object):
             if storage_path is not None:
                 OrphanManager.delete_orphaned_file(storage_path)
             count += 1
+        model.OrphanCount.adjust(content_type_id, -count)
         return count
 
     @staticmethod
@@ -317,6 +398,7 @@ class OrphanManager(object):
                     OrphanManager.delete_orphaned_file(unit_to_delete._storage_path)
                 count += 1
 
+        model.OrphanCount.adjust(type_id, -count)
         return count
 
     @staticmethod
@@ -342,7 +424,11 @@ class OrphanManager(object):
             OrphanManager.unlink_shared(path)
             return
 
+        # deduplicated content, the blob goes with its last hard link
+        blob = content_storage.unreferenced_blob(path)
         OrphanManager.delete(path)
+        if blob is not None:
+            OrphanManager.delete(blob)
 
         # delete parent directories on the path as long as they fall empty
         root_content_regex = re.compile(os.path.join(storage_dir, 'content', '[^/]+/?$'))
@@ -423,3 +509,13 @@ class OrphanManager(object):
 delete_all_orphans = task(OrphanManager.delete_all_orphans, base=Task)
 delete_orphans_by_id = task(OrphanManager.delete_orphans_by_id, base=Task, ignore_result=True)
 delete_orphans_by_type = task(OrphanManager.delete_orphans_by_type, base=Task, ignore_result=True)
+reconcile_orphan_counts = task(OrphanManager.reconcile_orphan_counts, base=Task)
+
+
+@celery.task(base=PulpTask)
+def queue_reconcile_orphan_counts():
+    """
+    Queue a task to count the orphans of every content type again.
+    """
+    task_tags = [tags.action_tag(tags.ACTION_RECONCILE_ORPHAN_COUNTS)]
+    reconcile_orphan_counts.apply_async(tags=task_tags)
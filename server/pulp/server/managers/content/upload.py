@@ -1,17 +1,20 @@
 from errno import ENOENT
 from gettext import gettext as _
+import json
 import logging
 import os
 import sys
+from StringIO import StringIO
 from uuid import uuid4
 
 from celery import task
 
 from pulp.common import error_codes
+from pulp.plugins.conduits.mixins import finalizing
 from pulp.plugins.conduits.upload import UploadConduit
 from pulp.plugins.config import PluginCallConfiguration
 from pulp.plugins.loader import api as plugin_api, exceptions as plugin_exceptions
-from pulp.server import config as pulp_config
+from pulp.server import config as pulp_config, util
 from pulp.server.async.tasks import Task
 from pulp.server.db import model
 from pulp.server.exceptions import (PulpDataException, MissingResource, PulpExecutionException,
@@ -21,6 +24,19 @@ from pulp.server.controllers import repository as repo_controller
 
 logger = logging.getLogger(__name__)
 
+# Number of bytes read from the request body and written to the upload file at a time
+SEGMENT_CHUNK_SIZE = 1024 * 1024
+
+# Checksum accumulated while segments are written, so it is known at import time
+UPLOAD_CHECKSUM_TYPE = util.TYPE_SHA256
+
+# Suffix of the file next to each upload that records the checksum progress
+CHECKSUM_STATE_SUFFIX = '.checksum'
+
+# Hashers for uploads whose segments were written in order by this process, keyed by
+# upload ID. Each value is a tuple of the offset of the next expected segment and the hasher.
+_checksum_states = {}
+
 
 class ContentUploadManager(object):
     def initialize_upload(self):
@@ -49,15 +65,25 @@ class ContentUploadManager(object):
         f = open(file_path, 'w')
         f.close()
 
+        ContentUploadManager._write_checksum_state(upload_id, 0, None)
+
         return upload_id
 
-    def save_data(self, upload_id, offset, data):
+    def save_data(self, upload_id, offset, data, size=None):
         """
         Saves bits into the given upload request starting at an offset value.
         The initialize_upload method should be called prior to this method
         to retrieve the upload_id value and perform any steps necessary before
         bits can be saved.
 
+        The data may be given as a string or as a file-like object, such as the
+        request itself, in which case it is copied to the upload file in chunks
+        without reading the whole segment into memory first.
+
+        While segments arrive in order, the checksum of the uploaded bits is
+        accumulated as they are written so it does not need to be calculated
+        from the file again when the upload is imported.
+
         @param upload_id: upload request ID
         @type  upload_id: str
 
@@ -65,7 +91,11 @@ class ContentUploadManager(object):
         @type  offset: int
 
         @param data: content to write to the file
-        @type  data: str
+        @type  data: str or file
+
+        @param size: number of bytes in the segment, if known; used to preallocate
+                     the space in the upload file before writing
+        @type  size: int
         """
 
         file_path = ContentUploadManager._upload_file_path(upload_id)
@@ -74,10 +104,65 @@ class ContentUploadManager(object):
         if not os.path.exists(file_path):
             raise MissingResource(upload_request=upload_id)
 
-        f = open(file_path, 'r+')
-        f.seek(offset)
-        f.write(data)
-        f.close()
+        if isinstance(data, basestring):
+            size = len(data)
+            data = StringIO(data)
+
+        hasher = ContentUploadManager._checksum_hasher(upload_id, offset)
+
+        written = 0
+        fd = os.open(file_path, os.O_WRONLY)
+        try:
+            if size:
+                _preallocate(fd, offset, size)
+            os.lseek(fd, offset, os.SEEK_SET)
+            while True:
+                chunk = data.read(SEGMENT_CHUNK_SIZE)
+                if not chunk:
+                    break
+                _write_fully(fd, chunk)
+                if hasher is not None:
+                    hasher.update(chunk)
+                written += len(chunk)
+        except Exception:
+            ContentUploadManager._discard_checksum_state(upload_id)
+            raise
+        finally:
+            os.close(fd)
+
+        if hasher is not None:
+            next_offset = offset + written
+            _checksum_states[upload_id] = (next_offset, hasher)
+            ContentUploadManager._write_checksum_state(upload_id, next_offset,
+                                                       hasher.hexdigest())
+
+    def get_upload_checksum(self, upload_id):
+        """
+        Returns the checksum that was accumulated while the segments of the given
+        upload were saved. The checksum is only available if every segment was
+        written in order and it covers the entire uploaded file; otherwise the
+        caller has to calculate it from the file.
+
+        @param upload_id: upload request ID
+        @type  upload_id: str
+
+        @return: tuple of checksum type and checksum value, or None if it is not known
+        @rtype:  tuple or None
+        """
+        state = ContentUploadManager._read_checksum_state(upload_id)
+        if state is None or state['checksum'] is None:
+            return None
+
+        file_path = ContentUploadManager._upload_file_path(upload_id)
+        try:
+            file_size = os.path.getsize(file_path)
+        except OSError:
+            return None
+
+        if state['offset'] != file_size:
+            return None
+
+        return state['checksum_type'], state['checksum']
 
     def delete_upload(self, upload_id):
         """
@@ -98,6 +183,8 @@ class ContentUploadManager(object):
             if e.errno != ENOENT:
                 raise
 
+        ContentUploadManager._discard_checksum_state(upload_id)
+
     def read_upload(self, upload_id):
         """
         Utility method for reading and returning the contents of an upload
@@ -130,7 +217,7 @@ class ContentUploadManager(object):
         @rtype:  list
         """
         upload_dir = ContentUploadManager._upload_storage_dir()
-        upload_ids = os.listdir(upload_dir)
+        upload_ids = [f for f in os.listdir(upload_dir) if not f.endswith(CHECKSUM_STATE_SUFFIX)]
         return upload_ids
 
     @staticmethod
@@ -204,7 +291,8 @@ class ContentUploadManager(object):
             raise MissingResource(repo_id), None, sys.exc_info()[2]
 
         # Assemble the data needed for the import
-        conduit = UploadConduit(repo_id, repo_importer['id'])
+        upload_checksum = ContentUploadManager().get_upload_checksum(upload_id)
+        conduit = UploadConduit(repo_id, repo_importer['id'], upload_checksum=upload_checksum)
 
         call_config = PluginCallConfiguration(plugin_config, repo_importer['config'],
                                               override_config)
@@ -214,8 +302,10 @@ class ContentUploadManager(object):
 
         # Invoke the importer
         try:
-            result = importer_instance.upload_unit(transfer_repo, unit_type_id, unit_key,
-                                                   unit_metadata, file_path, conduit, call_config)
+            with finalizing(conduit):
+                result = importer_instance.upload_unit(transfer_repo, unit_type_id, unit_key,
+                                                       unit_metadata, file_path, conduit,
+                                                       call_config)
             if not result['success_flag']:
                 raise PulpCodedException(
                     error_code=error_codes.PLP0047, repo_id=transfer_repo.id,
@@ -256,6 +346,107 @@ class ContentUploadManager(object):
         path = os.path.join(upload_storage_dir, upload_id)
         return path
 
+    @staticmethod
+    def _checksum_hasher(upload_id, offset):
+        """
+        Returns the hasher to feed with a segment written at the given offset. A segment
+        at offset 0 starts a new checksum. Any other segment continues the checksum only
+        if it directly follows the previous segment and that segment was hashed by this
+        process. Otherwise the checksum can no longer be accumulated for this upload, and
+        its state is discarded so the importer falls back to reading the file.
+
+        :param upload_id: identifies the upload in question
+        :type  upload_id: str
+        :param offset:    offset at which the segment is about to be written
+        :type  offset:    int
+        :return:          hasher to update with the segment, or None if the checksum is
+                          not being accumulated
+        :rtype:           hashlib.HASH or None
+        """
+        state = ContentUploadManager._read_checksum_state(upload_id)
+        if state is None:
+            _checksum_states.pop(upload_id, None)
+            return None
+
+        if offset == 0:
+            return util.CHECKSUM_FUNCTIONS[UPLOAD_CHECKSUM_TYPE]()
+
+        next_offset, hasher = _checksum_states.get(upload_id, (None, None))
+        if next_offset == offset == state['offset']:
+            return hasher
+
+        ContentUploadManager._discard_checksum_state(upload_id)
+        return None
+
+    @staticmethod
+    def _checksum_state_path(upload_id):
+        """
+        Returns the full path to the file recording the checksum progress of the given upload.
+
+        :param upload_id: identifies the upload in question
+        :type  upload_id: str
+        :return:          full path on the server's filesystem
+        :rtype:           str
+        """
+        return ContentUploadManager._upload_file_path(upload_id) + CHECKSUM_STATE_SUFFIX
+
+    @staticmethod
+    def _read_checksum_state(upload_id):
+        """
+        Reads the checksum progress of the given upload.
+
+        :param upload_id: identifies the upload in question
+        :type  upload_id: str
+        :return:          dict with the keys offset, checksum_type and checksum, or None if
+                          the checksum is not being accumulated for the upload
+        :rtype:           dict or None
+        """
+        try:
+            with open(ContentUploadManager._checksum_state_path(upload_id)) as state_file:
+                return json.load(state_file)
+        except IOError as e:
+            if e.errno != ENOENT:
+                raise
+        except ValueError:
+            logger.warning(_('Ignoring corrupt checksum state of upload [%(u)s]') %
+                           {'u': upload_id})
+        return None
+
+    @staticmethod
+    def _write_checksum_state(upload_id, offset, checksum):
+        """
+        Records the checksum progress of the given upload. The state is stored next to
+        the upload so it is available to the worker that imports it.
+
+        :param upload_id: identifies the upload in question
+        :type  upload_id: str
+        :param offset:    number of bytes covered by the checksum
+        :type  offset:    int
+        :param checksum:  hex digest of the first offset bytes of the upload
+        :type  checksum:  str or None
+        """
+        state = {'offset': offset, 'checksum_type': UPLOAD_CHECKSUM_TYPE, 'checksum': checksum}
+        state_path = ContentUploadManager._checksum_state_path(upload_id)
+        tmp_path = state_path + '.tmp'
+        with open(tmp_path, 'w') as state_file:
+            json.dump(state, state_file)
+        os.rename(tmp_path, state_path)
+
+    @staticmethod
+    def _discard_checksum_state(upload_id):
+        """
+        Stops accumulating the checksum of the given upload.
+
+        :param upload_id: identifies the upload in question
+        :type  upload_id: str
+        """
+        _checksum_states.pop(upload_id, None)
+        try:
+            os.remove(ContentUploadManager._checksum_state_path(upload_id))
+        except OSError as e:
+            if e.errno != ENOENT:
+                raise
+
     @staticmethod
     def _upload_storage_dir():
         """
@@ -276,4 +467,40 @@ class ContentUploadManager(object):
         return upload_storage_dir
 
 
+def _preallocate(fd, offset, size):
+    """
+    Makes sure the upload file is large enough to hold a segment before it is written, so
+    the file does not have to grow with every chunk of the segment.
+
+    :param fd:     file descriptor of the upload file
+    :type  fd:     int
+    :param offset: offset at which the segment is written
+    :type  offset: int
+    :param size:   number of bytes in the segment
+    :type  size:   int
+    """
+    end = offset + size
+    if os.fstat(fd).st_size >= end:
+        return
+    fallocate = getattr(os, 'posix_fallocate', None)
+    if fallocate is not None:
+        fallocate(fd, offset, size)
+    else:
+        os.ftruncate(fd, end)
+
+
+def _write_fully(fd, data):
+    """
+    Writes all of the given data to a file descriptor, retrying short writes.
+
+    :param fd:   file descriptor to write to
+    :type  fd:   int
+    :param data: bytes to write
+    :type  data: str
+    """
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
 import_uploaded_unit = task(ContentUploadManager.import_uploaded_unit, base=Task)
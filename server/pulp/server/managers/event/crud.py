@@ -6,12 +6,15 @@ import sys
 from bson.errors import InvalidId
 
 from pulp.server.compat import ObjectId
-from pulp.server.db.model.event import EventListener
+from pulp.server.db.model.event import EventListener, EventListenerVersion
 from pulp.server.event import notifiers
 from pulp.server.event.data import ALL_EVENT_TYPES
 from pulp.server.exceptions import InvalidValue, MissingResource
 
 
+LISTENER_VERSION_ID = 'event_listeners'
+
+
 class EventListenerManager(object):
 
     def create(self, notifier_type_id, notifier_config, event_types):
@@ -57,6 +60,7 @@ class EventListenerManager(object):
         el = EventListener(notifier_type_id, notifier_config, event_types)
         collection = EventListener.get_collection()
         created_id = collection.save(el)
+        listeners_changed()
         created = collection.find_one(created_id)
 
         return created
@@ -103,6 +107,7 @@ class EventListenerManager(object):
         self.get(event_listener_id)  # check for MissingResource
 
         collection.remove({'_id': ObjectId(event_listener_id)})
+        listeners_changed()
 
     def update(self, event_listener_id, notifier_config=None, event_types=None):
         """
@@ -153,6 +158,7 @@ class EventListenerManager(object):
 
         # Update the database
         collection.save(existing)
+        listeners_changed()
 
         # Reload to return
         existing = collection.find_one({'_id': ObjectId(event_listener_id)})
@@ -170,6 +176,26 @@ class EventListenerManager(object):
         return listeners
 
 
+def listeners_version():
+    """
+    @return: the number of changes made to event listeners
+    @rtype:  int
+    """
+    document = EventListenerVersion.get_collection().find_one({'_id': LISTENER_VERSION_ID})
+    if document is None:
+        return 0
+    return document['version']
+
+
+def listeners_changed():
+    """
+    Record a change to event listeners, so listeners cached by any process are reloaded. This
+    must be called after each change to the event listeners collection.
+    """
+    EventListenerVersion.get_collection().update(
+        {'_id': LISTENER_VERSION_ID}, {'$inc': {'version': 1}}, upsert=True)
+
+
 def _validate_event_types(event_types):
     if not isinstance(event_types, (tuple, list)) or len(event_types) == 0:
         raise InvalidValue(['event_types'])
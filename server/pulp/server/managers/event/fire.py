@@ -6,14 +6,57 @@ in a consistent event format for that type.
 """
 
 import logging
+from threading import Lock
 
 from pulp.server.db.model.event import EventListener
-from pulp.server.event import data as e, notifiers
+from pulp.server.event import data as e, delivery
+from pulp.server.managers.event import crud
 
 
 _logger = logging.getLogger(__name__)
 
 
+class ListenerCache(object):
+    """
+    The event listeners, loaded once and used while the listener version they were loaded at is
+    current, so finding the listeners of an event takes a single lookup of the version.
+    """
+
+    def __init__(self):
+        self._version = None
+        self._listeners = []
+        self._lock = Lock()
+
+    def get(self, event_type):
+        """
+        @param event_type: type of the event being fired
+        @type  event_type: str
+
+        @return: listener documents for the event type
+        @rtype:  list of dict
+        """
+        # read the version first, listeners changed while they load are reloaded next time
+        version = crud.listeners_version()
+        with self._lock:
+            if version != self._version:
+                self._listeners = list(EventListener.get_collection().find())
+                self._version = version
+            listeners = self._listeners
+        return [listener for listener in listeners
+                if event_type in listener['event_types'] or '*' in listener['event_types']]
+
+    def clear(self):
+        """
+        Drop the cached listeners.
+        """
+        with self._lock:
+            self._version = None
+            self._listeners = []
+
+
+listener_cache = ListenerCache()
+
+
 class EventFireManager(object):
 
     def fire_repo_sync_started(self, repo_id):
@@ -55,24 +98,12 @@ class EventFireManager(object):
     def _do_fire(self, event):
         """
         Performs the actual act of firing an event to all appropriate
-        listeners. This call will log but otherwise suppress any exception
-        that comes out of a notifier.
+        listeners. The notifiers are invoked from a background thread unless
+        the notification queue is disabled or full. Any exception that comes
+        out of a notifier is logged but otherwise suppressed.
 
         @param event: event object to fire
         @type  event: pulp.server.event.data.Event
         """
-        # Determine which listeners should be notified
-        listeners = list(EventListener.get_collection().find(
-            {'$or': ({'event_types': event.event_type}, {'event_types': '*'})}))
-
-        # For each listener, retrieve the notifier and invoke it. Be sure that
-        # an exception from a notifier is logged but does not interrupt the
-        # remainder of the firing, nor bubble up.
-        for listener in listeners:
-            notifier_type_id = listener['notifier_type_id']
-            f = notifiers.get_notifier_function(notifier_type_id)
-
-            try:
-                f(listener['notifier_config'], event)
-            except Exception:
-                _logger.exception('Exception from notifier of type [%s]' % notifier_type_id)
+        listeners = listener_cache.get(event.event_type)
+        delivery.get_dispatcher().dispatch(listeners, event)
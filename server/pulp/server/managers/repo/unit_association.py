@@ -6,11 +6,16 @@ from gettext import gettext as _
 import logging
 import sys
 
+from bson.objectid import ObjectId
 from celery import task
 import mongoengine
 import pymongo
+from pymongo.errors import BulkWriteError
+
+from pulp.common import dateutils
 
 from pulp.common import error_codes
+from pulp.plugins.conduits.mixins import finalizing
 from pulp.plugins.conduits.unit_import import ImportUnitConduit
 from pulp.plugins.config import PluginCallConfiguration
 from pulp.plugins.loader import api as plugin_api
@@ -37,6 +42,12 @@ SORT_DESCENDING = pymongo.DESCENDING
 
 _VALID_DIRECTIONS = (SORT_ASCENDING, SORT_DESCENDING)
 
+# Number of associations written in a single unordered bulk write
+ASSOCIATE_BATCH_SIZE = 5000
+
+# Error code of a write violating a unique index
+DUPLICATE_KEY_ERROR = 11000
+
 logger = logging.getLogger(__name__)
 
 
@@ -95,6 +106,8 @@ class RepoUnitAssociationManager(object):
         # Create the database entry
         association = RepoContentUnit(repo_id, unit_id, unit_type_id)
         RepoContentUnit.get_collection().save(association)
+        model.OrphanCount.units_associated(unit_type_id, [unit_id])
+        units_controller.add_repo_memberships(repo_id, unit_type_id, [unit_id])
 
         # update the count and times of associated units on the repo object
         if update_repo_metadata and not similar_exists:
@@ -122,21 +135,101 @@ class RepoUnitAssociationManager(object):
         @raise InvalidType: if the given owner type is not of the valid enumeration
         """
 
-        # There may be a way to batch this in mongo which would be ideal for a
-        # bulk operation like this. But for deadline purposes, this call will
-        # simply loop and call the single method.
+        units = ((unit_type_id, unit_id) for unit_id in unit_id_list)
+        return sum(self.associate_units(repo_id, units).values())
 
-        unique_count = 0
-        for unit_id in unit_id_list:
-            if not RepoUnitAssociationManager.association_exists(repo_id, unit_id, unit_type_id):
-                unique_count += 1
-            self.associate_unit_by_id(repo_id, unit_type_id, unit_id, False)
-
-        # update the count of associated units on the repo object
-        if unique_count:
-            repo_controller.update_unit_count(repo_id, unit_type_id, unique_count)
+    @staticmethod
+    def associate_units(repo_id, units, batch_size=ASSOCIATE_BATCH_SIZE, refresh_existing=False):
+        """
+        Creates associations between the given repo and content units in bulk.
+
+        The associations are upserted with unordered bulk writes of batch_size units.
+        Associations that already exist are left alone, like associate_unit_by_id does, unless
+        refresh_existing is True, which refreshes their updated timestamp the way
+        repo_controller.associate_single_unit does. After each batch, the content unit counts
+        of the repo are incremented by the number of associations the batch created, so they
+        stay correct if a later batch fails.
+
+        Both repo and units must exist in the database prior to this call,
+        however this call will not verify that for performance reasons.
+
+        :param repo_id:     identifies the repo
+        :type  repo_id:     str
+        :param units:       iterable of (unit_type_id, unit_id) tuples
+        :type  units:       iterable
+        :param batch_size:  number of associations written at a time
+        :type  batch_size:  int
+        :param refresh_existing: whether to refresh the updated timestamp of associations
+                                 that already exist
+        :type  refresh_existing: bool
+
+        :return:    number of new associations by unit type id
+        :rtype:     dict
+        """
+        added = {}
+        batch = []
+        for unit in units:
+            batch.append(unit)
+            if len(batch) >= batch_size:
+                RepoUnitAssociationManager._associate_batch(repo_id, batch, added,
+                                                            refresh_existing)
+                batch = []
+        if batch:
+            RepoUnitAssociationManager._associate_batch(repo_id, batch, added, refresh_existing)
+        if added:
             repo_controller.update_last_unit_added(repo_id)
-        return unique_count
+        return added
+
+    @staticmethod
+    def _associate_batch(repo_id, batch, added, refresh_existing=False):
+        """
+        Upsert a batch of associations and increment the content unit counts of the repo.
+
+        :param repo_id: identifies the repo
+        :type  repo_id: str
+        :param batch:   list of (unit_type_id, unit_id) tuples
+        :type  batch:   list
+        :param added:   number of new associations by unit type id, updated with the batch
+        :type  added:   dict
+        :param refresh_existing: whether to refresh the updated timestamp of associations
+                                 that already exist
+        :type  refresh_existing: bool
+        """
+        now = dateutils.format_iso8601_utc_timestamp(dateutils.now_utc_timestamp())
+        requests = []
+        for unit_type_id, unit_id in batch:
+            # the fields RepoContentUnit and RepositoryContentUnit give a new association
+            _id = ObjectId()
+            inserted = {'_id': _id, 'id': str(_id), '_ns': RepoContentUnit.collection_name,
+                        'created': now}
+            if refresh_existing:
+                update = {'$setOnInsert': inserted, '$set': {'updated': now}}
+            else:
+                inserted['updated'] = now
+                update = {'$setOnInsert': inserted}
+            requests.append(pymongo.UpdateOne({'repo_id': repo_id,
+                                               'unit_type_id': unit_type_id,
+                                               'unit_id': unit_id},
+                                              update, upsert=True))
+        try:
+            result = RepoContentUnit.get_collection().bulk_write(requests, ordered=False)
+            upserted = result.upserted_ids.keys()
+        except BulkWriteError, e:
+            # An association created concurrently makes its upsert fail on the unique index;
+            # it exists and was counted by whoever created it.
+            if any(error['code'] != DUPLICATE_KEY_ERROR for error in e.details['writeErrors']):
+                raise
+            upserted = [item['index'] for item in e.details['upserted']]
+
+        batch_added = {}
+        for index in upserted:
+            unit_type_id, unit_id = batch[index]
+            batch_added.setdefault(unit_type_id, []).append(unit_id)
+        for unit_type_id, unit_ids in batch_added.items():
+            repo_controller.update_unit_count(repo_id, unit_type_id, len(unit_ids))
+            model.OrphanCount.units_associated(unit_type_id, unit_ids)
+            units_controller.add_repo_memberships(repo_id, unit_type_id, unit_ids)
+            added[unit_type_id] = added.get(unit_type_id, 0) + len(unit_ids)
 
     @staticmethod
     def _units_from_criteria(source_repo, criteria):
@@ -268,19 +361,19 @@ class RepoUnitAssociationManager(object):
             dest_repo_importer.importer_type_id)
 
         try:
-            copied_units = importer_instance.import_units(
-                transfer_source_repo, transfer_dest_repo, conduit, call_config,
-                units=transfer_units)
+            with finalizing(conduit):
+                copied_units = importer_instance.import_units(
+                    transfer_source_repo, transfer_dest_repo, conduit, call_config,
+                    units=transfer_units)
+            # the content unit counts were updated as the units were associated
             if isinstance(copied_units, tuple):
                 suc_units_ids = [u.to_id_dict() for u in copied_units[0] if u is not None]
                 unsuc_units_ids = [u.to_id_dict() for u in copied_units[1]]
-                repo_controller.rebuild_content_unit_counts(dest_repo)
                 if suc_units_ids:
                     repo_controller.update_last_unit_added(dest_repo.repo_id)
                 return {'units_successful': suc_units_ids,
                         'units_failed_signature_filter': unsuc_units_ids}
             unit_ids = [u.to_id_dict() for u in copied_units if u is not None]
-            repo_controller.rebuild_content_unit_counts(dest_repo)
             if unit_ids:
                 repo_controller.update_last_unit_added(dest_repo.repo_id)
             return {'units_successful': unit_ids}
@@ -390,6 +483,8 @@ class RepoUnitAssociationManager(object):
                 'unit_id': {'$in': unit_ids}
             }
             collection.remove(spec)
+            model.OrphanCount.units_unassociated(unit_type_id, unit_ids)
+            units_controller.remove_repo_memberships(repo_id, unit_type_id, unit_ids)
 
         repo_controller.update_last_unit_removed(repo_id)
         repo_controller.rebuild_content_unit_counts(repo)
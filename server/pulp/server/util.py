@@ -3,6 +3,8 @@ This module contains utility code to be used by pulp.server.
 """
 from contextlib import contextmanager
 from gettext import gettext as _
+import errno
+import fcntl
 import hashlib
 import inspect
 import logging
@@ -26,6 +28,19 @@ def md5(*args, **kwargs):
         return hashlib.md5(*args, **kwargs)
 
 
+# ioctl request cloning the data of one file into another (copy on write), from linux/fs.h
+FICLONE = 0x40049409
+
+# errno values of a clone that is not possible for the file system or the pair of files
+CLONE_UNSUPPORTED = (errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.ENOSYS,
+                     errno.EBADF, errno.EPERM)
+
+# Modification times set by os.utime() are only precise to the microsecond
+MTIME_PRECISION = 0.000001
+
+# Number of bytes compared at a time when updating a clone of a changed file
+CLONE_CHUNK_SIZE = 1024 * 1024
+
 # Number of bytes to read into RAM at a time when validating the checksum
 CHECKSUM_CHUNK_SIZE = 8 * 1024 * 1024
 
@@ -287,6 +302,135 @@ def copytree(src, dst, symlinks=False, ignore=None):
         raise Error(errors)
 
 
+def reflink(src, dst):
+    """
+    Create dst as a copy on write clone of src. Cloning is supported by file systems such as
+    btrfs and XFS, when both files are on the same file system.
+
+    :param src: path to the file to clone
+    :type  src: basestring
+    :param dst: path to the new file; an existing file is truncated
+    :type  dst: basestring
+    :return: True if the file was cloned, False if cloning is not supported. dst may have been
+             created empty in that case.
+    :rtype:  bool
+    """
+    with open(src, 'rb') as src_file:
+        with open(dst, 'wb') as dst_file:
+            try:
+                fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+                return True
+            except IOError as e:
+                if e.errno in CLONE_UNSUPPORTED:
+                    return False
+                raise
+
+
+def clone_tree(src, dst, reference=None):
+    """
+    Copies src tree to dst, sharing data with existing files where possible.
+
+    Symlinks are copied as symlinks and directories are created. Each regular file is, in order
+    of preference:
+
+    - hard linked to the file with the same relative path in the reference tree, when that file
+      has the same size and modification time, to the microsecond (it is assumed to be
+      unchanged);
+    - cloned from the file with the same relative path in the reference tree using reflink(),
+      when the file system supports it, and then updated where its content differs from src;
+    - copied.
+
+    src is usually on another file system, so files are never cloned from it. The modification
+    and access times of files are preserved so a later clone that uses dst as its reference can
+    hard link them. SELinux labels are not copied, the same as copytree().
+
+    :param src: Source directory rooted at src
+    :type  src: basestring
+    :param dst: Destination directory, a new directory and any parent directories are created if
+                any are missing
+    :type  dst: basestring
+    :param reference: a tree on the same file system as dst, usually a previous copy of src
+    :type  reference: basestring or None
+    :return: the number of bytes written; data shared by hard links or clones is not counted
+    :rtype:  int
+    """
+    state = {'reflink': True}
+    return _clone_tree(src, dst, reference, state)
+
+
+def _clone_tree(src, dst, reference, state):
+    """
+    Recursive implementation of clone_tree().
+
+    :param state: 'reflink' is cleared once cloning turns out not to be supported so it is
+                  not tried for every file
+    :type  state: dict
+    """
+    if not os.path.exists(dst):
+        os.makedirs(dst)
+    copied = 0
+    for name in os.listdir(src):
+        srcname = os.path.join(src, name)
+        dstname = os.path.join(dst, name)
+        refname = os.path.join(reference, name) if reference else None
+        if os.path.islink(srcname):
+            os.symlink(os.readlink(srcname), dstname)
+            continue
+        if os.path.isdir(srcname):
+            copied += _clone_tree(srcname, dstname, refname, state)
+            continue
+        st = os.stat(srcname)
+        written = None
+        if refname is not None and os.path.isfile(refname) and not os.path.islink(refname):
+            ref_st = os.stat(refname)
+            if ref_st.st_size == st.st_size and \
+                    abs(ref_st.st_mtime - st.st_mtime) < MTIME_PRECISION:
+                os.link(refname, dstname)
+                continue
+            if state['reflink']:
+                written = _clone_changed_file(srcname, refname, dstname)
+                if written is None:
+                    state['reflink'] = False
+        if written is None:
+            copy(srcname, dstname)
+            written = st.st_size
+        copied += written
+        os.utime(dstname, (st.st_atime, st.st_mtime))
+    return copied
+
+
+def _clone_changed_file(src, reference, dst):
+    """
+    Create dst as a clone of reference, a previous version of src on the file system of dst, and
+    overwrite the chunks that differ from src. Unchanged chunks keep sharing their data with
+    reference.
+
+    :param src: path to the file with the new content
+    :type  src: basestring
+    :param reference: path to the previous version of the file
+    :type  reference: basestring
+    :param dst: path to the new file
+    :type  dst: basestring
+    :return: the number of bytes written, None if cloning is not supported
+    :rtype:  int or None
+    """
+    if not reflink(reference, dst):
+        return None
+    written = 0
+    offset = 0
+    with open(src, 'rb') as src_file:
+        with open(dst, 'r+b') as dst_file:
+            for chunk in iter(lambda: src_file.read(CLONE_CHUNK_SIZE), ''):
+                if dst_file.read(len(chunk)) != chunk:
+                    dst_file.seek(offset)
+                    dst_file.write(chunk)
+                    written += len(chunk)
+                offset += len(chunk)
+                dst_file.seek(offset)
+            dst_file.truncate(offset)
+    return written
+
+
 @contextmanager
 def deleting(path):
     """
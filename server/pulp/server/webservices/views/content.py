@@ -1,4 +1,5 @@
 from gettext import gettext as _
+import itertools
 
 from django.core.urlresolvers import reverse
 from django.http import HttpResponseNotFound, HttpResponseBadRequest
@@ -24,9 +25,15 @@ from pulp.server.webservices.views.serializers import content as serial_content
 from pulp.server.webservices.views.util import (generate_json_response,
                                                 generate_json_response_with_pulp_encoder,
                                                 generate_redirect_response,
+                                                generate_streaming_json_response,
+                                                json_array_chunks,
                                                 parse_json_body)
 
 
+# Maximum number of orphans in a page of an orphan listing
+MAX_ORPHAN_PAGE_SIZE = 10000
+
+
 def _process_content_unit(content_unit, content_type):
     """
     Adds an href to the content unit and hrefs for its children.
@@ -71,7 +78,8 @@ class OrphanCollectionView(View):
         rest_summary = {}
         for key, value in orphan_manager.orphans_summary().items():
             rest_summary[key] = {
-                'count': value,
+                'count': value['count'],
+                'stale': value['stale'],
                 '_href': reverse('content_orphan_type_subcollection', kwargs={'content_type': key})
             }
         return generate_json_response(rest_summary)
@@ -99,24 +107,70 @@ class OrphanTypeSubCollectionView(View):
     @auth_required(authorization.READ)
     def get(self, request, content_type):
         """
-        Returns a response containing a serialized list of all orphans of the specified type.
+        Returns a response streaming a serialized list of all orphans of the specified type.
+
+        When either 'limit' or 'cursor' is passed, a single page of orphans ordered by id is
+        returned as a dict with the keys 'results' and 'next_cursor'. Passing 'next_cursor' back
+        as 'cursor' returns the next page; it is None on the last page.
 
         :param request: WSGI request object
         :type  request: django.core.handlers.wsgi.WSGIRequest
         :param content_type: restrict the list of orphans to this content type
         :type  content_type: str
 
-        :return: response containing a serialized list of all orphans of specified type.
-        :rtype : django.http.HttpResponse
+        :return: response containing a serialized list of all orphans of specified type, or a page
+        :rtype : django.http.StreamingHttpResponse or django.http.HttpResponse
+        :raises InvalidValue: if the limit or the cursor is not valid
+        :raises MissingResource: when the content type does not exist
+        """
+        try:
+            # this tests if the type exists before the response starts streaming
+            units_controller.get_unit_key_fields_for_type(content_type)
+        except ValueError:
+            raise MissingResource(content_type_id=content_type)
+
+        limit = request.GET.get('limit')
+        cursor = request.GET.get('cursor')
+        if limit is None and cursor is None:
+            orphans = self._generate_orphans(content_type)
+            return generate_streaming_json_response(json_array_chunks(orphans))
+
+        page_size = search.CURSOR_PAGE_SIZE
+        if limit is not None:
+            try:
+                page_size = int(limit)
+            except ValueError:
+                raise InvalidValue(['limit'])
+            if page_size < 1 or page_size > MAX_ORPHAN_PAGE_SIZE:
+                raise InvalidValue(['limit'])
+        after = search.decode_cursor(cursor)
+        page = list(itertools.islice(self._generate_orphans(content_type, after), page_size))
+        next_cursor = None
+        if len(page) == page_size:
+            next_cursor = search.encode_cursor(page[-1]['_id'])
+        return generate_json_response({'results': page, 'next_cursor': next_cursor})
+
+    @staticmethod
+    def _generate_orphans(content_type, after=None):
+        """
+        Generate the orphans of a content type with their unit keys and links.
+
+        :param content_type: content type of the orphans
+        :type  content_type: str
+        :param after: only generate the orphans whose id sorts after this one
+        :type  after: basestring or None
+
+        :return: generator of orphaned units
+        :rtype:  generator
         """
         orphan_manager = factory.content_orphan_manager()
-        matched_orphans = list(orphan_manager.generate_orphans_by_type_with_unit_keys(content_type))
-        for orphan_dict in matched_orphans:
+        for orphan_dict in orphan_manager.generate_orphans_by_type_with_unit_keys(content_type,
+                                                                                  after):
             orphan_dict['_href'] = reverse(
                 'content_orphan_resource',
                 kwargs={'content_type': content_type, 'unit_id': orphan_dict['_id']}
             )
-        return generate_json_response(matched_orphans)
+            yield orphan_dict
 
     @auth_required(authorization.DELETE)
     def delete(self, request, content_type):
@@ -242,15 +296,52 @@ class CatalogResourceView(View):
 class ContentUnitSearch(search.SearchView):
     """
     Adds GET and POST searching for content units.
+
+    Searches including repositories are streamed in pages unless they are sorted, so the
+    repositories of the units are looked up one page at a time.
     """
     optional_bool_fields = ('include_repos',)
     manager = content_query.ContentQueryManager()
 
+    @classmethod
+    def _generate_response(cls, query, options, *args, **kwargs):
+        """
+        Overrides the base class to stream the searches including repositories.
+        """
+        if options.get('include_repos') is True and not query.get('sort') and \
+                search.STREAM not in options and options.get(search.CURSOR) is None:
+            options[search.STREAM] = True
+        return super(ContentUnitSearch, cls)._generate_response(query, options, *args, **kwargs)
+
     @staticmethod
-    def _add_repo_memberships(units, type_id):
+    def _find_repo_memberships(unit_ids, type_id):
+        """
+        Find what repos each of a list of units is a member of.
+
+        :param unit_ids: ids of the units
+        :type  unit_ids: list of str
+        :param type_id: content type id
+        :type  type_id: str
+        :return: set of repo_ids, indexed by unit id
+        :rtype:  dict
+        """
+        criteria = Criteria(
+            filters={'unit_id': {'$in': unit_ids}, 'unit_type_id': type_id},
+            fields=('repo_id', 'unit_id')
+        )
+        associations = factory.repo_unit_association_query_manager().find_by_criteria(criteria)
+        association_map = {}
+        for association in associations:
+            association_map.setdefault(association['unit_id'], set()).add(
+                association['repo_id'])
+        return association_map
+
+    @classmethod
+    def _add_repo_memberships(cls, units, type_id):
         """
         For a list of units, find what repos each is a member of and add a list
-        of repo_ids to each unit.
+        of repo_ids to each unit. The memberships cached by the units are used when
+        the cache is enabled.
 
         :param units:   list of unit documents
         :type  units:   list of dicts
@@ -263,21 +354,19 @@ class ContentUnitSearch(search.SearchView):
         if not units:
             return units
 
-        unit_ids = [unit['_id'] for unit in units]
-        criteria = Criteria(
-            filters={'unit_id': {'$in': unit_ids}, 'unit_type_id': type_id},
-            fields=('repo_id', 'unit_id')
-        )
-        associations = factory.repo_unit_association_query_manager().find_by_criteria(criteria)
-        unit_ids = None
-        criteria = None
+        cached = units_controller.repo_membership_cache_enabled()
+        field = units_controller.REPO_MEMBERSHIPS_FIELD
+        unit_ids = [unit['_id'] for unit in units if not cached or unit.get(field) is None]
         association_map = {}
-        for association in associations:
-            association_map.setdefault(association['unit_id'], set()).add(
-                association['repo_id'])
+        if unit_ids:
+            association_map = units_controller.cache_repo_memberships(
+                type_id, unit_ids, lambda ids: cls._find_repo_memberships(ids, type_id))
 
         for unit in units:
-            unit['repository_memberships'] = list(association_map.get(unit['_id'], []))
+            memberships = unit.get(field) if cached else None
+            if memberships is None:
+                memberships = association_map.get(unit['_id'], [])
+            unit['repository_memberships'] = list(memberships)
         return units
 
     @classmethod
@@ -287,14 +376,20 @@ class ContentUnitSearch(search.SearchView):
         """
 
         type_id = kwargs['type_id']
+        include_repos = options.get('include_repos') is True
         serializer = units_controller.get_model_serializer_for_type(type_id)
         if serializer and query.get('filters') is not None:
             # if we have a model serializer, translate the filter for this content unit type
             query['filters'] = serializer.translate_filters(serializer.model, query['filters'])
+        if include_repos and query.get('fields') and \
+                units_controller.repo_membership_cache_enabled():
+            query['fields'] = list(query['fields']) + [units_controller.REPO_MEMBERSHIPS_FIELD]
         units = list(search_method(type_id, query))
         units = [_process_content_unit(unit, type_id) for unit in units]
-        if options.get('include_repos') is True:
+        if include_repos:
             cls._add_repo_memberships(units, type_id)
+        for unit in units:
+            unit.pop(units_controller.REPO_MEMBERSHIPS_FIELD, None)
         return units
 
 
@@ -475,11 +570,18 @@ class UploadSegmentResourceView(View):
         except ValueError:
             raise InvalidValue(['offset'])
 
+        try:
+            size = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            size = 0
+
         upload_manager = factory.content_upload_manager()
 
         # If the upload ID doesn't exists, either because it was not initialized
-        # or was deleted, the call to the manager will raise missing resource
-        upload_manager.save_data(upload_id, offset, request.body)
+        # or was deleted, the call to the manager will raise missing resource.
+        # The request is passed as a stream so the body is written to the upload
+        # file as it is read rather than being loaded into memory first.
+        upload_manager.save_data(upload_id, offset, request, size=size)
         return generate_json_response(None)
 
 
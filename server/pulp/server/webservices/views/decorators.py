@@ -167,6 +167,7 @@ def _verify_auth(self, operation, super_user_only, method, *args, **kwargs):
     principal_manager = factory.principal_manager()
 
     # Consumers are not part of the User collection
+    user = None
     if not is_consumer:
         user = model.User.objects.get(login=login)
         if super_user_only and not user.is_superuser():
@@ -183,8 +184,7 @@ def _verify_auth(self, operation, super_user_only, method, *args, **kwargs):
                 raise PulpCodedAuthenticationException(error_code=error_codes.PLP0026,
                                                        user=login,
                                                        operation=OPERATION_NAMES[operation])
-        elif user_controller.is_authorized(http.resource_path(), login, operation):
-            user = model.User.objects.get(login=login)
+        elif user_controller.is_authorized(http.resource_path(), login, operation, user=user):
             principal_manager.set_principal(user)
         else:
             raise PulpCodedAuthenticationException(error_code=error_codes.PLP0026,
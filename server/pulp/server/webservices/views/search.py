@@ -2,9 +2,13 @@
 This module contains the SearchView superclass. Your view code should subclass this to create a
 search view for a specific model.
 """
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+import copy
 import json
 
+from bson.objectid import ObjectId
 from django.views import generic
+from pymongo import ASCENDING
 from pymongo.errors import OperationFailure
 
 from pulp.server import exceptions
@@ -14,6 +18,17 @@ from pulp.server.webservices.views import util
 from pulp.server.webservices.views.decorators import auth_required
 
 
+# Options supported by all search views.
+STREAM = 'stream'
+CURSOR = 'cursor'
+
+# The number of results fetched by each query when results are streamed.
+STREAM_PAGE_SIZE = 1000
+
+# The number of results in a cursor page when the criteria has no limit.
+CURSOR_PAGE_SIZE = 1000
+
+
 class SearchView(generic.View):
     """
     This class is meant to be subclassed by views that need to provide search functionality on a
@@ -46,6 +61,17 @@ class SearchView(generic.View):
                                model instance, sane serializers are used by default, and this
                                method should not be defined.
     :vartype serializer:       staticmethod
+
+    Two options are supported by all search views in addition to those defined by subclasses:
+
+    stream: When true, the results are fetched in pages ordered by id and streamed to the client
+            as they are serialized so the whole result set is never held in memory.
+    cursor: Requests keyset pagination. The results are ordered by id and returned as
+            {"results": [...], "next_cursor": <token>}. The opaque token is passed as the cursor
+            to get the next page; it is null on the last page. An empty cursor requests the first
+            page and the criteria limit is used as the page size.
+
+    Neither option supports sorting on other fields.
     """
 
     response_builder = staticmethod(util.generate_json_response_with_pulp_encoder)
@@ -64,14 +90,14 @@ class SearchView(generic.View):
         :rtype:  tuple containing a 2 dicts
         """
         options = {}
-        for field in filter(args.__contains__, cls.optional_bool_fields):
+        for field in filter(args.__contains__, cls.optional_bool_fields + (STREAM,)):
             value = args.pop(field)
             if isinstance(value, basestring):
                 options[field] = value.lower() == 'true'
             else:
                 options[field] = value
 
-        for field in filter(args.__contains__, cls.optional_string_fields):
+        for field in filter(args.__contains__, cls.optional_string_fields + (CURSOR,)):
             options[field] = args.pop(field)
 
         return args, options
@@ -191,6 +217,9 @@ class SearchView(generic.View):
         # We do not validate all aspects of the criteria object, so if pymongo has a problem we
         # raise an InvalidValue.
         try:
+            if options.get(STREAM) or options.get(CURSOR) is not None:
+                return cls._generate_paged_response(query, search_method, options,
+                                                    *args, **kwargs)
             return cls.response_builder(cls.get_results(query, search_method, options,
                                                         *args, **kwargs))
         except OperationFailure, e:
@@ -198,6 +227,61 @@ class SearchView(generic.View):
             invalid.add_child_exception(e)
             raise invalid
 
+    @classmethod
+    def _generate_paged_response(cls, query, search_method, options, *args, **kwargs):
+        """
+        Perform the database query in pages ordered by id and return the results as either
+        a streamed JSON response or a single cursor page.
+
+        The first page is fetched before the response is created so that errors in the criteria
+        are still reported to the client as errors.
+
+        :param query: The criteria that should be used to search for objects
+        :type  query: pulp.server.db.model.criteria.Criteria
+        :param search_method: function that should be used to search
+        :type  search_method: func
+        :param options: Extra options that individual views can use to optionally modify the data.
+        :type  options: dict
+        :return: The serialized search results
+        :rtype:  django.http.HttpResponse or django.http.StreamingHttpResponse
+
+        :raises exceptions.InvalidValue: if the cursor is not valid or a sort is requested
+        """
+        if query.sort:
+            raise exceptions.InvalidValue('sort')
+        is_model = hasattr(cls, 'model')
+        cursor = options.get(CURSOR)
+        if cursor is not None:
+            after = decode_cursor(cursor)
+            total = page_size = query.limit or CURSOR_PAGE_SIZE
+        else:
+            after = None
+            total = query.limit
+            page_size = STREAM_PAGE_SIZE
+        if after is not None:
+            # the skip only applies to the first page
+            query.skip = None
+
+        pages = _Pages(cls, query, search_method, options, is_model, after, total, page_size,
+                       args, kwargs)
+        first = pages.next()
+
+        def results():
+            for result in first:
+                yield result
+            for page in pages:
+                for result in page:
+                    yield result
+
+        if not options.get(STREAM):
+            page = list(results())
+            return cls.response_builder({'results': page, 'next_cursor': pages.next_cursor()})
+
+        chunks = util.json_array_chunks(results(), default=util.pulp_json_encoder)
+        if cursor is not None:
+            chunks = _cursor_envelope(chunks, pages)
+        return util.generate_streaming_json_response(chunks)
+
     @classmethod
     def get_results(cls, query, search_method, options, *args, **kwargs):
         """
@@ -230,3 +314,172 @@ def _trim_results(model, results, only):
         for k, v in result.items():
             if k not in return_fields:
                 result.pop(k)
+
+
+def encode_cursor(last_id):
+    """
+    Encode the id of the last result in a page as an opaque cursor.
+
+    :param last_id: the _id of the last result
+    :type  last_id: bson.objectid.ObjectId or basestring
+    :return: the cursor
+    :rtype:  str
+    """
+    if isinstance(last_id, ObjectId):
+        document = {'oid': str(last_id)}
+    else:
+        document = {'id': last_id}
+    return urlsafe_b64encode(json.dumps(document))
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor created using encode_cursor().
+
+    :param cursor: the cursor; empty for the first page
+    :type  cursor: basestring
+    :return: the _id of the last result of the previous page or None for the first page
+    :rtype:  bson.objectid.ObjectId or basestring or None
+    :raises exceptions.InvalidValue: if the cursor is not valid
+    """
+    if not cursor:
+        return None
+    try:
+        document = json.loads(urlsafe_b64decode(str(cursor)))
+        if 'oid' in document:
+            return ObjectId(document['oid'])
+        return document['id']
+    except Exception:
+        raise exceptions.InvalidValue(CURSOR)
+
+
+def _cursor_envelope(chunks, pages):
+    """
+    Wrap streamed JSON array chunks in a cursor page document.
+    The next cursor is known only once all of the results have been streamed.
+    """
+    yield '{"results": '
+    for chunk in chunks:
+        yield chunk
+    yield ', "next_cursor": %s}' % json.dumps(pages.next_cursor())
+
+
+class _Pages(object):
+    """
+    Iterates the pages of a search ordered by _id using keyset pagination.
+
+    Each page is fetched by calling the view's get_results() with a copy of the criteria and a
+    search method that restricts the query to results having an _id greater than the last _id
+    of the previous page. Any processing done by the view in get_results() is done one page at
+    a time.
+    """
+
+    def __init__(self, view, query, search_method, options, is_model, after, total, page_size,
+                 args, kwargs):
+        self.view = view
+        self.query = query
+        self.search_method = search_method
+        self.options = options
+        self.is_model = is_model
+        self.after = after
+        self.remaining = total
+        self.page_size = page_size
+        self.args = args
+        self.kwargs = kwargs
+        self.done = False
+        self.full = False
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        """
+        Fetch and process the next page.
+
+        :return: the processed results of the page
+        :rtype:  list
+        """
+        if self.done:
+            raise StopIteration()
+        limit = self.page_size
+        if self.remaining is not None:
+            limit = min(limit, self.remaining)
+        page_query = criteria.Criteria.from_dict(copy.deepcopy(self.query.as_dict()))
+        page_query.limit = limit
+        self.query.skip = None
+        keyset = _KeysetSearch(self.search_method, self.after, limit, self.is_model)
+        results = self.view.get_results(page_query, keyset, self.options,
+                                        *self.args, **self.kwargs)
+        self.full = keyset.count == limit
+        if keyset.last_id is not None:
+            self.after = keyset.last_id
+        if self.remaining is not None:
+            self.remaining -= keyset.count
+        if not self.full or self.remaining == 0:
+            self.done = True
+        return results
+
+    def next_cursor(self):
+        """
+        :return: the cursor for the page following the last page fetched, or None
+                 if there are no more results.
+        :rtype:  str or None
+        """
+        if not self.full or self.after is None:
+            return None
+        return encode_cursor(self.after)
+
+
+class _KeysetSearch(object):
+    """
+    Wraps a view search method to fetch a single page of results ordered by _id.
+
+    :ivar last_id: the _id of the last result fetched
+    :ivar count: the number of results fetched
+    """
+
+    def __init__(self, search_method, after, limit, is_model):
+        """
+        :param search_method: the view search method
+        :type  search_method: func
+        :param after: only results with an _id greater than this are fetched. None for all.
+        :param limit: the maximum number of results
+        :type  limit: int
+        :param is_model: the search method returns a mongoengine QuerySet rather than a cursor
+        :type  is_model: bool
+        """
+        self.search_method = search_method
+        self.after = after
+        self.limit = limit
+        self.is_model = is_model
+        self.last_id = None
+        self.count = 0
+
+    def __call__(self, *args):
+        """
+        Run the search.  The criteria is the last positional argument.
+        The _id restriction is applied to the mongoengine QuerySet so that it is not subject to
+        the translation of field names done by model serializers.
+
+        :return: the results
+        :rtype:  list
+        """
+        if self.is_model:
+            results = self.search_method(*args)
+            if self.after is not None:
+                results = results.filter(__raw__={'_id': {'$gt': self.after}})
+            results = results.order_by('+id').limit(self.limit)
+        else:
+            query = args[-1]
+            if self.after is not None:
+                keyset = {'_id': {'$gt': self.after}}
+                query.filters = {'$and': [query.filters, keyset]} if query.filters else keyset
+            query.sort = [('_id', ASCENDING)]
+            query.limit = self.limit
+            results = self.search_method(*args)
+        results = list(results)
+        self.count = len(results)
+        if results:
+            last = results[-1]
+            self.last_id = last['_id'] if isinstance(last, dict) else last.pk
+        return results
@@ -7,8 +7,10 @@ from django.views.generic import View
 from django.http import HttpResponse
 from mongoengine.queryset import DoesNotExist
 
-from pulp.common import error_codes
-from pulp.common.constants import CALL_CANCELED_STATE, CALL_COMPLETE_STATES
+from isodate import ISO8601Error
+
+from pulp.common import dateutils, error_codes
+from pulp.common.constants import CALL_CANCELED_STATE, CALL_COMPLETE_STATES, CALL_STATES
 from pulp.server import exceptions as pulp_exceptions
 from pulp.server.async import tasks
 from pulp.server.auth import authorization
@@ -24,6 +26,21 @@ from pulp.server.webservices.views.util import (generate_json_response,
 # This constant set is used for deleting the completed tasks from the collection.
 VALID_STATES = set(filter(lambda state: state != CALL_CANCELED_STATE, CALL_COMPLETE_STATES))
 
+# Task fields that can be large and are only included in a task listing when asked for.
+DETAIL_FIELDS = ('progress_report', 'result', 'metrics')
+
+# Time range filters for the task listing as: (query parameter, queryset lookup).
+TIME_FILTERS = (
+    ('started_after', 'start_time__gte'),
+    ('started_before', 'start_time__lt'),
+    ('finished_after', 'finish_time__gte'),
+    ('finished_before', 'finish_time__lt'),
+)
+
+# The page size used when a cursor is passed without a limit, and the largest page allowed.
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
 
 def task_serializer(task):
     """
@@ -57,22 +74,51 @@ class TaskCollectionView(View):
     @auth_required(authorization.READ)
     def get(self, request):
         """
-        Return a response containing a list of all tasks or a response containing
-        a list of tasks filtered by the optional GET parameter 'tags'.
+        Return a response containing a list of tasks that are not part of a task group.
+
+        The tasks can be filtered by the optional GET parameters 'tag', 'state', 'started_after',
+        'started_before', 'finished_after' and 'finished_before'. The potentially large
+        'progress_report', 'result' and 'metrics' fields are only included when the GET
+        parameter of the same name, or 'details', is true.
+
+        When either 'limit' or 'cursor' is passed, a single page of tasks ordered by id is
+        returned as a dict with the keys 'results' and 'next_cursor'. Passing 'next_cursor' back
+        as 'cursor' returns the next page; it is None on the last page.
 
         :param request: WSGI request object
         :type  request: django.core.handlers.wsgi.WSGIRequest
 
-        :return: Response containing a serialized list of dicts, one for each task
+        :return: Response containing a serialized list of dicts, one for each task, or a page
         :rtype:  django.http.HttpResponse
+        :raises pulp_exceptions.InvalidValue: if a filter, the limit or the cursor is not valid
         """
-        tags = request.GET.getlist('tag')
-        if tags:
-            raw_tasks = TaskStatus.objects(tags__all=tags, group_id=None)
-        else:
-            raw_tasks = TaskStatus.objects(group_id=None)
-        serialized_task_statuses = [task_serializer(task) for task in raw_tasks]
-        return generate_json_response_with_pulp_encoder(serialized_task_statuses)
+        details = request.GET.get('details', 'false').lower() == 'true'
+        excluded = [field for field in DETAIL_FIELDS
+                    if not details and request.GET.get(field, 'false').lower() != 'true']
+
+        raw_tasks = TaskStatus.objects(**_task_filters(request))
+        if excluded:
+            raw_tasks = raw_tasks.exclude(*excluded)
+
+        limit = request.GET.get('limit')
+        cursor = request.GET.get('cursor')
+        if limit is None and cursor is None:
+            serialized_task_statuses = [_list_serializer(task, excluded) for task in raw_tasks]
+            return generate_json_response_with_pulp_encoder(serialized_task_statuses)
+
+        page_size = _page_size(limit)
+        last_id = search.decode_cursor(cursor)
+        if last_id is not None:
+            raw_tasks = raw_tasks.filter(id__gt=last_id)
+        page = list(raw_tasks.order_by('+id').limit(page_size))
+        next_cursor = None
+        if len(page) == page_size:
+            next_cursor = search.encode_cursor(page[-1].id)
+        serialized_page = {
+            'results': [_list_serializer(task, excluded) for task in page],
+            'next_cursor': next_cursor,
+        }
+        return generate_json_response_with_pulp_encoder(serialized_page)
 
     @auth_required(authorization.DELETE)
     def delete(self, request):
@@ -94,12 +140,101 @@ class TaskCollectionView(View):
                 raise pulp_exceptions.PulpCodedValidationException(
                     error_code=error_codes.PLP1011, state=state)
 
-        for state in task_state:
-                TaskStatus.objects(state=state).delete()
+        TaskStatus.objects(state__in=task_state).delete()
 
         return HttpResponse(status=204)
 
 
+def _task_filters(request):
+    """
+    Build the queryset filters for the task listing from the GET parameters.
+
+    :param request: WSGI request object
+    :type  request: django.core.handlers.wsgi.WSGIRequest
+
+    :return: keyword arguments for TaskStatus.objects()
+    :rtype:  dict
+    :raises pulp_exceptions.InvalidValue: if a state or a time is not valid
+    """
+    filters = {'group_id': None}
+    tags = request.GET.getlist('tag')
+    if tags:
+        filters['tags__all'] = tags
+    states = request.GET.getlist('state')
+    if states:
+        invalid = [state for state in states if state not in CALL_STATES]
+        if invalid:
+            raise pulp_exceptions.InvalidValue(['state'])
+        filters['state__in'] = states
+    for parameter, lookup in TIME_FILTERS:
+        value = request.GET.get(parameter)
+        if value:
+            filters[lookup] = _normalize_time(parameter, value)
+    return filters
+
+
+def _normalize_time(parameter, value):
+    """
+    Convert an ISO8601 date or time to the UTC representation stored on TaskStatus so it
+    can be compared to the stored start and finish times.
+
+    :param parameter: name of the GET parameter, used for error reporting
+    :type  parameter: basestring
+    :param value: ISO8601 date or time; a time without a timezone is assumed to be UTC
+    :type  value: basestring
+
+    :return: ISO8601 representation of the time in UTC
+    :rtype:  basestring
+    :raises pulp_exceptions.InvalidValue: if the value is not a valid ISO8601 date or time
+    """
+    try:
+        parsed = dateutils.parse_iso8601_datetime_or_date(value)
+    except (ISO8601Error, ValueError):
+        raise pulp_exceptions.InvalidValue([parameter])
+    return dateutils.format_iso8601_datetime(
+        dateutils.to_utc_datetime(parsed, no_tz_equals_local_tz=False))
+
+
+def _page_size(limit):
+    """
+    Validate the requested page size.
+
+    :param limit: the 'limit' GET parameter, or None if it was not passed
+    :type  limit: basestring or None
+
+    :return: the page size
+    :rtype:  int
+    :raises pulp_exceptions.InvalidValue: if the limit is not between 1 and MAX_PAGE_SIZE
+    """
+    if limit is None:
+        return DEFAULT_PAGE_SIZE
+    try:
+        page_size = int(limit)
+    except ValueError:
+        raise pulp_exceptions.InvalidValue(['limit'])
+    if page_size < 1 or page_size > MAX_PAGE_SIZE:
+        raise pulp_exceptions.InvalidValue(['limit'])
+    return page_size
+
+
+def _list_serializer(task, excluded):
+    """
+    Serialize a task for the task listing, leaving out the fields that were not loaded.
+
+    :param task: The task from the database
+    :type  task: pulp.server.db.model.TaskStatus
+    :param excluded: names of the fields that were excluded from the query
+    :type  excluded: list
+
+    :return: the serialized task
+    :rtype: dict
+    """
+    task = task_serializer(task)
+    for field in excluded:
+        task.pop(field, None)
+    return task
+
+
 class TaskResourceView(View):
     """
     View for a single task.
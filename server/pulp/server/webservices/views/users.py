@@ -128,6 +128,7 @@ class UserResourceView(View):
         link = reverse('user_resource', kwargs={'login': login})
         if Permission.get_collection().find_one({'resource': link}):
             Permission.get_collection().remove({'resource': link})
+            authorization.permissions_changed()
         return generate_json_response()
 
     @auth_required(authorization.UPDATE)
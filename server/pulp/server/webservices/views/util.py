@@ -6,7 +6,7 @@ import httplib
 import json
 import sys
 
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.utils.encoding import iri_to_uri
 
 from pulp.common import dateutils, error_codes
@@ -65,6 +65,56 @@ generate_json_response_with_pulp_encoder = functools.partial(
 )
 
 
+def json_array_chunks(items, default=None, chunk_size=64 * 1024):
+    """
+    Incrementally encode the items as a JSON array.
+    Encoded items are buffered and yielded in chunks of approximately chunk_size bytes
+    so that only one chunk of the array is held in memory at a time.
+
+    :param items: the items to be encoded
+    :type  items: iterable
+    :param default: function used by json to serialize objects it does not support
+    :type  default: function or None
+    :param chunk_size: the approximate size of each chunk in bytes
+    :type  chunk_size: int
+
+    :return: generator of JSON encoded chunks
+    :rtype:  generator
+    """
+    encoder = json.JSONEncoder(default=default)
+    buf = ['[']
+    size = 1
+    separator = ''
+    for item in items:
+        encoded = encoder.encode(item)
+        buf.append(separator)
+        buf.append(encoded)
+        separator = ', '
+        size += len(encoded) + 2
+        if size >= chunk_size:
+            yield ''.join(buf)
+            buf = []
+            size = 0
+    buf.append(']')
+    yield ''.join(buf)
+
+
+def generate_streaming_json_response(chunks, content_type='application/json; charset=utf-8'):
+    """
+    Return a django streaming response for already JSON encoded chunks.
+    The content is sent to the client as it is generated and is never held in memory as a whole.
+
+    :param chunks: JSON encoded chunks, such as those generated by json_array_chunks()
+    :type  chunks: iterable
+    :param content_type: type of returned content
+    :type  content_type: str
+
+    :return: response streaming the content
+    :rtype:  django.http.StreamingHttpResponse
+    """
+    return StreamingHttpResponse(chunks, content_type=content_type)
+
+
 def generate_redirect_response(response, href):
     response['Location'] = iri_to_uri(href)
     response.status_code = httplib.CREATED
@@ -1,3 +1,4 @@
+import datetime
 import unittest
 
 from pymongo.errors import DuplicateKeyError
@@ -5,6 +6,7 @@ import mock
 import mongoengine
 
 from ... import base
+from pulp.common import dateutils
 from pulp.devel import mock_plugins
 from pulp.plugins.conduits import mixins
 from pulp.plugins.model import Unit, PublishReport
@@ -620,6 +622,127 @@ class AddUnitMixinTests(unittest.TestCase):
         # Test
         self.assertRaises(mixins.ImporterConduitException, self.mixin.save_unit, None)
 
+    @mock.patch('pulp.server.managers.content.query.ContentQueryManager.'
+                'get_multiple_units_by_keys_dicts')
+    @mock.patch('pulp.server.managers.content.cud.ContentManager.update_content_units')
+    @mock.patch('pulp.server.managers.content.cud.ContentManager.add_content_units')
+    @mock.patch('pulp.server.managers.repo.unit_association.RepoUnitAssociationManager.'
+                'associate_units')
+    def test_save_unit_buffered(self, mock_associate, mock_add, mock_update, mock_get):
+        """
+        Buffered units are saved with bulk writes when flushed: existing units are updated,
+        new units added, and units added by another workflow in the meantime updated.
+        """
+        existing = Unit('t', {'k': 'existing'}, {'m': 'm1'}, None)
+        new = Unit('t', {'k': 'new'}, {'m': 'm2'}, None)
+        raced = Unit('t', {'k': 'raced'}, {'m': 'm3'}, None)
+        mock_get.side_effect = [iter([{'_id': 'existing-id', 'k': u'existing'}]),
+                                iter([{'_id': 'raced-id', 'k': u'raced'}])]
+        mock_add.return_value = ['new-id', None]
+        self.mixin.buffer_saves()
+
+        for unit in (existing, new, raced):
+            self.assertTrue(self.mixin.save_unit(unit) is unit)
+        self.assertEqual(mock_get.call_count, 0)
+        self.assertEqual(new.id, None)
+
+        self.mixin.finalize()
+
+        self.assertEqual((existing.id, new.id, raced.id), ('existing-id', 'new-id', 'raced-id'))
+        self.assertEqual(mock_get.call_args_list[0][0][1],
+                         [{'k': 'existing'}, {'k': 'new'}, {'k': 'raced'}])
+        self.assertEqual(mock_get.call_args_list[1][0][1], [{'k': 'raced'}])
+        added = mock_add.call_args[0][1]
+        self.assertEqual([unit['k'] for unit in added], ['new', 'raced'])
+        self.assertEqual(sorted(mock_update.call_args[0][1].keys()), ['existing-id', 'raced-id'])
+        self.assertEqual(list(mock_associate.call_args[0][1]),
+                         [('t', 'existing-id'), ('t', 'new-id'), ('t', 'raced-id')])
+        self.assertEqual(mock_associate.call_args[1], {'refresh_existing': False})
+        self.assertEqual(self.mixin._added_count, 1)
+        self.assertEqual(self.mixin._updated_count, 2)
+
+        # nothing is left to save
+        self.mixin.finalize()
+        self.assertEqual(mock_associate.call_count, 1)
+
+    @mock.patch('pulp.server.managers.content.query.ContentQueryManager.'
+                'get_multiple_units_by_keys_dicts')
+    @mock.patch('pulp.server.managers.content.cud.ContentManager.update_content_units')
+    @mock.patch('pulp.server.managers.content.cud.ContentManager.add_content_units')
+    @mock.patch('pulp.server.managers.repo.unit_association.RepoUnitAssociationManager.'
+                'associate_units')
+    def test_save_unit_buffered_normalized_keys(self, mock_associate, mock_add, mock_update,
+                                                mock_get):
+        """
+        Units are matched on their key values as the database compares them.
+        """
+        when = datetime.datetime(2016, 1, 2, 3, 4, 5, 6789, tzinfo=dateutils.utc_tz())
+        unit = Unit('t', {'n': 1, 'when': when, 's': 'text'}, {}, None)
+        mock_get.return_value = iter([{'_id': 'unit-id', 'n': 1.0, 's': u'text',
+                                       'when': datetime.datetime(2016, 1, 2, 3, 4, 5, 6000)}])
+        self.mixin.buffer_saves()
+
+        self.mixin.save_unit(unit)
+        self.mixin.flush()
+
+        self.assertEqual(unit.id, 'unit-id')
+        self.assertEqual(mock_add.call_args[0][1], [])
+        self.assertEqual(mock_update.call_args[0][1].keys(), ['unit-id'])
+
+    @mock.patch('pulp.plugins.conduits.mixins.AddUnitMixin._update_unit')
+    @mock.patch('pulp.server.managers.content.query.ContentQueryManager.'
+                'get_multiple_units_by_keys_dicts')
+    @mock.patch('pulp.server.managers.content.cud.ContentManager.update_content_units')
+    @mock.patch('pulp.server.managers.content.cud.ContentManager.add_content_units')
+    @mock.patch('pulp.server.managers.repo.unit_association.RepoUnitAssociationManager.'
+                'associate_units')
+    def test_save_unit_buffered_unmatched(self, mock_associate, mock_add, mock_update, mock_get,
+                                          mock_update_unit):
+        """
+        A unit that cannot be added and is not found again is saved on its own.
+        """
+        unit = Unit('t', {'k': 'v'}, {}, None)
+        mock_get.side_effect = lambda *args, **kwargs: iter([])
+        mock_add.return_value = [None]
+        mock_update_unit.return_value = 'unit-id'
+        self.mixin.buffer_saves()
+
+        self.mixin.save_unit(unit)
+        self.mixin.flush()
+
+        self.assertEqual(unit.id, 'unit-id')
+        self.assertEqual(mock_add.call_count, 1)
+        mock_update_unit.assert_called_once_with(unit, mock.ANY)
+        self.assertEqual(list(mock_associate.call_args[0][1]), [('t', 'unit-id')])
+
+    @mock.patch('pulp.plugins.conduits.mixins.AddUnitMixin._save_units')
+    @mock.patch('pulp.server.managers.repo.unit_association.RepoUnitAssociationManager.'
+                'associate_units')
+    def test_save_unit_buffered_flushes(self, mock_associate, mock_save):
+        """
+        A full batch is flushed, and so is a batch holding a unit saved again, so the saves of
+        a unit are applied in order.
+        """
+        self.mixin.buffer_saves(batch_size=2)
+        first = Unit('t', {'k': '1'}, {'m': 'a'}, None)
+        again = Unit('t', {'k': '1'}, {'m': 'b'}, None)
+        other = Unit('t', {'k': '2'}, {'m': 'c'}, None)
+
+        self.mixin.save_unit(first)
+        self.mixin.save_unit(again)
+        self.assertEqual(mock_save.call_args_list, [mock.call('t', [first])])
+        self.mixin.save_unit(other)
+        self.assertEqual(mock_save.call_args_list[1], mock.call('t', [again, other]))
+        self.assertEqual(mock_associate.call_count, 2)
+
+    @mock.patch('pulp.plugins.conduits.mixins.AddUnitMixin._save_units')
+    def test_save_unit_buffered_error(self, mock_save):
+        mock_save.side_effect = Exception()
+        self.mixin.buffer_saves()
+        self.mixin.save_unit(Unit('t', {'k': '1'}, {}, None))
+
+        self.assertRaises(mixins.ImporterConduitException, self.mixin.flush)
+
     @mock.patch('pulp.server.managers.content.cud.ContentManager.link_referenced_content_units')
     def test_link_unit(self, mock_link):
         # Setup
@@ -673,6 +796,44 @@ class AddUnitMixinTests(unittest.TestCase):
         self.assertRaises(mixins.ImporterConduitException, self.mixin.link_unit, None, None)
 
 
+class FinalizingTests(unittest.TestCase):
+
+    def test_finalize(self):
+        conduit = mock.Mock()
+
+        with mixins.finalizing(conduit):
+            self.assertFalse(conduit.finalize.called)
+
+        conduit.finalize.assert_called_once_with()
+
+    def test_finalize_fails(self):
+        conduit = mock.Mock()
+        conduit.finalize.side_effect = ValueError()
+
+        def run():
+            with mixins.finalizing(conduit):
+                pass
+
+        self.assertRaises(ValueError, run)
+
+    @mock.patch('pulp.plugins.conduits.mixins._logger')
+    def test_importer_fails(self, mock_logger):
+        """
+        A failure to finalize after the importer raised is logged, the importer's exception is
+        raised.
+        """
+        conduit = mock.Mock()
+        conduit.finalize.side_effect = ValueError()
+
+        def run():
+            with mixins.finalizing(conduit):
+                raise KeyError('importer')
+
+        self.assertRaises(KeyError, run)
+        conduit.finalize.assert_called_once_with()
+        self.assertEqual(mock_logger.exception.call_count, 1)
+
+
 class StatusMixinTests(unittest.TestCase):
 
     def setUp(self):
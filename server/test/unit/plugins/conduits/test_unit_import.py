@@ -46,3 +46,22 @@ class ImportUnitConduitTests(base.PulpServerTests):
 
         # Verify the correct propagation to the mixin method
         mock_get.assert_called_once_with(self.dest_repo_id, criteria, ImporterConduitException)
+
+    def test_associate_units(self):
+        manager = mock.Mock()
+        self.conduit._ImportUnitConduit__association_manager = manager
+        units = [mock.Mock(type_id='type-1', id='unit-1'), mock.Mock(type_id='type-2', id='unit-2')]
+
+        result = self.conduit.associate_units(iter(units))
+
+        self.assertEqual(result, units)
+        manager.associate_units.assert_called_once_with(
+            self.dest_repo_id, [('type-1', 'unit-1'), ('type-2', 'unit-2')])
+
+    def test_associate_units_error(self):
+        manager = mock.Mock()
+        manager.associate_units.side_effect = Exception()
+        self.conduit._ImportUnitConduit__association_manager = manager
+
+        self.assertRaises(ImporterConduitException, self.conduit.associate_units,
+                          [mock.Mock(type_id='type-1', id='unit-1')])
@@ -0,0 +1,18 @@
+import unittest
+
+from pulp.plugins.conduits.upload import UploadConduit
+
+
+class UploadConduitTests(unittest.TestCase):
+
+    def test_get_upload_checksum(self):
+        conduit = UploadConduit('repo-1', 'imp-1', upload_checksum=('sha256', 'abc'))
+
+        self.assertEqual(conduit.get_upload_checksum('sha256'), 'abc')
+        self.assertEqual(conduit.get_upload_checksum('SHA256'), 'abc')
+        self.assertTrue(conduit.get_upload_checksum('md5') is None)
+
+    def test_get_upload_checksum_unknown(self):
+        conduit = UploadConduit('repo-1', 'imp-1')
+
+        self.assertTrue(conduit.get_upload_checksum('sha256') is None)
@@ -0,0 +1,153 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from pulp.plugins.rsync import manifest
+
+
+class TestRemoteManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.working_dir, manifest.MANIFEST_DIR, 'remote.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def publish(self, repo_id='repo1', interval=3, verify=False, units=(('a', 1, 'x'),),
+                delete=False):
+        """
+        :return: the paths of the files that had to be rsynced
+        """
+        remote = manifest.RemoteManifest(self.path, repo_id, interval, verify, delete)
+        rsynced = [path for path, size, checksum in units
+                   if not remote.has_file(path, size, checksum)]
+        remote.save()
+        return remote, rsynced
+
+    def test_first_publish_verifies(self):
+        remote, rsynced = self.publish()
+        self.assertTrue(remote.verify)
+        self.assertEqual(rsynced, ['a'])
+        with open(self.path) as f:
+            self.assertEqual(json.load(f), {'files': {'a': [1, 'x']}, 'links': {},
+                                            'publishes': {'repo1': 1},
+                                            'owners': {'repo1': {'files': ['a'], 'links': []}}})
+
+    def test_skip_unchanged(self):
+        self.publish()
+        remote, rsynced = self.publish(units=[('a', 1, 'x'), ('b', 2, None), ('c', 3, 'z')])
+        self.assertFalse(remote.verify)
+        self.assertEqual(rsynced, ['b', 'c'])
+
+    def test_changed(self):
+        self.publish()
+        self.assertEqual(self.publish(units=[('a', 2, 'x')])[1], ['a'])
+        self.assertEqual(self.publish(units=[('a', 2, 'y')])[1], ['a'])
+
+    def test_interval(self):
+        verified = [self.publish()[0].verify for n in xrange(7)]
+        self.assertEqual(verified, [True, False, False, True, False, False, True])
+
+    def test_interval_by_repo(self):
+        self.publish('repo1')
+        remote, rsynced = self.publish('repo2')
+        self.assertTrue(remote.verify)
+        # content is shared between the repositories
+        self.assertFalse(self.publish('repo1')[0].verify)
+
+    def test_verify(self):
+        self.publish()
+        remote, rsynced = self.publish(verify=True)
+        self.assertEqual(rsynced, ['a'])
+
+    def test_verify_replaces_entries(self):
+        """
+        A verifying publish drops the entries its repository no longer publishes, unless another
+        repository published them too.
+        """
+        self.publish('repo1', units=[('a', 1, 'x'), ('b', 1, 'x'), ('c', 1, 'x')])
+        self.publish('repo2', units=[('b', 1, 'x')])
+        remote = manifest.RemoteManifest(self.path, 'repo1', 3)
+        remote.has_link('repo1/a', 'a')
+        remote.has_link('repo1/c', 'c')
+        remote.save()
+
+        remote = manifest.RemoteManifest(self.path, 'repo1', 3, verify=True)
+        remote.has_file('a', 1, 'x')
+        remote.has_link('repo1/a', 'a')
+        remote.save()
+
+        remote = manifest.RemoteManifest(self.path, 'repo1', 3)
+        self.assertEqual(sorted(remote.files), ['a', 'b'])
+        self.assertEqual(sorted(remote.links), ['repo1/a'])
+        # the unit is rsynced again once it is published again
+        self.assertEqual(self.publish(units=[('a', 1, 'x'), ('c', 1, 'x')])[1], ['c'])
+
+    def test_delete(self):
+        """
+        A publish deleting remote files drops every entry it did not stage.
+        """
+        self.publish('repo1', units=[('a', 1, 'x'), ('b', 1, 'x')])
+        self.publish('repo2', units=[('c', 1, 'x')])
+
+        remote, rsynced = self.publish('repo1', units=[('a', 1, 'x')], delete=True)
+
+        self.assertTrue(remote.verify)
+        self.assertEqual(rsynced, ['a'])
+        remote = manifest.RemoteManifest(self.path, 'repo2', 3)
+        self.assertEqual(sorted(remote.files), ['a'])
+        self.assertEqual(remote.owners, {'repo1': {'files': ['a'], 'links': []}})
+
+    def test_links(self):
+        remote = manifest.RemoteManifest(self.path, 'repo1', 3)
+        self.assertFalse(remote.has_link('repo/a', 'content/a'))
+        remote.save()
+
+        remote = manifest.RemoteManifest(self.path, 'repo1', 3)
+        self.assertTrue(remote.has_link('repo/a', 'content/a'))
+        self.assertFalse(remote.has_link('repo/a', 'content/b'))
+
+    def test_concurrent_publishes(self):
+        first = manifest.RemoteManifest(self.path, 'repo1', 3)
+        second = manifest.RemoteManifest(self.path, 'repo2', 3)
+        first.has_file('a', 1, None)
+        second.has_file('b', 1, None)
+        first.save()
+        second.save()
+
+        remote = manifest.RemoteManifest(self.path, 'repo1', 3)
+        self.assertEqual(sorted(remote.files), ['a', 'b'])
+        self.assertEqual(remote.publishes, {'repo1': 1, 'repo2': 1})
+
+    def test_corrupt(self):
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, 'w') as f:
+            f.write('{"files": ')
+        remote, rsynced = self.publish()
+        self.assertTrue(remote.verify)
+        self.assertEqual(rsynced, ['a'])
+
+    @mock.patch('pulp.plugins.rsync.manifest.os.rename', side_effect=OSError)
+    def test_save_failed(self, mock_rename):
+        self.publish()
+        self.assertFalse(os.path.exists(self.path))
+
+    @mock.patch('pulp.plugins.rsync.manifest.pulp_config')
+    def test_for_remote(self, mock_config):
+        mock_config.get.return_value = self.working_dir
+        remote = {'ssh_user': 'user', 'host': 'example.com', 'root': '/srv'}
+
+        first = manifest.RemoteManifest.for_remote(remote, 'repo1', 3)
+        second = manifest.RemoteManifest.for_remote(dict(remote, root='/other'), 'repo1', 3,
+                                                    delete=True)
+
+        self.assertEqual(os.path.dirname(first.path),
+                         os.path.join(self.working_dir, manifest.MANIFEST_DIR))
+        self.assertNotEqual(first.path, second.path)
+        self.assertFalse(first.delete)
+        self.assertTrue(second.delete)
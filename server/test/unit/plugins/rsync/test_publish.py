@@ -0,0 +1,167 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from pulp.plugins.config import PluginCallConfiguration
+from pulp.plugins.rsync import configuration, publish
+from pulp.server.exceptions import PulpCodedException
+
+
+REMOTE = {'ssh_user': 'user', 'ssh_identity_file': '/key', 'host': 'example.com',
+          'root': '/srv'}
+
+
+class TestSplitFileList(unittest.TestCase):
+
+    def setUp(self):
+        self.src = tempfile.mkdtemp()
+        for name, size in (('a', 10), ('b', 10), ('c', 10), ('d', 30)):
+            with open(os.path.join(self.src, name), 'w') as f:
+                f.write('x' * size)
+
+    def tearDown(self):
+        shutil.rmtree(self.src)
+
+    def test_by_size(self):
+        parts = publish.split_file_list(['d', 'c', 'b', 'a'], self.src, 2)
+        self.assertEqual(parts, [(['a', 'b', 'c'], 30), (['d'], 30)])
+
+    def test_more_shards_than_files(self):
+        parts = publish.split_file_list(['b', 'a'], self.src, 4)
+        self.assertEqual(parts, [(['a'], 10), (['b'], 10)])
+
+    def test_single_shard(self):
+        parts = publish.split_file_list(['d', 'a', 'missing'], self.src, 1)
+        self.assertEqual(parts, [(['a', 'd', 'missing'], 40)])
+
+    def test_links(self):
+        os.symlink(os.path.join(self.src, 'd'), os.path.join(self.src, 'link'))
+        parts = publish.split_file_list(['link'], self.src, 1, follow_links=False)
+        self.assertTrue(parts[0][1] < 30)
+        parts = publish.split_file_list(['link'], self.src, 1)
+        self.assertEqual(parts[0][1], 30)
+
+
+class TestRSyncPublishStep(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.src = os.path.join(self.working_dir, 'src')
+        os.makedirs(self.src)
+        for name in ('a', 'b', 'c'):
+            with open(os.path.join(self.src, name), 'w') as f:
+                f.write('x' * 10)
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def make_step(self, shards=None, **kwargs):
+        config = {'remote': REMOTE}
+        if shards:
+            config['rsync_shards'] = shards
+        step = publish.RSyncPublishStep('rsync', ['c', 'a', 'b'], self.src, 'repo',
+                                        config=PluginCallConfiguration(None, config), **kwargs)
+        step.get_working_dir = mock.Mock(return_value=self.working_dir)
+        step.remote_mkdir = mock.Mock(return_value=(True, 'mkdir\n'))
+        return step
+
+    def rsync_calls(self, mock_call):
+        return [c[0][0] for c in mock_call.call_args_list]
+
+    @mock.patch('pulp.plugins.rsync.publish.pulp_config')
+    def test_ssh_cmd_connection(self, mock_config):
+        mock_config.get.return_value = self.working_dir
+        step = self.make_step()
+
+        cmd = step.make_ssh_cmd(connection=2)
+
+        control_dir = os.path.join(self.working_dir, publish.SSH_CONTROL_DIR)
+        self.assertTrue(os.path.isdir(control_dir))
+        self.assertTrue('ControlMaster auto' in cmd)
+        self.assertTrue('ControlPath %s' % os.path.join(control_dir, '%C-2') in cmd)
+        self.assertFalse('ControlMaster auto' in step.make_ssh_cmd())
+
+    @mock.patch('pulp.plugins.rsync.publish.RSyncPublishStep.call')
+    def test_rsync_not_sharded(self, mock_call):
+        mock_call.return_value = (True, 'out')
+        step = self.make_step()
+
+        self.assertEqual(step.rsync(), (True, 'mkdir\nout'))
+
+        self.assertEqual(mock_call.call_count, 1)
+        args = mock_call.call_args[0][0]
+        self.assertFalse('ControlMaster' in ' '.join(args))
+        with open(args[args.index('--files-from') + 1]) as f:
+            self.assertEqual(f.read(), 'a\nb\nc')
+
+    @mock.patch('pulp.plugins.rsync.publish.RSyncPublishStep.get_ssh_control_dir')
+    @mock.patch('pulp.plugins.rsync.publish.RSyncPublishStep.call')
+    def test_rsync_sharded(self, mock_call, mock_control_dir):
+        mock_control_dir.return_value = '/control'
+        mock_call.return_value = (True, 'out')
+        step = self.make_step(shards=2)
+        step.report_progress = mock.Mock()
+
+        is_successful, output = step.rsync()
+
+        self.assertTrue(is_successful)
+        calls = self.rsync_calls(mock_call)
+        self.assertEqual(len(calls), 2)
+        files = []
+        for index, args in enumerate(calls):
+            self.assertTrue('ControlPath /control/%%C-%d' % index in ' '.join(args))
+            with open(args[args.index('--files-from') + 1]) as f:
+                files.append(f.read())
+        self.assertEqual(files, ['a\nb', 'c'])
+        self.assertEqual(step.total_units, 2)
+        self.assertEqual(step.progress_successes, 2)
+        self.assertEqual(step.progress_bytes, 30)
+        self.assertTrue('rsync shard 2 of 2, 1 files, succeeded' in output)
+
+    @mock.patch('pulp.plugins.rsync.publish.RSyncPublishStep.get_ssh_control_dir')
+    @mock.patch('pulp.plugins.rsync.publish.RSyncPublishStep.call')
+    def test_rsync_shard_failed(self, mock_call, mock_control_dir):
+        mock_control_dir.return_value = None
+
+        def call(args):
+            with open(args[args.index('--files-from') + 1]) as f:
+                if 'c' in f.read():
+                    return (False, 'rsync error')
+            return (True, 'out')
+
+        mock_call.side_effect = call
+        step = self.make_step(shards=2)
+        step.report_progress = mock.Mock()
+
+        self.assertRaises(PulpCodedException, step.process_main)
+        self.assertEqual(step.progress_successes, 1)
+        self.assertEqual(step.progress_bytes, 20)
+
+    @mock.patch('pulp.plugins.rsync.publish.RSyncPublishStep.get_ssh_control_dir')
+    @mock.patch('pulp.plugins.rsync.publish.RSyncPublishStep.call')
+    def test_rsync_delete_not_sharded(self, mock_call, mock_control_dir):
+        mock_control_dir.return_value = '/control'
+        mock_call.return_value = (True, 'out')
+        step = self.make_step(shards=2, delete=True)
+
+        step.rsync()
+
+        self.assertEqual(mock_call.call_count, 1)
+        self.assertTrue('--delete' in mock_call.call_args[0][0])
+
+
+class TestValidateConfig(unittest.TestCase):
+
+    def validate(self, shards):
+        config = PluginCallConfiguration(None, {'remote': REMOTE, 'rsync_shards': shards})
+        return configuration.validate_config(None, config, None)
+
+    def test_shards(self):
+        self.assertEqual(self.validate(4), (True, None))
+        for shards in (0, '4', True):
+            valid, error = self.validate(shards)
+            self.assertFalse(valid)
+            self.assertTrue('rsync_shards' in error)
@@ -0,0 +1,153 @@
+from cStringIO import StringIO
+import gzip
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+import mock
+
+from pulp.plugins.util import compression
+
+
+DATA = ''.join('line %d of the data\n' % n for n in xrange(20000))
+
+
+class TestCompressedWriter(unittest.TestCase):
+
+    def test_uncompressed(self):
+        fileobj = StringIO()
+        writer = compression.compressed_writer(fileobj, None)
+        writer.write('abc')
+        writer.close()
+        self.assertEqual(fileobj.getvalue(), 'abc')
+        self.assertFalse(fileobj.closed)
+
+    def test_gzip(self):
+        writer = compression.compressed_writer(StringIO(), compression.GZIP, workers=2)
+        self.assertTrue(isinstance(writer, compression.GzipWriter))
+        self.assertEqual(writer.workers, 2)
+        writer.close()
+
+    @mock.patch('subprocess.Popen')
+    def test_xz(self, mock_popen):
+        writer = compression.compressed_writer(mock.Mock(), compression.XZ, workers=3)
+        self.assertTrue(isinstance(writer, compression.XzWriter))
+        self.assertEqual(mock_popen.call_args[0][0], ['xz', '-c', '-T', '3'])
+
+    def test_unsupported(self):
+        self.assertRaises(ValueError, compression.compressed_writer, StringIO(), 'bz2')
+
+
+class TestGzipWriter(unittest.TestCase):
+
+    def write(self, workers, chunk_size, data=DATA):
+        fileobj = StringIO()
+        writer = compression.GzipWriter(fileobj, workers=workers, chunk_size=chunk_size)
+        # writes that do not line up with the chunks
+        for i in xrange(0, len(data), 1000):
+            writer.write(data[i:i + 1000])
+        writer.close()
+        return fileobj.getvalue()
+
+    def decompress(self, value):
+        return gzip.GzipFile(fileobj=StringIO(value)).read()
+
+    def test_single_chunk(self):
+        self.assertEqual(self.decompress(self.write(1, len(DATA) * 2)), DATA)
+
+    def test_chunks(self):
+        self.assertEqual(self.decompress(self.write(1, 4096)), DATA)
+
+    def test_parallel(self):
+        self.assertEqual(self.decompress(self.write(3, 4096)), DATA)
+
+    def test_empty(self):
+        self.assertEqual(self.decompress(self.write(2, 4096, data='')), '')
+
+    def test_single_member(self):
+        """
+        The chunks are one gzip member, readable by tools that stop after the first one.
+        """
+        value = self.write(3, 4096)
+        decompressor = compression.zlib.decompressobj(16 + compression.zlib.MAX_WBITS)
+        self.assertEqual(decompressor.decompress(value), DATA)
+        self.assertEqual(decompressor.unused_data, '')
+
+    def test_pending_bounded(self):
+        fileobj = StringIO()
+        writer = compression.GzipWriter(fileobj, workers=2, chunk_size=10)
+        for n in xrange(100):
+            writer.write('0123456789')
+            self.assertTrue(len(writer.pending) <= 4)
+        writer.close()
+        self.assertEqual(self.decompress(fileobj.getvalue()), '0123456789' * 100)
+
+    def test_abort(self):
+        writer = compression.GzipWriter(StringIO(), workers=2, chunk_size=10)
+        writer.write('0123456789' * 3)
+
+        pool = writer.pool
+        with mock.patch.object(pool, 'terminate', wraps=pool.terminate) as mock_terminate:
+            writer.abort()
+
+        mock_terminate.assert_called_once_with()
+        self.assertTrue(writer.pool is None)
+        self.assertEqual(len(writer.pending), 0)
+
+
+class TestXzWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.working_dir, 'data.xz')
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def test_write(self):
+        try:
+            subprocess.call(['xz', '--version'], stdout=open(os.devnull, 'w'))
+        except OSError:
+            self.skipTest('xz is not installed')
+        with open(self.path, 'wb') as fileobj:
+            fileobj.write('header')
+            writer = compression.XzWriter(fileobj, workers=2)
+            writer.write(DATA)
+            writer.close()
+        with open(self.path, 'rb') as fileobj:
+            value = fileobj.read()
+        self.assertEqual(value[:6], 'header')
+        process = subprocess.Popen(['xz', '-d', '-c'], stdin=subprocess.PIPE,
+                                   stdout=subprocess.PIPE)
+        self.assertEqual(process.communicate(value[6:])[0], DATA)
+
+    @mock.patch('subprocess.Popen')
+    def test_failed(self, mock_popen):
+        mock_popen.return_value.wait.return_value = 1
+        writer = compression.XzWriter(mock.Mock())
+        writer.errors.write('xz: out of memory\n')
+
+        try:
+            writer.close()
+        except IOError, e:
+            self.assertTrue('out of memory' in str(e))
+        else:
+            self.fail('IOError not raised')
+        self.assertTrue(mock_popen.return_value.stdin.close.called)
+        # errors are written to a file, so xz cannot block on a full pipe
+        self.assertTrue(mock_popen.call_args[1]['stderr'] is writer.errors)
+
+    @mock.patch('subprocess.Popen')
+    def test_abort(self, mock_popen):
+        mock_popen.return_value.poll.return_value = None
+        mock_popen.return_value.stdin.closed = False
+        writer = compression.XzWriter(mock.Mock())
+
+        writer.abort()
+
+        mock_popen.return_value.kill.assert_called_once_with()
+        self.assertTrue(mock_popen.return_value.wait.called)
+        self.assertTrue(mock_popen.return_value.stdin.close.called)
+        self.assertTrue(writer.errors.closed)
@@ -1,9 +1,13 @@
 from cStringIO import StringIO
 import contextlib
+import os
+import shutil
+import tempfile
 import unittest
 
 import mock
 
+from pulp.common.plugins.distributor_constants import MANIFEST_FILENAME
 from pulp.plugins.util import manifest_writer
 
 
@@ -12,11 +16,6 @@ def make_fake_file(value):
     yield StringIO(value)
 
 
-@contextlib.contextmanager
-def giveitback(value):
-    yield value
-
-
 class TestGetSHA256Checksum(unittest.TestCase):
     @mock.patch('__builtin__.open', spec_set=True)
     def test_return_value(self, mock_open):
@@ -42,53 +41,222 @@ class TestGetSHA256Checksum(unittest.TestCase):
 
 
 class TestMakeManifestForDir(unittest.TestCase):
-    @mock.patch('os.listdir', return_value=tuple())
-    @mock.patch('__builtin__.open', spec_set=True)
-    def test_empty_dir(self, mock_open, mock_listdir):
-        fake_file = StringIO()
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.working_dir, 'publish')
+        os.mkdir(self.path)
 
-        mock_open.return_value = giveitback(fake_file)
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
 
-        manifest_writer.make_manifest_for_dir('/foo/')
+    def write(self, name, content):
+        with open(os.path.join(self.path, name), 'w') as f:
+            f.write(content)
 
-        self.assertEqual(fake_file.getvalue(), '')
+    def read_manifest(self):
+        with open(os.path.join(self.path, MANIFEST_FILENAME)) as f:
+            return sorted(f.read().splitlines())
+
+    def test_empty_dir(self):
+        manifest_writer.make_manifest_for_dir(self.path)
+
+        self.assertEqual(self.read_manifest(), [])
+
+    def test_value(self):
+        self.write('a', 'hi there\n')
+        self.write('b', '')
+        os.mkdir(os.path.join(self.path, 'c'))
+
+        manifest_writer.make_manifest_for_dir(self.path)
+
+        self.assertEqual(self.read_manifest(), [
+            'a,c641344867e9806fadfd219f25b62b97c94db0eed04a1d79e93676533cfb782b,9',
+            'b,e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855,0'])
 
-    @mock.patch('os.path.isfile', return_value=True)
-    @mock.patch('os.path.getsize', return_value=17)
-    @mock.patch('os.listdir', spec_set=True)
-    @mock.patch('__builtin__.open', spec_set=True)
     @mock.patch.object(manifest_writer, 'get_sha256_checksum', spec_set=True)
-    def test_value(self, mock_checksum, mock_open, mock_listdir, mock_getsize, mock_isfile):
-        mock_listdir.return_value = ['a', 'b']
+    def test_skip_dirs(self, mock_checksum):
         mock_checksum.return_value = 'greatchecksum'
-        fake_file = StringIO()
-        mock_open.return_value = giveitback(fake_file)
+        os.mkdir(os.path.join(self.path, 'a'))
+        self.write('b', 'x' * 17)
 
-        manifest_writer.make_manifest_for_dir(('/foo/'))
+        manifest_writer.make_manifest_for_dir(self.path)
 
-        mock_checksum.assert_any_call('/foo/a')
-        mock_checksum.assert_any_call('/foo/b')
-        self.assertEqual(mock_checksum.call_count, 2)
+        mock_checksum.assert_called_once_with(os.path.join(self.path, 'b'))
+        self.assertEqual(self.read_manifest(), ['b,greatchecksum,17'])
 
-        expected = 'a,greatchecksum,17\r\nb,greatchecksum,17\r\n'
+    def test_cache(self):
+        cache_path = os.path.join(self.working_dir, 'cache.json')
+        self.write('a', 'hi there\n')
 
-        self.assertEqual(fake_file.getvalue(), expected)
+        manifest_writer.make_manifest_for_dir(self.path, cache_path=cache_path)
+        with mock.patch.object(manifest_writer, 'get_sha256_checksum') as mock_checksum:
+            manifest_writer.make_manifest_for_dir(self.path, cache_path=cache_path)
 
-    @mock.patch('os.path.isfile', side_effect=(False, True))
-    @mock.patch('os.path.getsize', return_value=17)
-    @mock.patch('os.listdir', spec_set=True)
-    @mock.patch('__builtin__.open', spec_set=True)
+        self.assertFalse(mock_checksum.called)
+        self.assertEqual(self.read_manifest(), [
+            'a,c641344867e9806fadfd219f25b62b97c94db0eed04a1d79e93676533cfb782b,9'])
+
+    def test_cache_changed_file(self):
+        cache_path = os.path.join(self.working_dir, 'cache.json')
+        self.write('a', 'hi there\n')
+        manifest_writer.make_manifest_for_dir(self.path, cache_path=cache_path)
+        self.write('a', 'bye now\n')
+        stat = os.stat(os.path.join(self.path, 'a'))
+        os.utime(os.path.join(self.path, 'a'), (stat.st_atime, stat.st_mtime + 1))
+
+        manifest_writer.make_manifest_for_dir(self.path, cache_path=cache_path)
+
+        expected = manifest_writer.get_sha256_checksum(os.path.join(self.path, 'a'))
+        self.assertEqual(self.read_manifest(), ['a,%s,8' % expected])
+
+    @mock.patch.object(manifest_writer, 'get_unit_checksums', spec_set=True)
+    def test_unit_checksums(self, mock_unit_checksums):
+        self.write('target', 'hi there\n')
+        link_path = os.path.join(self.path, 'link')
+        os.symlink(os.path.join(self.path, 'target'), link_path)
+        mock_unit_checksums.return_value = {link_path: 'fromunit'}
+
+        manifest_writer.make_manifest_for_dir(self.path)
+
+        mock_unit_checksums.assert_called_once_with(
+            {os.path.join(os.path.realpath(self.path), 'target'): link_path})
+        self.assertEqual(self.read_manifest(), [
+            'link,fromunit,9',
+            'target,c641344867e9806fadfd219f25b62b97c94db0eed04a1d79e93676533cfb782b,9'])
+
+    @mock.patch.object(manifest_writer, 'get_unit_checksums', spec_set=True)
+    def test_unit_checksums_disabled(self, mock_unit_checksums):
+        self.write('target', '')
+        os.symlink(os.path.join(self.path, 'target'), os.path.join(self.path, 'link'))
+
+        manifest_writer.make_manifest_for_dir(self.path, unit_checksums=False)
+
+        self.assertFalse(mock_unit_checksums.called)
+
+
+class TestHashFiles(unittest.TestCase):
     @mock.patch.object(manifest_writer, 'get_sha256_checksum', spec_set=True)
-    def test_skip_dirs(self, mock_checksum, mock_open, mock_listdir, mock_getsize, mock_isfile):
-        mock_listdir.return_value = ['a', 'b']
-        mock_checksum.return_value = 'greatchecksum'
-        fake_file = StringIO()
-        mock_open.return_value = giveitback(fake_file)
+    def test_parallel(self, mock_checksum):
+        mock_checksum.side_effect = lambda path: 'sum-' + path
+
+        ret = manifest_writer.hash_files(['a', 'b', 'c'], workers=2)
+
+        self.assertEqual(ret, {'a': 'sum-a', 'b': 'sum-b', 'c': 'sum-c'})
+
+    @mock.patch.object(manifest_writer, 'ThreadPool', spec_set=True)
+    @mock.patch.object(manifest_writer, 'get_sha256_checksum', spec_set=True)
+    def test_serial(self, mock_checksum, mock_pool):
+        mock_checksum.side_effect = lambda path: 'sum-' + path
+
+        ret = manifest_writer.hash_files(['a', 'b'], workers=1)
+
+        self.assertEqual(ret, {'a': 'sum-a', 'b': 'sum-b'})
+        self.assertFalse(mock_pool.called)
+
+
+class TestGetUnitChecksums(unittest.TestCase):
+    @mock.patch.object(manifest_writer, 'plugin_api', spec_set=True)
+    @mock.patch.object(manifest_writer, 'pulp_config', spec_set=True)
+    def test_lookup(self, mock_config, mock_plugin_api):
+        mock_config.get.return_value = '/var/lib/pulp'
+        model = mock.MagicMock()
+        model._fields = {'checksum': None, 'checksumtype': None}
+        model.objects.return_value.scalar.return_value = [
+            ('/var/lib/pulp/content/units/rpm/ab/cd/a.rpm', 'ABC')]
+        mock_plugin_api.get_unit_model_by_id.side_effect = {'rpm': model}.get
+        paths = {'/var/lib/pulp/content/units/rpm/ab/cd/a.rpm': '/publish/a.rpm',
+                 '/var/lib/pulp/content/units/other/ab/cd/b': '/publish/b',
+                 '/tmp/c': '/publish/c'}
+
+        with mock.patch('os.path.realpath', side_effect=lambda path: path):
+            ret = manifest_writer.get_unit_checksums(paths)
+
+        self.assertEqual(ret, {'/publish/a.rpm': 'abc'})
+        model.objects.assert_called_once_with(
+            _storage_path__in=['/var/lib/pulp/content/units/rpm/ab/cd/a.rpm'],
+            checksumtype__in=manifest_writer.SHA256_TYPES)
+        model.objects.return_value.scalar.assert_called_once_with('_storage_path', 'checksum')
+
+    @mock.patch('pulp.server.content.storage.config')
+    @mock.patch.object(manifest_writer, 'plugin_api', spec_set=True)
+    @mock.patch.object(manifest_writer, 'pulp_config', spec_set=True)
+    def test_blob(self, mock_config, mock_plugin_api, mock_storage_config):
+        """
+        The checksum of a file deduplicated with symbolic links is the name of its blob.
+        """
+        mock_config.get.return_value = '/var/lib/pulp'
+        mock_storage_config.get.return_value = '/var/lib/pulp'
+        digest = 'ab' * 32
+        blob = '/var/lib/pulp/content/blobs/%s/%s' % (digest[0:2], digest[2:])
+
+        with mock.patch('os.path.realpath', side_effect=lambda path: path):
+            ret = manifest_writer.get_unit_checksums({blob: '/publish/a.iso'})
+
+        self.assertEqual(ret, {'/publish/a.iso': digest})
+        self.assertFalse(mock_plugin_api.get_unit_model_by_id.called)
+
+    @mock.patch.object(manifest_writer, 'plugin_api', spec_set=True)
+    @mock.patch.object(manifest_writer, 'pulp_config', spec_set=True)
+    def test_no_checksum_type(self, mock_config, mock_plugin_api):
+        mock_config.get.return_value = '/var/lib/pulp'
+        model = mock.MagicMock()
+        model._fields = {'checksum': None}
+        mock_plugin_api.get_unit_model_by_id.return_value = model
+
+        with mock.patch('os.path.realpath', side_effect=lambda path: path):
+            ret = manifest_writer.get_unit_checksums(
+                {'/var/lib/pulp/content/units/iso/ab/cd/a.iso': '/publish/a.iso'})
+
+        self.assertEqual(ret, {})
+        self.assertFalse(model.objects.called)
+
+
+class TestChecksumCache(unittest.TestCase):
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.working_dir, 'cache.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def stat(self, inode):
+        return mock.Mock(st_dev=1, st_ino=inode, st_mtime=1.5, st_size=10)
+
+    def test_round_trip(self):
+        cache = manifest_writer.ChecksumCache(self.path)
+        cache.set(self.stat(1), 'one')
+        cache.save()
+
+        cache = manifest_writer.ChecksumCache(self.path)
+
+        self.assertEqual(cache.get(self.stat(1)), 'one')
+        self.assertEqual(cache.get(self.stat(2)), None)
+
+    def test_prune(self):
+        cache = manifest_writer.ChecksumCache(self.path, size=1)
+        cache.set(self.stat(1), 'one')
+        cache.now += 1
+        cache.set(self.stat(2), 'two')
+        cache.save()
+
+        cache = manifest_writer.ChecksumCache(self.path)
+
+        self.assertEqual(cache.get(self.stat(1)), None)
+        self.assertEqual(cache.get(self.stat(2)), 'two')
+
+    def test_invalid_file(self):
+        with open(self.path, 'w') as f:
+            f.write('not json')
+
+        cache = manifest_writer.ChecksumCache(self.path)
 
-        manifest_writer.make_manifest_for_dir('/foo/')
+        self.assertEqual(cache.entries, {})
 
-        mock_checksum.assert_called_once_with('/foo/b')
+    @mock.patch.object(manifest_writer, '_logger', spec_set=True)
+    def test_save_error(self, mock_logger):
+        cache = manifest_writer.ChecksumCache(os.path.join(self.working_dir, 'missing', 'cache'))
+        cache.set(self.stat(1), 'one')
 
-        expected = 'b,greatchecksum,17'
+        cache.save()
 
-        self.assertEqual(fake_file.getvalue().strip(), expected)
+        self.assertTrue(mock_logger.warning.called)
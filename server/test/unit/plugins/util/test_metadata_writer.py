@@ -1,5 +1,6 @@
 import gzip
 import hashlib
+import json
 import unittest
 import os
 import tempfile
@@ -12,9 +13,10 @@ from mock import Mock, patch
 from pulp.common.error_codes import PLP1005
 from pulp.devel.unit.server.util import assert_validation_exception
 from pulp.plugins.util.metadata_writer import MetadataFileContext, JSONArrayFileContext
+from pulp.plugins.util.metadata_writer import ChecksumFile
 from pulp.plugins.util.metadata_writer import XmlFileContext
 from pulp.plugins.util.metadata_writer import FastForwardXmlFileContext
-from pulp.server.util import TYPE_SHA1
+from pulp.server.util import TYPE_MD5, TYPE_SHA1, TYPE_SHA256
 
 
 DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', 'data'))
@@ -247,6 +249,52 @@ class MetadataWriterTests(unittest.TestCase):
                                                    expected_metadata_file_name)
         self.assertEquals(expected_metadata_file_path, context.metadata_file_path)
 
+    def test_finalize_checksums_written(self):
+        path = os.path.join(self.metadata_file_dir, 'test.xml')
+        context = MetadataFileContext(path, TYPE_SHA256, checksum_types=[TYPE_MD5])
+
+        context.initialize()
+        context.metadata_file_handle.write('<metadata/>')
+        context.finalize()
+
+        self.assertEqual(context.checksum, hashlib.sha256('<metadata/>').hexdigest())
+        self.assertEqual(context.checksums, {TYPE_SHA256: context.checksum,
+                                             TYPE_MD5: hashlib.md5('<metadata/>').hexdigest()})
+        self.assertEqual(os.path.basename(context.metadata_file_path),
+                         context.checksum + '-test.xml')
+
+    def test_finalize_checksums_gzip(self):
+        path = os.path.join(self.metadata_file_dir, 'test.xml.gz')
+        context = MetadataFileContext(path, checksum_types=[TYPE_SHA256])
+
+        context.initialize()
+        context.metadata_file_handle.write('<metadata/>' * 100)
+        context.finalize()
+
+        # the checksum is of the compressed file and the file name is not changed
+        with open(path, 'rb') as h:
+            self.assertEqual(context.checksums, {TYPE_SHA256: hashlib.sha256(h.read()).hexdigest()})
+        self.assertEqual(context.checksum, None)
+        h = gzip.open(path)
+        self.assertEqual(h.read(), '<metadata/>' * 100)
+        h.close()
+
+    def test_finalize_checksums_read_back(self):
+        # a handle not opened by the context is hashed by reading the file
+        path = os.path.join(self.metadata_file_dir, 'test.xml')
+        context = MetadataFileContext(path, TYPE_SHA1)
+        context.metadata_file_handle = open(path, 'w')
+        context.metadata_file_handle.write('<metadata/>')
+
+        context.finalize()
+
+        self.assertEqual(context.checksum, hashlib.sha1('<metadata/>').hexdigest())
+
+    def test_init_invalid_additional_checksum(self):
+        path = os.path.join(self.metadata_file_dir, 'header.xml')
+        assert_validation_exception(MetadataFileContext, [PLP1005], path,
+                                    checksum_types=['invalid'])
+
     @patch('pulp.plugins.util.metadata_writer._LOG.exception')
     def test_finalize_error_on_footer(self, mock_logger):
 
@@ -294,6 +342,44 @@ class MetadataWriterTests(unittest.TestCase):
         context.initialize.assert_called_once_with()
 
 
+class TestChecksumFile(unittest.TestCase):
+
+    def test_write(self):
+        file_object = Mock()
+        checksum_file = ChecksumFile(file_object, {TYPE_SHA1: hashlib.sha1,
+                                                   TYPE_MD5: hashlib.md5})
+
+        checksum_file.write('abc')
+        checksum_file.write('def')
+        # the small writes are buffered
+        self.assertFalse(file_object.write.called)
+        checksum_file.flush()
+        checksum_file.close()
+
+        file_object.write.assert_called_once_with('abcdef')
+        self.assertTrue(file_object.flush.called)
+        self.assertTrue(file_object.close.called)
+        self.assertEqual(checksum_file.hexdigests(), {TYPE_SHA1: hashlib.sha1('abcdef').hexdigest(),
+                                                      TYPE_MD5: hashlib.md5('abcdef').hexdigest()})
+
+    @patch('pulp.plugins.util.metadata_writer.CHECKSUM_BUFFER_SIZE', new=4)
+    def test_write_full_buffer(self):
+        file_object = Mock()
+        checksum_file = ChecksumFile(file_object, {TYPE_SHA1: hashlib.sha1})
+
+        checksum_file.write('abc')
+        checksum_file.write('def')
+        checksum_file.write('g')
+
+        file_object.write.assert_called_once_with('abcdef')
+        self.assertEqual(checksum_file.hexdigests(),
+                         {TYPE_SHA1: hashlib.sha1('abcdefg').hexdigest()})
+
+    def test_closed(self):
+        file_object = Mock(closed=True)
+        self.assertTrue(ChecksumFile(file_object, {}).closed)
+
+
 class TestJSONArrayFileContext(unittest.TestCase):
 
     def setUp(self):
@@ -401,8 +487,11 @@ class FastForwardXmlFileContextTests(unittest.TestCase):
                                             self.tag, 'package', self.attributes)
         context._open_metadata_file_handle()
         self.assertTrue(context.fast_forward)
+        # the file is read compressed, there is no decompressed copy
         self.assertEquals(context.existing_file,
-                          os.path.join(self.working_dir, 'original.test.xml'))
+                          os.path.join(self.working_dir, 'original.test.xml.gz'))
+        self.assertEquals(sorted(os.listdir(self.working_dir)),
+                          ['original.test.xml.gz', 'test.xml.gz'])
 
     @patch('pulp.plugins.util.metadata_writer.XMLGenerator')
     def test_open_metadata_file_handle_existing_checksum_file(self, mock_generator):
@@ -421,8 +510,9 @@ class FastForwardXmlFileContextTests(unittest.TestCase):
                     os.path.join(self.working_dir, 'bb-test.xml'))
         context._open_metadata_file_handle()
         self.assertTrue(context.fast_forward)
-        self.assertEquals(context.existing_file, os.path.join(self.working_dir,
-                                                              'original.bb-test.xml'))
+        # the preserved file is read in place
+        self.assertEquals(context.existing_file, os.path.join(self.working_dir, 'bb-test.xml'))
+        self.assertFalse(context.remove_existing_file)
 
     @patch('pulp.plugins.util.metadata_writer.XMLGenerator')
     def test_open_metadata_file_handle_existing_checksum_gzip_file(self, mock_generator):
@@ -434,7 +524,7 @@ class FastForwardXmlFileContextTests(unittest.TestCase):
         context._open_metadata_file_handle()
         self.assertTrue(context.fast_forward)
         self.assertEquals(context.existing_file,
-                          os.path.join(self.working_dir, 'original.bb-test.xml'))
+                          os.path.join(self.working_dir, 'bb-test.xml.gz'))
 
     @patch('pulp.plugins.util.metadata_writer.BUFFER_SIZE', new=8)
     def test_write_file_header_fast_forward_small_buffer(self):
@@ -528,6 +618,94 @@ class FastForwardXmlFileContextTests(unittest.TestCase):
         test_file_handle.close()
         self.assertEquals(test_content, created_content)
 
+    def _publish(self, file_name, packages, **kwargs):
+        """
+        Fast forward a metadata file and add packages to it.
+        """
+        context = FastForwardXmlFileContext(os.path.join(self.working_dir, file_name),
+                                            self.tag, 'package', self.attributes, **kwargs)
+        with context:
+            for package in packages:
+                context.metadata_file_handle.write('<package>%s</package>' % package)
+        return context
+
+    def _read(self, path):
+        if path.endswith('.gz'):
+            h = gzip.open(path)
+        else:
+            h = open(path)
+        try:
+            return h.read()
+        finally:
+            h.close()
+
+    def test_fast_forward_offset_index(self):
+        for file_name in ('index.xml', 'index.xml.gz'):
+            self._publish(file_name, ['a', 'b'], offset_index=True)
+            path = os.path.join(self.working_dir, file_name)
+            self.assertTrue(os.path.exists(path + '.offsets'))
+
+            with patch.object(FastForwardXmlFileContext, '_copy_content') as mock_copy:
+                context = self._publish(file_name, ['c'], offset_index=True)
+
+            self.assertFalse(mock_copy.called)
+            self.assertEqual(context.existing_offsets, (63, 103))
+            self.assertEqual(self._read(path),
+                             '<?xml version="1.0" encoding="UTF-8"?>\n<metadata packages="30">'
+                             '<package>a</package><package>b</package><package>c</package>'
+                             '</metadata>')
+            self.assertEqual(sorted(os.listdir(self.working_dir)),
+                             [file_name, file_name + '.offsets'])
+            os.unlink(path)
+            os.unlink(path + '.offsets')
+
+    def test_fast_forward_offset_index_checksum(self):
+        first = self._publish('index.xml.gz', ['a'], offset_index=True, checksum_type=TYPE_SHA1)
+        self.assertTrue(os.path.exists(first.metadata_file_path + '.offsets'))
+
+        second = self._publish('index.xml.gz', ['b'], offset_index=True, checksum_type=TYPE_SHA1)
+
+        self.assertEqual(second.existing_offsets, (63, 83))
+        self.assertTrue(self._read(second.metadata_file_path).endswith(
+            '<package>a</package><package>b</package></metadata>'))
+        # the previous file is preserved
+        self.assertTrue(os.path.exists(first.metadata_file_path))
+
+    def test_fast_forward_stale_offset_index(self):
+        self._publish('index.xml', ['a'], offset_index=True)
+        path = os.path.join(self.working_dir, 'index.xml')
+        with open(path, 'w') as h:
+            h.write('<metadata><package>x</package><package>y</package></metadata>')
+
+        context = self._publish('index.xml', ['z'], offset_index=True)
+
+        self.assertEqual(context.existing_offsets, None)
+        self.assertTrue(self._read(path).endswith(
+            '<package>x</package><package>y</package><package>z</package></metadata>'))
+
+    def test_fast_forward_offset_index_mismatch(self):
+        self._publish('index.xml', ['a'], offset_index=True)
+        path = os.path.join(self.working_dir, 'index.xml')
+        stat = os.stat(path)
+        with open(path + '.offsets', 'w') as h:
+            json.dump({'size': stat.st_size, 'mtime': stat.st_mtime, 'start': 2, 'end': 10}, h)
+
+        self._publish('index.xml', ['b'], offset_index=True)
+
+        # the content was searched for instead
+        self.assertTrue(self._read(path).endswith(
+            '<metadata packages="30"><package>a</package><package>b</package></metadata>'))
+
+    @patch('pulp.plugins.util.metadata_writer.BUFFER_SIZE', new=3)
+    def test_fast_forward_end_tag_spans_reads(self):
+        self._publish('index.xml.gz', ['a', 'b'])
+
+        self._publish('index.xml.gz', ['c'])
+
+        self.assertTrue(self._read(os.path.join(self.working_dir, 'index.xml.gz')).endswith(
+            '<metadata packages="30"><package>a</package><package>b</package>'
+            '<package>c</package></metadata>'))
+
     @patch('pulp.plugins.util.metadata_writer.XMLGenerator')
     def test_write_file_header_no_fast_forward(self, mock_generator):
         context = FastForwardXmlFileContext(os.path.join(self.working_dir, 'aa.xml'),
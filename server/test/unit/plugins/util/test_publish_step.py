@@ -1,4 +1,5 @@
 import contextlib
+import errno
 import os
 import shutil
 import sys
@@ -473,6 +474,30 @@ class PluginStepTests(PluginBase):
 
         step.report_progress.assert_called_once_with(force=True)
 
+    @patch('pulp.plugins.util.publish_step.instrumentation.record_step')
+    def test_process_records_phases(self, mock_record_step):
+        step = publish_step.PluginStep('foo_step', working_dir=self.working_dir,
+                                       conduit=self.conduit)
+        step.report_progress = Mock()
+
+        step.process()
+
+        phases = [c[0][:2] for c in mock_record_step.call_args_list]
+        self.assertEqual(phases, [('foo_step', 'initialize'), ('foo_step', 'process'),
+                                  ('foo_step', 'finalize'), ('foo_step', 'post_process')])
+
+    @patch('pulp.plugins.util.publish_step.instrumentation.record_step')
+    def test_process_records_phases_on_error(self, mock_record_step):
+        step = publish_step.PluginStep('foo_step', working_dir=self.working_dir,
+                                       conduit=self.conduit)
+        step.report_progress = Mock()
+        step.initialize = Mock(side_effect=ValueError())
+
+        self.assertRaises(ValueError, step.process)
+
+        phases = [c[0][:2] for c in mock_record_step.call_args_list]
+        self.assertEqual(phases, [('foo_step', 'initialize'), ('foo_step', 'finalize')])
+
     def test_clear_children(self):
         step = publish_step.PublishStep("foo")
         step.children = ['bar']
@@ -757,6 +782,56 @@ class TestAtomicDirectoryPublishStep(unittest.TestCase):
         self.assertTrue(os.path.exists(existing_file))
         self.assertEquals(1, len(os.listdir(master_dir)))
 
+    @patch('pulp.server.util.reflink', return_value=False)
+    @patch('selinux.restorecon')
+    def test_process_main_cross_device(self, restorecon, mock_reflink):
+        source_dir = os.path.join(self.working_directory, 'source')
+        master_dir = os.path.join(self.working_directory, 'master')
+        publish_dir = os.path.join(self.working_directory, 'publish', 'bar')
+        step = publish_step.AtomicDirectoryPublishStep(source_dir, [('/', publish_dir)], master_dir)
+        step.parent = Mock(timestamp=str(time.time()))
+
+        os.makedirs(source_dir)
+        for name in ('foo.html', 'bar.html'):
+            with open(os.path.join(source_dir, name), 'w') as f:
+                f.write('12345')
+        os.symlink('/var/lib/pulp/unit', os.path.join(source_dir, 'unit'))
+        # the previous master has an unchanged copy of foo.html
+        previous_dir = os.path.join(master_dir, '1.0')
+        os.makedirs(previous_dir)
+        shutil.copy2(os.path.join(source_dir, 'foo.html'), previous_dir)
+
+        real_rename = os.rename
+
+        def rename(src, dst):
+            if src == source_dir:
+                raise OSError(errno.EXDEV, 'cross device')
+            real_rename(src, dst)
+
+        with patch('os.rename', side_effect=rename):
+            step.process_main()
+
+        timestamp_master_dir = os.path.join(master_dir, step.parent.timestamp)
+        restorecon.assert_called_once_with(timestamp_master_dir.encode('utf-8'), recursive=True)
+        self.assertEqual(os.listdir(master_dir), [step.parent.timestamp])
+        self.assertEqual(os.readlink(publish_dir), timestamp_master_dir)
+        self.assertEqual(sorted(os.listdir(timestamp_master_dir)), ['bar.html', 'foo.html', 'unit'])
+        self.assertEqual(os.readlink(os.path.join(timestamp_master_dir, 'unit')),
+                         '/var/lib/pulp/unit')
+        # foo.html was hard linked to the previous master, only bar.html was copied
+        self.assertEqual(step.progress_bytes, 5)
+        report = step.get_progress_report()[0]
+        self.assertEqual(report[reporting_constants.PROGRESS_NUM_BYTES_KEY], 5)
+
+    def test_previous_master_dir(self):
+        master_dir = os.path.join(self.working_directory, 'master')
+        for name in ('1.5', '10.25', '.30.0', '30.0', 'other'):
+            os.makedirs(os.path.join(master_dir, name))
+        step = publish_step.AtomicDirectoryPublishStep('source', [], master_dir)
+        step.parent = Mock(timestamp='30.0')
+
+        self.assertEqual(step._previous_master_dir(), os.path.join(master_dir, '10.25'))
+
 
 class TestSaveTarFilePublishStep(unittest.TestCase):
     def setUp(self):
@@ -779,6 +854,66 @@ class TestSaveTarFilePublishStep(unittest.TestCase):
             names = tar_file.getnames()
             # the first item is either '' or '.' depending on if this is py2.7 or py2.6
             self.assertEquals(names[1:], ['foo.txt'])
+        self.assertEquals(os.listdir(os.path.dirname(target_file)), ['target.tar'])
+        self.assertEquals(os.listdir(source_dir), ['foo.txt'])
+
+    def test_process_main_compressed(self):
+        source_dir = os.path.join(self.working_directory, 'source')
+        os.makedirs(source_dir)
+        with open(os.path.join(self.working_directory, 'unit'), 'w') as f:
+            f.write('content of the unit')
+        os.symlink(os.path.join(self.working_directory, 'unit'), os.path.join(source_dir, 'unit'))
+        target_file = os.path.join(self.working_directory, 'target.tar.gz')
+        step = publish_step.SaveTarFilePublishStep(source_dir, target_file, compression='gz',
+                                                   workers=2)
+
+        step.process_main()
+
+        with contextlib.closing(tarfile.open(target_file, 'r:gz')) as tar_file:
+            member = tar_file.getmember('unit')
+            # symlinks are followed
+            self.assertTrue(member.isfile())
+            self.assertEquals(tar_file.extractfile(member).read(), 'content of the unit')
+        self.assertEquals(oct(os.stat(target_file).st_mode & 0777), '0644')
+
+    @patch('pulp.plugins.util.publish_step.SaveTarFilePublishStep.report_progress')
+    def test_process_main_progress(self, mock_report):
+        source_dir = os.path.join(self.working_directory, 'source')
+        os.makedirs(source_dir)
+        with open(os.path.join(source_dir, 'foo.txt'), 'w') as f:
+            f.write('x' * 100000)
+        target_file = os.path.join(self.working_directory, 'target.tar')
+        step = publish_step.SaveTarFilePublishStep(source_dir, target_file)
+        step.PROGRESS_INTERVAL = 40000
+
+        step.process_main()
+
+        self.assertEquals(step.progress_bytes, os.path.getsize(target_file))
+        self.assertEquals(mock_report.call_count, step.progress_bytes / 40000)
+
+    @patch('tarfile.TarFile.add', side_effect=IOError('disk full'))
+    def test_process_main_failed(self, mock_add):
+        source_dir = os.path.join(self.working_directory, 'source')
+        os.makedirs(source_dir)
+        target_file = os.path.join(self.working_directory, 'target', 'target.tar')
+        step = publish_step.SaveTarFilePublishStep(source_dir, target_file)
+
+        self.assertRaises(IOError, step.process_main)
+
+        self.assertEquals(os.listdir(os.path.dirname(target_file)), [])
+
+    @patch('pulp.plugins.util.publish_step.compressed_writer')
+    @patch('tarfile.TarFile.add', side_effect=IOError('disk full'))
+    def test_process_main_failed_aborts_writer(self, mock_add, mock_writer):
+        source_dir = os.path.join(self.working_directory, 'source')
+        os.makedirs(source_dir)
+        target_file = os.path.join(self.working_directory, 'target.tar.gz')
+        step = publish_step.SaveTarFilePublishStep(source_dir, target_file, compression='gz')
+
+        self.assertRaises(IOError, step.process_main)
+
+        mock_writer.return_value.abort.assert_called_once_with()
+        self.assertFalse(mock_writer.return_value.close.called)
 
 
 class TestCopyDirectoryStep(unittest.TestCase):
@@ -1006,13 +1141,15 @@ class DownloadStepTests(unittest.TestCase):
         dlstep.process_main()
         mock_downloader.download.assert_called_once_with(['fake', 'downloads'])
 
-    def test_download_succeeded(self):
+    @patch('pulp.plugins.util.publish_step.instrumentation.record_bytes')
+    def test_download_succeeded(self, mock_record_bytes):
         dlstep = publish_step.DownloadStep('fake-step')
         mock_report = Mock()
         mock_report_progress = Mock()
         dlstep.report_progress = mock_report_progress
         dlstep.download_succeeded(mock_report)
         self.assertEquals(dlstep.progress_successes, 1)
+        mock_record_bytes.assert_called_once_with(downloaded=mock_report.bytes_downloaded)
         # assert report_progress was called with no args
         mock_report_progress.assert_called_once_with()
 
@@ -1063,7 +1200,7 @@ class DownloadStepTests(unittest.TestCase):
         dlstep.cancel()
 
 
-@patch('pulp.plugins.util.publish_step.repo_controller.associate_single_unit')
+@patch('pulp.plugins.util.publish_step.manager_factory.repo_unit_association_manager')
 @patch('pulp.plugins.util.publish_step.units_controller.find_units')
 class TestGetLocalUnitsStep(unittest.TestCase):
 
@@ -1111,6 +1248,7 @@ class TestGetLocalUnitsStep(unittest.TestCase):
 
         self.assertEqual(self.step.conduit.save_unit.call_count, 0)
         self.assertEqual(self.step.units_to_download, [])
+        self.assertFalse(mock_associate.return_value.associate_units.called)
 
     @patch('pulp.plugins.util.publish_step.misc.paginate')
     def test_calls_get_multiple(self, mock_paginate, mock_find_units, mock_associate):
@@ -1133,7 +1271,8 @@ class TestGetLocalUnitsStep(unittest.TestCase):
         mock_find_units.return_value = [existing_demo]
 
         self.step.process_main()
-        mock_associate.assert_called_once_with('fake_repo', existing_demo)
+        mock_associate.return_value.associate_units.assert_called_once_with(
+            'fake-repo', [('demo_model', 'foo')], refresh_existing=True)
         mock_find_units.assert_called_once_with((demo, ))
 
         # Ensure that the unit was not marked for download
@@ -1155,7 +1294,8 @@ class TestGetLocalUnitsStep(unittest.TestCase):
         mock_find_units.assert_called_once_with((demo_1, demo_2))
 
         # the one that exists is associated
-        mock_associate.assert_called_once_with('fake_repo', existing_demo)
+        mock_associate.return_value.associate_units.assert_called_once_with(
+            'fake-repo', [('demo_model', 'foo')], refresh_existing=True)
         # the one that does not exist yet is added to the download list
         self.assertEqual(self.step.units_to_download, [demo_1])
 
@@ -1183,7 +1323,8 @@ class TestGetLocalUnitsStep(unittest.TestCase):
         # being ignored and the correct available_units is being used instead.
         mock_find_units.assert_called_once_with((demo_1, demo_2, demo_3))
         # the one that exists is associated
-        mock_associate.assert_called_once_with('fake_repo', existing_demo)
+        mock_associate.return_value.associate_units.assert_called_once_with(
+            'fake-repo', [('demo_model', 'foo')], refresh_existing=True)
         # the two that do not exist yet are added to the download list
         self.assertEqual(step.units_to_download, [demo_1, demo_3])
 
@@ -1227,10 +1368,67 @@ class TestCreateManifestStep(unittest.TestCase):
         # make sure the description has some value
         self.assertTrue(step.description)
 
+    @patch('pulp.plugins.util.manifest_writer.checksum_cache_path', spec_set=True)
     @patch('pulp.plugins.util.manifest_writer.make_manifest_for_dir', spec_set=True)
-    def test_process_main(self, mock_make_manifest):
+    def test_process_main(self, mock_make_manifest, mock_cache_path):
         step = publish_step.CreatePulpManifestStep('/foo/')
 
         step.process_main()
 
-        mock_make_manifest.assert_called_once_with('/foo/')
+        mock_make_manifest.assert_called_once_with('/foo/',
+                                                   cache_path=mock_cache_path.return_value)
+
+
+class TestRSyncFastForwardUnitPublishStep(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.storage_dir = os.path.join(self.working_dir, 'storage')
+        units_dir = os.path.join(self.storage_dir, 'content', 'units', 'rpm')
+        os.makedirs(units_dir)
+        self.units = []
+        for name in ('a.rpm', 'b.rpm'):
+            storage_path = os.path.join(units_dir, name)
+            touch(storage_path)
+            unit = Mock(storage_path=storage_path, type_id='rpm', checksum='sum-' + name)
+            unit.get_symlink_name.return_value = 'Packages/' + name
+            self.units.append(unit)
+
+        config = PluginCallConfiguration(None, {'remote': {'root': '/srv'}})
+        self.step = publish_step.RSyncFastForwardUnitPublishStep(
+            'rsync', [], config=config, remote_repo_path='/repo')
+        self.step.get_working_dir = Mock(return_value=self.working_dir)
+        self.step.parent = Mock(content_unit_file_list=[], symlink_list=[], remote_manifest=None)
+        self.step.parent.get_units_directory_dest_path.return_value = 'content/units'
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    @patch('pulp.plugins.util.publish_step.pulp_config')
+    def test_process_main(self, mock_config):
+        mock_config.get.return_value = self.storage_dir
+
+        for unit in self.units:
+            self.step.process_main(item=unit)
+
+        self.assertEqual(self.step.parent.content_unit_file_list, ['rpm/a.rpm', 'rpm/b.rpm'])
+        self.assertEqual(self.step.parent.symlink_list, ['Packages/a.rpm', 'Packages/b.rpm'])
+        link = os.path.join(self.working_dir, '.relative', 'Packages', 'a.rpm')
+        self.assertEqual(os.readlink(link), '../../content/units/rpm/a.rpm')
+
+    @patch('pulp.plugins.util.publish_step.pulp_config')
+    def test_process_main_manifest(self, mock_config):
+        mock_config.get.return_value = self.storage_dir
+        manifest = self.step.parent.remote_manifest = Mock()
+        # a.rpm is on the remote server, b.rpm is but not linked into this repository
+        manifest.has_file.side_effect = [True, True]
+        manifest.has_link.side_effect = [True, False]
+
+        for unit in self.units:
+            self.step.process_main(item=unit)
+
+        self.assertEqual(self.step.parent.content_unit_file_list, [])
+        self.assertEqual(self.step.parent.symlink_list, ['Packages/b.rpm'])
+        self.assertEqual(self.step.units_skipped, 1)
+        manifest.has_file.assert_any_call('content/units/rpm/a.rpm', 0, 'sum-a.rpm')
+        manifest.has_link.assert_any_call('repo/Packages/a.rpm', 'content/units/rpm/a.rpm')
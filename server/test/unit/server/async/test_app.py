@@ -88,3 +88,17 @@ class InitializeWorkerTestCase(unittest.TestCase):
 
         self.assertEquals(2, len(mock_rm_lock().save.mock_calls))
         mock_time.sleep.assert_called_once_with(PULP_PROCESS_HEARTBEAT_INTERVAL)
+
+
+class DeliverQueuedEventsTestCase(unittest.TestCase):
+    """
+    This class contains tests for the deliver_queued_events() function.
+    """
+    @mock.patch('pulp.server.async.app.delivery.drain')
+    def test_deliver_queued_events(self, mock_drain):
+        """
+        Assert that a worker child process waits for its queued events when it shuts down.
+        """
+        app.deliver_queued_events(pid=1, exitcode=0)
+
+        mock_drain.assert_called_once_with(app.delivery.EXIT_TIMEOUT)
@@ -15,6 +15,7 @@ from pulp.server.constants import PULP_DJANGO_SETTINGS_MODULE
 from pulp.server.controllers.repository import queue_download_deferred
 from pulp.server.db.reaper import queue_reap_expired_documents
 from pulp.server.maintenance.monthly import queue_monthly_maintenance
+from pulp.server.managers.content.orphan import queue_reconcile_orphan_counts
 
 
 class TestCelerybeatSchedule(unittest.TestCase):
@@ -30,7 +31,7 @@ class TestCelerybeatSchedule(unittest.TestCase):
         """
         # Please read the docblock to this test if you find yourself needing to adjust this
         # assertion.
-        self.assertEqual(len(celery_instance.celery.conf['CELERYBEAT_SCHEDULE']), 3)
+        self.assertEqual(len(celery_instance.celery.conf['CELERYBEAT_SCHEDULE']), 4)
 
     def test_reap_expired_documents(self):
         """
@@ -70,6 +71,20 @@ class TestCelerybeatSchedule(unittest.TestCase):
             expected_download_deferred
         )
 
+    def test_reconcile_orphan_counts(self):
+        """
+        Make sure the reconcile_orphan_counts Task is present and properly configured.
+        """
+        expected_reconcile = {
+            'task': queue_reconcile_orphan_counts.name,
+            'schedule': timedelta(days=1),
+            'args': tuple(),
+        }
+        self.assertEqual(
+            celery_instance.celery.conf['CELERYBEAT_SCHEDULE']['reconcile_orphan_counts'],
+            expected_reconcile
+        )
+
     def test_celery_conf_updated(self):
         """
         Make sure the Celery config was updated with our CELERYBEAT_SCHEDULE.
@@ -0,0 +1,107 @@
+"""
+This module contains tests for the pulp.server.async.instrumentation module.
+"""
+import os
+import tempfile
+import unittest
+
+import mock
+
+from pulp.server.async import instrumentation
+
+
+@mock.patch('pulp.server.async.instrumentation.config')
+class TestInstrumentation(unittest.TestCase):
+
+    def tearDown(self):
+        instrumentation.stop()
+
+    def test_disabled(self, mock_config):
+        mock_config.getboolean.return_value = False
+
+        instrumentation.start()
+        instrumentation.record_step('step', 'process', 1.0)
+
+        self.assertEqual(instrumentation.stop(), None)
+        mock_config.getboolean.assert_called_once_with('profiling', 'instrumentation')
+
+    @mock.patch('pulp.server.async.instrumentation.time.time')
+    def test_metrics(self, mock_time, mock_config):
+        mock_config.getboolean.return_value = True
+        mock_time.return_value = 100
+        instrumentation.start()
+
+        instrumentation.record_step('step', 'initialize', 0.5)
+        instrumentation.record_step('step', 'process', 1.0)
+        instrumentation.record_step('step', 'process', 2.0)
+        instrumentation.record_bytes(downloaded=10)
+        instrumentation.record_bytes(written=20)
+        listener = instrumentation.MongoCommandListener()
+        listener.succeeded(mock.Mock(command_name='find', duration_micros=2000))
+        listener.succeeded(mock.Mock(command_name='find', duration_micros=1000))
+        listener.failed(mock.Mock(command_name='update', duration_micros=500))
+        mock_time.return_value = 105
+
+        metrics = instrumentation.stop()
+
+        self.assertTrue(metrics.pop('max_rss') > 0)
+        self.assertEqual(metrics, {
+            'wall_time': 5,
+            'steps': {'step': {'initialize': 0.5, 'process': 3.0}},
+            'mongo': {'count': 3, 'time': 0.0035,
+                      'commands': {'find': {'count': 2, 'time': 0.003},
+                                   'update': {'count': 1, 'time': 0.0005}}},
+            'bytes_downloaded': 10,
+            'bytes_written': 20,
+        })
+        self.assertEqual(instrumentation.stop(), None)
+
+    def test_not_measured(self, mock_config):
+        """
+        Nothing is recorded outside of tasks.
+        """
+        instrumentation.record_step('step', 'process', 1.0)
+        instrumentation.record_bytes(downloaded=10)
+        instrumentation.record_file_written('/does/not/exist')
+        instrumentation.MongoCommandListener().succeeded(mock.Mock())
+
+        self.assertEqual(instrumentation.stop(), None)
+
+    def test_record_file_written(self, mock_config):
+        mock_config.getboolean.return_value = True
+        instrumentation.start()
+        with tempfile.NamedTemporaryFile() as temp_file:
+            temp_file.write('x' * 42)
+            temp_file.flush()
+            instrumentation.record_file_written(os.path.abspath(temp_file.name))
+
+        self.assertEqual(instrumentation.stop()['bytes_written'], 42)
+
+    @mock.patch('pulp.server.async.instrumentation.monitoring.register')
+    @mock.patch('pulp.server.async.instrumentation._listener_registered', False)
+    def test_register_mongo_listener(self, mock_register, mock_config):
+        mock_config.getboolean.return_value = True
+
+        instrumentation.register_mongo_listener()
+        instrumentation.register_mongo_listener()
+
+        self.assertEqual(mock_register.call_count, 1)
+        self.assertTrue(isinstance(mock_register.call_args[0][0],
+                                   instrumentation.MongoCommandListener))
+
+    @mock.patch('pulp.server.async.instrumentation.random.randint')
+    def test_sample_profile(self, mock_randint, mock_config):
+        mock_config.getint.return_value = 10
+        mock_randint.return_value = 1
+        self.assertTrue(instrumentation.sample_profile())
+        mock_randint.assert_called_once_with(1, 10)
+
+        mock_randint.return_value = 2
+        self.assertFalse(instrumentation.sample_profile())
+
+    @mock.patch('pulp.server.async.instrumentation.random.randint')
+    def test_sample_profile_disabled(self, mock_randint, mock_config):
+        mock_config.getint.return_value = 0
+
+        self.assertFalse(instrumentation.sample_profile())
+        self.assertFalse(mock_randint.called)
@@ -1,5 +1,7 @@
 import unittest
 
+import mock
+
 from pulp.server.auth import authorization
 
 
@@ -29,3 +31,123 @@ class TestAuthorization(unittest.TestCase):
         self.assertEqual(_lookup(4), 'EXECUTE')
         invalid_operation_value = 1000
         self.assertRaises(KeyError, _lookup, invalid_operation_value)
+
+
+class TestPermissionTree(unittest.TestCase):
+
+    def setUp(self):
+        self.tree = authorization.PermissionTree()
+
+    def test_resource(self):
+        self.tree.add('/v2/repositories/zoo/', [authorization.READ, authorization.UPDATE])
+
+        self.assertTrue(self.tree.is_authorized('/v2/repositories/zoo/', authorization.READ))
+        self.assertTrue(self.tree.is_authorized('/v2/repositories/zoo/', authorization.UPDATE))
+        self.assertFalse(self.tree.is_authorized('/v2/repositories/zoo/', authorization.DELETE))
+
+    def test_base_resource(self):
+        """
+        Operations granted on a resource are granted on the resources below it.
+        """
+        self.tree.add('/v2/repositories/', [authorization.READ])
+
+        self.assertTrue(self.tree.is_authorized('/v2/repositories/zoo/', authorization.READ))
+        self.assertTrue(self.tree.is_authorized('/v2/repositories/', authorization.READ))
+        self.assertFalse(self.tree.is_authorized('/v2/', authorization.READ))
+        self.assertFalse(self.tree.is_authorized('/v2/repositories2/', authorization.READ))
+        self.assertFalse(self.tree.is_authorized('/', authorization.READ))
+
+    def test_root(self):
+        self.tree.add('/', [authorization.EXECUTE])
+
+        self.assertTrue(self.tree.is_authorized('/v2/tasks/', authorization.EXECUTE))
+        self.assertTrue(self.tree.is_authorized('/', authorization.EXECUTE))
+        self.assertFalse(self.tree.is_authorized('/v2/tasks/', authorization.READ))
+
+    def test_not_canonical(self):
+        """
+        Resources not in the /a/b/ form are ignored, they never matched a resource.
+        """
+        self.tree.add('/v2/repositories', [authorization.READ])
+        self.tree.add('v2/', [authorization.READ])
+
+        self.assertFalse(self.tree.is_authorized('/v2/repositories/', authorization.READ))
+
+    def test_empty(self):
+        self.assertFalse(self.tree.is_authorized('/', authorization.READ))
+
+    @mock.patch('pulp.server.auth.authorization.Permission.get_collection')
+    def test_load(self, mock_collection):
+        mock_collection.return_value.find.return_value = [
+            {'resource': '/v2/repositories/', 'users': [{'username': 'user1',
+                                                         'permissions': [authorization.READ]}]},
+            {'resource': '/v2/tasks/', 'users': [{'username': 'user1',
+                                                  'permissions': [authorization.DELETE]}]}]
+
+        tree = authorization.PermissionTree.load('user1')
+
+        mock_collection.return_value.find.assert_called_once_with(
+            {'users.username': 'user1'},
+            {'resource': 1, 'users': {'$elemMatch': {'username': 'user1'}}})
+        self.assertTrue(tree.is_authorized('/v2/repositories/zoo/', authorization.READ))
+        self.assertTrue(tree.is_authorized('/v2/tasks/1/', authorization.DELETE))
+        self.assertFalse(tree.is_authorized('/v2/tasks/1/', authorization.READ))
+
+
+@mock.patch('pulp.server.auth.authorization.PermissionVersion.get_collection')
+class TestPermissionVersion(unittest.TestCase):
+
+    def test_version(self, mock_collection):
+        mock_collection.return_value.find_one.return_value = {'_id': 'permissions', 'version': 3}
+        self.assertEqual(authorization.permission_version(), 3)
+        mock_collection.return_value.find_one.assert_called_once_with({'_id': 'permissions'})
+
+    def test_no_version(self, mock_collection):
+        mock_collection.return_value.find_one.return_value = None
+        self.assertEqual(authorization.permission_version(), 0)
+
+    def test_permissions_changed(self, mock_collection):
+        authorization.permissions_changed()
+        mock_collection.return_value.update.assert_called_once_with(
+            {'_id': 'permissions'}, {'$inc': {'version': 1}}, upsert=True)
+
+
+@mock.patch('pulp.server.auth.authorization.PermissionTree.load')
+@mock.patch('pulp.server.auth.authorization.permission_version')
+class TestPermissionCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = authorization.PermissionCache(capacity=2)
+
+    def test_cached(self, mock_version, mock_load):
+        mock_version.return_value = 1
+
+        tree = self.cache.get('user1')
+
+        self.assertTrue(tree is mock_load.return_value)
+        self.assertTrue(self.cache.get('user1') is tree)
+        mock_load.assert_called_once_with('user1')
+        self.assertEqual(mock_version.call_count, 2)
+
+    def test_version_changed(self, mock_version, mock_load):
+        mock_version.return_value = 1
+        self.cache.get('user1')
+        mock_version.return_value = 2
+        self.cache.get('user1')
+
+        self.assertEqual(mock_load.call_count, 2)
+
+    def test_capacity(self, mock_version, mock_load):
+        mock_version.return_value = 1
+        for login in ('user1', 'user2', 'user3'):
+            self.cache.get(login)
+
+        self.assertEqual(len(self.cache), 2)
+        self.cache.get('user1')
+        self.assertEqual(mock_load.call_count, 4)
+
+    def test_clear(self, mock_version, mock_load):
+        mock_version.return_value = 1
+        self.cache.get('user1')
+        self.cache.clear()
+        self.assertEqual(len(self.cache), 0)
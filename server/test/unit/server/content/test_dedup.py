@@ -0,0 +1,82 @@
+import os
+import shutil
+import tempfile
+
+from hashlib import sha256
+from unittest import TestCase
+
+from mock import patch
+
+from pulp.server.content import dedup
+
+
+class TestDedup(TestCase):
+
+    def setUp(self):
+        self.storage_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.storage_dir)
+        settings = {'storage_dir': self.storage_dir}
+        for module in ('dedup', 'storage'):
+            patcher = patch('pulp.server.content.%s.config' % module)
+            config = patcher.start()
+            self.addCleanup(patcher.stop)
+            config.get = lambda s, p: settings[p]
+        self.units_dir = os.path.join(self.storage_dir, 'content', 'units')
+        self.paths = [self.write('a', 'content'), self.write('b', 'content'),
+                      self.write('c', 'other')]
+        digest = sha256('content').hexdigest()
+        self.blob = os.path.join(self.storage_dir, 'content', 'blobs', digest[0:2], digest[2:])
+
+    def write(self, name, content):
+        path = os.path.join(self.units_dir, name)
+        if not os.path.isdir(self.units_dir):
+            os.makedirs(self.units_dir)
+        with open(path, 'w') as fp:
+            fp.write(content)
+        return path
+
+    def test_dedupe_hardlink(self):
+        report = dedup.dedupe('hardlink')
+
+        self.assertEqual(report, {'deduplicated': 3, 'bytes_freed': 7, 'failed': 0})
+        self.assertTrue(os.path.samefile(self.paths[0], self.blob))
+        self.assertTrue(os.path.samefile(self.paths[1], self.blob))
+        self.assertEqual(os.stat(self.paths[2]).st_nlink, 2)
+
+        # already deduplicated
+        self.assertEqual(dedup.dedupe('hardlink'),
+                         {'deduplicated': 0, 'bytes_freed': 0, 'failed': 0})
+
+    def test_dedupe_symlink(self):
+        report = dedup.dedupe('symlink')
+
+        self.assertEqual(report, {'deduplicated': 3, 'bytes_freed': 7, 'failed': 0})
+        self.assertEqual(os.readlink(self.paths[0]), self.blob)
+        self.assertEqual(os.readlink(self.paths[1]), self.blob)
+        with open(self.paths[1]) as fp:
+            self.assertEqual(fp.read(), 'content')
+        self.assertEqual(os.stat(self.blob).st_nlink, 1)
+
+    def test_dedupe_dry_run(self):
+        report = dedup.dedupe('hardlink', dry_run=True)
+
+        self.assertEqual(report, {'deduplicated': 3, 'bytes_freed': 7, 'failed': 0})
+        self.assertFalse(os.path.exists(os.path.join(self.storage_dir, 'content', 'blobs')))
+        self.assertEqual(os.stat(self.paths[0]).st_nlink, 1)
+
+    def test_collect_blobs(self):
+        dedup.dedupe('symlink')
+        os.remove(self.paths[0])
+
+        # the blob is still referenced
+        self.assertEqual(dedup.collect_blobs(grace_period=0), {'removed': 0, 'bytes_freed': 0})
+        os.remove(self.paths[1])
+        # the blob was referenced recently
+        self.assertEqual(dedup.collect_blobs(), {'removed': 0, 'bytes_freed': 0})
+        self.assertEqual(dedup.collect_blobs(dry_run=True, grace_period=0),
+                         {'removed': 1, 'bytes_freed': 7})
+        self.assertTrue(os.path.exists(self.blob))
+
+        self.assertEqual(dedup.collect_blobs(grace_period=0), {'removed': 1, 'bytes_freed': 7})
+        self.assertFalse(os.path.exists(self.blob))
+        self.assertTrue(os.path.exists(self.paths[2]))
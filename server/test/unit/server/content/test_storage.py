@@ -1,11 +1,15 @@
 import os
+import shutil
+import tempfile
 
 from errno import EEXIST, EPERM
+from hashlib import sha256
 from unittest import TestCase
 
 from mock import Mock, patch
 
 from pulp.plugins.util import verification
+from pulp.server.content import storage as content_storage
 from pulp.server.content.storage import mkdir, ContentStorage, FileStorage, SharedStorage
 
 
@@ -333,3 +337,99 @@ class TestSharedStorage(TestCase):
         symlink.side_effect = OSError()
         symlink.side_effect.errno = EPERM
         self.assertRaises(OSError, storage.link, unit)
+
+
+class TestDedupStorage(TestCase):
+
+    def setUp(self):
+        self.storage_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.storage_dir)
+        self.settings = {'storage_dir': self.storage_dir, 'dedup_storage': 'hardlink'}
+        patcher = patch('pulp.server.content.storage.config')
+        config = patcher.start()
+        self.addCleanup(patcher.stop)
+        config.get = lambda s, p: self.settings[p]
+        self.source = os.path.join(self.storage_dir, 'source')
+        with open(self.source, 'w') as fp:
+            fp.write('content')
+        self.blob = os.path.join(self.storage_dir, 'content', 'blobs',
+                                 sha256('content').hexdigest()[0:2],
+                                 sha256('content').hexdigest()[2:])
+
+    def unit(self, name):
+        path = os.path.join(self.storage_dir, 'content', 'units', 'test', name)
+        return Mock(spec=['storage_path'], storage_path=path)
+
+    def test_dedup_mode(self):
+        self.assertEqual(content_storage.dedup_mode(), 'hardlink')
+        self.settings['dedup_storage'] = 'Symlink'
+        self.assertEqual(content_storage.dedup_mode(), 'symlink')
+        self.settings['dedup_storage'] = 'false'
+        self.assertEqual(content_storage.dedup_mode(), None)
+
+    def test_put_hardlink(self):
+        units = [self.unit('a'), self.unit('b')]
+        for unit in units:
+            FileStorage().put(unit, self.source)
+
+        for unit in units:
+            self.assertTrue(os.path.samefile(unit.storage_path, self.blob))
+        self.assertEqual(os.stat(self.blob).st_nlink, 3)
+        # no temporary files are left
+        self.assertEqual(os.listdir(os.path.dirname(os.path.dirname(self.blob))),
+                         [os.path.basename(os.path.dirname(self.blob))])
+
+    def test_put_symlink(self):
+        self.settings['dedup_storage'] = 'symlink'
+        unit = self.unit('a')
+
+        FileStorage().put(unit, self.source)
+
+        self.assertEqual(os.readlink(unit.storage_path), self.blob)
+        with open(unit.storage_path) as fp:
+            self.assertEqual(fp.read(), 'content')
+
+    def test_put_incorrect_size(self):
+        unit = self.unit('a')
+        unit.verify_size = Mock(side_effect=verification.VerificationException(1))
+
+        self.assertRaises(verification.VerificationException, FileStorage().put, unit,
+                          self.source)
+        self.assertFalse(os.path.lexists(unit.storage_path))
+        self.assertFalse(os.path.lexists(self.blob))
+        self.assertEqual(os.listdir(content_storage.blobs_dir()), [])
+
+    def test_unreferenced_blob(self):
+        units = [self.unit('a'), self.unit('b')]
+        for unit in units:
+            FileStorage().put(unit, self.source)
+
+        self.assertEqual(content_storage.unreferenced_blob(units[0].storage_path), None)
+        os.remove(units[0].storage_path)
+        self.assertEqual(content_storage.unreferenced_blob(units[1].storage_path), self.blob)
+        self.assertEqual(content_storage.unreferenced_blob(self.source), None)
+        self.assertEqual(content_storage.unreferenced_blob('/does/not/exist'), None)
+
+    @patch('pulp.server.content.storage.file_digest')
+    def test_unreferenced_blob_not_hardlinked(self, mock_digest):
+        """
+        Files are not hashed when units are not hard linked to the blob store.
+        """
+        path = os.path.join(self.storage_dir, 'linked')
+        os.link(self.source, path)
+        for mode in ('symlink', 'false'):
+            self.settings['dedup_storage'] = mode
+            self.assertEqual(content_storage.unreferenced_blob(path), None)
+        # the blob store does not exist
+        self.settings['dedup_storage'] = 'hardlink'
+        self.assertEqual(content_storage.unreferenced_blob(path), None)
+        self.assertFalse(mock_digest.called)
+
+    def test_blob_digest(self):
+        digest = sha256('content').hexdigest()
+        self.assertEqual(content_storage.blob_digest(self.blob), digest)
+        self.assertEqual(content_storage.blob_digest(self.source), None)
+        blobs_dir = content_storage.blobs_dir()
+        self.assertEqual(content_storage.blob_digest(os.path.join(blobs_dir, 'tmpabc')), None)
+        self.assertEqual(content_storage.blob_digest(
+            os.path.join(blobs_dir, digest[0:2], 'x' * 62)), None)
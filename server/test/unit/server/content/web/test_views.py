@@ -61,7 +61,7 @@ class TestContentView(TestCase):
         # validation
         key_load.assert_called_once_with(key_path)
 
-    @patch(MODULE + '.Key.load', Mock())
+    @patch(MODULE + '.Key.signing_key', Mock())
     def test_urljoin(self):
         scheme = 'http'
         host = 'redhat.com'
@@ -194,7 +194,7 @@ class TestContentView(TestCase):
     @patch('os.path.exists')
     @patch(MODULE + '.allow_access')
     @patch(MODULE + '.ContentView.x_send')
-    @patch(MODULE + '.Key.load', Mock())
+    @patch(MODULE + '.Key.signing_key', Mock())
     def test_get_x_send(self, x_send, allow_access, exists, realpath):
         allow_access.return_value = True
         exists.return_value = True
@@ -217,7 +217,7 @@ class TestContentView(TestCase):
         self.assertEqual(reply, x_send.return_value)
 
     @patch('os.path.lexists', Mock(return_value=False))
-    @patch(MODULE + '.Key.load', Mock())
+    @patch(MODULE + '.Key.signing_key', Mock())
     @patch(MODULE + '.allow_access')
     @patch('os.path.realpath')
     def test_get_http(self, realpath, allow_access):
@@ -241,7 +241,7 @@ class TestContentView(TestCase):
     @patch(MODULE + '.pulp_conf.get', return_value='True')
     @patch(MODULE + '.allow_access')
     @patch(MODULE + '.ContentView.redirect')
-    @patch(MODULE + '.Key.load', Mock())
+    @patch(MODULE + '.Key.signing_key', Mock())
     def test_get_redirected(self, redirect, allow_access, mock_conf_get, exists, realpath):
         allow_access.return_value = True
         exists.return_value = False
@@ -268,7 +268,7 @@ class TestContentView(TestCase):
     @patch('os.path.lexists', Mock(return_value=False))
     @patch('os.path.realpath', Mock())
     @patch(MODULE + '.allow_access', Mock(return_value=True))
-    @patch(MODULE + '.Key.load', Mock())
+    @patch(MODULE + '.Key.signing_key', Mock())
     @patch(MODULE + '.pulp_conf')
     def test_get_not_found(self, pulp_conf):
         host = 'localhost'
@@ -287,7 +287,7 @@ class TestContentView(TestCase):
 
     @patch(MODULE + '.allow_access')
     @patch(MODULE + '.HttpResponseForbidden')
-    @patch(MODULE + '.Key.load', Mock())
+    @patch(MODULE + '.Key.signing_key', Mock())
     def test_get_not_authorized(self, forbidden, allow_access):
         allow_access.return_value = False
 
@@ -307,7 +307,7 @@ class TestContentView(TestCase):
 
     @patch(MODULE + '.allow_access')
     @patch(MODULE + '.HttpResponseForbidden')
-    @patch(MODULE + '.Key.load', Mock())
+    @patch(MODULE + '.Key.signing_key', Mock())
     def test_get_outside_pub(self, forbidden, allow_access):
         allow_access.return_value = True
 
@@ -340,12 +340,16 @@ class UpdateRepoUnitCountsTests(unittest.TestCase):
         repo.save.assert_called_once_with()
 
 
+@patch('pulp.server.controllers.repository.update_unit_count')
 class AssociateSingleUnitTests(unittest.TestCase):
 
+    @patch('pulp.server.controllers.repository.model.OrphanCount')
     @patch('pulp.server.controllers.repository.model.RepositoryContentUnit.objects')
     @patch('pulp.server.controllers.repository.dateutils.format_iso8601_utc_timestamp')
-    def test_unit_association(self, mock_get_timestamp, mock_rcu_objects):
+    def test_unit_association(self, mock_get_timestamp, mock_rcu_objects, mock_orphan_count,
+                              mock_update_count):
         mock_get_timestamp.return_value = 'foo_tstamp'
+        mock_rcu_objects.return_value.update_one.return_value = {'updatedExisting': False}
         test_unit = DemoModel(id='bar', key_field='baz')
         repo = MagicMock(repo_id='foo')
         repo_controller.associate_single_unit(repo, test_unit)
@@ -357,13 +361,31 @@ class AssociateSingleUnitTests(unittest.TestCase):
         mock_rcu_objects.return_value.update_one.assert_called_once_with(
             set_on_insert__created='foo_tstamp',
             set__updated='foo_tstamp',
-            upsert=True)
+            upsert=True,
+            full_result=True)
+        mock_orphan_count.units_associated.assert_called_once_with(
+            DemoModel._content_type_id.default, ['bar'])
+        mock_update_count.assert_called_once_with('foo', DemoModel._content_type_id.default, 1)
+
+    @patch('pulp.server.controllers.repository.model.OrphanCount')
+    @patch('pulp.server.controllers.repository.model.RepositoryContentUnit.objects')
+    def test_existing_association(self, mock_rcu_objects, mock_orphan_count, mock_update_count):
+        """
+        Updating an existing association does not change the orphan and unit counts.
+        """
+        mock_rcu_objects.return_value.update_one.return_value = {'updatedExisting': True}
+        test_unit = DemoModel(id='bar', key_field='baz')
+        repo_controller.associate_single_unit(MagicMock(repo_id='foo'), test_unit)
+        self.assertFalse(mock_orphan_count.units_associated.called)
+        self.assertFalse(mock_update_count.called)
 
 
+@patch('pulp.server.controllers.repository.update_unit_count')
 class TestDisassociateUnits(unittest.TestCase):
     @patch('pulp.server.controllers.repository.update_last_unit_removed')
     @patch('pulp.server.controllers.repository.model.RepositoryContentUnit.objects')
-    def test_disassociate_units(self, m_rcu_objects, m_update_last_unit_removed):
+    def test_disassociate_units(self, m_rcu_objects, m_update_last_unit_removed,
+                                m_update_count):
         """"
         Test that multiple objects are all deleted and timestamp for units removal updated
         """
@@ -375,8 +397,25 @@ class TestDisassociateUnits(unittest.TestCase):
         m_rcu_objects.return_value.delete.assert_called_once()
         m_update_last_unit_removed.assert_called_once_with('foo')
 
+    @patch('pulp.server.controllers.repository.model.OrphanCount')
+    @patch('pulp.server.controllers.repository.update_last_unit_removed')
+    @patch('pulp.server.controllers.repository.model.RepositoryContentUnit.objects')
+    def test_disassociate_units_orphan_count(self, m_rcu_objects, m_update_last_unit_removed,
+                                             m_orphan_count, m_update_count):
+        """
+        Test that the orphan count is adjusted for the units that were associated
+        """
+        m_rcu_objects.return_value.distinct.return_value = ['bar']
+        test_unit1 = DemoModel(id='bar', key_field='baz')
+        test_unit2 = DemoModel(id='baz', key_field='baz')
+        repo_controller.disassociate_units(MagicMock(repo_id='foo'), [test_unit1, test_unit2])
+        m_rcu_objects.return_value.distinct.assert_called_once_with('unit_id')
+        m_orphan_count.units_unassociated.assert_called_once_with(
+            DemoModel._content_type_id.default, ['bar'])
+        m_update_count.assert_called_once_with('foo', DemoModel._content_type_id.default, -1)
+
     @patch('pulp.server.controllers.repository.update_last_unit_removed')
-    def test_disassociate_units_empty_iterable(self, m_update_last_unit_removed):
+    def test_disassociate_units_empty_iterable(self, m_update_last_unit_removed, m_update_count):
         """"
         Test that timestamp for units removal is not updated when no units are removed
         """
@@ -545,6 +584,26 @@ class TestDelete(unittest.TestCase):
         m_task_result.assert_called_once_with(error=None, spawned_tasks=[])
         self.assertTrue(result is m_task_result.return_value)
 
+    def test_delete_marks_orphan_counts_stale(self, m_factory, m_model, m_content, m_publish,
+                                              m_sync, m_task_result, m_imp_ctrl, m_dist_ctrl):
+        """
+        The orphan counts are marked stale once the associations are removed, so a count
+        computed in between cannot miss the units that became orphans.
+        """
+        m_model.Importer.objects.return_value.first.return_value = None
+        m_model.Distributor.objects.return_value.__iter__.return_value = []
+        m_repo = m_model.Repository.objects.get_repo_or_missing_resource.return_value
+        m_repo.content_unit_counts = {'foo': 2}
+        m_factory.consumer_bind_manager.return_value.find_by_repo.return_value = []
+        calls = mock.MagicMock()
+        calls.attach_mock(m_content.get_collection.return_value.remove, 'remove')
+        calls.attach_mock(m_model.OrphanCount.mark_stale, 'mark_stale')
+
+        repo_controller.delete('foo-repo')
+
+        self.assertEqual(calls.mock_calls, [mock.call.remove({'repo_id': 'foo-repo'}),
+                                            mock.call.mark_stale(['foo'])])
+
     @mock.patch('pulp.server.controllers.repository.consumer_controller')
     def test_delete_imforms_other_collections(self, mock_consumer_ctrl, m_factory, m_model,
                                               m_content, m_publish, m_sync, m_task_result,
@@ -1810,7 +1869,7 @@ class TestGetDeferredContentUnits(unittest.TestCase):
 
 class TestCreateDownloadRequests(unittest.TestCase):
 
-    @patch(MODULE + 'Key.load', Mock())
+    @patch(MODULE + 'Key.signing_key', Mock())
     @patch(MODULE + 'common_utils.get_working_directory', Mock(return_value='/working/'))
     @patch(MODULE + 'mkdir')
     @patch(MODULE + '_get_streamer_url')
@@ -126,3 +126,86 @@ class TestGetModelSerializerForType(unittest.TestCase):
 
         serializer = units_controller.get_model_serializer_for_type('demo_model')
         self.assertTrue(serializer is None)
+
+
+@patch('pulp.server.controllers.units.config')
+@patch('pulp.server.controllers.units.types_db.type_units_collection')
+class TestRepoMemberships(unittest.TestCase):
+
+    def test_add(self, mock_collection, mock_config):
+        mock_config.getboolean.return_value = True
+
+        units_controller.add_repo_memberships('repo1', 'demo_model', ['u1', 'u2'])
+
+        mock_config.getboolean.assert_called_once_with('server', 'repo_membership_cache')
+        mock_collection.assert_called_once_with('demo_model')
+        mock_collection.return_value.update_many.assert_called_once_with(
+            {'_id': {'$in': ['u1', 'u2']}, '_repo_memberships': {'$exists': True}},
+            {'$addToSet': {'_repo_memberships': 'repo1'}})
+
+    def test_add_disabled(self, mock_collection, mock_config):
+        mock_config.getboolean.return_value = False
+
+        units_controller.add_repo_memberships('repo1', 'demo_model', ['u1'])
+
+        self.assertFalse(mock_collection.called)
+
+    def test_remove(self, mock_collection, mock_config):
+        mock_config.getboolean.return_value = True
+
+        units_controller.remove_repo_memberships('repo1', 'demo_model', ['u1'])
+
+        mock_collection.return_value.update_many.assert_called_once_with(
+            {'_id': {'$in': ['u1']}, '_repo_memberships': 'repo1'},
+            {'$pull': {'_repo_memberships': 'repo1'}})
+
+    def test_remove_all(self, mock_collection, mock_config):
+        mock_config.getboolean.return_value = True
+
+        units_controller.remove_repo_memberships('repo1', 'demo_model')
+
+        mock_collection.return_value.update_many.assert_called_once_with(
+            {'_repo_memberships': 'repo1'}, {'$pull': {'_repo_memberships': 'repo1'}})
+
+    def test_remove_no_units(self, mock_collection, mock_config):
+        mock_config.getboolean.return_value = True
+
+        units_controller.remove_repo_memberships('repo1', 'demo_model', [])
+
+        self.assertFalse(mock_collection.called)
+
+    def test_cache(self, mock_collection, mock_config):
+        """
+        The cache is created empty before the memberships are looked up.
+        """
+        mock_config.getboolean.return_value = True
+        collection = mock_collection.return_value
+        created = []
+
+        def find(unit_ids):
+            created.append(collection.update_many.called)
+            return {'u1': set(['repo1']), 'u2': set()}
+
+        memberships = units_controller.cache_repo_memberships('demo_model', ['u1', 'u2'], find)
+
+        self.assertEqual(created, [True])
+
+        self.assertEqual(memberships, {'u1': set(['repo1']), 'u2': set()})
+        collection.update_many.assert_called_once_with(
+            {'_id': {'$in': ['u1', 'u2']}, '_repo_memberships': {'$exists': False}},
+            {'$set': {'_repo_memberships': []}})
+        requests = collection.bulk_write.call_args[0][0]
+        self.assertEqual(len(requests), 1)
+        self.assertEqual(requests[0]._filter, {'_id': 'u1'})
+        self.assertEqual(requests[0]._doc,
+                         {'$addToSet': {'_repo_memberships': {'$each': ['repo1']}}})
+
+    def test_cache_disabled(self, mock_collection, mock_config):
+        mock_config.getboolean.return_value = False
+        find = MagicMock(return_value={'u1': set(['repo1'])})
+
+        memberships = units_controller.cache_repo_memberships('demo_model', ['u1'], find)
+
+        self.assertEqual(memberships, {'u1': set(['repo1'])})
+        find.assert_called_once_with(['u1'])
+        self.assertFalse(mock_collection.called)
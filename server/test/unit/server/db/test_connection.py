@@ -903,8 +903,179 @@ class TestUnsafeRetry(unittest.TestCase):
             return mock_r()
 
         m_config.getboolean.return_value = True
+        m_config.getfloat.return_value = 0
         m_logger.error.side_effect = restart_mongo
 
         final_answer = mock_func()
         m_logger.error.assert_called_once_with('mock_func operation failed on mock_coll')
         self.assertTrue(final_answer is 'final')
+
+    @patch('pulp.server.db.connection.UnsafeRetry.circuit_breaker',
+           new_callable=connection.CircuitBreaker)
+    @patch('pulp.server.db.connection.time')
+    def test_retry_decorator_budget(self, m_time, m_breaker, m_config):
+        """
+        Operations failing for longer than the retry budget raise AutoReconnect.
+        """
+        m_config.getfloat.return_value = 10
+        # the circuit opening, the start of the first failure and three budget checks
+        m_time.time.side_effect = [100, 100, 100, 106, 112]
+
+        @connection.UnsafeRetry.retry_decorator(full_name='mock_coll')
+        def mock_func():
+            raise AutoReconnect()
+
+        self.assertRaises(AutoReconnect, mock_func)
+        self.assertEqual(m_time.sleep.call_count, 2)
+        m_config.getfloat.assert_called_with('database', 'unsafe_autoretry_budget')
+        self.assertEqual(m_breaker.stats(), {'open': True, 'retries': 3, 'given_up': 1,
+                                             'time_lost': 12})
+
+    @patch('pulp.server.db.connection.UnsafeRetry.circuit_breaker',
+           new_callable=connection.CircuitBreaker)
+    @patch('pulp.server.db.connection.time')
+    def test_retry_decorator_stats(self, m_time, m_breaker, m_config):
+        """
+        Operations succeeding after retries close the circuit and are counted.
+        """
+        m_config.getfloat.return_value = 0
+        m_time.time.return_value = 100
+        mock_r = MagicMock(side_effect=[AutoReconnect(), AutoReconnect(), 'final'])
+
+        @connection.UnsafeRetry.retry_decorator(full_name='mock_coll')
+        def mock_func():
+            return mock_r()
+
+        self.assertEqual(mock_func(), 'final')
+        self.assertEqual(m_breaker.stats(), {'open': False, 'retries': 2, 'given_up': 0,
+                                             'time_lost': 0})
+
+    @patch('pulp.server.db.connection.UnsafeRetry.circuit_breaker',
+           new_callable=connection.CircuitBreaker)
+    def test_retry_decorator_other_error_closes(self, m_breaker, m_config):
+        """
+        An error other than AutoReconnect means the database answered.
+        """
+        m_breaker.failed()
+
+        @connection.UnsafeRetry.retry_decorator(full_name='mock_coll')
+        def mock_func():
+            raise ValueError()
+
+        self.assertRaises(ValueError, mock_func)
+        self.assertEqual(m_breaker.opened, None)
+
+    @patch('pulp.server.db.connection.UnsafeRetry.circuit_breaker',
+           new_callable=connection.CircuitBreaker)
+    def test_retry_decorator_nested_probe(self, m_breaker, m_config):
+        """
+        A decorated method calling another decorated method of its instance, as find_one calls
+        find, probes the database once instead of waiting for its own probe while the circuit is
+        open.
+        """
+        m_config.getboolean.return_value = True
+        m_config.getfloat.return_value = 0.01
+
+        class MockCollection(object):
+            # one is find and two is find_one
+            def one(self, spec):
+                return iter([spec])
+
+            def two(self, spec):
+                return next(self.one(spec), None)
+
+        collection = MockCollection()
+        connection.UnsafeRetry.decorate_instance(collection, 'mock_coll')
+        m_breaker.failed()
+
+        self.assertEqual(collection.two({'a': 1}), {'a': 1})
+        self.assertEqual(m_breaker.opened, None)
+        # the nesting depth is reset for the next call
+        self.assertEqual(connection.UnsafeRetry._local.depth, 0)
+
+    @patch('pulp.server.db.connection.UnsafeRetry.circuit_breaker',
+           new_callable=connection.CircuitBreaker)
+    def test_retry_decorator_interrupted_probe(self, m_breaker, m_config):
+        """
+        A probe interrupted by an exception that is not an error lets another thread probe the
+        database and resets the nesting depth.
+        """
+        m_breaker.failed()
+
+        @connection.UnsafeRetry.retry_decorator(full_name='mock_coll')
+        def mock_func():
+            raise KeyboardInterrupt()
+
+        self.assertRaises(KeyboardInterrupt, mock_func)
+        self.assertEqual(connection.UnsafeRetry._local.depth, 0)
+        self.assertTrue(m_breaker.opened is not None)
+        self.assertEqual(m_breaker._prober, None)
+
+    @patch('pulp.server.db.connection.random.uniform')
+    def test_retry_delay(self, m_uniform, m_config):
+        """
+        The retry delay doubles up to the maximum and is jittered.
+        """
+        delays = [connection.UnsafeRetry.retry_delay(attempt) for attempt in (1, 2, 3, 10)]
+
+        self.assertEqual(delays, [m_uniform.return_value] * 4)
+        self.assertEqual(m_uniform.call_args_list,
+                         [call(0, connection.RETRY_BASE_DELAY),
+                          call(0, connection.RETRY_BASE_DELAY * 2),
+                          call(0, connection.RETRY_BASE_DELAY * 4),
+                          call(0, connection.RETRY_MAX_DELAY)])
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """
+    Tests for the circuit breaker shared by retried operations.
+    """
+
+    def setUp(self):
+        self.breaker = connection.CircuitBreaker()
+
+    def test_closed(self):
+        self.assertTrue(self.breaker.acquire(0))
+        self.assertTrue(self.breaker.acquire(0))
+
+    @patch('pulp.server.db.connection.threading.current_thread')
+    def test_one_probe(self, m_current_thread):
+        m_current_thread.return_value.ident = 1
+        self.breaker.failed()
+        self.assertTrue(self.breaker.acquire(0))
+
+        # other threads wait for the probe
+        m_current_thread.return_value.ident = 2
+        self.assertFalse(self.breaker.acquire(0))
+
+        # a failed probe lets another thread probe
+        m_current_thread.return_value.ident = 1
+        self.breaker.failed()
+        m_current_thread.return_value.ident = 2
+        self.assertTrue(self.breaker.acquire(0))
+        self.assertFalse(self.breaker.acquire(0))
+
+    @patch('pulp.server.db.connection.threading.current_thread')
+    def test_release(self, m_current_thread):
+        m_current_thread.return_value.ident = 1
+        self.breaker.failed()
+        self.assertTrue(self.breaker.acquire(0))
+
+        # only the probing thread releases the probe
+        m_current_thread.return_value.ident = 2
+        self.breaker.release()
+        self.assertFalse(self.breaker.acquire(0))
+
+        m_current_thread.return_value.ident = 1
+        self.breaker.release()
+        m_current_thread.return_value.ident = 2
+        self.assertTrue(self.breaker.acquire(0))
+        self.assertTrue(self.breaker.opened is not None)
+
+    def test_succeeded(self):
+        self.breaker.failed()
+        self.breaker.acquire(0)
+        self.breaker.succeeded()
+        self.assertEqual(self.breaker.opened, None)
+        self.assertTrue(self.breaker.acquire(0))
+        self.assertTrue(self.breaker.acquire(0))
@@ -168,6 +168,8 @@ class TestContentUnit(unittest.TestCase):
 
         mock_signals.pre_save.connect.assert_called_once_with(ContentUnitHelper.pre_save_signal,
                                                               sender=ContentUnitHelper)
+        mock_signals.post_save.connect.assert_called_once_with(ContentUnitHelper.post_save_signal,
+                                                               sender=ContentUnitHelper)
 
     @patch('pulp.server.db.model.dateutils.now_utc_timestamp')
     def test_pre_save_signal(self, mock_now_utc):
@@ -185,6 +187,20 @@ class TestContentUnit(unittest.TestCase):
         # make sure the last updated time has been updated
         self.assertEquals(helper._last_updated, 'foo')
 
+    @patch('pulp.server.db.model.OrphanCount.adjust')
+    def test_post_save_signal(self, mock_adjust):
+        """
+        A new unit is counted as an orphan.
+        """
+        helper = ContentUnitHelper()
+
+        model.ContentUnit.post_save_signal({}, helper, created=True)
+        mock_adjust.assert_called_once_with(helper._content_type_id, 1)
+
+        mock_adjust.reset_mock()
+        model.ContentUnit.post_save_signal({}, helper, created=False)
+        self.assertFalse(mock_adjust.called)
+
     @patch('pulp.server.db.model.Repository.objects')
     @patch('pulp.server.db.model.RepositoryContentUnit.objects')
     def test_get_repositories(self, mock_rcu_query, mock_repository_query):
@@ -1390,6 +1406,64 @@ class TestDeferredDownload(unittest.TestCase):
         self.assertEquals(model.DeferredDownload._meta['collection'], 'deferred_download')
 
 
+class TestOrphanCount(unittest.TestCase):
+    """
+    Test the OrphanCount class.
+    """
+
+    def test_model_superclass(self):
+        self.assertTrue(isinstance(model.OrphanCount(), model.AutoRetryDocument))
+
+    def test_meta_collection(self):
+        self.assertEquals(model.OrphanCount._meta['collection'], 'orphan_counts')
+
+    @patch('pulp.server.db.model.OrphanCount.objects')
+    def test_adjust(self, mock_objects):
+        model.OrphanCount.adjust('foo', -2)
+
+        mock_objects.assert_called_once_with(content_type_id='foo')
+        mock_objects.return_value.update_one.assert_called_once_with(inc__count=-2)
+
+    @patch('pulp.server.db.model.OrphanCount.objects')
+    def test_adjust_nothing(self, mock_objects):
+        model.OrphanCount.adjust('foo', 0)
+        self.assertFalse(mock_objects.called)
+
+    @patch('pulp.server.db.model.OrphanCount.adjust')
+    @patch('pulp.server.db.model.RepositoryContentUnit._get_collection')
+    def test_units_associated(self, mock_get_collection, mock_adjust):
+        """
+        Only the units with no other association were orphans.
+        """
+        mock_get_collection.return_value.aggregate.return_value = iter([{'_id': 'a'}])
+
+        model.OrphanCount.units_associated('foo', ['a', 'b'])
+
+        pipeline = mock_get_collection.return_value.aggregate.call_args[0][0]
+        self.assertEqual(pipeline[0], {'$match': {'unit_id': {'$in': ['a', 'b']}}})
+        mock_adjust.assert_called_once_with('foo', -1)
+
+    @patch('pulp.server.db.model.OrphanCount.adjust')
+    @patch('pulp.server.db.model.RepositoryContentUnit.objects')
+    def test_units_unassociated(self, mock_rcu_objects, mock_adjust):
+        """
+        Only the units with no association left are orphans.
+        """
+        mock_rcu_objects.return_value.distinct.return_value = ['b']
+
+        model.OrphanCount.units_unassociated('foo', ['a', 'b', 'c'])
+
+        mock_rcu_objects.assert_called_once_with(unit_id__in=['a', 'b', 'c'])
+        mock_adjust.assert_called_once_with('foo', 2)
+
+    @patch('pulp.server.db.model.OrphanCount.objects')
+    def test_mark_stale(self, mock_objects):
+        model.OrphanCount.mark_stale(iter(['foo', 'bar']))
+
+        mock_objects.assert_called_once_with(content_type_id__in=['foo', 'bar'])
+        mock_objects.return_value.update.assert_called_once_with(set__stale=True)
+
+
 class TestUser(unittest.TestCase):
     """
     Tests for the User model.
@@ -1492,17 +1566,52 @@ class TestUserAuth(unittest.TestCase):
         password = 1
         self.assertRaises(exceptions.InvalidValue, self.user.set_password, password)
 
-    @patch('pulp.server.db.model.User._pbkdf_sha256')
+    @patch('pulp.server.db.model.pbkdf2_hmac')
     @patch('pulp.server.db.model.User._random_bytes')
-    def test_hash_password(self, mock_rand, mock_sha):
+    def test_hash_password(self, mock_rand, mock_pbkdf2):
         """
         Test hashing a password.
         """
         password = "some password"
         mock_rand.return_value.encode.return_value.strip.return_value = 'mock_salt'
-        mock_sha.return_value.encode.return_value.strip.return_value = 'mock_hash'
+        mock_pbkdf2.return_value.encode.return_value.strip.return_value = 'mock_hash'
         salted = self.user._hash_password(password)
-        self.assertEqual(salted, 'mock_salt,mock_hash')
+        self.assertEqual(salted, 'pbkdf2_sha256$%d$mock_salt$mock_hash' %
+                         model.PASSWORD_ITERATIONS)
+        mock_pbkdf2.assert_called_once_with('sha256', password, mock_rand.return_value,
+                                            model.PASSWORD_ITERATIONS)
+
+    def test_hash_password_unicode(self):
+        """
+        Test that unicode passwords are hashed as UTF-8.
+        """
+        self.user.set_password(u'p\xe4ssword')
+        self.assertTrue(self.user.check_password(u'p\xe4ssword'))
+        self.assertTrue(self.user.check_password('p\xc3\xa4ssword'))
+
+    def test_check_password_legacy(self):
+        """
+        Test checking a password hashed before pbkdf2_sha256 was used.
+        """
+        salt = 'saltsalt'
+        hashed = self.user._pbkdf_sha256('mock_password', salt, model.PASSWORD_ITERATIONS)
+        self.user.password = salt.encode('base64').strip() + ',' + hashed.encode('base64').strip()
+
+        self.assertTrue(self.user.check_password('mock_password'))
+        self.assertFalse(self.user.check_password('wrong_password'))
+        self.assertTrue(self.user.password_needs_rehash())
+
+    def test_password_needs_rehash(self):
+        """
+        Test that only passwords hashed with fewer iterations or the old algorithm need a rehash.
+        """
+        self.user.set_password('mock_password')
+        self.assertFalse(self.user.password_needs_rehash())
+        self.user.password = self.user.password.replace(
+            '$%d$' % model.PASSWORD_ITERATIONS, '$1000$')
+        self.assertTrue(self.user.password_needs_rehash())
+        self.user.password = None
+        self.assertFalse(self.user.password_needs_rehash())
 
     @patch('pulp.server.db.model.random')
     def test_rand_bytes(self, mock_rand):
@@ -93,6 +93,59 @@ class TestCriteriaQuerySet(unittest.TestCase):
         mock_get.assert_called_once_with(field='value')
 
 
+@mock.patch('mongoengine.queryset.base.BaseQuerySet.update')
+class TestCriteriaQuerySetUpdate(unittest.TestCase):
+    """
+    Tests for the post_save emulation of CriteriaQuerySet.update.
+    """
+
+    def setUp(self):
+        self.received = []
+        querysets.post_bulk_update.connect(self.receiver)
+
+    def tearDown(self):
+        querysets.post_bulk_update.disconnect(self.receiver)
+
+    def receiver(self, sender, **kwargs):
+        self.received.append((sender, kwargs))
+
+    def test_signal(self, mock_update):
+        qs = querysets.CriteriaQuerySet(MockDocument, mock.MagicMock())
+        qs = qs.filter(__raw__={'name': 'abc'})
+        qs.clone = mock.MagicMock()
+
+        result = qs.update(set__name='new')
+
+        self.assertTrue(result is mock_update.return_value)
+        mock_update.assert_called_once_with(upsert=False, multi=True, write_concern=None,
+                                            full_result=False, set__name='new')
+        self.assertEqual(self.received, [(MockDocument, {'query': {'name': 'abc'},
+                                                         'update': {'set__name': 'new'},
+                                                         'result': result})])
+        # the documents are not loaded for models that did not opt in
+        self.assertEqual(qs.clone.call_count, 0)
+
+    def test_post_save(self, mock_update):
+        class PostSaveDocument(Document):
+            meta = {'queryset_class': querysets.CriteriaQuerySet}
+            post_save_on_update = True
+            post_save_fields = ('name',)
+
+        qs = querysets.CriteriaQuerySet(PostSaveDocument, mock.MagicMock())
+        qs.clone = mock.MagicMock()
+        docs = [mock.MagicMock(), mock.MagicMock()]
+        batched = qs.clone.return_value.batch_size
+        batched.return_value.only.return_value.__iter__.return_value = iter(docs)
+
+        qs.update(set__name='new')
+
+        batched.assert_called_once_with(querysets.POST_SAVE_BATCH_SIZE)
+        batched.return_value.only.assert_called_once_with('name')
+        for doc in docs:
+            doc.post_save.assert_called_once_with('PostSaveDocument', doc)
+        self.assertEqual(len(self.received), 1)
+
+
 class TestReqoQuerySet(unittest.TestCase):
     """
     Tests for the repository custom query set.
@@ -0,0 +1,182 @@
+import unittest
+
+import mock
+
+from pulp.server.event import delivery, notifiers
+
+
+class DeliveryTests(unittest.TestCase):
+
+    def setUp(self):
+        self.notifier = mock.Mock()
+        self.batch_notifier = mock.Mock(return_value=[])
+        notifiers.NOTIFIER_FUNCTIONS['single'] = self.notifier
+        notifiers.NOTIFIER_FUNCTIONS['batch'] = self.notifier
+        notifiers.NOTIFIER_BATCH_FUNCTIONS['batch'] = self.batch_notifier
+        self.single = {'_id': 1, 'notifier_type_id': 'single', 'notifier_config': {'a': 1}}
+        self.batch = {'_id': 2, 'notifier_type_id': 'batch', 'notifier_config': {'b': 2}}
+
+    def tearDown(self):
+        notifiers.reset()
+
+
+class TestDeliver(DeliveryTests):
+
+    def test_single(self):
+        self.notifier.side_effect = [None, Exception()]
+
+        failed = delivery.deliver(self.single, ['event 1', 'event 2'])
+
+        self.assertEqual(failed, ['event 2'])
+        self.assertEqual(self.notifier.call_args_list,
+                         [mock.call({'a': 1}, 'event 1'), mock.call({'a': 1}, 'event 2')])
+
+    def test_batch(self):
+        self.batch_notifier.return_value = ['event 2']
+
+        self.assertEqual(delivery.deliver(self.batch, ['event 1', 'event 2']), ['event 2'])
+        self.batch_notifier.assert_called_once_with({'b': 2}, ['event 1', 'event 2'])
+        self.assertFalse(self.notifier.called)
+
+    def test_batch_exception(self):
+        self.batch_notifier.side_effect = Exception()
+
+        self.assertEqual(delivery.deliver(self.batch, ['event 1']), ['event 1'])
+
+    def test_deliver_now(self):
+        self.assertTrue(delivery.deliver_now(self.batch, 'event 1'))
+        self.notifier.assert_called_once_with({'b': 2}, 'event 1')
+        self.notifier.side_effect = Exception()
+        self.assertFalse(delivery.deliver_now(self.single, 'event 1'))
+
+
+class TestDispatcher(DeliveryTests):
+
+    def test_synchronous(self):
+        dispatcher = delivery.Dispatcher(0, 10, 3, 0)
+
+        dispatcher.dispatch([self.single, self.batch], 'event')
+
+        # the caller does not use the batch functions
+        self.assertEqual(self.notifier.call_count, 2)
+        self.assertFalse(self.batch_notifier.called)
+        self.assertEqual(dispatcher.stats()['delivered'], 2)
+
+    def test_no_listeners(self):
+        dispatcher = delivery.Dispatcher(10, 10, 3, 0)
+        dispatcher.dispatch([], 'event')
+        self.assertTrue(dispatcher._queue is None)
+
+    def test_queued(self):
+        dispatcher = delivery.Dispatcher(10, 10, 3, 0)
+
+        dispatcher.dispatch([self.single, self.batch], 'event')
+
+        self.assertTrue(dispatcher.wait(5))
+        self.notifier.assert_called_once_with({'a': 1}, 'event')
+        self.batch_notifier.assert_called_once_with({'b': 2}, ['event'])
+        stats = dispatcher.stats()
+        self.assertEqual(stats['queue_depth'], 0)
+        self.assertEqual(stats['delivered'], 2)
+        self.assertTrue(stats['latency_max'] >= stats['latency_avg'] >= 0)
+
+    def test_batching(self):
+        dispatcher = delivery.Dispatcher(10, 10, 3, 0)
+        # queue the events before the delivery thread starts
+        with mock.patch('threading.Thread'):
+            dispatcher.dispatch([self.batch], 'event 1')
+            dispatcher.dispatch([self.batch], 'event 2')
+        batch = [dispatcher._queue.get_nowait(), dispatcher._queue.get_nowait()]
+
+        dispatcher._deliver_batch(batch)
+
+        self.batch_notifier.assert_called_once_with({'b': 2}, ['event 1', 'event 2'])
+
+    @mock.patch('pulp.server.event.delivery.time.time', return_value=100)
+    def test_retry(self, mock_time):
+        dispatcher = delivery.Dispatcher(10, 10, 2, 1)
+        self.batch_notifier.return_value = ['event']
+
+        dispatcher._deliver_batch([(100, [self.batch], 'event')])
+        # not due yet
+        dispatcher._deliver_retries()
+        self.assertEqual(self.batch_notifier.call_count, 1)
+
+        mock_time.return_value = 101
+        dispatcher._deliver_retries()
+        self.assertEqual(self.batch_notifier.call_count, 2)
+        # the delay doubles
+        self.assertEqual(dispatcher._retry_heap[0][0], 103)
+
+        mock_time.return_value = 103
+        dispatcher._deliver_retries()
+        self.assertEqual(self.batch_notifier.call_count, 3)
+        self.assertEqual(dispatcher._retry_heap, [])
+        stats = dispatcher.stats()
+        self.assertEqual(stats['failed'], 1)
+        self.assertEqual(stats['retried'], 2)
+
+    def test_queue_full(self):
+        dispatcher = delivery.Dispatcher(1, 10, 3, 0)
+        with mock.patch('threading.Thread'):
+            dispatcher.dispatch([self.single], 'event 1')
+            dispatcher.dispatch([self.single], 'event 2')
+
+        # the second event was delivered by the caller
+        self.notifier.assert_called_once_with({'a': 1}, 'event 2')
+        self.assertEqual(dispatcher.stats()['overflowed'], 1)
+        self.assertEqual(dispatcher.stats()['queue_depth'], 1)
+
+    @mock.patch('pulp.server.event.delivery.os.getpid')
+    def test_fork(self, mock_getpid):
+        dispatcher = delivery.Dispatcher(10, 10, 3, 0)
+        with mock.patch('threading.Thread') as mock_thread:
+            mock_getpid.return_value = 1
+            queue = dispatcher._get_queue()
+            self.assertTrue(dispatcher._get_queue() is queue)
+            mock_getpid.return_value = 2
+            self.assertFalse(dispatcher._get_queue() is queue)
+        self.assertEqual(mock_thread.return_value.start.call_count, 2)
+
+    def test_drain(self):
+        dispatcher = delivery.Dispatcher(10, 10, 3, 0)
+        self.assertEqual(dispatcher.drain(0), 0)
+
+        dispatcher.dispatch([self.single], 'event')
+
+        self.assertEqual(dispatcher.drain(5), 0)
+        self.notifier.assert_called_once_with({'a': 1}, 'event')
+
+    @mock.patch('pulp.server.event.delivery._logger')
+    def test_drain_dropped(self, mock_logger):
+        dispatcher = delivery.Dispatcher(10, 10, 3, 60)
+        with mock.patch('threading.Thread'):
+            dispatcher.dispatch([self.single], 'event 1')
+        dispatcher._retry_heap.append((0, 0, 1, self.batch, ['event 2', 'event 3']))
+
+        self.assertEqual(dispatcher.drain(0), 3)
+        self.assertEqual(mock_logger.warning.call_count, 1)
+        self.assertFalse(self.notifier.called)
+
+
+class TestGetDispatcher(unittest.TestCase):
+
+    def tearDown(self):
+        delivery.reset()
+
+    @mock.patch('pulp.server.event.delivery.config')
+    def test_from_config(self, mock_config):
+        mock_config.getint.side_effect = [5, 6, 7]
+        mock_config.getfloat.return_value = 0.5
+        delivery.reset()
+
+        dispatcher = delivery.get_dispatcher()
+
+        self.assertTrue(delivery.get_dispatcher() is dispatcher)
+        self.assertEqual((dispatcher.queue_size, dispatcher.batch_size, dispatcher.retries,
+                          dispatcher.retry_delay), (5, 6, 7, 0.5))
+
+    @mock.patch('pulp.server.event.delivery._dispatcher')
+    def test_drain(self, mock_dispatcher):
+        delivery.drain(2)
+        mock_dispatcher.drain.assert_called_once_with(2)
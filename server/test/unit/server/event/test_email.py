@@ -13,8 +13,9 @@ import mock
 
 from pulp.server.compat import json
 from pulp.server.config import config
-from pulp.server.event import data, mail
+from pulp.server.event import data, delivery, mail
 from pulp.server.managers import factory
+from pulp.server.managers.event import fire
 
 
 class TestSendEmail(unittest.TestCase):
@@ -106,6 +107,52 @@ class TestHandleEvent(unittest.TestCase):
         mail.handle_event(self.notifier_config, event_with_id)
 
 
+class TestHandleEvents(unittest.TestCase):
+    def setUp(self):
+        self.notifier_config = {
+            'subject': 'hello',
+            'addresses': ['user1@some.domain', 'user2@some.domain']
+        }
+        self.events = [mock.MagicMock(), mock.MagicMock()]
+        for n, event in enumerate(self.events):
+            event.data.return_value = 'event %d' % n
+
+    @mock.patch('ConfigParser.SafeConfigParser.getboolean', return_value=False)
+    @mock.patch('smtplib.SMTP')
+    def test_email_disabled(self, mock_smtp, mock_getbool):
+        self.assertEqual(mail.handle_events(self.notifier_config, self.events), [])
+        self.assertFalse(mock_smtp.called)
+
+    @mock.patch('ConfigParser.SafeConfigParser.getboolean', return_value=True)
+    @mock.patch('smtplib.SMTP')
+    def test_one_connection(self, mock_smtp, mock_getbool):
+        self.assertEqual(mail.handle_events(self.notifier_config, self.events), [])
+
+        self.assertEqual(mock_smtp.call_count, 1)
+        mock_sendmail = mock_smtp.return_value.sendmail
+        self.assertEqual([c[0][1] for c in mock_sendmail.call_args_list],
+                         self.notifier_config['addresses'] * 2)
+        message = Parser().parsestr(mock_sendmail.call_args[0][2])
+        self.assertEqual(json.loads(message.get_payload()), 'event 1')
+        self.assertEqual(message.get('To', None), 'user2@some.domain')
+        mock_smtp.return_value.quit.assert_called_once_with()
+
+    @mock.patch('ConfigParser.SafeConfigParser.getboolean', return_value=True)
+    @mock.patch('smtplib.SMTP')
+    def test_connect_failure(self, mock_smtp, mock_getbool):
+        mock_smtp.side_effect = smtplib.SMTPConnectError(123, 'aww crap')
+        self.assertEqual(mail.handle_events(self.notifier_config, self.events), self.events)
+
+    @mock.patch('ConfigParser.SafeConfigParser.getboolean', return_value=True)
+    @mock.patch('smtplib.SMTP')
+    def test_send_failure(self, mock_smtp, mock_getbool):
+        mock_smtp.return_value.sendmail.side_effect = smtplib.SMTPRecipientsRefused(
+            ['user1@some.domain'])
+        # a refused recipient is not retried
+        self.assertEqual(mail.handle_events(self.notifier_config, self.events), [])
+        self.assertEqual(mock_smtp.return_value.sendmail.call_count, 4)
+
+
 class TestSystem(unittest.TestCase):
     # test integration with the event system
 
@@ -115,12 +162,17 @@ class TestSystem(unittest.TestCase):
             'addresses': ['user1@some.domain', 'user2@some.domain']
         }
         self.event_doc = {
+            '_id': 'listener-1',
             'notifier_type_id': mail.TYPE_ID,
             'event_types': data.TYPE_REPO_SYNC_FINISHED,
             'notifier_config': self.notifier_config,
         }
 
     @mock.patch('pulp.server.event.data.task_serializer')
+    # deliver the event synchronously
+    @mock.patch('pulp.server.managers.event.fire.delivery.get_dispatcher',
+                return_value=delivery.Dispatcher(0, 1, 0, 0))
+    @mock.patch('pulp.server.managers.event.crud.listeners_version', return_value=1)
     # don't actually spawn a thread
     @mock.patch('threading.Thread', new=dummy_threading.Thread)
     # mock qpid, because it freaks out over dummy_threading
@@ -131,8 +183,10 @@ class TestSystem(unittest.TestCase):
     @mock.patch('ConfigParser.SafeConfigParser.getboolean', return_value=True)
     # inject fake results from the database query
     @mock.patch('pulp.server.db.model.event.EventListener.get_collection')
-    def test_fire(self, mock_get_collection, mock_getbool, mock_smtp, mock_publish, mock_task_ser):
+    def test_fire(self, mock_get_collection, mock_getbool, mock_smtp, mock_publish, mock_version,
+                  mock_get_dispatcher, mock_task_ser):
         # verify that the event system will trigger listeners of this type
+        fire.listener_cache.clear()
         mock_get_collection.return_value.find.return_value = [self.event_doc]
         mock_task_ser.return_value = 'serialized task'
         event = data.Event(data.TYPE_REPO_SYNC_FINISHED, 'stuff')
@@ -27,6 +27,36 @@ class TestHTTPNotifierTests(unittest.TestCase):
             mock_json.dumps.return_value
         )
 
+    @mock.patch(MODULE_PATH + '_send_post')
+    @mock.patch(MODULE_PATH + 'Session')
+    def test_handle_events(self, mock_session, mock_send_post):
+        notifier_config = {'url': 'https://localhost/api/'}
+        events = [mock.Mock(spec=Event), mock.Mock(spec=Event)]
+        for n, event in enumerate(events):
+            event.data.return_value = {'n': n}
+        mock_send_post.side_effect = [True, False]
+
+        self.assertEqual(http.handle_events(notifier_config, events), events[1:])
+
+        post = mock_session.return_value.post
+        self.assertEqual(mock_send_post.call_args_list,
+                         [mock.call(notifier_config, '{"n": 0}', post),
+                          mock.call(notifier_config, '{"n": 1}', post)])
+        mock_session.return_value.close.assert_called_once_with()
+
+    def test_send_post_retry(self):
+        notifier_config = {'url': 'https://localhost/api/'}
+        post = mock.Mock()
+
+        post.return_value.status_code = 200
+        self.assertTrue(http._send_post(notifier_config, '{}', post))
+        post.return_value.status_code = 404
+        self.assertTrue(http._send_post(notifier_config, '{}', post))
+        post.return_value.status_code = 503
+        self.assertFalse(http._send_post(notifier_config, '{}', post))
+        post.side_effect = IOError()
+        self.assertFalse(http._send_post(notifier_config, '{}', post))
+
     @mock.patch(MODULE_PATH + 'post')
     def test_send_post_no_auth(self, mock_post):
         notifier_config = {'url': 'https://localhost/api/'}
@@ -1,4 +1,8 @@
+import os
+import shutil
+import tempfile
 from collections import OrderedDict
+from time import time
 from unittest import TestCase
 
 from mock import patch, Mock, PropertyMock
@@ -6,7 +10,8 @@ from M2Crypto import RSA
 
 from pulp.server.lazy.url import (
     NotValid, DecodingError, NotSigned, ResourceNotMatched, ExtensionNotMatched, PolicyMalformed,
-    PolicyNotAuthenticated, PolicyExpired, Base64, JSON, Policy, Query, Key, URL, SignedURL)
+    PolicyNotAuthenticated, PolicyExpired, Base64, JSON, Policy, Query, Key, URL, SignedURL,
+    HMACKey, ValidationCache)
 
 
 MODULE = 'pulp.server.lazy.url'
@@ -327,6 +332,157 @@ class TestKey(TestCase):
         rsa.load_key_bio.assert_called_once_with(bio.MemoryBuffer.return_value)
         self.assertEqual(key, rsa.load_key_bio.return_value)
 
+    def test_load_cached(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        path = os.path.join(tmp_dir, 'key.pem')
+        with open(path, 'w+') as fp:
+            fp.write('-----BEGIN PUBLIC KEY-----')
+
+        # test
+        with patch(MODULE + '.Key._cache', {}):
+            with patch(MODULE + '.Key._load_path') as load_path:
+                load_path.side_effect = lambda p: Mock()
+                key = Key.load(path=path)
+                cached = Key.load(path=path)
+                with open(path, 'a') as fp:
+                    fp.write('\n')
+                reloaded = Key.load(path=path)
+
+        # validation
+        self.assertTrue(key is cached)
+        self.assertFalse(key is reloaded)
+        self.assertEqual(load_path.call_count, 2)
+
+    def test_load_secret(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        path = os.path.join(tmp_dir, 'secret')
+        with open(path, 'w+') as fp:
+            fp.write('s3cret\n')
+
+        # test
+        with patch(MODULE + '.Key._cache', {}):
+            key = Key.load_secret(path)
+
+        # validation
+        self.assertTrue(isinstance(key, HMACKey))
+        self.assertEqual(key.secret, 's3cret')
+
+    @patch(MODULE + '.Key.load_secret')
+    @patch(MODULE + '.Key.load')
+    def test_signing_key(self, load, load_secret):
+        options = {
+            'url_signing_secret': '',
+            'rsa_key': '/tmp/rsa.key',
+            'rsa_pub': '/tmp/rsa_pub.key',
+        }
+        conf = Mock()
+        conf.get.side_effect = lambda s, p: options[p]
+
+        # test
+        signing = Key.signing_key(conf)
+        validation = Key.validation_key(conf)
+
+        # validation
+        load.assert_any_call('/tmp/rsa.key')
+        load.assert_any_call('/tmp/rsa_pub.key')
+        self.assertEqual(signing, load.return_value)
+        self.assertEqual(validation, load.return_value)
+        self.assertFalse(load_secret.called)
+
+    @patch(MODULE + '.Key.load_secret')
+    @patch(MODULE + '.Key.load')
+    def test_signing_key_secret(self, load, load_secret):
+        conf = Mock()
+        conf.get.return_value = '/tmp/secret'
+
+        # test
+        signing = Key.signing_key(conf)
+        validation = Key.validation_key(conf)
+
+        # validation
+        load_secret.assert_called_with('/tmp/secret')
+        self.assertEqual(signing, load_secret.return_value)
+        self.assertEqual(validation, load_secret.return_value)
+        self.assertFalse(load.called)
+
+
+class TestHMACKey(TestCase):
+
+    def test_verify(self):
+        key = HMACKey('s3cret')
+        signature = key.sign('digest')
+        self.assertTrue(key.verify('digest', signature))
+        self.assertFalse(key.verify('other', signature))
+        self.assertFalse(HMACKey('other').verify('digest', signature))
+
+    def test_round_trip(self):
+        key = HMACKey('s3cret')
+        url = URL('https://pulp.org/content/test.rpm')
+        signed = url.sign(key, remote_ip='10.1.1.1')
+        self.assertEqual(signed.validate(key, remote_ip='10.1.1.1'), '/content/test.rpm')
+        self.assertRaises(PolicyNotAuthenticated, signed.validate, HMACKey('other'))
+
+
+class TestValidationCache(TestCase):
+
+    def test_validate(self):
+        key = HMACKey('s3cret')
+        url = URL('https://pulp.org/content/test.rpm').sign(key, remote_ip='10.1.1.1')
+        cache = ValidationCache()
+
+        # test
+        with patch(MODULE + '.Policy.validate', wraps=Policy.validate) as validate:
+            resource = cache.validate(url, key, remote_ip='10.1.1.1')
+            cached = cache.validate(url, key, remote_ip='10.1.1.1')
+
+        # validation
+        self.assertEqual(resource, '/content/test.rpm')
+        self.assertEqual(cached, resource)
+        self.assertEqual(validate.call_count, 1)
+        self.assertEqual(len(cache), 1)
+
+    def test_not_valid_not_cached(self):
+        key = HMACKey('s3cret')
+        url = URL('https://pulp.org/content/test.rpm').sign(key, remote_ip='10.1.1.1')
+        cache = ValidationCache()
+
+        # test
+        self.assertRaises(ExtensionNotMatched, cache.validate, url, key, remote_ip='10.9.9.9')
+        self.assertRaises(PolicyNotAuthenticated, cache.validate, url, HMACKey('other'),
+                          remote_ip='10.1.1.1')
+
+        # validation
+        self.assertEqual(len(cache), 0)
+
+    def test_expired(self):
+        key = HMACKey('s3cret')
+        url = URL('https://pulp.org/content/test.rpm').sign(key)
+        cache = ValidationCache()
+        cache.validate(url, key)
+
+        # test
+        with patch(MODULE + '.time', return_value=time() + 3600):
+            self.assertRaises(PolicyExpired, cache.validate, url, key)
+
+        # validation
+        self.assertEqual(len(cache), 0)
+
+    def test_capacity(self):
+        key = HMACKey('s3cret')
+        cache = ValidationCache(capacity=2)
+
+        # test
+        for n in range(3):
+            url = URL('https://pulp.org/content/%d.rpm' % n).sign(key)
+            cache.validate(url, key)
+
+        # validation
+        self.assertEqual(len(cache), 2)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
 
 class TestURL(TestCase):
 
@@ -0,0 +1,174 @@
+import unittest
+
+import mock
+
+from pulp.server.db import model
+from pulp.server.managers.auth import authentication
+
+
+class TestCredentialCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = authentication.CredentialCache(capacity=2)
+
+    def test_key(self):
+        key = self.cache.key('password', u'admin', 'secret')
+        self.assertEqual(key, self.cache.key('password', 'admin', u'secret'))
+        self.assertNotEqual(key, self.cache.key('password', 'admin', 'other'))
+        self.assertFalse('secret' in key)
+        # each cache uses its own key
+        self.assertNotEqual(key, authentication.CredentialCache().key('password', 'admin',
+                                                                      'secret'))
+
+    @mock.patch('pulp.server.managers.auth.authentication.time')
+    def test_get(self, mock_time):
+        mock_time.return_value = 100
+        self.cache.set('key', 'value', 10)
+        self.assertEqual(self.cache.get('key'), 'value')
+        self.assertEqual(self.cache.get('other'), None)
+
+        mock_time.return_value = 110
+        self.assertEqual(self.cache.get('key'), None)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_capacity(self):
+        self.cache.set('a', 1, 10)
+        self.cache.set('b', 2, 10)
+        self.cache.set('c', 3, 10)
+        self.assertEqual(len(self.cache), 2)
+        self.assertEqual(self.cache.get('a'), None)
+        self.assertEqual(self.cache.get('c'), 3)
+
+    def test_clear(self):
+        self.cache.set('a', 1, 10)
+        self.cache.clear()
+        self.assertEqual(len(self.cache), 0)
+
+    @mock.patch('pulp.server.managers.auth.authentication.config')
+    def test_ttl(self, mock_config):
+        self.assertEqual(self.cache.ttl(), mock_config.getint.return_value)
+        mock_config.getint.assert_called_once_with('authentication', 'credential_cache_ttl')
+
+
+@mock.patch('pulp.server.managers.auth.authentication.CredentialCache.ttl')
+@mock.patch('pulp.server.managers.auth.authentication.model.User.objects')
+class TestCheckUsernamePassword(unittest.TestCase):
+
+    def setUp(self):
+        authentication.credential_cache.clear()
+        self.manager = authentication.AuthenticationManager()
+        self.user = model.User(login='admin')
+        self.user.set_password('secret')
+        self.user.save = mock.Mock()
+
+    def tearDown(self):
+        authentication.credential_cache.clear()
+
+    def test_cache_disabled(self, mock_objects, mock_ttl):
+        mock_objects.return_value.first.return_value = self.user
+        mock_ttl.return_value = 0
+
+        with mock.patch.object(self.user, 'check_password', return_value=True) as mock_check:
+            self.manager._check_username_password_local('admin', 'secret')
+            self.manager._check_username_password_local('admin', 'secret')
+
+        self.assertEqual(mock_check.call_count, 2)
+        self.assertEqual(len(authentication.credential_cache), 0)
+
+    def test_cached(self, mock_objects, mock_ttl):
+        mock_objects.return_value.first.return_value = self.user
+        mock_ttl.return_value = 60
+
+        with mock.patch.object(self.user, 'check_password', return_value=True) as mock_check:
+            user = self.manager._check_username_password_local('admin', 'secret')
+            self.manager._check_username_password_local('admin', 'secret')
+
+        self.assertTrue(user is self.user)
+        self.assertEqual(mock_check.call_count, 1)
+
+    def test_wrong_password_not_cached(self, mock_objects, mock_ttl):
+        mock_objects.return_value.first.return_value = self.user
+        mock_ttl.return_value = 60
+
+        self.assertEqual(self.manager._check_username_password_local('admin', 'wrong'), None)
+        self.assertEqual(self.manager._check_username_password_local('admin', 'wrong'), None)
+        self.assertEqual(len(authentication.credential_cache), 0)
+
+    def test_password_changed(self, mock_objects, mock_ttl):
+        mock_objects.return_value.first.return_value = self.user
+        mock_ttl.return_value = 60
+        self.manager._check_username_password_local('admin', 'secret')
+
+        # another process changes the password
+        changed = model.User(login='admin')
+        changed.set_password('new secret')
+        mock_objects.return_value.first.return_value = changed
+
+        self.assertEqual(self.manager._check_username_password_local('admin', 'secret'), None)
+
+    def test_user_deleted(self, mock_objects, mock_ttl):
+        mock_objects.return_value.first.return_value = self.user
+        mock_ttl.return_value = 60
+        self.manager._check_username_password_local('admin', 'secret')
+
+        mock_objects.return_value.first.return_value = None
+
+        self.assertEqual(self.manager._check_username_password_local('admin', 'secret'), None)
+
+    def test_rehash(self, mock_objects, mock_ttl):
+        salt = 'saltsalt'
+        hashed = self.user._pbkdf_sha256('secret', salt, model.PASSWORD_ITERATIONS)
+        self.user.password = salt.encode('base64').strip() + ',' + hashed.encode('base64').strip()
+        mock_objects.return_value.first.return_value = self.user
+        mock_ttl.return_value = 0
+
+        user = self.manager._check_username_password_local('admin', 'secret')
+
+        self.assertTrue(user.password.startswith(model.PASSWORD_ALGORITHM + '$'))
+        self.assertTrue(user.check_password('secret'))
+        user.save.assert_called_once_with()
+
+
+@mock.patch('pulp.server.managers.auth.authentication.CredentialCache.ttl', return_value=60)
+class TestCheckCerts(unittest.TestCase):
+
+    def setUp(self):
+        authentication.credential_cache.clear()
+        self.manager = authentication.AuthenticationManager()
+
+    def tearDown(self):
+        authentication.credential_cache.clear()
+
+    @mock.patch('pulp.server.managers.auth.authentication.AuthenticationManager.'
+                'check_username_password')
+    @mock.patch('pulp.server.managers.auth.authentication.AuthenticationManager.'
+                '_decode_user_cert')
+    def test_user_cert(self, mock_decode, mock_check, mock_ttl):
+        mock_decode.return_value = 'admin'
+
+        self.manager.check_user_cert('cert')
+        login = self.manager.check_user_cert('cert')
+
+        self.assertEqual(login, mock_check.return_value)
+        mock_decode.assert_called_once_with('cert')
+        # the user is looked up for every request
+        self.assertEqual(mock_check.call_args_list, [mock.call('admin'), mock.call('admin')])
+
+    @mock.patch('pulp.server.managers.auth.authentication.AuthenticationManager.'
+                '_decode_user_cert')
+    def test_user_cert_invalid(self, mock_decode, mock_ttl):
+        mock_decode.return_value = None
+
+        self.assertEqual(self.manager.check_user_cert('cert'), None)
+        self.assertEqual(self.manager.check_user_cert('cert'), None)
+        self.assertEqual(mock_decode.call_count, 2)
+
+    @mock.patch('pulp.server.managers.auth.authentication.AuthenticationManager.'
+                '_verify_consumer_cert')
+    def test_consumer_cert(self, mock_verify, mock_ttl):
+        mock_verify.return_value = 'consumer1'
+
+        self.assertEqual(self.manager.check_consumer_cert('cert'), 'consumer1')
+        self.assertEqual(self.manager.check_consumer_cert('cert'), 'consumer1')
+        self.assertEqual(self.manager.check_consumer_cert('other cert'), 'consumer1')
+        self.assertEqual(mock_verify.call_args_list, [mock.call('cert'), mock.call('other cert')])
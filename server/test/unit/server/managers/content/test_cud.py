@@ -62,6 +62,25 @@ class PulpContentCUDTests(PulpContentTests):
         self.assertTrue(unit['search-1'] == 'two')
         self.assertTrue('_last_updated' in unit)
 
+    def test_add_content_units(self):
+        existing_id = self.cud_manager.add_content_unit(TYPE_1_DEF.id, None, TYPE_1_UNITS[0])
+        unit_ids = self.cud_manager.add_content_units(TYPE_1_DEF.id, TYPE_1_UNITS)
+        self.assertEqual(unit_ids[0], None)
+        self.assertTrue(None not in unit_ids[1:])
+        units = self.query_manager.list_content_units(TYPE_1_DEF.id)
+        self.assertEqual(sorted(unit['_id'] for unit in units),
+                         sorted([existing_id] + unit_ids[1:]))
+        self.assertTrue(all('_last_updated' in unit for unit in units))
+
+    def test_update_content_units(self):
+        unit_ids = self.cud_manager.add_content_units(TYPE_1_DEF.id, TYPE_1_UNITS[:2])
+        self.cud_manager.update_content_units(TYPE_1_DEF.id,
+                                              dict((unit_id, {'search-1': 'three'})
+                                                   for unit_id in unit_ids))
+        for unit_id in unit_ids:
+            unit = self.query_manager.get_content_unit_by_id(TYPE_1_DEF.id, unit_id)
+            self.assertEqual(unit['search-1'], 'three')
+
     def test_delete_content_unit(self):
         unit_id = self.cud_manager.add_content_unit(TYPE_1_DEF.id, None, TYPE_1_UNITS[0])
         units = self.query_manager.list_content_units(TYPE_1_DEF.id)
@@ -10,6 +10,7 @@ import traceback
 from mock import call, patch, Mock
 
 from .... import base
+from pulp.common import constants, tags
 from pulp.plugins.types import database as content_type_db
 from pulp.plugins.types.model import TypeDefinition
 from pulp.server import exceptions as pulp_exceptions
@@ -309,6 +310,135 @@ class OrphanManagerGeneratorTests(OrphanManagerTests):
         mock_get_model.return_value.objects.assert_called_once_with(id__in=('orphan2',))
 
 
+class TestOrphansSummary(TestCase):
+
+    @patch(MODULE_PATH + 'OrphanManager.queue_reconcile_counts')
+    @patch(MODULE_PATH + 'model.OrphanCount.objects')
+    @patch(MODULE_PATH + 'plugin_api.list_unit_models')
+    @patch(MODULE_PATH + 'content_types_db.all_type_ids')
+    def test_stored_counts(self, mock_type_ids, mock_list_models, mock_objects, mock_queue):
+        """
+        Stored counts are returned, missing and stale counts are counted again in a task.
+        """
+        mock_type_ids.return_value = ['type_1', 'type_2']
+        mock_list_models.return_value = {'type_3': Mock()}
+        mock_objects.only.return_value = [
+            Mock(content_type_id='type_1', count=3, stale=False),
+            Mock(content_type_id='type_2', count=5, stale=True),
+        ]
+
+        summary = OrphanManager().orphans_summary()
+
+        self.assertEqual(summary, {'type_1': {'count': 3, 'stale': False},
+                                   'type_2': {'count': 5, 'stale': True},
+                                   'type_3': {'count': 0, 'stale': True}})
+        mock_queue.assert_called_once_with(['type_2', 'type_3'])
+
+    @patch(MODULE_PATH + 'OrphanManager.queue_reconcile_counts')
+    @patch(MODULE_PATH + 'model.OrphanCount.objects')
+    @patch(MODULE_PATH + 'plugin_api.list_unit_models')
+    @patch(MODULE_PATH + 'content_types_db.all_type_ids')
+    def test_counts_current(self, mock_type_ids, mock_list_models, mock_objects, mock_queue):
+        mock_type_ids.return_value = ['type_1']
+        mock_list_models.return_value = {}
+        mock_objects.only.return_value = [Mock(content_type_id='type_1', count=3, stale=False)]
+
+        self.assertEqual(OrphanManager().orphans_summary(), {'type_1': {'count': 3,
+                                                                        'stale': False}})
+        self.assertFalse(mock_queue.called)
+
+    @patch(MODULE_PATH + 'reconcile_orphan_counts')
+    @patch(MODULE_PATH + 'model.TaskStatus.objects')
+    def test_queue_reconcile_counts(self, mock_task_objects, mock_reconcile):
+        mock_task_objects.return_value.count.return_value = 0
+
+        OrphanManager.queue_reconcile_counts(['type_1'])
+
+        task_tag = tags.action_tag(tags.ACTION_RECONCILE_ORPHAN_COUNTS)
+        mock_task_objects.assert_called_once_with(tags=task_tag,
+                                                  state__in=constants.CALL_INCOMPLETE_STATES)
+        mock_reconcile.apply_async.assert_called_once_with(args=[['type_1']], tags=[task_tag])
+
+    @patch(MODULE_PATH + 'reconcile_orphan_counts')
+    @patch(MODULE_PATH + 'model.TaskStatus.objects')
+    def test_queue_reconcile_counts_queued(self, mock_task_objects, mock_reconcile):
+        """
+        A task is not queued while another one counting orphans is waiting or running.
+        """
+        mock_task_objects.return_value.count.return_value = 1
+
+        OrphanManager.queue_reconcile_counts(['type_1'])
+
+        self.assertFalse(mock_reconcile.apply_async.called)
+
+    @patch(MODULE_PATH + 'dateutils.now_utc_datetime_with_tzinfo')
+    @patch(MODULE_PATH + 'OrphanManager.generate_orphans_by_type')
+    @patch(MODULE_PATH + 'model.OrphanCount.objects')
+    def test_reconcile_count_by_type(self, mock_objects, mock_generate, mock_now):
+        mock_generate.return_value = iter([{'_id': 'a'}, {'_id': 'b'}])
+
+        self.assertEqual(OrphanManager.reconcile_count_by_type('type_1'), 2)
+
+        mock_objects.assert_called_once_with(content_type_id='type_1')
+        mock_objects.return_value.update_one.assert_called_once_with(
+            set__count=2, set__stale=False, set__reconciled=mock_now.return_value, upsert=True)
+
+    @patch(MODULE_PATH + 'OrphanManager.reconcile_count_by_type')
+    @patch(MODULE_PATH + 'plugin_api.list_unit_models')
+    @patch(MODULE_PATH + 'content_types_db.all_type_ids')
+    def test_reconcile_orphan_counts(self, mock_type_ids, mock_list_models, mock_reconcile):
+        mock_type_ids.return_value = ['type_1']
+        mock_list_models.return_value = {'type_1': Mock(), 'type_2': Mock()}
+        mock_reconcile.side_effect = lambda content_type_id: len(content_type_id)
+
+        counts = OrphanManager.reconcile_orphan_counts()
+
+        self.assertEqual(counts, {'type_1': 6, 'type_2': 6})
+        self.assertEqual(mock_reconcile.call_count, 2)
+
+    @patch(MODULE_PATH + 'OrphanManager.reconcile_count_by_type')
+    @patch(MODULE_PATH + 'content_types_db.all_type_ids')
+    def test_reconcile_orphan_counts_by_type(self, mock_type_ids, mock_reconcile):
+        mock_reconcile.return_value = 4
+
+        self.assertEqual(OrphanManager.reconcile_orphan_counts(['type_2']), {'type_2': 4})
+        self.assertFalse(mock_type_ids.called)
+
+
+@patch(MODULE_PATH + 'ORPHAN_BATCH_SIZE', 2)
+@patch(MODULE_PATH + 'RepoContentUnit.get_collection')
+@patch(MODULE_PATH + 'content_types_db.type_units_collection')
+class TestGenerateOrphansByType(TestCase):
+
+    def test_batches(self, mock_units_collection, mock_get_collection):
+        """
+        Associations are looked up once for each batch of units.
+        """
+        units = [{'_id': 'a'}, {'_id': 'b'}, {'_id': 'c'}]
+        cursor = mock_units_collection.return_value.find.return_value.sort.return_value
+        cursor.batch_size.return_value = iter(units)
+        mock_find = mock_get_collection.return_value.find
+        mock_find.return_value.distinct.side_effect = [['b'], []]
+
+        orphans = list(OrphanManager.generate_orphans_by_type('type_1'))
+
+        self.assertEqual(orphans, [{'_id': 'a'}, {'_id': 'c'}])
+        mock_units_collection.return_value.find.assert_called_once_with({}, projection=['_id'])
+        mock_units_collection.return_value.find.return_value.sort.assert_called_once_with('_id')
+        self.assertEqual(mock_find.call_args_list,
+                         [call({'unit_id': {'$in': ['a', 'b']}}),
+                          call({'unit_id': {'$in': ['c']}})])
+
+    def test_after(self, mock_units_collection, mock_get_collection):
+        cursor = mock_units_collection.return_value.find.return_value.sort.return_value
+        cursor.batch_size.return_value = iter([])
+
+        list(OrphanManager.generate_orphans_by_type('type_1', ['_id', 'name'], after='a'))
+
+        mock_units_collection.return_value.find.assert_called_once_with(
+            {'_id': {'$gt': 'a'}}, projection=['_id', 'name'])
+
+
 class TestDelete(TestCase):
 
     @patch('shutil.rmtree')
@@ -543,6 +673,27 @@ class TestDeleteOrphanedFile(TestCase):
         delete.assert_called_once_with(path)
         self.assertFalse(unlink_shared.called)
 
+    @patch('pulp.server.managers.content.orphan.os.access')
+    @patch('pulp.server.managers.content.orphan.os.listdir')
+    @patch('pulp.server.managers.content.orphan.content_storage.unreferenced_blob')
+    def test_unreferenced_blob(self, unreferenced_blob, listdir, access, is_shared, unlink_shared,
+                               delete, config, rmdir, lexists):
+        """
+        The blob of deduplicated content is deleted with its last hard link.
+        """
+        path = '/storage/pulp/content/units/test/ab/cdef'
+        blob = '/storage/pulp/content/blobs/12/3456'
+        unreferenced_blob.return_value = blob
+        listdir.return_value = ['other']
+        is_shared.return_value = False
+        config.get.return_value = '/storage/pulp'
+        lexists.return_value = True
+
+        OrphanManager.delete_orphaned_file(path)
+
+        unreferenced_blob.assert_called_once_with(path)
+        self.assertEqual(delete.call_args_list, [call(path), call(blob)])
+
     @patch('pulp.server.managers.content.orphan.os.access')
     @patch('pulp.server.managers.content.orphan.os.listdir')
     def test_clean_non_root(
@@ -1,6 +1,9 @@
 import errno
+import hashlib
 import os
 import shutil
+from StringIO import StringIO
+import tempfile
 
 import unittest
 import mock
@@ -10,6 +13,7 @@ from pulp.common import dateutils
 from pulp.devel import mock_plugins
 from pulp.plugins.conduits.upload import UploadConduit
 from pulp.server.controllers import importer as importer_controller
+from pulp.server import util
 from pulp.server.db import model
 from pulp.server.exceptions import (MissingResource, PulpDataException, PulpExecutionException,
                                     InvalidValue, PulpCodedException)
@@ -263,8 +267,8 @@ class TestContentUploadManager(unittest.TestCase):
     def test_delete_upload_removes_file(self, mock_os, mock__upload_file_path):
         my_upload_id = 'asdf'
         ContentUploadManager().delete_upload(my_upload_id)
-        mock__upload_file_path.assert_called_once_with(my_upload_id)
-        mock_os.remove.assert_called_once_with(mock__upload_file_path.return_value)
+        mock__upload_file_path.assert_any_call(my_upload_id)
+        mock_os.remove.assert_any_call(mock__upload_file_path.return_value)
 
     @mock.patch.object(ContentUploadManager, '_upload_file_path')
     @mock.patch('pulp.server.managers.content.upload.os')
@@ -290,3 +294,81 @@ class TestContentUploadManager(unittest.TestCase):
         my_upload_id = 'asdf'
         mock_os.remove.side_effect = ValueError()
         self.assertRaises(ValueError, ContentUploadManager().delete_upload, my_upload_id)
+
+
+class TestContentUploadManagerChecksum(unittest.TestCase):
+
+    def setUp(self):
+        self.upload_dir = tempfile.mkdtemp()
+        patcher = mock.patch.object(ContentUploadManager, '_upload_storage_dir',
+                                    return_value=self.upload_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.upload_manager = ContentUploadManager()
+
+    def tearDown(self):
+        shutil.rmtree(self.upload_dir)
+
+    def test_checksum_in_order(self):
+        upload_id = self.upload_manager.initialize_upload()
+
+        write_us = ['abc', 'de', 'fghi', 'jkl']
+        offset = 0
+        for w in write_us:
+            self.upload_manager.save_data(upload_id, offset, w)
+            offset += len(w)
+
+        expected = hashlib.sha256(''.join(write_us)).hexdigest()
+        self.assertEqual(self.upload_manager.get_upload_checksum(upload_id),
+                         (util.TYPE_SHA256, expected))
+
+    def test_checksum_file_like(self):
+        upload_id = self.upload_manager.initialize_upload()
+
+        self.upload_manager.save_data(upload_id, 0, StringIO('fus ro dah'), size=10)
+        self.upload_manager.save_data(upload_id, 10, StringIO('!'))
+
+        self.assertEqual(self.upload_manager.read_upload(upload_id), 'fus ro dah!')
+        expected = hashlib.sha256('fus ro dah!').hexdigest()
+        self.assertEqual(self.upload_manager.get_upload_checksum(upload_id),
+                         (util.TYPE_SHA256, expected))
+
+    def test_checksum_out_of_order(self):
+        upload_id = self.upload_manager.initialize_upload()
+
+        self.upload_manager.save_data(upload_id, 3, 'def')
+        self.upload_manager.save_data(upload_id, 0, 'abc')
+
+        self.assertEqual(self.upload_manager.read_upload(upload_id), 'abcdef')
+        self.assertTrue(self.upload_manager.get_upload_checksum(upload_id) is None)
+
+    def test_checksum_other_process(self):
+        upload_id = self.upload_manager.initialize_upload()
+        self.upload_manager.save_data(upload_id, 0, 'abc')
+
+        # the next segment is handled by a process that has not seen the first one
+        with mock.patch.dict('pulp.server.managers.content.upload._checksum_states', clear=True):
+            self.upload_manager.save_data(upload_id, 3, 'def')
+
+        self.assertTrue(self.upload_manager.get_upload_checksum(upload_id) is None)
+
+    def test_checksum_incomplete(self):
+        upload_id = self.upload_manager.initialize_upload()
+        self.upload_manager.save_data(upload_id, 0, StringIO('abc'), size=6)
+
+        self.assertTrue(self.upload_manager.get_upload_checksum(upload_id) is None)
+
+    def test_checksum_state_not_listed(self):
+        upload_id = self.upload_manager.initialize_upload()
+        self.upload_manager.save_data(upload_id, 0, 'abc')
+
+        self.assertEqual(self.upload_manager.list_upload_ids(), [upload_id])
+
+    def test_delete_removes_checksum_state(self):
+        upload_id = self.upload_manager.initialize_upload()
+        self.upload_manager.save_data(upload_id, 0, 'abc')
+
+        self.upload_manager.delete_upload(upload_id)
+
+        self.assertEqual(os.listdir(self.upload_dir), [])
+        self.assertTrue(self.upload_manager.get_upload_checksum(upload_id) is None)
@@ -1,3 +1,5 @@
+import unittest
+
 import mock
 
 from .... import base
@@ -202,3 +204,22 @@ class EventTests(base.PulpServerTests):
         event = event_data.Event('fake_type', {})
 
         self.assertTrue(event.call_report is None)
+
+
+@mock.patch('pulp.server.managers.event.crud.EventListenerVersion.get_collection')
+class TestListenersVersion(unittest.TestCase):
+
+    def test_version(self, mock_get_collection):
+        mock_get_collection.return_value.find_one.return_value = {'version': 4}
+        self.assertEqual(crud.listeners_version(), 4)
+        mock_get_collection.return_value.find_one.assert_called_once_with(
+            {'_id': crud.LISTENER_VERSION_ID})
+
+    def test_no_version(self, mock_get_collection):
+        mock_get_collection.return_value.find_one.return_value = None
+        self.assertEqual(crud.listeners_version(), 0)
+
+    def test_changed(self, mock_get_collection):
+        crud.listeners_changed()
+        mock_get_collection.return_value.update.assert_called_once_with(
+            {'_id': crud.LISTENER_VERSION_ID}, {'$inc': {'version': 1}}, upsert=True)
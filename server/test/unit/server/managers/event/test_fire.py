@@ -1,9 +1,12 @@
+import unittest
+
 import mock
 
 from .... import base
 from pulp.server.db.model.event import EventListener
-from pulp.server.event import data as event_data, notifiers
+from pulp.server.event import data as event_data, delivery, notifiers
 from pulp.server.managers import factory as manager_factory
+from pulp.server.managers.event import fire
 
 
 class EventFireManagerTests(base.PulpServerTests):
@@ -13,6 +16,7 @@ class EventFireManagerTests(base.PulpServerTests):
 
         self.manager = manager_factory.event_fire_manager()
         self.event_manager = manager_factory.event_listener_manager()
+        fire.listener_cache.clear()
 
     def tearDown(self):
         super(EventFireManagerTests, self).tearDown()
@@ -41,6 +45,7 @@ class EventFireManagerTests(base.PulpServerTests):
         # Test
         event = event_data.Event(event_data.TYPE_REPO_SYNC_STARTED, 'payload')
         self.manager._do_fire(event)
+        delivery.get_dispatcher().wait()
 
         # Verify
         self.assertEqual(1, notifier_1.fire.call_count)
@@ -66,6 +71,7 @@ class EventFireManagerTests(base.PulpServerTests):
         # Test
         event = event_data.Event(event_data.TYPE_REPO_SYNC_STARTED, 'payload')
         self.manager._do_fire(event)
+        delivery.get_dispatcher().wait()
 
         # Verify
         self.assertEqual(1, notifier_1.fire.call_count)
@@ -88,6 +94,7 @@ class EventFireManagerTests(base.PulpServerTests):
         # Test
         event = event_data.Event(event_data.TYPE_REPO_SYNC_STARTED, 'payload')
         self.manager._do_fire(event)
+        delivery.get_dispatcher().wait()
 
         # Verify
 
@@ -113,6 +120,7 @@ class EventFireManagerTests(base.PulpServerTests):
         # Test
         repo_id = 'test-repo'
         self.manager.fire_repo_sync_started(repo_id)
+        delivery.get_dispatcher().wait()
 
         # Verify
         self.assertEqual(1, notifier.fire.call_count)
@@ -134,6 +142,7 @@ class EventFireManagerTests(base.PulpServerTests):
         # so make up a fake dict here to simulate that.
         result = {'repo_id': 'test-repo', 'result': 'success'}
         self.manager.fire_repo_sync_finished(result)
+        delivery.get_dispatcher().wait()
 
         # Verify
         self.assertEqual(1, notifier.fire.call_count)
@@ -141,3 +150,59 @@ class EventFireManagerTests(base.PulpServerTests):
 
         self.assertEqual(event.event_type, event_data.TYPE_REPO_SYNC_FINISHED)
         self.assertEqual(event.payload, result)
+
+
+@mock.patch('pulp.server.managers.event.fire.EventListener.get_collection')
+@mock.patch('pulp.server.managers.event.crud.listeners_version')
+class TestListenerCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = fire.ListenerCache()
+        self.listeners = [{'_id': 1, 'event_types': [event_data.TYPE_REPO_SYNC_STARTED]},
+                          {'_id': 2, 'event_types': ['*']},
+                          {'_id': 3, 'event_types': [event_data.TYPE_REPO_SYNC_FINISHED]}]
+
+    def test_get(self, mock_version, mock_get_collection):
+        mock_version.return_value = 1
+        mock_get_collection.return_value.find.return_value = self.listeners
+
+        listeners = self.cache.get(event_data.TYPE_REPO_SYNC_STARTED)
+        self.cache.get(event_data.TYPE_REPO_SYNC_FINISHED)
+
+        self.assertEqual([listener['_id'] for listener in listeners], [1, 2])
+        self.assertEqual(mock_get_collection.return_value.find.call_count, 1)
+
+    def test_changed(self, mock_version, mock_get_collection):
+        mock_version.return_value = 1
+        mock_get_collection.return_value.find.return_value = self.listeners
+        self.cache.get(event_data.TYPE_REPO_SYNC_STARTED)
+
+        mock_version.return_value = 2
+        mock_get_collection.return_value.find.return_value = self.listeners[:1]
+
+        self.assertEqual(self.cache.get('*'), [])
+        self.assertEqual(mock_get_collection.return_value.find.call_count, 2)
+
+    def test_clear(self, mock_version, mock_get_collection):
+        mock_version.return_value = 1
+        mock_get_collection.return_value.find.return_value = self.listeners
+        self.cache.get(event_data.TYPE_REPO_SYNC_STARTED)
+
+        self.cache.clear()
+        self.cache.get(event_data.TYPE_REPO_SYNC_STARTED)
+
+        self.assertEqual(mock_get_collection.return_value.find.call_count, 2)
+
+
+@mock.patch('pulp.server.managers.event.fire.delivery.get_dispatcher')
+@mock.patch('pulp.server.managers.event.fire.listener_cache')
+class TestDoFire(unittest.TestCase):
+
+    def test_do_fire(self, mock_cache, mock_get_dispatcher):
+        event = mock.Mock(event_type=event_data.TYPE_REPO_SYNC_STARTED)
+
+        fire.EventFireManager()._do_fire(event)
+
+        mock_cache.get.assert_called_once_with(event_data.TYPE_REPO_SYNC_STARTED)
+        mock_get_dispatcher.return_value.dispatch.assert_called_once_with(
+            mock_cache.get.return_value, event)
@@ -1,4 +1,5 @@
 import mock
+from pymongo.errors import BulkWriteError
 
 from .... import base
 from pulp.common.compat import unittest
@@ -24,6 +25,118 @@ MOCK_TYPE_DEF = model.TypeDefinition('mock-type', 'Mock Type', 'Used by the mock
                                      ['key-1'], [], [])
 
 
+@mock.patch('pulp.server.managers.repo.unit_association.repo_controller')
+@mock.patch('pulp.server.managers.repo.unit_association.RepoContentUnit.get_collection')
+class TestAssociateUnits(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = association_manager.RepoUnitAssociationManager()
+        patcher = mock.patch('pulp.server.managers.repo.unit_association.model.OrphanCount')
+        self.mock_orphan_count = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_batches(self, mock_get_collection, mock_ctrl):
+        bulk_write = mock_get_collection.return_value.bulk_write
+        # the second unit of the first batch was already associated
+        bulk_write.side_effect = [mock.Mock(upserted_ids={0: 'a', 2: 'c'}),
+                                  mock.Mock(upserted_ids={0: 'd'})]
+        units = [('type-1', 'u1'), ('type-1', 'u2'), ('type-2', 'u3'), ('type-2', 'u4')]
+
+        added = self.manager.associate_units('repo1', iter(units), batch_size=3)
+
+        self.assertEqual(added, {'type-1': 1, 'type-2': 2})
+        self.assertEqual(bulk_write.call_count, 2)
+        requests = bulk_write.call_args_list[0][0][0]
+        self.assertEqual(len(requests), 3)
+        self.assertEqual(requests[1]._filter,
+                         {'repo_id': 'repo1', 'unit_type_id': 'type-1', 'unit_id': 'u2'})
+        self.assertTrue(requests[1]._upsert)
+        self.assertEqual(bulk_write.call_args_list[0][1], {'ordered': False})
+        # counts are updated for each batch
+        self.assertEqual(mock_ctrl.update_unit_count.call_args_list,
+                         [mock.call('repo1', 'type-1', 1), mock.call('repo1', 'type-2', 1),
+                          mock.call('repo1', 'type-2', 1)])
+        mock_ctrl.update_last_unit_added.assert_called_once_with('repo1')
+        # orphan counts are adjusted for the new associations only
+        self.assertEqual(self.mock_orphan_count.units_associated.call_args_list,
+                         [mock.call('type-1', ['u1']), mock.call('type-2', ['u3']),
+                          mock.call('type-2', ['u4'])])
+
+    def test_refresh_existing(self, mock_get_collection, mock_ctrl):
+        bulk_write = mock_get_collection.return_value.bulk_write
+        bulk_write.return_value.upserted_ids = {}
+
+        self.manager.associate_units('repo1', [('type-1', 'u1')], refresh_existing=True)
+        self.manager.associate_units('repo1', [('type-1', 'u1')])
+
+        refreshed = bulk_write.call_args_list[0][0][0][0]._doc
+        self.assertEqual(sorted(refreshed.keys()), ['$set', '$setOnInsert'])
+        self.assertEqual(refreshed['$set'].keys(), ['updated'])
+        self.assertEqual(sorted(refreshed['$setOnInsert'].keys()),
+                         ['_id', '_ns', 'created', 'id'])
+        kept = bulk_write.call_args_list[1][0][0][0]._doc
+        self.assertEqual(kept.keys(), ['$setOnInsert'])
+        self.assertEqual(sorted(kept['$setOnInsert'].keys()),
+                         ['_id', '_ns', 'created', 'id', 'updated'])
+
+    def test_legacy_fields(self, mock_get_collection, mock_ctrl):
+        """
+        New associations get the id and _ns fields the models give them.
+        """
+        bulk_write = mock_get_collection.return_value.bulk_write
+        bulk_write.return_value.upserted_ids = {}
+
+        self.manager.associate_units('repo1', [('type-1', 'u1'), ('type-1', 'u2')])
+
+        first, second = [r._doc['$setOnInsert'] for r in bulk_write.call_args[0][0]]
+        self.assertEqual(first['id'], str(first['_id']))
+        self.assertEqual(first['_ns'], 'repo_content_units')
+        self.assertNotEqual(first['_id'], second['_id'])
+
+    def test_nothing_added(self, mock_get_collection, mock_ctrl):
+        mock_get_collection.return_value.bulk_write.return_value.upserted_ids = {}
+
+        added = self.manager.associate_units('repo1', [('type-1', 'u1')])
+
+        self.assertEqual(added, {})
+        self.assertFalse(mock_ctrl.update_unit_count.called)
+        self.assertFalse(mock_ctrl.update_last_unit_added.called)
+
+    def test_no_units(self, mock_get_collection, mock_ctrl):
+        self.assertEqual(self.manager.associate_units('repo1', []), {})
+        self.assertFalse(mock_get_collection.return_value.bulk_write.called)
+
+    def test_duplicate_key(self, mock_get_collection, mock_ctrl):
+        """
+        An association created concurrently is not counted.
+        """
+        details = {'writeErrors': [{'index': 1, 'code': 11000}],
+                   'upserted': [{'index': 0, '_id': 'a'}]}
+        mock_get_collection.return_value.bulk_write.side_effect = BulkWriteError(details)
+
+        added = self.manager.associate_units('repo1', [('type-1', 'u1'), ('type-1', 'u2')])
+
+        self.assertEqual(added, {'type-1': 1})
+        mock_ctrl.update_unit_count.assert_called_once_with('repo1', 'type-1', 1)
+
+    def test_write_error(self, mock_get_collection, mock_ctrl):
+        details = {'writeErrors': [{'index': 1, 'code': 11000}, {'index': 2, 'code': 2}],
+                   'upserted': [{'index': 0, '_id': 'a'}]}
+        mock_get_collection.return_value.bulk_write.side_effect = BulkWriteError(details)
+
+        self.assertRaises(BulkWriteError, self.manager.associate_units, 'repo1',
+                          [('type-1', 'u1'), ('type-1', 'u2'), ('type-1', 'u3')])
+        self.assertFalse(mock_ctrl.update_unit_count.called)
+
+    def test_associate_all_by_ids(self, mock_get_collection, mock_ctrl):
+        mock_get_collection.return_value.bulk_write.return_value.upserted_ids = {0: 'a', 1: 'b'}
+
+        ret = self.manager.associate_all_by_ids('repo1', 'type-1', ['u1', 'u2'])
+
+        self.assertEqual(ret, 2)
+        mock_ctrl.update_unit_count.assert_called_once_with('repo1', 'type-1', 2)
+
+
 @mock.patch('pulp.server.controllers.repository.find_repo_content_units', spec_set=True)
 class TestUnitsFromCriteria(unittest.TestCase):
     def setUp(self):
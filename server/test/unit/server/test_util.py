@@ -1,6 +1,9 @@
 from cStringIO import StringIO
+import errno
 import hashlib
+import os
 import shutil
+import tempfile
 
 from mock import Mock, patch, call
 
@@ -210,6 +213,109 @@ class TestCopyTree(unittest.TestCase):
                                      call('src/file3')])
 
 
+class TestCloneTree(unittest.TestCase):
+
+    def setUp(self):
+        self.working_dir = tempfile.mkdtemp()
+        self.src = os.path.join(self.working_dir, 'src')
+        os.makedirs(os.path.join(self.src, 'sub'))
+        self.write(os.path.join(self.src, 'a'), 'aaaa')
+        self.write(os.path.join(self.src, 'sub', 'b'), 'bb')
+        os.symlink('/some/unit', os.path.join(self.src, 'link'))
+
+    def tearDown(self):
+        shutil.rmtree(self.working_dir)
+
+    def write(self, path, content):
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def read(self, path):
+        with open(path) as f:
+            return f.read()
+
+    @patch('pulp.server.util.reflink', return_value=False)
+    def test_copy(self, mock_reflink):
+        dst = os.path.join(self.working_dir, 'dst')
+
+        copied = util.clone_tree(self.src, dst)
+
+        self.assertEqual(copied, 6)
+        self.assertEqual(self.read(os.path.join(dst, 'a')), 'aaaa')
+        self.assertEqual(self.read(os.path.join(dst, 'sub', 'b')), 'bb')
+        self.assertEqual(os.readlink(os.path.join(dst, 'link')), '/some/unit')
+        self.assertAlmostEqual(os.stat(os.path.join(dst, 'a')).st_mtime,
+                               os.stat(os.path.join(self.src, 'a')).st_mtime, places=5)
+        # there is no reference to clone from
+        self.assertFalse(mock_reflink.called)
+
+    @patch('pulp.server.util.reflink', side_effect=lambda src, dst: not shutil.copy(src, dst))
+    def test_reflink(self, mock_reflink):
+        """
+        Files are never cloned from src, which is on another file system.
+        """
+        dst = os.path.join(self.working_dir, 'dst')
+
+        copied = util.clone_tree(self.src, dst)
+
+        self.assertEqual(copied, 6)
+        self.assertFalse(mock_reflink.called)
+
+    @patch('pulp.server.util.CLONE_CHUNK_SIZE', 2)
+    @patch('pulp.server.util.reflink', side_effect=lambda src, dst: not shutil.copy(src, dst))
+    def test_reflink_changed(self, mock_reflink):
+        """
+        Changed files are cloned from the reference and only their changed chunks are written.
+        """
+        previous = os.path.join(self.working_dir, 'previous')
+        util.clone_tree(self.src, previous)
+        self.write(os.path.join(self.src, 'a'), 'aaAAa')
+        self.write(os.path.join(self.src, 'sub', 'b'), 'b')
+        dst = os.path.join(self.working_dir, 'dst')
+
+        copied = util.clone_tree(self.src, dst, previous)
+
+        self.assertEqual(copied, 3)
+        self.assertEqual(self.read(os.path.join(dst, 'a')), 'aaAAa')
+        self.assertEqual(self.read(os.path.join(dst, 'sub', 'b')), 'b')
+        mock_reflink.assert_has_calls([call(os.path.join(previous, 'a'), os.path.join(dst, 'a')),
+                                       call(os.path.join(previous, 'sub', 'b'),
+                                            os.path.join(dst, 'sub', 'b'))], any_order=True)
+
+    @patch('pulp.server.util.reflink', return_value=False)
+    def test_hard_link_unchanged(self, mock_reflink):
+        previous = os.path.join(self.working_dir, 'previous')
+        util.clone_tree(self.src, previous)
+        # a changed file with the same size
+        self.write(os.path.join(self.src, 'a'), 'AAAA')
+        st = os.stat(os.path.join(self.src, 'a'))
+        os.utime(os.path.join(self.src, 'a'), (st.st_atime, st.st_mtime + 10))
+        dst = os.path.join(self.working_dir, 'dst')
+
+        copied = util.clone_tree(self.src, dst, previous)
+
+        self.assertEqual(copied, 4)
+        self.assertEqual(self.read(os.path.join(dst, 'a')), 'AAAA')
+        self.assertEqual(os.stat(os.path.join(dst, 'sub', 'b')).st_ino,
+                         os.stat(os.path.join(previous, 'sub', 'b')).st_ino)
+        self.assertNotEqual(os.stat(os.path.join(dst, 'a')).st_ino,
+                            os.stat(os.path.join(previous, 'a')).st_ino)
+        mock_reflink.assert_called_once_with(os.path.join(previous, 'a'),
+                                             os.path.join(dst, 'a'))
+
+    @patch('pulp.server.util.fcntl.ioctl', side_effect=IOError(errno.EXDEV, 'cross device'))
+    def test_reflink_unsupported(self, mock_ioctl):
+        dst = os.path.join(self.working_dir, 'a')
+
+        self.assertFalse(util.reflink(os.path.join(self.src, 'a'), dst))
+
+    @patch('pulp.server.util.fcntl.ioctl', side_effect=IOError(errno.ENOSPC, 'full'))
+    def test_reflink_error(self, mock_ioctl):
+        dst = os.path.join(self.working_dir, 'a')
+
+        self.assertRaises(IOError, util.reflink, os.path.join(self.src, 'a'), dst)
+
+
 class TestPackageListenerDeleting(unittest.TestCase):
     @patch('os.remove')
     def test_removes_path(self, mock_remove):
@@ -26,6 +26,7 @@ from pulp.server.webservices.views.content import (
     UploadsCollectionView,
     UploadSegmentResourceView
 )
+from pulp.server.webservices.views import search
 
 
 class TestOrphanCollectionView(unittest.TestCase):
@@ -43,8 +44,8 @@ class TestOrphanCollectionView(unittest.TestCase):
         Orphan collection should create a response from a dict of orphan dicts.
         """
         mock_orphans = {
-            'orphan1': 1,
-            'orphan2': 2,
+            'orphan1': {'count': 1, 'stale': False},
+            'orphan2': {'count': 2, 'stale': True},
         }
         mock_orphan_manager = mock.MagicMock()
         mock_orphan_manager.orphans_summary.return_value = mock_orphans
@@ -58,10 +59,12 @@ class TestOrphanCollectionView(unittest.TestCase):
         expected_content = {
             'orphan1': {
                 'count': 1,
+                'stale': False,
                 '_href': '/mock/path/',
             },
             'orphan2': {
                 'count': 2,
+                'stale': True,
                 '_href': '/mock/path/',
             },
         }
@@ -91,12 +94,13 @@ class TestOrphanTypeSubCollectionView(unittest.TestCase):
 
     @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
                 new=assert_auth_READ())
+    @mock.patch('pulp.server.controllers.units.get_unit_key_fields_for_type', spec_set=True)
     @mock.patch('pulp.server.webservices.views.content.reverse')
-    @mock.patch('pulp.server.webservices.views.content.generate_json_response')
     @mock.patch('pulp.server.webservices.views.content.factory')
-    def test_get_orphan_type_subcollection(self, mock_factory, mock_resp, mock_reverse):
+    def test_get_orphan_type_subcollection(self, mock_factory, mock_reverse,
+                                           mock_get_unit_key_fields):
         """
-        OrphanTypeSubCollection should return a response from a list of dicts, one for each orphan.
+        OrphanTypeSubCollection should stream a list of dicts, one for each orphan.
         """
         mock_orphan_manager = mock.MagicMock()
         mock_orphan_manager.generate_orphans_by_type_with_unit_keys.return_value = [
@@ -104,6 +108,7 @@ class TestOrphanTypeSubCollectionView(unittest.TestCase):
         ]
         mock_factory.content_orphan_manager.return_value = mock_orphan_manager
         request = mock.MagicMock()
+        request.GET = {}
         mock_reverse.return_value = '/mock/path/'
 
         orphan_type_subcollection = OrphanTypeSubCollectionView()
@@ -112,14 +117,17 @@ class TestOrphanTypeSubCollectionView(unittest.TestCase):
         expected_content = [{'_id': 'orphan1', '_href': '/mock/path/'},
                             {'_id': 'orphan2', '_href': '/mock/path/'}]
 
-        mock_resp.assert_called_once_with(expected_content)
-        self.assertTrue(response is mock_resp.return_value)
+        self.assertTrue(response.streaming)
+        self.assertEqual(json.loads(''.join(response.streaming_content)), expected_content)
+        mock_orphan_manager.generate_orphans_by_type_with_unit_keys.assert_called_once_with(
+            'mock_type', None)
 
     @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
                 new=assert_auth_READ())
-    @mock.patch('pulp.server.webservices.views.content.generate_json_response')
+    @mock.patch('pulp.server.controllers.units.get_unit_key_fields_for_type', spec_set=True)
     @mock.patch('pulp.server.webservices.views.content.factory')
-    def test_get_orphan_type_subcollection_with_empty_list(self, mock_factory, mock_resp):
+    def test_get_orphan_type_subcollection_with_empty_list(self, mock_factory,
+                                                           mock_get_unit_key_fields):
         """
         View should return a response with an empty list when there are no orphans of the type.
         """
@@ -127,14 +135,70 @@ class TestOrphanTypeSubCollectionView(unittest.TestCase):
         mock_orphan_manager.generate_orphans_by_type_with_unit_keys.return_value = []
         mock_factory.content_orphan_manager.return_value = mock_orphan_manager
         request = mock.MagicMock()
+        request.GET = {}
 
         orphan_type_subcollection = OrphanTypeSubCollectionView()
         response = orphan_type_subcollection.get(request, 'mock_type')
 
-        expected_content = []
-        mock_resp.assert_called_once_with(expected_content)
+        self.assertEqual(json.loads(''.join(response.streaming_content)), [])
+
+    @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
+                new=assert_auth_READ())
+    @mock.patch('pulp.server.controllers.units.get_unit_key_fields_for_type', spec_set=True)
+    @mock.patch('pulp.server.webservices.views.content.reverse')
+    @mock.patch('pulp.server.webservices.views.content.generate_json_response')
+    @mock.patch('pulp.server.webservices.views.content.factory')
+    def test_get_orphan_type_subcollection_page(self, mock_factory, mock_resp, mock_reverse,
+                                                mock_get_unit_key_fields):
+        """
+        A page of orphans is returned with the cursor of the next page.
+        """
+        mock_orphan_manager = mock.MagicMock()
+        mock_orphan_manager.generate_orphans_by_type_with_unit_keys.return_value = iter([
+            {'_id': 'orphan2'}, {'_id': 'orphan3'}, {'_id': 'orphan4'}
+        ])
+        mock_factory.content_orphan_manager.return_value = mock_orphan_manager
+        mock_reverse.return_value = '/mock/path/'
+        request = mock.MagicMock()
+        request.GET = {'limit': '2', 'cursor': search.encode_cursor('orphan1')}
+
+        response = OrphanTypeSubCollectionView().get(request, 'mock_type')
+
+        mock_orphan_manager.generate_orphans_by_type_with_unit_keys.assert_called_once_with(
+            'mock_type', 'orphan1')
+        mock_resp.assert_called_once_with({
+            'results': [{'_id': 'orphan2', '_href': '/mock/path/'},
+                        {'_id': 'orphan3', '_href': '/mock/path/'}],
+            'next_cursor': search.encode_cursor('orphan3'),
+        })
         self.assertTrue(response is mock_resp.return_value)
 
+    @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
+                new=assert_auth_READ())
+    @mock.patch('pulp.server.controllers.units.get_unit_key_fields_for_type', spec_set=True)
+    def test_get_orphan_type_subcollection_invalid_limit(self, mock_get_unit_key_fields):
+        """
+        An invalid page size is rejected.
+        """
+        request = mock.MagicMock()
+        request.GET = {'limit': '0'}
+
+        self.assertRaises(InvalidValue, OrphanTypeSubCollectionView().get, request, 'mock_type')
+
+    @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
+                new=assert_auth_READ())
+    @mock.patch('pulp.server.controllers.units.get_unit_key_fields_for_type', spec_set=True)
+    def test_get_orphan_type_subcollection_invalid_type(self, mock_get_unit_key_fields):
+        """
+        An unknown content type is reported before the response starts streaming.
+        """
+        mock_get_unit_key_fields.side_effect = ValueError
+        request = mock.MagicMock()
+        request.GET = {}
+
+        self.assertRaises(MissingResource, OrphanTypeSubCollectionView().get, request,
+                          'mock_type')
+
     @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
                 new=assert_auth_DELETE())
     @mock.patch('pulp.server.controllers.units.get_unit_key_fields_for_type', spec_set=True)
@@ -318,6 +382,41 @@ class TestContentUnitSearch(unittest.TestCase):
         self.assertEqual(len(ret), 1)
         self.assertEqual(ret[0].get('repository_memberships'), ['repo1'])
 
+    @mock.patch('pulp.server.webservices.views.content.units_controller')
+    @mock.patch('pulp.server.webservices.views.content.factory')
+    def test_add_repo_memberships_cached(self, mock_factory, mock_ctrl):
+        """
+        Units caching their memberships are not looked up.
+        """
+        mock_ctrl.REPO_MEMBERSHIPS_FIELD = '_repo_memberships'
+        mock_ctrl.repo_membership_cache_enabled.return_value = True
+        mock_ctrl.cache_repo_memberships.side_effect = lambda type_id, ids, find: find(ids)
+        mock_find = mock_factory.repo_unit_association_query_manager().find_by_criteria
+        mock_find.return_value = [{'repo_id': 'repo2', 'unit_id': 'unit2'}]
+        units = [{'_id': 'unit1', '_repo_memberships': ['repo1']}, {'_id': 'unit2'}]
+
+        ContentUnitSearch()._add_repo_memberships(units, 'rpm')
+
+        self.assertEqual(mock_ctrl.cache_repo_memberships.call_args[0][:2], ('rpm', ['unit2']))
+        criteria = mock_find.call_args[0][0]
+        self.assertEqual(criteria.filters, {'unit_id': {'$in': ['unit2']}, 'unit_type_id': 'rpm'})
+        self.assertEqual(units[0]['repository_memberships'], ['repo1'])
+        self.assertEqual(units[1]['repository_memberships'], ['repo2'])
+
+    @mock.patch('pulp.server.webservices.views.search.SearchView._generate_response')
+    def test_include_repos_streamed(self, mock_generate):
+        """
+        Searches including repositories are streamed unless they are sorted or paged.
+        """
+        for query, options, stream in [
+                ({}, {'include_repos': True}, True),
+                ({}, {'include_repos': False}, None),
+                ({'sort': [['name', 'ascending']]}, {'include_repos': True}, None),
+                ({}, {'include_repos': True, 'stream': False}, False),
+                ({}, {'include_repos': True, 'cursor': ''}, None)]:
+            ContentUnitSearch._generate_response(query, options, type_id='rpm')
+            self.assertEqual(options.get('stream'), stream)
+
     @mock.patch('pulp.server.webservices.views.content.ContentUnitSearch._add_repo_memberships')
     @mock.patch('pulp.server.webservices.views.content._process_content_unit')
     def test_get_results_without_repos(self, mock_process, mock_add_repo):
@@ -642,12 +741,12 @@ class TestUploadSegmentResourceView(unittest.TestCase):
         mock_upload_manager = mock.MagicMock()
         mock_factory.content_upload_manager.return_value = mock_upload_manager
         request = mock.MagicMock()
-        request.body = 'upload these bits'
+        request.META = {'CONTENT_LENGTH': '17'}
 
         upload_segment_resource = UploadSegmentResourceView()
         response = upload_segment_resource.put(request, 'mock_id', 4)
 
-        mock_upload_manager.save_data.assert_called_once_with('mock_id', 4, 'upload these bits')
+        mock_upload_manager.save_data.assert_called_once_with('mock_id', 4, request, size=17)
         mock_resp.assert_called_once_with(None)
         self.assertTrue(response is mock_resp.return_value)
 
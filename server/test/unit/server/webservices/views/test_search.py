@@ -1,6 +1,8 @@
 """
 This module contains tests for the pulp.server.webservices.views.search module.
 """
+import json
+
 import mock
 from django import http
 from pymongo.errors import OperationFailure
@@ -445,6 +447,115 @@ class TestParseArgs(unittest.TestCase):
         self.assertTrue(options['opt_bool'] is False)
 
 
+class FakeManager(object):
+    """
+    A manager searching a list of documents with support for the subset of the
+    mongo query language used by keyset pagination.
+    """
+
+    def __init__(self, documents):
+        self.documents = documents
+
+    @staticmethod
+    def _matched(document, clause):
+        for key, condition in clause.items():
+            if isinstance(condition, dict):
+                if '$gt' in condition and not document[key] > condition['$gt']:
+                    return False
+                if '$gte' in condition and not document[key] >= condition['$gte']:
+                    return False
+            elif document[key] != condition:
+                return False
+        return True
+
+    def find_by_criteria(self, query):
+        filters = query.filters or {}
+        clauses = filters.get('$and', [filters])
+        results = [d for d in self.documents if all(self._matched(d, c) for c in clauses)]
+        if query.sort:
+            results.sort(key=lambda d: d[query.sort[0][0]])
+        if query.skip:
+            results = results[query.skip:]
+        if query.limit:
+            results = results[:query.limit]
+        return iter(results)
+
+
+class TestPagedSearch(unittest.TestCase):
+    """
+    Tests streaming and cursor pagination of search results.
+    """
+
+    def setUp(self):
+        documents = [{'_id': 'id-%02d' % n, 'n': n} for n in range(7)]
+        documents.reverse()
+
+        class FakeSearchView(search.SearchView):
+            manager = FakeManager(documents)
+
+        self.view = FakeSearchView
+        self.expected = sorted(documents, key=lambda d: d['_id'])
+
+    def page(self, cursor, **query):
+        response = self.view._generate_response(query, {search.CURSOR: cursor})
+        return json.loads(response.content)
+
+    @mock.patch('pulp.server.webservices.views.search.STREAM_PAGE_SIZE', 2)
+    def test_stream(self):
+        with mock.patch.object(self.view, 'get_results',
+                               side_effect=self.view.get_results) as get_results:
+            response = self.view._generate_response({'filters': {'n': {'$gte': 1}}},
+                                                    {search.STREAM: True})
+            # the first page is fetched before the response is returned
+            self.assertEqual(get_results.call_count, 1)
+            content = ''.join(response.streaming_content)
+
+        self.assertTrue(isinstance(response, http.StreamingHttpResponse))
+        self.assertEqual(json.loads(content), self.expected[1:])
+        # three full pages and an empty page
+        self.assertEqual(get_results.call_count, 4)
+
+    @mock.patch('pulp.server.webservices.views.search.STREAM_PAGE_SIZE', 2)
+    def test_stream_limit_skip(self):
+        response = self.view._generate_response({'limit': 3, 'skip': 1}, {search.STREAM: True})
+        content = ''.join(response.streaming_content)
+        self.assertEqual(json.loads(content), self.expected[1:4])
+
+    def test_cursor(self):
+        results = []
+        page = self.page('', limit=3)
+        results.extend(page['results'])
+        while page['next_cursor']:
+            self.assertEqual(len(page['results']), 3)
+            page = self.page(page['next_cursor'], limit=3)
+            results.extend(page['results'])
+        self.assertEqual(results, self.expected)
+
+    def test_cursor_stream(self):
+        response = self.view._generate_response(
+            {'limit': 5}, {search.CURSOR: '', search.STREAM: True})
+        page = json.loads(''.join(response.streaming_content))
+        self.assertEqual(page['results'], self.expected[:5])
+        self.assertEqual(search.decode_cursor(page['next_cursor']), self.expected[4]['_id'])
+
+    def test_cursor_object_id(self):
+        object_id = search.ObjectId()
+        self.assertEqual(search.decode_cursor(search.encode_cursor(object_id)), object_id)
+        self.assertTrue(search.decode_cursor('') is None)
+
+    def test_invalid_cursor(self):
+        self.assertRaises(exceptions.InvalidValue, self.page, 'not-a-cursor')
+
+    def test_sort_not_supported(self):
+        self.assertRaises(exceptions.InvalidValue, self.view._generate_response,
+                          {'sort': [['n', 'ascending']]}, {search.STREAM: True})
+
+    def test_parse_args(self):
+        params, options = self.view._parse_args({'stream': 'true', 'cursor': 'abc', 'limit': 1})
+        self.assertEqual(params, {'limit': 1})
+        self.assertEqual(options, {search.STREAM: True, search.CURSOR: 'abc'})
+
+
 class TestTrimResults(unittest.TestCase):
     """
     Tests the helper function for removing all non-required non-requested fields.
@@ -3,6 +3,8 @@ This module contains tests for the pulp.server.webservices.views.tasks module.
 """
 import mock
 
+from bson.objectid import ObjectId
+from django.http import QueryDict
 from mongoengine.queryset import DoesNotExist
 
 from .base import assert_auth_DELETE, assert_auth_READ
@@ -10,9 +12,10 @@ from pulp.common.compat import unittest
 from pulp.server import exceptions as pulp_exceptions
 from pulp.server.db import model
 from pulp.server.exceptions import MissingResource
-from pulp.server.webservices.views import util
-from pulp.server.webservices.views.tasks import (TaskCollectionView, TaskResourceView,
-                                                 TaskSearchView, task_serializer)
+from pulp.server.webservices.views import search, util
+from pulp.server.webservices.views.tasks import (DEFAULT_PAGE_SIZE, TaskCollectionView,
+                                                 TaskResourceView, TaskSearchView,
+                                                 task_serializer)
 
 
 @mock.patch('pulp.server.webservices.views.tasks.serial_dispatch')
@@ -66,16 +69,18 @@ class TestTaskCollection(unittest.TestCase):
         """
 
         mock_request = mock.MagicMock()
-        mock_request.GET.getlist.return_value = ['mock_tag_1', 'mock_tag_2']
-        mock_task_status.objects.return_value = ['mock_1', 'mock_2']
-        mock_task_serializer.side_effect = lambda x: x
+        mock_request.GET = QueryDict('tag=mock_tag_1&tag=mock_tag_2')
+        mock_task_status.objects.return_value.exclude.return_value = ['mock_1', 'mock_2']
+        mock_task_serializer.side_effect = lambda x: {'task': x, 'result': 'r'}
 
         task_collection = TaskCollectionView()
         response = task_collection.get(mock_request)
 
         mock_task_status.objects.assert_called_once_with(group_id=None, tags__all=['mock_tag_1',
                                                                                    'mock_tag_2'])
-        mock_resp.assert_called_once_with(['mock_1', 'mock_2'])
+        mock_task_status.objects.return_value.exclude.assert_called_once_with(
+            'progress_report', 'result', 'metrics')
+        mock_resp.assert_called_once_with([{'task': 'mock_1'}, {'task': 'mock_2'}])
         mock_task_serializer.assert_has_calls([mock.call('mock_1'), mock.call('mock_2')])
         self.assertTrue(response is mock_resp.return_value)
 
@@ -90,33 +95,171 @@ class TestTaskCollection(unittest.TestCase):
         """
 
         mock_request = mock.MagicMock()
-        mock_request.GET.getlist.return_value = []
-        mock_task_status.objects.return_value = ['mock_1', 'mock_2']
-        mock_task_serializer.side_effect = lambda x: x
+        mock_request.GET = QueryDict('')
+        mock_task_status.objects.return_value.exclude.return_value = ['mock_1', 'mock_2']
+        mock_task_serializer.side_effect = lambda x: {'task': x}
 
         task_collection = TaskCollectionView()
         response = task_collection.get(mock_request)
 
         mock_task_status.objects.assert_called_once_with(group_id=None)
-        mock_resp.assert_called_once_with(['mock_1', 'mock_2'])
+        mock_resp.assert_called_once_with([{'task': 'mock_1'}, {'task': 'mock_2'}])
         mock_task_serializer.assert_has_calls([mock.call('mock_1'), mock.call('mock_2')])
         self.assertTrue(response is mock_resp.return_value)
 
+    @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
+                new=assert_auth_READ())
+    @mock.patch('pulp.server.webservices.views.tasks.task_serializer')
+    @mock.patch('pulp.server.webservices.views.tasks.TaskStatus')
+    @mock.patch('pulp.server.webservices.views.tasks.generate_json_response_with_pulp_encoder')
+    def test_get_task_collection_details(self, mock_resp, mock_task_status,
+                                         mock_task_serializer):
+        """
+        Test that the progress report and result are included when asked for.
+        """
+        mock_request = mock.MagicMock()
+        mock_request.GET = QueryDict('details=true')
+        mock_task_status.objects.return_value = ['mock_1']
+        mock_task_serializer.side_effect = lambda x: {'task': x, 'result': 'r'}
+
+        # the queryset is a list, it would fail if fields were excluded
+        TaskCollectionView().get(mock_request)
+
+        mock_resp.assert_called_once_with([{'task': 'mock_1', 'result': 'r'}])
+
+    @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
+                new=assert_auth_READ())
+    @mock.patch('pulp.server.webservices.views.tasks.task_serializer')
+    @mock.patch('pulp.server.webservices.views.tasks.TaskStatus')
+    @mock.patch('pulp.server.webservices.views.tasks.generate_json_response_with_pulp_encoder')
+    def test_get_task_collection_result(self, mock_resp, mock_task_status, mock_task_serializer):
+        """
+        Test that a single detail field can be asked for.
+        """
+        mock_request = mock.MagicMock()
+        mock_request.GET = QueryDict('result=true')
+        mock_task_status.objects.return_value.exclude.return_value = []
+
+        TaskCollectionView().get(mock_request)
+
+        mock_task_status.objects.return_value.exclude.assert_called_once_with('progress_report',
+                                                                              'metrics')
+
+    @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
+                new=assert_auth_READ())
+    @mock.patch('pulp.server.webservices.views.tasks.TaskStatus')
+    @mock.patch('pulp.server.webservices.views.tasks.generate_json_response_with_pulp_encoder')
+    def test_get_task_collection_filters(self, mock_resp, mock_task_status):
+        """
+        Test the state and time range filters.
+        """
+        mock_request = mock.MagicMock()
+        mock_request.GET = QueryDict('state=running&state=waiting&started_after=2016-01-02'
+                                     '&finished_before=2016-01-02T03:04:05%2B02:00')
+        mock_task_status.objects.return_value.exclude.return_value = []
+
+        TaskCollectionView().get(mock_request)
+
+        mock_task_status.objects.assert_called_once_with(
+            group_id=None, state__in=['running', 'waiting'],
+            start_time__gte='2016-01-02T00:00:00Z', finish_time__lt='2016-01-02T01:04:05Z')
+
+    @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
+                new=assert_auth_READ())
+    @mock.patch('pulp.server.webservices.views.tasks.TaskStatus')
+    def test_get_task_collection_invalid_filters(self, mock_task_status):
+        """
+        Test that invalid states and times are rejected.
+        """
+        for query in ('state=bogus', 'started_before=yesterday', 'limit=0', 'limit=x',
+                      'limit=1001', 'cursor=bogus'):
+            mock_request = mock.MagicMock()
+            mock_request.GET = QueryDict(query)
+            self.assertRaises(pulp_exceptions.InvalidValue, TaskCollectionView().get,
+                              mock_request)
+
+    @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
+                new=assert_auth_READ())
+    @mock.patch('pulp.server.webservices.views.tasks.task_serializer')
+    @mock.patch('pulp.server.webservices.views.tasks.TaskStatus')
+    @mock.patch('pulp.server.webservices.views.tasks.generate_json_response_with_pulp_encoder')
+    def test_get_task_collection_page(self, mock_resp, mock_task_status, mock_task_serializer):
+        """
+        Test getting the first page of tasks.
+        """
+        tasks = [mock.MagicMock(id=ObjectId()), mock.MagicMock(id=ObjectId())]
+        mock_request = mock.MagicMock()
+        mock_request.GET = QueryDict('limit=2')
+        queryset = mock_task_status.objects.return_value.exclude.return_value
+        queryset.order_by.return_value.limit.return_value = tasks
+        mock_task_serializer.side_effect = lambda x: {'task': x}
+
+        TaskCollectionView().get(mock_request)
+
+        self.assertFalse(queryset.filter.called)
+        queryset.order_by.assert_called_once_with('+id')
+        queryset.order_by.return_value.limit.assert_called_once_with(2)
+        page = mock_resp.call_args[0][0]
+        self.assertEqual(page['results'], [{'task': tasks[0]}, {'task': tasks[1]}])
+        self.assertEqual(search.decode_cursor(page['next_cursor']), tasks[1].id)
+
+    @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
+                new=assert_auth_READ())
+    @mock.patch('pulp.server.webservices.views.tasks.task_serializer')
+    @mock.patch('pulp.server.webservices.views.tasks.TaskStatus')
+    @mock.patch('pulp.server.webservices.views.tasks.generate_json_response_with_pulp_encoder')
+    def test_get_task_collection_last_page(self, mock_resp, mock_task_status,
+                                           mock_task_serializer):
+        """
+        Test getting the page after a cursor, which is the last page.
+        """
+        last_id = ObjectId()
+        tasks = [mock.MagicMock(id=ObjectId())]
+        mock_request = mock.MagicMock()
+        mock_request.GET = QueryDict('cursor=%s' % search.encode_cursor(last_id))
+        queryset = mock_task_status.objects.return_value.exclude.return_value.filter.return_value
+        queryset.order_by.return_value.limit.return_value = tasks
+        mock_task_serializer.side_effect = lambda x: {'task': x}
+
+        TaskCollectionView().get(mock_request)
+
+        mock_task_status.objects.return_value.exclude.return_value.filter.assert_called_once_with(
+            id__gt=last_id)
+        queryset.order_by.return_value.limit.assert_called_once_with(DEFAULT_PAGE_SIZE)
+        mock_resp.assert_called_once_with({'results': [{'task': tasks[0]}], 'next_cursor': None})
+
     @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
                 new=assert_auth_DELETE())
     @mock.patch('pulp.server.webservices.views.tasks.TaskStatus')
     def test_delete_task_collection(self, mock_task_status):
         """
-        Test get task_collection with tags.
+        Test deleting completed tasks in a single query.
         """
 
         mock_request = mock.MagicMock()
-        mock_request.GET.getlist.return_value = ['finished']
+        mock_request.GET.getlist.return_value = ['finished', 'skipped']
 
         task_collection = TaskCollectionView()
         task_collection.delete(mock_request)
 
-        mock_task_status.objects.assert_called_once_with(state='finished')
+        mock_task_status.objects.assert_called_once_with(state__in=['finished', 'skipped'])
+        mock_task_status.objects.return_value.delete.assert_called_once_with()
+
+    @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
+                new=assert_auth_DELETE())
+    @mock.patch('pulp.server.webservices.views.tasks.TaskStatus')
+    def test_delete_task_collection_invalid_state(self, mock_task_status):
+        """
+        Test that nothing is deleted when a state is not valid.
+        """
+
+        mock_request = mock.MagicMock()
+        mock_request.GET.getlist.return_value = ['finished', 'running']
+
+        task_collection = TaskCollectionView()
+        with self.assertRaises(pulp_exceptions.PulpCodedValidationException):
+            task_collection.delete(mock_request)
+        self.assertFalse(mock_task_status.objects.called)
 
     @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
                 new=assert_auth_DELETE())
@@ -135,11 +135,12 @@ class TestUserResourceView(unittest.TestCase):
 
     @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
                 new=assert_auth_DELETE())
+    @mock.patch('pulp.server.webservices.views.users.authorization.permissions_changed')
     @mock.patch('pulp.server.webservices.views.users.reverse')
     @mock.patch('pulp.server.webservices.views.users.Permission.get_collection')
     @mock.patch('pulp.server.webservices.views.users.generate_json_response')
     @mock.patch('pulp.server.webservices.views.users.user_controller')
-    def test_delete_single_user(self, mock_ctrl, mock_resp, mock_perm, mock_rev):
+    def test_delete_single_user(self, mock_ctrl, mock_resp, mock_perm, mock_rev, mock_changed):
         """
         Test user deletion.
         """
@@ -151,6 +152,8 @@ class TestUserResourceView(unittest.TestCase):
         mock_ctrl.delete_user.assert_called_once_with('test-user')
         mock_resp.assert_called_once_with()
         mock_perm().remove.assert_called_once_with({'resource': mock_rev.return_value})
+        # cached permissions are reloaded
+        mock_changed.assert_called_once_with()
         self.assertTrue(response is mock_resp.return_value)
 
     @mock.patch('pulp.server.webservices.views.decorators._verify_auth',
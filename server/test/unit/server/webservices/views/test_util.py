@@ -1,8 +1,9 @@
+from datetime import datetime
 import httplib
 import json
 import mock
 
-from django.http import HttpResponse, HttpResponseNotFound
+from django.http import HttpResponse, HttpResponseNotFound, StreamingHttpResponse
 
 from pulp.common.compat import unittest
 from pulp.server.exceptions import InputEncodingError, PulpCodedValidationException
@@ -58,6 +59,32 @@ class TestResponseGenerators(unittest.TestCase):
         util.generate_json_response_with_pulp_encoder(test_content)
         mock_json.dumps.assert_called_once_with(test_content, default=pulp_json_encoder)
 
+    def test_json_array_chunks(self):
+        """
+        Test that the items are encoded incrementally as a single JSON array.
+        """
+        items = [{'n': n, 'when': datetime(2015, 1, n + 1)} for n in range(10)]
+        chunks = list(util.json_array_chunks(iter(items), default=pulp_json_encoder,
+                                             chunk_size=64))
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual(''.join(chunks), json.dumps(items, default=pulp_json_encoder))
+
+    def test_json_array_chunks_empty(self):
+        """
+        Test that no items are encoded as an empty array.
+        """
+        self.assertEqual(list(util.json_array_chunks([])), ['[]'])
+
+    def test_generate_streaming_json_response(self):
+        """
+        Test that the chunks are streamed with the JSON content type.
+        """
+        response = util.generate_streaming_json_response(iter(['[', '1', ']']))
+        self.assertTrue(isinstance(response, StreamingHttpResponse))
+        self.assertEqual(response._headers.get('content-type'),
+                         ('Content-Type', 'application/json; charset=utf-8'))
+        self.assertEqual(''.join(response.streaming_content), '[1]')
+
     @mock.patch('pulp.server.webservices.views.util.iri_to_uri')
     def test_generate_redirect_response(self, mock_iri_to_uri):
         """